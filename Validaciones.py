@@ -1,4 +1,52 @@
+from __future__ import annotations
+
 import re
+import functools
+from typing import Iterable, List, Optional
+
+import carga_diferida
+
+# numpy y pandas solo hacen falta para validar columnas completas (importaciones)
+np = carga_diferida.modulo("numpy")
+pd = carga_diferida.modulo("pandas")
+
+REGEX_CORREO = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
+_PATRON_CORREO = re.compile(REGEX_CORREO)
+
+# =======================
+# Forma canónica del RUT
+# =======================
+# Una sola forma para comparar RUT en toda la app (validación, upsert y referencias por RUT de
+# las importaciones, filtros de la API): sin puntos ni guion, sin espacios en los extremos y con
+# K mayúscula, '12.345.678-k' -> '12345678K'. canonizar_rut, canonizar_ruts_serie y
+# sql_rut_canonico (base de los índices de RUT de db.py) la calculan igual.
+_ESPACIOS = " \t\n\r\x0b\x0c"
+REGEX_FORMA_RUT = r"[0-9]{7,8}[0-9K]"  # cuerpo de 7 u 8 dígitos y DV, ya canónico
+_PATRON_FORMA_RUT = re.compile(REGEX_FORMA_RUT)
+
+
+def canonizar_rut(rut_raw: str) -> Optional[str]:
+    """
+    Forma canónica del RUT si el texto tiene forma de RUT; None si no.
+    No revisa el dígito verificador (ver validar_rut / normalizar_rut).
+    """
+    if not isinstance(rut_raw, str):
+        return None
+    rut = rut_raw.replace(".", "").replace("-", "").strip(_ESPACIOS).upper()
+    return rut if _PATRON_FORMA_RUT.fullmatch(rut) else None
+
+
+def canonizar_ruts_serie(ruts: pd.Series) -> pd.Series:
+    """canonizar_rut sobre una columna completa (None donde no hay forma de RUT)."""
+    rut = ruts.astype("string").str.replace(".", "", regex=False).str.replace("-", "", regex=False)
+    rut = rut.str.strip(_ESPACIOS).str.upper()
+    return rut.where(rut.str.fullmatch(REGEX_FORMA_RUT).fillna(False).astype(bool), None)
+
+
+def sql_rut_canonico(col: str) -> str:
+    """canonizar_rut como expresión SQL, sin revisar la forma (índices y comparaciones por RUT)."""
+    return f"UPPER(TRIM(REPLACE(REPLACE({col}, '.', ''), '-', ''), ' ' || char(9, 10, 13, 11, 12)))"
+
 
 def validar_correo(correo: str) -> bool:
     """
@@ -8,8 +56,7 @@ def validar_correo(correo: str) -> bool:
     if correo is None:
         return False
     correo = correo.strip()
-    regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-    return re.match(regex, correo) is not None
+    return _PATRON_CORREO.match(correo) is not None
 
 
 def validar_rut(rut_raw: str) -> bool:
@@ -22,27 +69,15 @@ def validar_rut(rut_raw: str) -> bool:
     - '9.876.543-K'
     """
     try:
-        if rut_raw is None:
-            return False
-
-        # 1. limpiar: sacar puntos y guion, mayúscula
-        rut = rut_raw.replace(".", "").replace("-", "").strip().upper()
-
-        # ahora rut debe ser [cuerpo][DV]
-        # cuerpo = todos menos el último
-        # DV = último (0-9 o K)
-        if len(rut) < 8 or len(rut) > 9:
-            # mínimo 7 dígitos + DV = 8 chars
-            # máximo 8 dígitos + DV = 9 chars
+        # 1. limpiar: sacar puntos y guion, mayúscula (forma canónica)
+        # ahora rut debe ser [cuerpo][DV]: 7 u 8 dígitos + DV (0-9 o K)
+        rut = canonizar_rut(rut_raw)
+        if rut is None:
             return False
 
         cuerpo = rut[:-1]
         dv_ingresado = rut[-1]
 
-        # cuerpo tiene que ser numérico
-        if not cuerpo.isdigit():
-            return False
-
         # 2. calcular dígito verificador esperado con el algoritmo oficial
         suma = 0
         mult = 2
@@ -68,3 +103,106 @@ def validar_rut(rut_raw: str) -> bool:
         return False
 
 
+
+
+# =======================
+# Validación por columnas (importaciones)
+# =======================
+@functools.lru_cache(maxsize=None)
+def _tablas_rut() -> tuple:
+    """(DV por resto, pesos, potencias de 10); se arman al primer uso para no cargar numpy antes."""
+    # DV según 11 - (suma % 11): 11 -> '0', 10 -> 'K'
+    dv_por_resto = np.array(["", "1", "2", "3", "4", "5", "6", "7", "8", "9", "K", "0"])
+    # Multiplicadores de izquierda a derecha para un cuerpo de 8 dígitos (2, 3, ..., 7, 2, 3 desde la derecha)
+    pesos = np.array([3, 2, 7, 6, 5, 4, 3, 2], dtype="int64")
+    return dv_por_resto, pesos, 10 ** np.arange(7, -1, -1, dtype="int64")
+
+
+def digitos_verificadores_desde_digitos(digitos: np.ndarray) -> np.ndarray:
+    """
+    DV esperado para cada fila de una matriz (n, 8) de dígitos 0-9, con los cuerpos alineados
+    a la derecha y completados con ceros (los ceros a la izquierda no suman).
+    """
+    dv_por_resto, pesos, _ = _tablas_rut()
+    suma = np.asarray(digitos, dtype="int64") @ pesos
+    return dv_por_resto[11 - suma % 11]
+
+
+def digitos_verificadores(cuerpos: np.ndarray) -> np.ndarray:
+    """DV esperado para cada cuerpo de RUT (enteros de hasta 8 dígitos), sin recorrer fila a fila."""
+    n = np.asarray(cuerpos, dtype="int64")
+    return digitos_verificadores_desde_digitos(n[:, None] // _tablas_rut()[2] % 10)
+
+
+def _por_columna(valores: pd.Series, rapido, escalar) -> pd.Series:
+    """
+    Aplica `rapido` (operaciones de columna) a los textos ASCII imprimibles y el validador
+    escalar al resto (tabs, Unicode...), que es raro; así el resultado es idéntico al escalar.
+    Los valores nulos no son válidos.
+    """
+    ok = pd.Series(False, index=valores.index)
+    texto = valores[valores.notna()].astype(str)
+    imprimible = texto.str.fullmatch(r"[ -~]*").fillna(False).astype(bool)
+    ok[texto.index[imprimible.to_numpy()]] = rapido(texto[imprimible]).to_numpy()
+    otros = texto[~imprimible]
+    if len(otros):
+        ok[otros.index] = otros.map(escalar).astype(bool).to_numpy()
+    return ok
+
+
+def _ruts_imprimibles(texto: pd.Series) -> pd.Series:
+    rut = canonizar_ruts_serie(texto)
+    forma = rut.notna().to_numpy()
+    ok = np.zeros(len(rut), dtype=bool)
+    candidatos = rut[forma]
+    if len(candidatos):
+        esperado = digitos_verificadores(candidatos.str[:-1].astype("int64").to_numpy())
+        ok[forma] = candidatos.str[-1].to_numpy(dtype=object) == esperado
+    return pd.Series(ok, index=texto.index)
+
+
+def _correos_imprimibles(texto: pd.Series) -> pd.Series:
+    return texto.str.strip().str.match(REGEX_CORREO).fillna(False).astype(bool)
+
+
+def validar_rut_serie(ruts: pd.Series) -> pd.Series:
+    """validar_rut sobre una columna completa (Series de bool con el mismo índice)."""
+    return _por_columna(ruts, _ruts_imprimibles, validar_rut)
+
+
+def validar_correo_serie(correos: pd.Series) -> pd.Series:
+    """validar_correo sobre una columna completa (Series de bool con el mismo índice)."""
+    return _por_columna(correos, _correos_imprimibles, validar_correo)
+
+
+# =======================
+# API por lotes (listas, columnas de CSV, resultados de consultas)
+# =======================
+def _serie(valores: Iterable) -> pd.Series:
+    if isinstance(valores, pd.Series):
+        return valores
+    return pd.Series(list(valores), dtype=object)
+
+
+def validar_ruts(ruts: Iterable) -> np.ndarray:
+    """validar_rut para muchos valores a la vez; devuelve un arreglo de bool en el mismo orden."""
+    return validar_rut_serie(_serie(ruts)).to_numpy()
+
+
+def validar_correos(correos: Iterable) -> np.ndarray:
+    """validar_correo para muchos valores a la vez; devuelve un arreglo de bool en el mismo orden."""
+    return validar_correo_serie(_serie(correos)).to_numpy()
+
+
+def normalizar_rut(rut_raw: str) -> Optional[str]:
+    """Forma canónica de un RUT válido ('12.345.678-k' -> '12345678K'); None si el RUT no es válido."""
+    return canonizar_rut(rut_raw) if validar_rut(rut_raw) else None
+
+
+def normalizar_ruts(ruts: Iterable) -> List[Optional[str]]:
+    """normalizar_rut para muchos valores a la vez (None en los inválidos), en el mismo orden."""
+    serie = _serie(ruts)
+    ok = validar_rut_serie(serie).to_numpy()
+    salida = np.full(len(serie), None, dtype=object)
+    salida[ok] = canonizar_ruts_serie(serie[ok]).to_numpy(dtype=object)
+    return salida.tolist()
@@ -0,0 +1,362 @@
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import sqlite3
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import cdc
+import db
+import metricas
+
+# =======================
+# API JSON (sin Streamlit)
+# =======================
+# Servidor HTTP de la biblioteca estándar sobre db.py, para integraciones (laboratorio, tótem
+# de citas) que hoy leen los CSV exportados. Corre como proceso aparte contra el mismo archivo
+# SQLite que la app (WAL: lee en paralelo con ella):
+#
+#     python api.py --bd base.db --puerto 8600
+#
+#   GET  /                                           recursos y sus filtros
+#   GET  /<recurso>?<filtro>=v&limite=50&despues=N   página por keyset (rowid > N); "siguiente"
+#                                                    y el header Link traen el cursor de la próxima
+#   GET  /<recurso>/<id>                             una fila
+#   POST /<recurso>[?modo=upsert&simular=1]          alta masiva: lista JSON de objetos, pasa por
+#                                                    importar_csv (validación, deduplicación, RUTs);
+#                                                    201 si entraron todas, 207 si solo algunas (el
+#                                                    reporte detalla las rechazadas), 422 si ninguna
+#   GET  /salud
+# Los GET llevan ETag (watermark de CambioLog + versión del esquema): todas las tablas expuestas
+# tienen triggers de CDC, así que con If-None-Match igual se responde 304 sin leer las tablas.
+PUERTO = 8600
+LIMITE_PAGINA = 50
+MAX_LIMITE = 500
+MAX_CUERPO = 50 * 1024 * 1024
+VERSION_API = 1  # entra en el ETag: cambiarla si cambia la forma de las respuestas
+
+
+def _fk_resultado() -> str:
+    """Columna de ResultadoExamen que apunta a SolicitudExamen (depende del esquema, como en ui_timeline)."""
+    return "ID_SolicitudExamen" if db.has_column("ResultadoExamen", "ID_SolicitudExamen") else "ID_Resultado_Examen"
+
+
+# recurso -> tabla, filtros (parámetro -> condición SQL con un ?), columnas internas que no se
+# exponen y entidad de ENTIDADES_IMPORT para el alta masiva
+RECURSOS = {
+    "pacientes": {
+        "tabla": "Paciente",
+        "filtros": {"rut": f"{db.sql_rut_canonico('rut')} = {db.sql_rut_canonico('?')}"},
+        "ocultar": ["hash_fila"],
+        "importar": "Pacientes",
+    },
+    "medicos": {
+        "tabla": "Medico",
+        "filtros": {
+            "rut": f"{db.sql_rut_canonico('Rut')} = {db.sql_rut_canonico('?')}",
+            "especialidad": "especialidad = ?",
+            "estado": "Estado = ?",
+        },
+        "ocultar": ["hash_fila"],
+        "importar": "Medicos",
+    },
+    "citas": {
+        "tabla": "Cita",
+        "filtros": {
+            "id_paciente": "id_paciente = ?",
+            "id_medico": "id_medico = ?",
+            "estado": "estado = ?",
+            "fecha_desde": "fecha >= ?",
+            "fecha_hasta": "fecha <= ?",
+        },
+        "importar": "Citas",
+    },
+    "fichas": {
+        "tabla": "FichaMedica",
+        "filtros": {"id_paciente": "id_paciente = ?"},
+        "importar": "FichaMedica",  # con presion_arterial, Temperatura, ... crea también los signos vitales
+    },
+    "signos_vitales": {
+        "tabla": "SignosVitales",
+        "filtros": {"id_ficha": "ID_Ficha_Medica = ?"},
+    },
+    "examenes": {
+        "tabla": "SolicitudExamen",
+        "filtros": {"id_ficha": "ID_ficha_medica = ?", "estado": "Estado = ?"},
+    },
+    "resultados_examen": {
+        "tabla": "ResultadoExamen",
+        "filtros": {"id_examen": lambda: f"{_fk_resultado()} = ?"},
+    },
+    "prescripciones": {
+        "tabla": "Prescripcion",
+        "filtros": {"id_ficha": "ID_Ficha_Medica = ?", "estado": "Estado = ?"},
+    },
+}
+
+
+class ErrorApi(Exception):
+    """Error con su código HTTP; se responde como {"error": mensaje}."""
+
+    def __init__(self, estado: int, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# =======================
+# Consultas
+# =======================
+def _condicion(spec: dict, filtro: str) -> str:
+    condicion = spec["filtros"][filtro]
+    return condicion() if callable(condicion) else condicion
+
+
+def sql_pagina(recurso: str, filtros: List[str]) -> str:
+    """Página por keyset: filas con rowid > ? en orden de rowid (la PK, o el índice del filtro + rowid)."""
+    spec = RECURSOS[recurso]
+    condiciones = [_condicion(spec, f) for f in filtros] + ["rowid > ?"]
+    return f"SELECT rowid AS _cursor, * FROM {spec['tabla']} WHERE {' AND '.join(condiciones)} ORDER BY rowid LIMIT ?"
+
+
+def _a_dict(recurso: str, fila: sqlite3.Row) -> dict:
+    ocultar = set(RECURSOS[recurso].get("ocultar", ())) | {"_cursor"}
+    return {k: fila[k] for k in fila.keys() if k not in ocultar}
+
+
+def listar(conn, recurso: str, filtros: dict, limite: int = LIMITE_PAGINA, despues: int = 0) -> Tuple[List[dict], Optional[int]]:
+    """(filas, cursor de la página siguiente o None). Se pide una fila de más para saber si hay otra página."""
+    nombres = sorted(filtros)
+    filas = db.fetch_all(
+        sql_pagina(recurso, nombres), tuple(filtros[f] for f in nombres) + (despues, limite + 1), conn=conn
+    )
+    siguiente = filas[limite - 1]["_cursor"] if len(filas) > limite else None
+    return [_a_dict(recurso, f) for f in filas[:limite]], siguiente
+
+
+def obtener(conn, recurso: str, id_fila: int) -> Optional[dict]:
+    fila = db.fetch_one(f"SELECT * FROM {RECURSOS[recurso]['tabla']} WHERE rowid = ?", (id_fila,), conn=conn)
+    return _a_dict(recurso, fila) if fila is not None else None
+
+
+def crear(recurso: str, filas: List[dict], modo: str = "agregar", simular: bool = False) -> dict:
+    """Alta masiva con el mismo pipeline que el import de CSV del sidebar; devuelve su reporte."""
+    from import_export import importar_csv  # carga pandas: solo el primer POST lo paga
+
+    columnas = list(dict.fromkeys(c for fila in filas for c in fila))
+    texto = io.StringIO()
+    escritor = csv.DictWriter(texto, fieldnames=columnas)
+    escritor.writeheader()
+    for fila in filas:
+        if any(isinstance(v, (dict, list)) for v in fila.values()):
+            raise ErrorApi(400, "Los valores deben ser escalares (sin objetos ni listas anidadas).")
+        escritor.writerow({c: "" if v is None else int(v) if isinstance(v, bool) else v for c, v in fila.items()})
+    archivo = io.BytesIO(texto.getvalue().encode("utf-8"))
+    return importar_csv(RECURSOS[recurso]["importar"], archivo, modo=modo, simular=simular)
+
+
+def filas_aceptadas(reporte: dict) -> Tuple[int, int]:
+    """(aceptadas, rechazadas) de un reporte de importar_csv; en upsert, una fila igual a la guardada cuenta como aceptada."""
+    if reporte["modo"] == "upsert":
+        aceptadas = reporte["nuevas"] + reporte["cambiadas"] + reporte["sin_cambios"]
+    else:
+        aceptadas = reporte["insertadas"]
+    return aceptadas, reporte["filas_leidas"] - aceptadas
+
+
+def etag(conn, url: str) -> str:
+    """Cambia con cualquier escritura en las tablas con CDC o con un cambio de esquema."""
+    esquema = conn.execute("PRAGMA schema_version").fetchone()[0]
+    clave = f"{VERSION_API}:{cdc.watermark_actual(conn)}:{esquema}:{url}"
+    return f'W/"{hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def _json_default(valor):
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(valor)).decode("ascii")
+    if hasattr(valor, "item"):  # escalares de numpy en el reporte de importar_csv
+        return valor.item()
+    return str(valor)
+
+
+# =======================
+# Servidor HTTP
+# =======================
+class _Manejador(BaseHTTPRequestHandler):
+    server_version = "SGP-API/1"
+    protocol_version = "HTTP/1.1"  # keep-alive: el tótem reutiliza la conexión
+
+    def do_GET(self):
+        self._atender("GET", self._get)
+
+    def do_POST(self):
+        self._atender("POST", self._post)
+
+    def _atender(self, metodo: str, fn) -> None:
+        t0 = time.perf_counter()
+        url = urlsplit(self.path)
+        partes = [p for p in url.path.split("/") if p]
+        recurso = partes[0] if partes else "-"
+        estado = 500
+        try:
+            estado = fn(partes, {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()})
+        except ErrorApi as e:
+            estado = self._responder(e.estado, {"error": str(e)})
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "agotado" in str(e):
+                estado = self._responder(503, {"error": str(e)}, {"Retry-After": "1"})
+            else:
+                estado = self._error_interno(metodo, e)
+        except Exception as e:
+            estado = self._error_interno(metodo, e)
+        finally:
+            if recurso not in RECURSOS and recurso not in ("-", "salud"):
+                recurso = "(otro)"  # no una serie de métricas por cada URL inventada
+            metricas.observar("sgp_api_segundos", time.perf_counter() - t0, metodo, recurso, str(estado))
+
+    def _error_interno(self, metodo: str, e: Exception) -> int:
+        """500 en JSON; el traceback va al log del servidor (stderr), no al cliente."""
+        self.log_error("%s %s: %r", metodo, self.path, e)
+        traceback.print_exc()
+        return self._responder(500, {"error": f"Error interno ({type(e).__name__}); el detalle quedó en el log."})
+
+    def _get(self, partes: List[str], parametros: dict) -> int:
+        if not partes:
+            return self._responder(200, {
+                "recursos": {
+                    nombre: {"filtros": sorted(spec["filtros"]), "alta_masiva": "importar" in spec}
+                    for nombre, spec in RECURSOS.items()
+                }
+            })
+        if partes == ["salud"]:
+            with self.server.pool.conexion() as conn:
+                return self._responder(200, {"ok": True, "watermark": cdc.watermark_actual(conn)})
+        recurso = self._recurso(partes)
+
+        with self.server.pool.conexion() as conn:
+            etiqueta = etag(conn, self.path)
+            pedidas = [e.strip() for e in self.headers.get("If-None-Match", "").split(",")]
+            if etiqueta in pedidas or "*" in pedidas:
+                return self._responder(304, None, {"ETag": etiqueta})
+
+            if len(partes) == 2:
+                fila = obtener(conn, recurso, _entero(partes[1], "id"))
+                if fila is None:
+                    raise ErrorApi(404, f"No existe {recurso}/{partes[1]}.")
+                return self._responder(200, fila, {"ETag": etiqueta})
+
+            limite = _entero(parametros.pop("limite", LIMITE_PAGINA), "limite")
+            despues = _entero(parametros.pop("despues", 0), "despues")
+            if not 1 <= limite <= MAX_LIMITE:
+                raise ErrorApi(400, f"limite debe estar entre 1 y {MAX_LIMITE}.")
+            desconocidos = sorted(set(parametros) - set(RECURSOS[recurso]["filtros"]))
+            if desconocidos:
+                raise ErrorApi(400, f"Filtros desconocidos: {', '.join(desconocidos)}. "
+                                    f"Disponibles: {', '.join(sorted(RECURSOS[recurso]['filtros']))}.")
+            filas, siguiente = listar(conn, recurso, parametros, limite, despues)
+
+        encabezados = {"ETag": etiqueta}
+        if siguiente is not None:
+            query = urlencode({**parametros, "limite": limite, "despues": siguiente})
+            encabezados["Link"] = f'</{recurso}?{query}>; rel="next"'
+        return self._responder(200, {"datos": filas, "siguiente": siguiente, "limite": limite}, encabezados)
+
+    def _post(self, partes: List[str], parametros: dict) -> int:
+        recurso = self._recurso(partes)
+        if len(partes) != 1 or "importar" not in RECURSOS[recurso]:
+            raise ErrorApi(405, f"POST solo en /{'|'.join(n for n, s in RECURSOS.items() if 'importar' in s)}.")
+        modo = parametros.get("modo", "agregar")
+        if modo not in ("agregar", "upsert"):
+            raise ErrorApi(400, "modo debe ser 'agregar' o 'upsert'.")
+        simular = parametros.get("simular", "0").lower() in ("1", "true", "si", "sí")
+
+        largo = _entero(self.headers.get("Content-Length", ""), "Content-Length")
+        if largo > MAX_CUERPO:
+            raise ErrorApi(413, f"El cuerpo supera {MAX_CUERPO // (1024 * 1024)} MB: usa varios POST.")
+        try:
+            filas = json.loads(self.rfile.read(largo) or b"null")
+        except ValueError as e:
+            raise ErrorApi(400, f"JSON inválido: {e}")
+        if isinstance(filas, dict):
+            filas = [filas]
+        if not filas or not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+            raise ErrorApi(400, "Se espera una lista JSON de objetos (uno por fila).")
+
+        try:
+            reporte = crear(recurso, filas, modo, simular)
+        except ValueError as e:  # columnas obligatorias faltantes, modo no soportado, ...
+            raise ErrorApi(400, str(e))
+        aceptadas, rechazadas = filas_aceptadas(reporte)
+        if not aceptadas:
+            return self._responder(422, reporte)  # ninguna fila entró (o entraría, si es simulación)
+        if rechazadas:
+            return self._responder(207, reporte)  # éxito parcial: el reporte trae rechazos y conteos
+        return self._responder(200 if simular else 201, reporte)
+
+    def _recurso(self, partes: List[str]) -> str:
+        if partes[0] not in RECURSOS or len(partes) > 2:
+            raise ErrorApi(404, f"Recurso desconocido: /{'/'.join(partes)}. Ver GET / para la lista.")
+        return partes[0]
+
+    def _responder(self, estado: int, cuerpo, encabezados: Optional[dict] = None) -> int:
+        datos = b"" if cuerpo is None else json.dumps(cuerpo, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.send_response(estado)
+        if cuerpo is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        if estado != 304:
+            self.send_header("Content-Length", str(len(datos)))
+        if self.command == "GET":
+            self.send_header("Cache-Control", "no-cache")  # el cliente revalida con If-None-Match
+        for nombre, valor in (encabezados or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+        return estado
+
+
+def _entero(valor, nombre: str) -> int:
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ErrorApi(400, f"{nombre} debe ser un entero.")
+    if numero < 0:
+        raise ErrorApi(400, f"{nombre} no puede ser negativo.")
+    return numero
+
+
+def crear_servidor(host: str = "127.0.0.1", puerto: int = PUERTO, conexiones: int = 8) -> ThreadingHTTPServer:
+    servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    servidor.daemon_threads = True
+    servidor.pool = db.PoolConexiones(conexiones)
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON sobre la base de datos de la clínica (sin Streamlit).")
+    parser.add_argument("--bd", default=db.DB_PATH, help="archivo SQLite (el mismo que usa la app)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--conexiones", type=int, default=8, help="tamaño del pool de conexiones SQLite")
+    args = parser.parse_args()
+
+    db.DB_PATH = args.bd
+    db.init_db()  # idempotente: el esquema y los triggers de CDC (los ETag dependen de ellos)
+    metricas.iniciar_desde_entorno()  # SGP_METRICAS_PUERTO / SGP_METRICAS_ARCHIVO
+    servidor = crear_servidor(args.host, args.puerto, args.conexiones)
+    print(f"API en http://{args.host}:{args.puerto}/ (BD: {args.bd})", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servidor.pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
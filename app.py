@@ -1,17 +1,34 @@
 import streamlit as st                           #streamlit run app.py
-from ui_pacientes import ui_pacientes
-from ui_medicos import ui_medicos
-from ui_citas import ui_citas
 from import_export import sidebar_exports_imports
 from db import DB_PATH, init_db
 from pathlib import Path
 import base64, pathlib
-from ui_ficha_medica import ui_ficha_medica
+import importlib
+import perfil
+import metricas
+import time
+
+# Sección -> módulo ui_* (con una función del mismo nombre). Se importa al abrir la sección:
+# el arranque no paga el import de páginas que nadie ha visitado.
+PAGINAS = {
+    "Pacientes": "ui_pacientes",
+    "Médicos": "ui_medicos",
+    "Citas": "ui_citas",
+    "Ficha Médica": "ui_ficha_medica",
+    "Línea de tiempo": "ui_timeline",
+}
 # -------------------------------------------------------------
 # App principal
 # -------------------------------------------------------------
 def main():
     st.set_page_config(page_title="SGP – Sistema de Gestión de Pacientes", layout="wide")
+    inicio = time.perf_counter()
+    try:
+        metricas.iniciar_desde_entorno()  # SGP_METRICAS_PUERTO / SGP_METRICAS_ARCHIVO
+    except (OSError, ValueError) as e:
+        st.sidebar.warning(f"No se pudieron exponer las métricas: {e}")
+    perf = perfil.iniciar()  # panel de rendimiento (SGP_DEBUG=1 o ?debug=1)
+    perfil.seccion(perf, "fondo")
     img_path = pathlib.Path("foto.jpg")
     if img_path.exists():
         with open(img_path, "rb") as f:
@@ -171,23 +188,24 @@ def main():
     st.sidebar.success(f"Base de datos: {DB_PATH}")
 
     # Inicializa (no borra datos existentes)
+    perfil.seccion(perf, "init_db")
     init_db()
 
     # Barra lateral: exportar/importar CSV con pandas
+    perfil.seccion(perf, "exportaciones")
     sidebar_exports_imports()
 
     # Navegación
-    seccion = st.sidebar.radio("Secciones", ["Pacientes", "Médicos", "Citas", "Ficha Médica"], index=0)
-
-    if seccion == "Pacientes":
-        ui_pacientes()
-    elif seccion == "Médicos":
-        ui_medicos()
-    elif seccion == "Ficha Médica":
-        ui_ficha_medica()
-    else:
-        ui_citas()
-        
+    seccion = st.sidebar.radio("Secciones", list(PAGINAS), index=0)
+    perfil.seccion(perf, f"página: {seccion}")
+
+    with metricas.cronometro("sgp_pagina_segundos", seccion):
+        modulo = PAGINAS[seccion]
+        getattr(importlib.import_module(modulo), modulo)()
+
+    perfil.mostrar(perf)
+    metricas.observar("sgp_rerun_segundos", time.perf_counter() - inicio)
+
 
 
 if __name__ == "__main__":
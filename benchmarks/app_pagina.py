@@ -0,0 +1,23 @@
+"""
+Script que benchmarks.suite corre con AppTest: dibuja una sola página de la app (o solo el
+sidebar) contra la BD que la suite fijó en db.DB_PATH. La página se elige con la variable de
+entorno SGP_BENCH_PAGINA (nombre del módulo ui_*, o "sidebar").
+"""
+import importlib
+import os
+
+
+def main():
+    pagina = os.environ.get("SGP_BENCH_PAGINA", "sidebar")
+    if pagina == "sidebar":
+        from import_export import sidebar_exports_imports
+
+        sidebar_exports_imports()
+    else:
+        getattr(importlib.import_module(pagina), pagina)()
+
+
+# Como app.py: los procesos spawn (importar_paquete) vuelven a importar el __main__ del padre,
+# que bajo AppTest es este script, y no deben dibujar la página.
+if __name__ == "__main__":
+    main()
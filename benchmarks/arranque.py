@@ -0,0 +1,163 @@
+"""
+Perfil de arranque de la app, cada medición en un proceso nuevo (como tras un deploy o un
+autoscaling): árbol de tiempos de import de app.py (python -X importtime) y tiempo hasta el
+primer render con AppTest, más qué dependencias pesadas quedaron cargadas.
+
+    python -m benchmarks.arranque
+    python -m benchmarks.arranque --repeticiones 5 --umbral-ms 5 --bd benchmarks/datos/clinica_10k_42.db
+
+La BD se copia a una carpeta temporal (init_db puede crear índices) y se inicializa una vez
+antes de medir, para que el primer render no incluya migraciones.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import db
+import generador_datos
+
+from benchmarks.suite import RAIZ, copiar_bd
+
+PESADOS = ["streamlit", "pandas", "numpy", "pyarrow", "pytest"]
+_LINEA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+# Corre en el proceso nuevo: imprime un JSON con los tiempos en la última línea
+_SCRIPT_RENDER = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {raiz!r})
+os.chdir({raiz!r})  # app.py busca foto.jpg en el directorio actual
+import db
+db.DB_PATH = {bd!r}
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(os.path.join({raiz!r}, "app.py"), default_timeout={timeout})
+at.run()
+t2 = time.perf_counter()
+cargados = [m for m in {pesados!r} if m in sys.modules]
+at.run()
+t3 = time.perf_counter()
+print(json.dumps({{
+    "import_apptest_s": t1 - t0,
+    "primer_render_s": t2 - t1,
+    "segundo_render_s": t3 - t2,
+    "pesados_tras_primer_render": cargados,
+    "excepciones": [str(e.value) for e in at.exception],
+}}))
+"""
+
+
+# =======================
+# Árbol de imports
+# =======================
+def arbol_imports(modulo: str = "app") -> dict:
+    """
+    Importa `modulo` en un proceso nuevo con -X importtime y arma el árbol: {"modulo",
+    "propio_ms", "total_ms", "hijos"}. importtime escribe cada módulo después de sus hijos,
+    con dos espacios de sangría por nivel.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    )
+    pendientes = defaultdict(list)
+    for linea in proc.stderr.splitlines():
+        m = _LINEA_IMPORTTIME.match(linea)
+        if not m:
+            continue
+        propio, total, sangria, nombre = m.groups()
+        nivel = len(sangria) // 2
+        pendientes[nivel].append({
+            "modulo": nombre,
+            "propio_ms": int(propio) / 1000,
+            "total_ms": int(total) / 1000,
+            "hijos": pendientes.pop(nivel + 1, []),
+        })
+    return next(n for n in reversed(pendientes[0]) if n["modulo"] == modulo)
+
+
+def buscar(nodo: dict, modulo: str):
+    """Primer nodo del árbol con ese nombre (el import que realmente pagó la carga)."""
+    if nodo["modulo"] == modulo:
+        return nodo
+    for hijo in nodo["hijos"]:
+        encontrado = buscar(hijo, modulo)
+        if encontrado is not None:
+            return encontrado
+    return None
+
+
+def imprimir_arbol(nodo: dict, umbral_ms: float, nivel: int = 0) -> None:
+    print(f"{nodo['total_ms']:9.1f} ms {nodo['propio_ms']:8.1f} ms  {'  ' * nivel}{nodo['modulo']}")
+    for hijo in sorted(nodo["hijos"], key=lambda h: h["total_ms"], reverse=True):
+        if hijo["total_ms"] >= umbral_ms:
+            imprimir_arbol(hijo, umbral_ms, nivel + 1)
+
+
+# =======================
+# Primer render
+# =======================
+def primer_render(bd: str, timeout: float) -> dict:
+    codigo = _SCRIPT_RENDER.format(raiz=RAIZ, bd=bd, timeout=timeout, pesados=PESADOS)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True)
+    total = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"El proceso de render falló:\n{proc.stderr[-2000:]}")
+    medicion = json.loads(proc.stdout.strip().splitlines()[-1])
+    medicion["proceso_s"] = total  # arranque del intérprete + imports + primer render + segundo render
+    return medicion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3, help="procesos nuevos por medición (se informa la mediana)")
+    parser.add_argument("--umbral-ms", type=float, default=10.0, help="oculta del árbol los imports más rápidos")
+    parser.add_argument("--bd", default=os.path.join(RAIZ, db.DB_PATH), help="BD para el render (se usa una copia)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="segundos máximos del primer render")
+    parser.add_argument("--salida", help="guarda las mediciones en este JSON")
+    args = parser.parse_args()
+
+    arboles = [arbol_imports("app") for _ in range(args.repeticiones)]
+    arbol = sorted(arboles, key=lambda a: a["total_ms"])[len(arboles) // 2]
+    print(f"Imports de app.py (mediana de {args.repeticiones}; total / propio, >= {args.umbral_ms:g} ms):")
+    imprimir_arbol(arbol, args.umbral_ms)
+    print("\nDependencias pesadas al importar app.py:")
+    for nombre in PESADOS:
+        nodo = buscar(arbol, nombre)
+        print(f"  {nombre:10} " + ("no se carga" if nodo is None else f"{nodo['total_ms']:.1f} ms"))
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        bd = os.path.join(carpeta, "arranque.db")
+        copiar_bd(args.bd, bd)
+        with generador_datos.usando_bd(bd):
+            db.init_db()  # migraciones e índices fuera de la medición
+        renders = [primer_render(bd, args.timeout) for _ in range(args.repeticiones)]
+
+    print(f"\nPrimer render en un proceso nuevo (mediana de {args.repeticiones}):")
+    for clave, etiqueta in [
+        ("import_apptest_s", "importar streamlit + AppTest"),
+        ("primer_render_s", "primer rerun de app.py (imports + render)"),
+        ("segundo_render_s", "segundo rerun (módulos ya cargados)"),
+        ("proceso_s", "proceso completo (wall clock)"),
+    ]:
+        print(f"  {etiqueta:45} {statistics.median(r[clave] for r in renders) * 1000:9.1f} ms")
+    print(f"  cargados tras el primer render: {', '.join(renders[-1]['pesados_tras_primer_render']) or '-'}")
+    for e in renders[-1]["excepciones"]:
+        print(f"  EXCEPCIÓN en el render: {e}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"imports": arbol, "renders": renders}, f, ensure_ascii=False, indent=2)
+        print(f"\nMediciones en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
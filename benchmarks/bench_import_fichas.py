@@ -0,0 +1,111 @@
+"""
+Benchmark: importación de FichaMedica fila a fila (iterrows + lastrowid) vs por conjuntos
+(staging + INSERT ... SELECT de import_export.importar_csv). Usa una BD temporal.
+
+    python -m benchmarks.bench_import_fichas --filas 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import db
+from import_export import importar_csv
+
+PACIENTES = 5000
+
+def csv_sintetico(n: int, semilla: int = 7) -> bytes:
+    rng = np.random.default_rng(semilla)
+    base = pd.Timestamp("2020-01-01")
+    minutos = rng.choice(5 * 365 * 24 * 60, size=n, replace=False)
+    df = pd.DataFrame({
+        "id_paciente": rng.integers(1, PACIENTES, n),
+        "fecha_hora": (base + pd.to_timedelta(minutos, unit="min")).strftime("%Y-%m-%d %H:%M:%S"),
+        "motivo_consulta": "Control",
+        "anamnesis": "Sin antecedentes",
+        "observaciones": "Estable",
+        "presion_arterial": pd.Series(rng.integers(90, 180, n)).astype(str) + "/"
+        + pd.Series(rng.integers(50, 110, n)).astype(str),
+        "temperatura": np.round(rng.normal(36.8, 0.6, n), 1),
+        "Frecuencia_cardiaca": rng.integers(50, 130, n),
+        "peso": np.round(rng.normal(72, 14, n), 1),
+    })
+    return df.to_csv(index=False, sep=";").encode("latin1")
+
+
+def fila_a_fila(contenido: bytes) -> int:
+    """Equivalente al importador anterior: una pasada de iterrows con dos INSERT por fila."""
+    df = pd.read_csv(io.BytesIO(contenido), sep=";", encoding="latin1", dtype=str)
+    df = df.rename(columns={"id_paciente": "ID_paciente", "anamnesis": "Anamnesis", "temperatura": "Temperatura"})
+    cols_ficha = ["ID_paciente", "fecha_hora", "motivo_consulta", "Anamnesis", "observaciones"]
+    cols_sv = ["presion_arterial", "Temperatura", "Frecuencia_cardiaca", "peso"]
+    with contextlib.closing(db.get_conn()) as conn:
+        cur = conn.cursor()
+        existentes = {
+            f"{r[0]}|{r[1]}" for r in cur.execute("SELECT ID_paciente, fecha_hora FROM FichaMedica")
+        }
+        insertadas = 0
+        for _, row in df.iterrows():
+            key = f"{row['ID_paciente']}|{row['fecha_hora']}"
+            if key in existentes:
+                continue
+            existentes.add(key)
+            cur.execute(
+                f"INSERT INTO FichaMedica ({', '.join(cols_ficha)}) VALUES ({', '.join('?' for _ in cols_ficha)})",
+                [row[c] for c in cols_ficha],
+            )
+            cur.execute(
+                f"INSERT INTO SignosVitales (ID_Ficha_Medica, {', '.join(cols_sv)}) "
+                f"VALUES (?, {', '.join('?' for _ in cols_sv)})",
+                [cur.lastrowid] + [row[c] for c in cols_sv],
+            )
+            insertadas += 1
+        conn.commit()
+    return insertadas
+
+
+def por_conjuntos(contenido: bytes) -> int:
+    reporte = importar_csv("FichaMedica", io.BytesIO(contenido))
+    if reporte["errores"]:
+        raise RuntimeError(reporte["errores"])
+    return reporte["insertadas"]
+
+
+def medir(nombre: str, fn, contenido: bytes, carpeta: str):
+    db.DB_PATH = os.path.join(carpeta, f"{nombre}.db")
+    db.init_db()
+    with contextlib.closing(db.get_conn()) as conn:
+        conn.executemany(
+            "INSERT INTO Paciente (id_paciente, rut, nombre) VALUES (?, ?, ?)",
+            [(i, f"{i}-K", f"Paciente {i}") for i in range(1, PACIENTES)],
+        )
+        conn.commit()
+    t0 = time.perf_counter()
+    n = fn(contenido)
+    return n, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=100_000)
+    args = parser.parse_args()
+
+    contenido = csv_sintetico(args.filas)
+    with tempfile.TemporaryDirectory() as carpeta:
+        n_fila, t_fila = medir("fila_a_fila", fila_a_fila, contenido, carpeta)
+        n_conj, t_conj = medir("por_conjuntos", por_conjuntos, contenido, carpeta)
+
+    assert n_fila == n_conj, (n_fila, n_conj)
+    print(f"filas: {args.filas:,}")
+    print(f"fila a fila:   {t_fila:8.2f} s  ({args.filas / t_fila:,.0f} filas/s)")
+    print(f"por conjuntos: {t_conj:8.2f} s  ({args.filas / t_conj:,.0f} filas/s)")
+    print(f"speedup:       {t_fila / t_conj:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
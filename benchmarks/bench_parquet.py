@@ -0,0 +1,79 @@
+"""
+Benchmark: exportar, leer con pandas (lo que hace el equipo de análisis) e importar
+Pacientes en CSV vs Parquet sobre una BD temporal.
+
+    python -m benchmarks.bench_parquet --filas 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import db
+from import_export import EXPORTACIONES, exportar_csv, exportar_parquet, importar_csv
+
+
+def poblar(n: int) -> None:
+    with contextlib.closing(db.get_conn()) as conn:
+        conn.executemany(
+            "INSERT INTO Paciente (rut, nombre, fecha_nacimiento, correo, telefono, tipo_paciente) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (f"{10_000_000 + i}-{i % 10}", f"Paciente {i}", f"{1940 + i % 80}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                 f"p{i}@mail.cl", f"9{i % 100_000_000:08d}", "Ambulatorio")
+                for i in range(n)
+            ),
+        )
+        conn.commit()
+
+
+def medir(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=200_000)
+    args = parser.parse_args()
+    sql = EXPORTACIONES["Pacientes"]["sql"]
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        db.DB_PATH = os.path.join(carpeta, "origen.db")
+        db.init_db()
+        poblar(args.filas)
+        resultados = {}
+        for formato, exportar in (("CSV", exportar_csv), ("Parquet", exportar_parquet)):
+            (archivo, stats), t_exp = medir(lambda: exportar(sql))
+            contenido = archivo.read()
+            archivo.close()
+            leer = pd.read_parquet if formato == "Parquet" else pd.read_csv
+            _, t_leer = medir(lambda: leer(io.BytesIO(contenido)))
+
+            db.DB_PATH = os.path.join(carpeta, f"destino_{formato}.db")
+            db.init_db()
+            reporte, t_imp = medir(lambda: importar_csv("Pacientes", io.BytesIO(contenido)))
+            assert reporte["insertadas"] == args.filas, reporte
+            resultados[formato] = (t_exp, t_leer, t_imp, len(contenido))
+            db.DB_PATH = os.path.join(carpeta, "origen.db")
+
+    print(f"filas: {args.filas:,}")
+    for formato, (t_exp, t_leer, t_imp, tam) in resultados.items():
+        print(
+            f"{formato:8s} export {t_exp:6.2f} s • lectura pandas {t_leer:6.2f} s • "
+            f"import {t_imp:6.2f} s • {tam / 1e6:7.1f} MB"
+        )
+    (ce, cl, ci, cb), (pe, pl, pi, pb) = resultados["CSV"], resultados["Parquet"]
+    print(
+        f"Parquet vs CSV: export {ce / pe:.1f}x • lectura {cl / pl:.1f}x • "
+        f"import {ci / pi:.1f}x • tamaño {cb / pb:.1f}x menor"
+    )
+
+
+if __name__ == "__main__":
+    main()
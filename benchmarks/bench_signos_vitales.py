@@ -0,0 +1,86 @@
+"""
+Benchmark: parsing escalar (ui_ficha_medica) vs vectorizado (signos_vitales).
+
+    python -m benchmarks.bench_signos_vitales --filas 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from signos_vitales import parse_float_series, parse_int_series, parse_pa_series
+from ui_ficha_medica import as_float, as_int, parse_pa
+
+
+def datos_sinteticos(n: int, semilla: int = 7) -> pd.DataFrame:
+    """Valores con el mismo desorden que se ve en la BD: unidades, comas, vacíos."""
+    rng = np.random.default_rng(semilla)
+    pas = rng.integers(90, 180, n)
+    pad = rng.integers(50, 110, n)
+    temp = np.round(rng.normal(36.8, 0.6, n), 1)
+    fc = rng.integers(50, 130, n)
+    peso = np.round(rng.normal(72, 14, n), 1)
+
+    pa = pd.Series(pas.astype(str)) + "/" + pd.Series(pad.astype(str))
+    pa[rng.random(n) < 0.02] = None
+    temp_txt = pd.Series(temp.astype(str))
+    con_unidad = rng.random(n) < 0.3
+    temp_txt[con_unidad] = temp_txt[con_unidad].str.replace(".", ",", regex=False) + "°C"
+    fc_txt = pd.Series(fc.astype(str))
+    fc_txt[rng.random(n) < 0.3] = fc_txt + " lpm"
+    peso_txt = pd.Series(peso.astype(str)) + " kg"
+    return pd.DataFrame({"pa": pa, "temp": temp_txt, "fc": fc_txt, "peso": peso_txt})
+
+
+def escalar(df: pd.DataFrame):
+    pa = [parse_pa(v, None, None) for v in df["pa"]]
+    temp = [as_float(v, None) for v in df["temp"]]
+    fc = [as_int(v, None) for v in df["fc"]]
+    peso = [as_float(v, None) for v in df["peso"]]
+    return pa, temp, fc, peso
+
+
+def vectorizado(df: pd.DataFrame):
+    pa = parse_pa_series(df["pa"])
+    return pa, parse_float_series(df["temp"]), parse_int_series(df["fc"]), parse_float_series(df["peso"])
+
+
+def comparar(df: pd.DataFrame, res_esc, res_vec) -> None:
+    """Verifica que ambos caminos entreguen lo mismo (None del escalar == NaN del vectorizado)."""
+    def a_array(vals):
+        return np.array([np.nan if v is None else v for v in vals], dtype="float64")
+
+    pa_e, temp_e, fc_e, peso_e = res_esc
+    pa_v, temp_v, fc_v, peso_v = res_vec
+    np.testing.assert_allclose(a_array(p[0] for p in pa_e), pa_v["pas"].to_numpy())
+    np.testing.assert_allclose(a_array(p[1] for p in pa_e), pa_v["pad"].to_numpy())
+    np.testing.assert_allclose(a_array(temp_e), temp_v.to_numpy())
+    np.testing.assert_allclose(a_array(fc_e), fc_v.to_numpy())
+    np.testing.assert_allclose(a_array(peso_e), peso_v.to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = datos_sinteticos(args.filas)
+
+    t0 = time.perf_counter()
+    res_esc = escalar(df)
+    t_esc = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res_vec = vectorizado(df)
+    t_vec = time.perf_counter() - t0
+
+    comparar(df, res_esc, res_vec)
+    print(f"filas: {args.filas:,}")
+    print(f"escalar:     {t_esc:8.2f} s  ({args.filas / t_esc:,.0f} filas/s)")
+    print(f"vectorizado: {t_vec:8.2f} s  ({args.filas / t_vec:,.0f} filas/s)")
+    print(f"speedup:     {t_esc / t_vec:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
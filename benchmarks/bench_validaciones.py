@@ -0,0 +1,114 @@
+"""
+Benchmark: validar_rut / validar_correo fila a fila vs por columnas (Validaciones.*_serie)
+y la API por lotes (validar_ruts, normalizar_ruts, validar_correos), verificando que
+todos los caminos den el mismo resultado, también con entradas aleatorias “feas”.
+
+    python -m benchmarks.bench_validaciones --filas 1000000
+"""
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from Validaciones import (
+    REGEX_CORREO,
+    normalizar_rut,
+    normalizar_ruts,
+    validar_correo,
+    validar_correo_serie,
+    validar_correos,
+    validar_rut,
+    validar_rut_serie,
+    validar_ruts,
+)
+
+ALFABETO_RUT = "0123456789kK.- \t\n\u00a0\u0663\u00b2@x"
+ALFABETO_CORREO = "ab.@-_+ \tñ1\n"
+
+
+def datos_sinteticos(n: int, semilla: int = 7) -> pd.DataFrame:
+    """RUT con y sin puntos, DV al azar (~1/11 válidos), minúsculas, espacios y algo de basura."""
+    rng = np.random.default_rng(semilla)
+    cuerpos = pd.Series(rng.integers(1_000_000, 26_000_000, n)).astype(str)
+    dv = pd.Series(rng.choice(list("0123456789Kk"), n))
+    con_puntos = rng.random(n) < 0.5
+    cuerpos[con_puntos] = cuerpos[con_puntos].str.replace(r"(\d)(?=(\d{3})+$)", r"\1.", regex=True)
+    ruts = cuerpos + "-" + dv
+    ruts[rng.random(n) < 0.05] = " 12.3x5.678-9 "
+    ruts[rng.random(n) < 0.01] = None
+    correos = pd.Series(rng.choice(["nombre.apellido@gmail.com", " a+b@clinica.cl ", "sin-arroba.cl", "a@b"], n))
+    return pd.DataFrame({"rut": ruts, "correo": correos})
+
+
+def aleatorios(alfabeto: str, n: int, largo: int = 14, semilla: int = 11) -> list:
+    """Textos al azar (espacios raros, dígitos Unicode, saltos de línea) más algunos None."""
+    rng = random.Random(semilla)
+    return [
+        None if rng.random() < 0.01 else "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, largo)))
+        for _ in range(n)
+    ]
+
+
+def verificar_equivalencia(n: int) -> None:
+    """Misma respuesta que los validadores escalares en entradas arbitrarias."""
+    def escalar(fn, valores):
+        return [fn(v) if isinstance(v, str) else False for v in valores]
+
+    ruts = aleatorios(ALFABETO_RUT, n)
+    assert validar_ruts(ruts).tolist() == escalar(validar_rut, ruts)
+    assert normalizar_ruts(ruts) == [normalizar_rut(v) if isinstance(v, str) else None for v in ruts]
+    correos = aleatorios(ALFABETO_CORREO, n)
+    assert validar_correos(correos).tolist() == escalar(validar_correo, correos)
+    print(f"equivalencia con los validadores escalares: ok ({n:,} entradas aleatorias)")
+
+
+def medir(nombre: str, fn, *args):
+    t0 = time.perf_counter()
+    resultado = fn(*args)
+    return nombre, time.perf_counter() - t0, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    verificar_equivalencia(min(args.filas, 200_000))
+    df = datos_sinteticos(args.filas)
+    for nombre, col, escalar, serie in (
+        ("rut", "rut", validar_rut, validar_rut_serie),
+        ("correo", "correo", validar_correo, validar_correo_serie),
+    ):
+        t0 = time.perf_counter()
+        esperado = [escalar(v) if isinstance(v, str) else False for v in df[col]]
+        t_esc = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        obtenido = serie(df[col])
+        t_vec = time.perf_counter() - t0
+
+        assert obtenido.tolist() == esperado, f"{nombre}: resultados distintos"
+        print(f"{nombre}: {sum(esperado):,} válidos de {args.filas:,}")
+        print(f"  fila a fila:    {t_esc:8.2f} s  ({args.filas / t_esc * 60:,.0f} filas/min)")
+        print(f"  por columnas:   {t_vec:8.2f} s  ({args.filas / t_vec * 60:,.0f} filas/min)")
+        print(f"  speedup:        {t_esc / t_vec:8.1f}x")
+
+    # API por lotes sobre listas de Python y patrón precompilado vs re.match con el texto del patrón
+    ruts = df["rut"].tolist()
+    correos = df["correo"].tolist()
+    for nombre, t, _ in (
+        medir("normalizar_rut x n", lambda v: [normalizar_rut(r) if r else None for r in v], ruts),
+        medir("normalizar_ruts", normalizar_ruts, ruts),
+        medir("validar_ruts", validar_ruts, ruts),
+        medir("re.match(patrón) x n", lambda v: [re.match(REGEX_CORREO, c.strip()) is not None for c in v], correos),
+        medir("validar_correo x n", lambda v: [validar_correo(c) for c in v], correos),
+        medir("validar_correos", validar_correos, correos),
+    ):
+        print(f"{nombre:22s} {t:8.2f} s  ({args.filas / t * 60:,.0f} filas/min)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Prueba de carga: N sesiones concurrentes (hilos, como las sesiones de Streamlit en un mismo
+proceso) repiten una mezcla realista de flujos de la app sobre una copia de la BD sintética:
+listar pacientes, ver el historial clínico, listar citas, crear citas, cambiar su estado,
+guardar fichas con signos vitales y exportar. Con --apptest cada sesión además reejecuta una
+página con AppTest; como AppTest usa un Runtime de Streamlit por proceso, en ese caso (o con
+--procesos) cada sesión es un proceso aparte. Por cada nivel de concurrencia informa
+throughput, latencias p50/p95/p99 y cuántas operaciones fallaron con "database is locked".
+
+    python -m benchmarks.carga --escala 10k --sesiones 1 2 4 8 16 32 --duracion 10
+    python -m benchmarks.carga --sesiones 4 8 --apptest ui_pacientes --pausa 200
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import db
+import generador_datos
+from benchmarks.suite import CARPETA_DATOS, CARPETA_RESULTADOS, RAIZ, TIMEOUT_PAGINA, copiar_bd, metadatos, preparar_datos
+from import_export import EXPORTACIONES, exportar_csv
+from ui_pacientes import listado_pacientes
+
+try:  # AppTest existe desde Streamlit 1.28
+    from streamlit.testing.v1 import AppTest
+except ImportError:  # pragma: no cover
+    AppTest = None
+
+P99_MAXIMO = 1.0   # segundos; sobre esto el nivel se considera saturado
+MUESTRA_CITAS = 5_000
+
+
+# =======================
+# Flujos (mismas consultas que las páginas)
+# =======================
+def _listar_pacientes(rng, ctx):
+    listado_pacientes()
+
+
+def _historial_ficha(rng, ctx):
+    fichas = db.fetch_all(
+        """
+        SELECT ID_Ficha, fecha_hora, motivo_consulta, Anamnesis, observaciones
+        FROM FichaMedica
+        WHERE id_paciente = ?
+        ORDER BY datetime(fecha_hora) DESC
+        """,
+        (rng.choice(ctx["pacientes"]),),
+    )
+    for ficha in fichas[:5]:
+        db.fetch_one("SELECT * FROM SignosVitales WHERE ID_Ficha_Medica = ? LIMIT 1", (ficha["ID_Ficha"],))
+
+
+def _listar_citas(rng, ctx):
+    db.fetch_all(
+        """
+        SELECT C.id_cita, C.fecha, C.hora, C.estado, C.id_paciente, C.id_medico,
+               P.rut AS rut_paciente, P.nombre AS nombre_paciente,
+               M.nombre AS nombre_medico, M.especialidad
+        FROM Cita C
+        JOIN Paciente P ON P.id_paciente = C.id_paciente
+        JOIN Medico M ON M.id_medico = C.id_medico
+        ORDER BY C.fecha DESC, C.hora DESC
+        """
+    )
+
+
+def _crear_cita(rng, ctx):
+    dia = date.today() + timedelta(days=rng.randint(0, 60))
+    id_cita = db.execute(
+        "INSERT INTO Cita (fecha, hora, estado, id_paciente, id_medico) VALUES (?, ?, ?, ?, ?)",
+        (dia.isoformat(), f"{rng.randint(8, 18):02d}:{rng.choice((0, 15, 30, 45)):02d}:00", "Agendada",
+         rng.choice(ctx["pacientes"]), rng.choice(ctx["medicos"])),
+    )
+    with ctx["lock"]:
+        ctx["citas"].append(id_cita)
+
+
+def _cambiar_estado_cita(rng, ctx):
+    with ctx["lock"]:
+        id_cita = rng.choice(ctx["citas"])
+    db.execute("UPDATE Cita SET estado=? WHERE id_cita=?", (rng.choice(("Realizada", "Cancelada")), id_cita))
+
+
+def _guardar_ficha(rng, ctx):
+    id_paciente = rng.choice(ctx["pacientes"])
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    motivo = f"Control carga {rng.randint(1, 10**9)}"
+    db.execute(
+        "INSERT INTO FichaMedica (id_paciente, fecha_hora, motivo_consulta, Anamnesis, observaciones) VALUES (?, ?, ?, ?, ?)",
+        (id_paciente, ahora, motivo, None, None),
+    )
+    fila = db.fetch_one(
+        """
+        SELECT ID_Ficha FROM FichaMedica
+        WHERE id_paciente = ? AND fecha_hora = ? AND motivo_consulta = ?
+        ORDER BY ID_Ficha DESC LIMIT 1
+        """,
+        (id_paciente, ahora, motivo),
+    )
+    db.execute(
+        "INSERT INTO SignosVitales (ID_Ficha_Medica, presion_arterial, Temperatura, Frecuencia_cardiaca, peso) VALUES (?,?,?,?,?)",
+        (fila["ID_Ficha"], f"{rng.randint(100, 150)}/{rng.randint(60, 95)}", "36.7", str(rng.randint(55, 110)), "70.0"),
+    )
+
+
+def _exportar_pacientes(rng, ctx):
+    archivo, _ = exportar_csv(EXPORTACIONES["Pacientes"]["sql"])
+    archivo.close()
+
+
+# nombre -> (peso en la mezcla, función(rng, ctx))
+FLUJOS = {
+    "listar_pacientes": (25, _listar_pacientes),
+    "historial_ficha": (25, _historial_ficha),
+    "listar_citas": (10, _listar_citas),
+    "crear_cita": (15, _crear_cita),
+    "cambiar_estado_cita": (10, _cambiar_estado_cita),
+    "guardar_ficha": (13, _guardar_ficha),
+    "exportar_pacientes": (2, _exportar_pacientes),
+}
+PESO_APPTEST = 10
+
+
+# =======================
+# Corrida
+# =======================
+def _contexto() -> dict:
+    with contextlib.closing(db.get_conn()) as conn:
+        return {
+            "pacientes": [r[0] for r in conn.execute("SELECT id_paciente FROM Paciente")],
+            "medicos": [r[0] for r in conn.execute("SELECT id_medico FROM Medico")],
+            "citas": [r[0] for r in conn.execute("SELECT id_cita FROM Cita ORDER BY random() LIMIT ?", (MUESTRA_CITAS,))],
+            "lock": threading.Lock(),
+        }
+
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _sesion(n: int, ctx: dict, flujos: dict, fin: float, pausa: float, semilla: int, resultados: list,
+            pagina: str = None) -> None:
+    """Repite flujos al azar (según sus pesos) hasta `fin` y agrega (flujo, segundos, error) a `resultados`."""
+    rng = random.Random(semilla * 1000 + n)
+    nombres = list(flujos)
+    pesos = [flujos[f][0] for f in nombres]
+    at = None
+    if pagina:
+        at = AppTest.from_file(os.path.join(RAIZ, "benchmarks", "app_pagina.py"), default_timeout=TIMEOUT_PAGINA)
+    while time.perf_counter() < fin:
+        nombre = rng.choices(nombres, pesos)[0]
+        t0 = time.perf_counter()
+        error = None
+        try:
+            if nombre == "apptest":
+                at.run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].value)
+            else:
+                flujos[nombre][1](rng, ctx)
+        except sqlite3.OperationalError as e:
+            error = "bloqueo" if "locked" in str(e) else f"sqlite: {e}"
+        except Exception as e:  # una sesión que falla no debe detener la prueba
+            error = f"{type(e).__name__}: {e}"
+        resultados.append((nombre, time.perf_counter() - t0, error))
+        if pausa:
+            time.sleep(rng.expovariate(1 / pausa))
+
+
+def _sesion_proceso(n: int, ruta: str, flujos: dict, duracion: float, pausa: float, semilla: int,
+                    pagina: str = None) -> tuple:
+    """Una sesión en su propio proceso: devuelve (resultados, segundos que corrió)."""
+    db.DB_PATH = ruta
+    ctx = _contexto()
+    resultados = []
+    inicio = time.perf_counter()
+    _sesion(n, ctx, flujos, inicio + duracion, pausa, semilla, resultados, pagina)
+    return resultados, time.perf_counter() - inicio
+
+
+def correr_nivel(ruta: str, sesiones: int, duracion: float, pausa: float = 0.0, semilla: int = 1,
+                 pagina: str = None, procesos: bool = False) -> dict:
+    """
+    Corre `sesiones` sesiones durante `duracion` segundos sobre la BD `ruta` y resume el
+    resultado. Por defecto son hilos de este proceso; con `procesos` (obligatorio si hay
+    `pagina` de AppTest) cada una es un proceso, sin contar lo que tarda en arrancar.
+    """
+    flujos = dict(FLUJOS)
+    if pagina:
+        os.environ["SGP_BENCH_PAGINA"] = pagina  # los procesos hijos heredan el entorno
+        flujos["apptest"] = (PESO_APPTEST, None)
+        procesos = True
+    if procesos:
+        # spawn: un fork copiaría los hilos de este proceso a medias
+        with ProcessPoolExecutor(sesiones, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futuros = [
+                pool.submit(_sesion_proceso, n, ruta, flujos, duracion, pausa, semilla, pagina) for n in range(sesiones)
+            ]
+            salidas = [f.result() for f in futuros]
+        resultados = [r for parcial, _ in salidas for r in parcial]
+        return resumir(resultados, sesiones, max(segundos for _, segundos in salidas))
+
+    with generador_datos.usando_bd(ruta):
+        ctx = _contexto()
+        resultados = []  # list.append es atómico con el GIL
+        fin = time.perf_counter() + duracion
+        hilos = [
+            threading.Thread(target=_sesion, args=(n, ctx, flujos, fin, pausa, semilla, resultados, pagina),
+                             name=f"sesion_{n}")
+            for n in range(sesiones)
+        ]
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+    return resumir(resultados, sesiones, segundos)
+
+
+def resumir(resultados: list, sesiones: int, segundos: float) -> dict:
+    def estadisticas(filas):
+        latencias = [s for _, s, error in filas if error is None]
+        return {
+            "operaciones": len(filas),
+            "ok": len(latencias),
+            "p50_ms": _percentil(latencias, 50) * 1000,
+            "p95_ms": _percentil(latencias, 95) * 1000,
+            "p99_ms": _percentil(latencias, 99) * 1000,
+            "media_ms": statistics.fmean(latencias) * 1000 if latencias else 0.0,
+            "bloqueos": sum(1 for *_, error in filas if error == "bloqueo"),
+            "errores": sum(1 for *_, error in filas if error not in (None, "bloqueo")),
+        }
+
+    resumen = {"sesiones": sesiones, "segundos": segundos, **estadisticas(resultados)}
+    resumen["ops_por_segundo"] = resumen["ok"] / segundos if segundos else 0.0
+    resumen["flujos"] = {
+        nombre: estadisticas([r for r in resultados if r[0] == nombre]) for nombre in sorted({r[0] for r in resultados})
+    }
+    errores = sorted({error for *_, error in resultados if error not in (None, "bloqueo")})
+    resumen["ejemplos_error"] = errores[:5]
+    return resumen
+
+
+def imprimir(resumen: dict) -> None:
+    print(
+        f"{resumen['sesiones']:>8} {resumen['ops_por_segundo']:>10,.1f} {resumen['p50_ms']:>9,.1f} "
+        f"{resumen['p95_ms']:>9,.1f} {resumen['p99_ms']:>9,.1f} {resumen['bloqueos']:>9,} {resumen['errores']:>8,}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", default="10k", help="escala de generador_datos (10k, 100k, 1M, 10M)")
+    parser.add_argument("--semilla", type=int, default=generador_datos.SEMILLA)
+    parser.add_argument("--sesiones", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos por nivel de concurrencia")
+    parser.add_argument("--pausa", type=float, default=0.0, help="tiempo medio de 'pensar' entre operaciones (ms)")
+    parser.add_argument("--apptest", metavar="PAGINA",
+                        help="cada sesión reejecuta también esta página (ej: ui_pacientes); implica --procesos")
+    parser.add_argument("--procesos", action="store_true", help="una sesión por proceso en vez de por hilo")
+    parser.add_argument("--p99-maximo", type=float, default=P99_MAXIMO, help="segundos; sobre esto se considera saturado")
+    parser.add_argument("--datos", default=CARPETA_DATOS)
+    parser.add_argument("--salida", help="JSON de resultados (por defecto en benchmarks/resultados/)")
+    args = parser.parse_args()
+    if args.apptest and AppTest is None:
+        parser.error("--apptest requiere Streamlit >= 1.28 (AppTest).")
+
+    os.makedirs(args.datos, exist_ok=True)
+    origen, _ = preparar_datos(args.escala, args.semilla, args.datos)
+    niveles = []
+    limite = None
+    print(f"{'sesiones':>8} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'bloqueos':>9} {'errores':>8}")
+    with tempfile.TemporaryDirectory() as carpeta_tmp:
+        ruta = os.path.join(carpeta_tmp, "carga.db")
+        for sesiones in args.sesiones:
+            copiar_bd(origen, ruta)  # cada nivel parte de la misma BD
+            resumen = correr_nivel(
+                ruta, sesiones, args.duracion, args.pausa / 1000, args.semilla, args.apptest, args.procesos
+            )
+            imprimir(resumen)
+            niveles.append(resumen)
+            if limite is None and (resumen["bloqueos"] or resumen["p99_ms"] > args.p99_maximo * 1000):
+                limite = sesiones
+            for error in resumen["ejemplos_error"]:
+                print(f"         error: {error}")
+
+    if limite is None:
+        print(f"\nSin bloqueos ni p99 > {args.p99_maximo:g} s hasta {args.sesiones[-1]} sesiones.")
+    else:
+        print(f"\nSaturación desde {limite} sesiones (bloqueos o p99 > {args.p99_maximo:g} s).")
+
+    corrida = {
+        "meta": {**metadatos(), "escala": args.escala, "semilla": args.semilla, "duracion": args.duracion,
+                 "pausa_ms": args.pausa, "apptest": args.apptest,
+                 "procesos": bool(args.procesos or args.apptest), "pesos": {f: p for f, (p, _) in FLUJOS.items()}},
+        "niveles": niveles,
+        "saturacion": limite,
+    }
+    salida = args.salida or os.path.join(
+        CARPETA_RESULTADOS, f"carga_{datetime.now():%Y%m%d_%H%M%S}_{corrida['meta']['commit'] or 'sin_git'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(corrida, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
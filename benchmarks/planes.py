@@ -0,0 +1,400 @@
+"""
+Regresiones de planes de consulta: corre EXPLAIN QUERY PLAN para cada consulta crítica sobre
+una BD sintética de generador_datos y compara con una foto guardada (benchmarks/planes_base.json).
+Sale con código 1 si aparece un escaneo completo de una tabla, un B-tree temporal (ORDER BY,
+GROUP BY o DISTINCT sin índice) o un índice automático que la foto no tenía, y sugiere un
+índice o una reescritura de la consulta.
+
+Cada problema aceptado en la foto lleva una justificación escrita ("justificaciones" de su
+consulta: por qué no se corrige). Un problema aceptado sin justificación también hace fallar la
+comparación: --actualizar conserva las justificaciones existentes y deja vacías las nuevas para
+completarlas a mano en el JSON.
+
+    python -m benchmarks.planes
+    python -m benchmarks.planes --detalle        # también los problemas ya aceptados
+    python -m benchmarks.planes --actualizar     # acepta los planes actuales como base
+
+Consultas críticas: las registradas en CONSULTAS (exportaciones, línea de tiempo, CDC, ...) y
+todas las que hacen las secciones de la app al renderizarse con AppTest (capturadas con la
+traza de db.py, una por huella SQL). Los planes dependen de la versión de SQLite y de las
+estadísticas de ANALYZE, por eso la BD es siempre la misma (escala y semilla fijas).
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+import cdc
+import db
+import generador_datos
+import metricas
+import api
+import signos_vitales
+import ui_timeline
+from import_export import EXPORTACIONES
+
+from benchmarks.suite import CARPETA_DATOS, RAIZ, SECCIONES, TIMEOUT_PAGINA, AppTest
+
+ESCALA = "1000"            # la página de Citas dibuja un widget por cita: a 10k no termina
+ARCHIVO_BASE = os.path.join(RAIZ, "benchmarks", "planes_base.json")
+
+# nombre -> (sql, parámetros); los parámetros solo tienen que calzar con los placeholders
+CONSULTAS = {
+    **{f"export/{nombre}": (lambda sql=exp["sql"]: (sql, ())) for nombre, exp in EXPORTACIONES.items()},
+    "timeline/pagina": lambda: (
+        ui_timeline.sql_timeline(),
+        {"pid": 1, "ts": ui_timeline.CURSOR_INICIAL[0], "tipo": ui_timeline.CURSOR_INICIAL[1],
+         "id": ui_timeline.CURSOR_INICIAL[2], "limit": ui_timeline.PAGINA_TIMELINE},
+    ),
+    "signos/lectura": lambda: (signos_vitales.SQL_SIGNOS, ()),
+    "cdc/cambios_netos": lambda: (cdc.sql_cambios_netos(), {"desde": 0, "limite": cdc.LIMITE_CAMBIOS}),
+    "cdc/cambios_netos_tablas": lambda: (
+        cdc.sql_cambios_netos(["Paciente", "Cita"]), {"desde": 0, "limite": cdc.LIMITE_CAMBIOS}
+    ),
+    "rut/paciente": lambda: (
+        f"SELECT id_paciente FROM Paciente WHERE {db.sql_rut_canonico('rut')} = {db.sql_rut_canonico('?')}",
+        ("12.345.678-5",),
+    ),
+    "rut/medico": lambda: (
+        f"SELECT id_medico FROM Medico WHERE {db.sql_rut_canonico('Rut')} = {db.sql_rut_canonico('?')}",
+        ("12.345.678-5",),
+    ),
+    **{
+        f"api/{recurso}?{filtro}": (lambda recurso=recurso, filtro=filtro: (api.sql_pagina(recurso, [filtro]), (1, 0, 51)))
+        for recurso, filtro in [
+            ("citas", "id_paciente"), ("fichas", "id_paciente"), ("signos_vitales", "id_ficha"),
+            ("examenes", "id_ficha"), ("resultados_examen", "id_examen"), ("prescripciones", "id_ficha"),
+        ]
+    },
+}
+
+
+# =======================
+# Análisis de un plan
+# =======================
+_ESCANEO = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?")
+_TEMP = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+_AUTOMATICO = re.compile(r"^SEARCH (\w+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((.+?)\)")
+_TABLA_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.I)
+_FUNCION_COLUMNA = re.compile(
+    r"\b(datetime|date|time|julianday|lower|upper|trim|ltrim|rtrim|substr|ifnull|coalesce|replace|cast)"
+    r"\s*\(\s*([A-Za-z_][\w.]*)",
+    re.I,
+)
+_CLAUSULA = r"\b{}\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\bHAVING\b|\bUNION\b|\)\s*$|$)"
+_NO_ALIAS = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "ORDER", "GROUP", "LIMIT", "USING", "NATURAL", "UNION"}
+
+
+def alias_tablas(sql: str, tablas: set) -> Dict[str, str]:
+    """{alias o nombre: tabla} de las tablas reales que aparecen en FROM/JOIN."""
+    reales = {t.lower(): t for t in tablas}
+    alias = {}
+    for tabla, nombre in _TABLA_ALIAS.findall(sql):
+        if tabla.lower() not in reales:
+            continue
+        alias[tabla] = reales[tabla.lower()]
+        if nombre and nombre.upper() not in _NO_ALIAS:
+            alias[nombre] = reales[tabla.lower()]
+    return alias
+
+
+def problemas(plan: List[str], sql: str, tablas: set) -> List[str]:
+    """
+    Problemas del plan como claves estables: "escaneo:<tabla>" (recorre la tabla completa,
+    aunque sea en el orden de un índice), "temp_btree:<ORDER BY|GROUP BY|...>" y
+    "indice_automatico:<tabla>(<columnas>)". Las tablas internas (sqlite_*) y los escaneos
+    de subconsultas o CTE no cuentan.
+    """
+    alias = alias_tablas(sql, tablas)
+    encontrados = []
+    for detalle in plan:
+        m = _ESCANEO.match(detalle)
+        if m and m.group(1) != "CONSTANT":
+            tabla = alias.get(m.group(2) or m.group(1))
+            if tabla and not tabla.lower().startswith("sqlite_"):
+                encontrados.append(f"escaneo:{tabla}")
+            continue
+        m = _TEMP.search(detalle)
+        if m:
+            encontrados.append(f"temp_btree:{m.group(1)}")
+            continue
+        m = _AUTOMATICO.match(detalle)
+        if m:
+            columnas = ", ".join(c.split("=")[0].strip() for c in m.group(2).split(" AND "))
+            encontrados.append(f"indice_automatico:{alias.get(m.group(1), m.group(1))}({columnas})")
+    return sorted(encontrados)
+
+
+def _clausula(sql: str, palabra: str) -> str:
+    m = re.search(_CLAUSULA.format(palabra.replace(" ", r"\s+")), " ".join(sql.split()), re.I)
+    return m.group(1) if m else ""
+
+
+def sugerir(problema: str, sql: str, tablas: set) -> str:
+    """Sugerencia (heurística) de índice o reescritura para un problema de `problemas`."""
+    tipo, _, objeto = problema.partition(":")
+    if tipo == "indice_automatico":
+        tabla, columnas = objeto[:-1].split("(", 1)
+        return (f"SQLite arma un índice temporal en cada ejecución: "
+                f"CREATE INDEX idx_{tabla.lower()}_{columnas.replace(', ', '_').lower()} ON {tabla}({columnas})")
+
+    alias = alias_tablas(sql, tablas)
+    if tipo == "temp_btree":
+        if objeto.endswith("DISTINCT"):
+            return "DISTINCT ordena todas las filas: si el JOIN no duplica filas, quítalo; si no, usa EXISTS"
+        palabra = "GROUP BY" if objeto.endswith("GROUP BY") else "ORDER BY"
+        if len(re.findall(r"\bSELECT\b", sql, re.I)) > 1:
+            return (f"consulta con subconsultas: la línea anterior al sort en el plan dice qué tabla se recorre; "
+                    f"un índice con las columnas del WHERE (=) y luego las del {palabra} de esa subconsulta lo evita")
+        clausula = _clausula(sql, palabra)
+        funciones = _FUNCION_COLUMNA.findall(clausula)
+        if funciones:
+            f, col = funciones[0]
+            return (f"{f}({col}) en el {palabra} no puede usar un índice sobre {col}: ordena por la columna "
+                    f"directamente si su formato ya ordena bien, o crea un índice sobre la expresión")
+        unica = next(iter(set(alias.values()))) if len(set(alias.values())) == 1 else None
+        por_tabla = {}
+        for col in (c.strip().split()[0] for c in clausula.split(",") if c.strip()):
+            prefijo, _, nombre = col.rpartition(".")
+            tabla = alias.get(prefijo) if prefijo else unica
+            if tabla:
+                por_tabla.setdefault(tabla, []).append(nombre)
+        if len(por_tabla) == 1:
+            tabla, cols = next(iter(por_tabla.items()))
+            filtros = _columnas_filtradas(sql, tabla, alias)
+            cols = [c for c in filtros if c not in cols] + cols
+            return (f"un índice que entregue las filas ya ordenadas evita el sort: "
+                    f"CREATE INDEX idx_{tabla.lower()}_{'_'.join(cols).lower()} ON {tabla}({', '.join(cols)}) "
+                    f"(las columnas del WHERE con = van primero)")
+        return f"el {palabra} mezcla columnas de varias tablas: ordena por columnas de la tabla que se recorre primero"
+
+    if tipo == "escaneo":
+        donde = _clausula(sql, "WHERE")
+        for f, col in _FUNCION_COLUMNA.findall(donde):
+            if alias.get(col.rpartition(".")[0] or objeto, objeto) == objeto:
+                return (f"{f}({col}) en el WHERE impide usar un índice: compara la columna directamente "
+                        f"o crea un índice sobre la expresión (como idx_paciente_rut_canon)")
+        if re.search(r"LIKE\s+'%", donde, re.I):
+            return "LIKE '%...' no puede usar un índice: usa un prefijo (LIKE 'abc%') o una tabla FTS"
+        filtros = _columnas_filtradas(sql, objeto, alias)
+        if filtros:
+            return (f"el WHERE filtra {objeto} por {', '.join(filtros)} sin índice: "
+                    f"CREATE INDEX idx_{objeto.lower()}_{'_'.join(filtros).lower()} ON {objeto}({', '.join(filtros)})")
+        return (f"la consulta lee {objeto} completa (sin filtro por sus columnas): esperado en exportaciones "
+                f"y listados completos; si no, agrega un WHERE o pagina con LIMIT")
+    return ""
+
+
+def _columnas_filtradas(sql: str, tabla: str, alias: Dict[str, str]) -> List[str]:
+    """Columnas de `tabla` comparadas con = o IN en el WHERE (heurística)."""
+    nombres = [a for a, t in alias.items() if t == tabla]
+    solo_una = len(set(alias.values())) == 1
+    columnas = []
+    for prefijo, col in re.findall(r"(?:\b(\w+)\.)?\b(\w+)\s*(?:=|\bIN\b)", _clausula(sql, "WHERE"), re.I):
+        if (prefijo in nombres or (not prefijo and solo_una)) and col not in columnas:
+            columnas.append(col)
+    return columnas
+
+
+# =======================
+# Recolección
+# =======================
+def planes_registrados(conn: sqlite3.Connection, tablas: set) -> Dict[str, dict]:
+    resultado = {}
+    for nombre, consulta in CONSULTAS.items():
+        sql, params = consulta()
+        plan = [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        resultado[nombre] = _entrada(sql, plan, nombre, tablas)
+    return resultado
+
+
+def planes_paginas(tablas: set, timeout: float) -> Dict[str, dict]:
+    """Cada consulta distinta (por huella) que hacen las secciones de la app al renderizarse."""
+    if AppTest is None:
+        print("AppTest no está disponible (Streamlit < 1.28): se omiten las páginas.")
+        return {}
+    consultas = db.iniciar_traza(planes=True, todos_los_hilos=True)
+    anterior = os.getcwd()
+    os.chdir(RAIZ)  # app.py busca foto.jpg en el directorio actual
+    try:
+        for seccion in SECCIONES:
+            db.etiquetar_traza(seccion, todos_los_hilos=True)
+            at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=timeout)
+            try:
+                at.run()
+                next(r for r in at.sidebar.radio if r.label == "Secciones").set_value(seccion)
+                at.run()
+            except RuntimeError as e:  # timeout: se usa lo capturado hasta ahí
+                print(f"  {seccion}: {e}", flush=True)
+            if at.exception:
+                print(f"  {seccion}: la página lanzó una excepción: {at.exception[0].value}", flush=True)
+    finally:
+        db.detener_traza(todos_los_hilos=True)
+        os.chdir(anterior)
+
+    resultado = {}
+    for c in consultas:
+        if not c["plan"]:
+            continue
+        huella, _ = metricas.huella_sql(c["sql"])
+        clave = f"app/{huella}"
+        if clave not in resultado:
+            resultado[clave] = _entrada(c["sql"], c["plan"], f"{c['etiqueta']}: {c['origen']}", tablas)
+    return resultado
+
+
+def _entrada(sql: str, plan: List[str], origen: Optional[str], tablas: set) -> dict:
+    return {
+        "origen": origen,
+        "sql": metricas.huella_sql(sql)[1],
+        "plan": plan,
+        "problemas": problemas(plan, sql, tablas),
+        "sugerencias": {},
+        "_sql": sql,
+    }
+
+
+def preparar_bd(escala: str, semilla: int, carpeta: str) -> str:
+    ruta = os.path.join(carpeta, f"planes_{escala}_{semilla}.db")
+    if not os.path.exists(ruta):
+        print(f"Generando datos {escala} (semilla {semilla})...", flush=True)
+        generador_datos.generar(ruta, escala, semilla, reemplazar=True)
+    else:
+        with generador_datos.usando_bd(ruta):
+            db.init_db()  # índices nuevos del esquema
+        with sqlite3.connect(ruta) as conn:
+            conn.execute("ANALYZE")
+    return ruta
+
+
+# =======================
+# Comparación
+# =======================
+def comparar(actual: Dict[str, dict], base: Dict[str, dict]) -> List[tuple]:
+    """[(clave, problemas nuevos)]: los que la base no tenía (o tenía menos veces)."""
+    regresiones = []
+    for clave, entrada in sorted(actual.items()):
+        nuevos = Counter(entrada["problemas"]) - Counter(base.get(clave, {}).get("problemas", []))
+        if nuevos:
+            regresiones.append((clave, sorted(nuevos.elements())))
+    return regresiones
+
+
+def sin_justificar(actual: Dict[str, dict], base: Dict[str, dict]) -> List[tuple]:
+    """[(clave, problemas)]: problemas aceptados en la base cuya justificación falta o está vacía."""
+    pendientes = []
+    for clave, entrada in sorted(actual.items()):
+        justificaciones = base.get(clave, {}).get("justificaciones", {})
+        aceptados = set(entrada["problemas"]) & set(base.get(clave, {}).get("problemas", []))
+        faltan = sorted(p for p in aceptados if not justificaciones.get(p, "").strip())
+        if faltan:
+            pendientes.append((clave, faltan))
+    return pendientes
+
+
+def imprimir(clave: str, entrada: dict, problemas_a_mostrar: List[str]) -> None:
+    print(f"\n{clave}  [{entrada['origen']}]")
+    print(f"  {entrada['sql']}")
+    for paso in entrada["plan"]:
+        print(f"    | {paso}")
+    for p in problemas_a_mostrar:
+        print(f"  - {p}: {entrada['sugerencias'].get(p, '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", default=ESCALA, help="escala de generador_datos (la base se tomó con 1000)")
+    parser.add_argument("--semilla", type=int, default=generador_datos.SEMILLA)
+    parser.add_argument("--datos", default=CARPETA_DATOS, help="carpeta de la BD generada (se reutiliza)")
+    parser.add_argument("--base", default=ARCHIVO_BASE, help="foto de planes contra la que se compara")
+    parser.add_argument("--actualizar", action="store_true", help="guarda los planes actuales como base")
+    parser.add_argument("--detalle", action="store_true", help="muestra también los problemas ya aceptados")
+    parser.add_argument("--sin-paginas", action="store_true", help="solo las consultas registradas (sin AppTest)")
+    parser.add_argument("--timeout-pagina", type=float, default=TIMEOUT_PAGINA)
+    args = parser.parse_args()
+
+    os.makedirs(args.datos, exist_ok=True)
+    ruta = preparar_bd(args.escala, args.semilla, args.datos)
+    with generador_datos.usando_bd(ruta):
+        with sqlite3.connect(ruta) as conn:
+            tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            actual = planes_registrados(conn, tablas)
+        if not args.sin_paginas:
+            print("Capturando las consultas de las páginas...", flush=True)
+            actual.update(planes_paginas(tablas, args.timeout_pagina))
+    for entrada in actual.values():
+        sql = entrada.pop("_sql")
+        entrada["sugerencias"] = {p: sugerir(p, sql, tablas) for p in entrada["problemas"]}
+
+    if args.actualizar:
+        if args.sin_paginas and os.path.exists(args.base):  # conserva las de páginas de la base
+            with open(args.base, encoding="utf-8") as f:
+                anteriores = json.load(f)["consultas"]
+            actual = {**{k: v for k, v in anteriores.items() if k.startswith("app/")}, **actual}
+        anteriores = {}
+        if os.path.exists(args.base):
+            with open(args.base, encoding="utf-8") as f:
+                anteriores = json.load(f)["consultas"]
+        for clave, entrada in actual.items():
+            previas = anteriores.get(clave, {}).get("justificaciones", {})
+            entrada["justificaciones"] = {p: previas.get(p, "") for p in sorted(set(entrada["problemas"]))}
+        foto = {
+            "meta": {"sqlite": sqlite3.sqlite_version, "escala": args.escala, "semilla": args.semilla},
+            "consultas": dict(sorted(actual.items())),
+        }
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(foto, f, ensure_ascii=False, indent=2)
+        print(f"{len(actual)} planes guardados en {args.base}")
+        pendientes = sum(not t for e in actual.values() for t in e["justificaciones"].values())
+        if pendientes:
+            print(f"{pendientes} problemas sin justificación: complétalas en \"justificaciones\" de {args.base}.")
+        return
+
+    base = {"meta": {}, "consultas": {}}
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+    else:
+        print(f"No existe {args.base}: todos los problemas cuentan como nuevos (crea la base con --actualizar).")
+    meta = base["meta"]
+    if meta.get("sqlite") not in (None, sqlite3.sqlite_version):
+        print(f"Aviso: la base se tomó con SQLite {meta['sqlite']} y esta es {sqlite3.sqlite_version}.")
+    if meta.get("escala") not in (None, args.escala) or meta.get("semilla") not in (None, args.semilla):
+        print(f"Aviso: la base se tomó con escala {meta['escala']} y semilla {meta['semilla']}.")
+
+    if args.detalle:
+        for clave, entrada in sorted(actual.items()):
+            if entrada["problemas"]:
+                imprimir(clave, entrada, entrada["problemas"])
+
+    regresiones = comparar(actual, base["consultas"])
+    aceptados = sum(len(e["problemas"]) for e in actual.values()) - sum(len(n) for _, n in regresiones)
+    desaparecidas = sorted(set(base["consultas"]) - set(actual))
+    if args.sin_paginas:
+        desaparecidas = [c for c in desaparecidas if not c.startswith("app/")]
+    for clave in desaparecidas:
+        print(f"(ya no se ejecuta: {clave} {base['consultas'][clave]['sql'][:80]})")
+    print(f"\n{len(actual)} consultas, {aceptados} problemas ya aceptados en la base.")
+    pendientes = sin_justificar(actual, base["consultas"])
+    for clave, faltan in pendientes:
+        print("\nSIN JUSTIFICACIÓN", end="")
+        imprimir(clave, actual[clave], faltan)
+    if regresiones:
+        for clave, nuevos in regresiones:
+            print("\nREGRESIÓN", end="")
+            imprimir(clave, actual[clave], nuevos)
+        print(f"\n{len(regresiones)} consultas con planes peores que {args.base}. "
+              "Si el cambio es intencional: python -m benchmarks.planes --actualizar")
+    if pendientes:
+        print(f"\n{len(pendientes)} consultas con problemas aceptados sin justificación en {args.base}.")
+    if regresiones or pendientes:
+        sys.exit(1)
+    print(f"Sin regresiones de planes respecto de {args.base}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Suite de benchmarks: páginas de la app (con AppTest, sin navegador), helpers de db.py,
+importadores y exportadores, sobre BDs sintéticas de generador_datos en varias escalas.
+Por cada medición guarda tiempo, cantidad de consultas SQL y pico de memoria en un JSON,
+y puede compararlo con una corrida base (sale con código 1 si hay regresiones).
+
+    python -m benchmarks.suite --escalas 10k 100k
+    python -m benchmarks.suite --escalas 10k --base benchmarks/resultados/base.json
+
+Las BDs y archivos generados quedan en --datos y se reutilizan entre corridas.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+import db
+import generador_datos
+from import_export import (
+    ENTIDADES_IMPORT,
+    EXPORTACIONES,
+    exportar_csv,
+    exportar_parquet,
+    exportar_snapshot,
+    importar_csv,
+    importar_paquete,
+    pq,
+)
+
+try:  # AppTest existe desde Streamlit 1.28
+    from streamlit.testing.v1 import AppTest
+except ImportError:  # pragma: no cover
+    AppTest = None
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_DATOS = os.path.join(RAIZ, "benchmarks", "datos")
+CARPETA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+SECCIONES = ["Pacientes", "Médicos", "Citas", "Ficha Médica", "Línea de tiempo"]
+PAGINAS = ["ui_pacientes", "ui_medicos", "ui_citas", "ui_ficha_medica", "ui_timeline", "sidebar"]
+SEGUNDOS_MICRO = 0.2       # cada repetición de un microbenchmark dura al menos esto
+TOLERANCIA = 0.15          # regresión = más de 15 % peor que la base
+MEMORIA_MINIMA_MB = 1.0    # diferencias de memoria menores se consideran ruido
+TIMEOUT_PAGINA = 120       # segundos por rerun; una página que no termina queda como error
+
+# PRAGMAs que db.get_conn ejecuta al abrir cada conexión (no cuentan como consultas)
+_PRAGMAS_CONEXION = re.compile(r"\s*PRAGMA\s+(foreign_keys|journal_mode|synchronous)\b", re.I)
+
+
+# =======================
+# Medición
+# =======================
+@contextlib.contextmanager
+def contar_consultas():
+    """
+    Cuenta conexiones y sentencias SQL de todo el proceso mientras dura el bloque
+    (todas las conexiones salen de sqlite3.connect). Las sentencias internas de los
+    triggers no se cuentan; executemany cuenta una por fila.
+    """
+    conteo = {"consultas": 0, "conexiones": 0}
+    original = sqlite3.connect
+
+    def contar(sql: str) -> None:
+        if not sql.startswith("--") and not _PRAGMAS_CONEXION.match(sql):
+            conteo["consultas"] += 1
+
+    def conectar(*args, **kwargs):
+        conn = original(*args, **kwargs)
+        conteo["conexiones"] += 1
+        conn.set_trace_callback(contar)
+        return conn
+
+    sqlite3.connect = conectar
+    try:
+        yield conteo
+    finally:
+        sqlite3.connect = original
+
+
+def medir(fn, repeticiones: int = 3, preparar=None, veces: int = 1) -> dict:
+    """
+    Mediana y mínimo de `repeticiones` corridas de fn (cada una llama fn `veces` veces y se
+    informa el tiempo por llamada). Luego una corrida más, sin cronometrar, con conteo de
+    consultas y tracemalloc, que agregan demasiado overhead para medir tiempo a la vez.
+    `preparar` se llama antes de cada corrida y no se mide.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        for _ in range(veces):
+            fn()
+        tiempos.append((time.perf_counter() - t0) / veces)
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    try:
+        with contar_consultas() as conteo:
+            resultado = fn()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    medicion = {
+        "segundos": statistics.median(tiempos),
+        "min_segundos": min(tiempos),
+        "repeticiones": repeticiones,
+        "consultas": conteo["consultas"],
+        "conexiones": conteo["conexiones"],
+        "memoria_pico_mb": round(pico / 1024 / 1024, 2),
+    }
+    if isinstance(resultado, dict) and "filas_leidas" in resultado:
+        medicion["filas"] = resultado["filas_leidas"]
+        medicion["filas_por_segundo"] = resultado["filas_leidas"] / medicion["segundos"]
+    return medicion
+
+
+def medir_micro(fn, repeticiones: int = 5) -> dict:
+    """Como medir, para operaciones cortas: se repiten hasta durar SEGUNDOS_MICRO por corrida."""
+    t0 = time.perf_counter()
+    fn()
+    veces = max(1, int(SEGUNDOS_MICRO / max(time.perf_counter() - t0, 1e-6)))
+    return medir(fn, repeticiones, veces=veces)
+
+
+def copiar_bd(origen: str, destino: str) -> None:
+    """Copia consistente (API de backup: incluye lo que aún está en el WAL)."""
+    for sufijo in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(destino + sufijo)
+    with contextlib.closing(sqlite3.connect(origen)) as src, contextlib.closing(sqlite3.connect(destino)) as dst:
+        src.backup(dst)
+
+
+def preparar_datos(escala: str, semilla: int, carpeta: str) -> tuple:
+    """BD sintética y sus archivos de importación para `escala`; se generan solo la primera vez."""
+    ruta = os.path.join(carpeta, f"clinica_{escala}_{semilla}.db")
+    archivos = os.path.join(carpeta, f"import_{escala}_{semilla}")
+    if not os.path.exists(ruta):
+        print(f"Generando datos {escala} (semilla {semilla})...", flush=True)
+        generador_datos.generar(ruta, escala, semilla, reemplazar=True)
+        shutil.rmtree(archivos, ignore_errors=True)
+    if not os.path.exists(os.path.join(archivos, "paquete.zip")):
+        generador_datos.exportar_archivos(ruta, archivos)
+    return ruta, archivos
+
+
+# =======================
+# Grupos de benchmarks
+# =======================
+def bench_paginas(repeticiones: int, timeout: float = TIMEOUT_PAGINA) -> dict:
+    """
+    Rerun de cada sección de la app completa, de cada página sola y del sidebar solo.
+    Si un rerun pasa de `timeout` segundos o lanza una excepción, la medición queda como
+    {"error": ...} y se sigue con la siguiente.
+    """
+    if AppTest is None:
+        print("AppTest no está disponible (Streamlit < 1.28): se omiten las páginas.")
+        return {}
+    resultados = {}
+    anterior = os.getcwd()
+    os.chdir(RAIZ)  # app.py busca foto.jpg en el directorio actual
+    try:
+        for seccion in SECCIONES:
+            # AppTest nueva por sección: tras un timeout la anterior queda detenida
+            at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=timeout)
+            resultados[f"app/{seccion}"] = _medir_apptest(at, repeticiones, seccion)
+
+        for pagina in PAGINAS:
+            os.environ["SGP_BENCH_PAGINA"] = pagina
+            at = AppTest.from_file(os.path.join(RAIZ, "benchmarks", "app_pagina.py"), default_timeout=timeout)
+            resultados[f"pagina/{pagina}"] = _medir_apptest(at, repeticiones)
+    finally:
+        os.environ.pop("SGP_BENCH_PAGINA", None)
+        os.chdir(anterior)
+    return resultados
+
+
+def _medir_apptest(at, repeticiones: int, seccion: str = None) -> dict:
+    def rerun():
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"La página lanzó una excepción: {at.exception[0].value}")
+
+    try:
+        rerun()  # primer render (no se mide)
+        if seccion is not None:
+            next(r for r in at.sidebar.radio if r.label == "Secciones").set_value(seccion)
+            rerun()
+        return medir(rerun, repeticiones)
+    except RuntimeError as e:
+        print(f"  {e}", flush=True)
+        return {"error": str(e)}
+
+
+def bench_db(repeticiones: int, carpeta_tmp: str) -> dict:
+    """Helpers de db.py sobre la BD actual; las escrituras van a una BD aparte."""
+    rut = db.fetch_one("SELECT rut FROM Paciente LIMIT 1")[0]
+    resultados = {
+        "db/get_conn": medir_micro(lambda: db.get_conn().close(), repeticiones),
+        "db/fetch_one_pk": medir_micro(
+            lambda: db.fetch_one("SELECT * FROM Paciente WHERE id_paciente = ?", (1,)), repeticiones
+        ),
+        "db/fetch_one_rut": medir_micro(
+            lambda: db.fetch_one(
+                f"SELECT id_paciente FROM Paciente WHERE {db.sql_rut_canonico('rut')} = {db.sql_rut_canonico('?')}",
+                (rut,),
+            ),
+            repeticiones,
+        ),
+        "db/fetch_all_medicos": medir_micro(lambda: db.fetch_all("SELECT * FROM Medico"), repeticiones),
+        "db/fetch_all_1000": medir_micro(lambda: db.fetch_all("SELECT * FROM Paciente LIMIT 1000"), repeticiones),
+        "db/has_column": medir_micro(lambda: db.has_column("Paciente", "rut"), repeticiones),
+        "db/init_db": medir(db.init_db, repeticiones),
+    }
+    # execute escribe: se mide en una BD vacía para no ensuciar la BD sintética
+    with generador_datos.usando_bd(os.path.join(carpeta_tmp, "escritura.db")):
+        db.init_db()
+        db.execute("CREATE TABLE IF NOT EXISTS _bench (id INTEGER PRIMARY KEY, valor TEXT)")
+        resultados["db/execute_insert"] = medir_micro(
+            lambda: db.execute("INSERT INTO _bench (valor) VALUES (?)", ("x",)), repeticiones
+        )
+    return resultados
+
+
+def bench_exportadores(repeticiones: int) -> dict:
+    resultados = {}
+    formatos = [("csv", exportar_csv, {}), ("csv_gzip", exportar_csv, {"comprimir": True})]
+    if pq is not None:
+        formatos.append(("parquet", exportar_parquet, {}))
+    for nombre, exp in EXPORTACIONES.items():
+        for formato, exportar, opciones in formatos:
+            resultados[f"export/{nombre}/{formato}"] = medir(
+                lambda: _cerrar(exportar(exp["sql"], **opciones)), repeticiones
+            )
+    resultados["export/snapshot"] = medir(lambda: _cerrar(exportar_snapshot()), repeticiones)
+    return resultados
+
+
+def _cerrar(salida):
+    archivo, stats = salida
+    archivo.close()
+    return {"filas_leidas": stats["filas"]} if "filas" in stats else stats
+
+
+def bench_importadores(archivos: str, repeticiones: int, carpeta_tmp: str) -> dict:
+    """
+    Cada entidad se importa a una copia fresca de la BD: vacía para Pacientes y Médicos, y
+    con esos ya cargados para Citas y FichaMedica (que los referencian por RUT).
+    """
+    vacia = os.path.join(carpeta_tmp, "vacia.db")
+    con_personas = os.path.join(carpeta_tmp, "con_personas.db")
+    destino = os.path.join(carpeta_tmp, "importacion.db")
+    with generador_datos.usando_bd(vacia):
+        db.init_db()
+
+    resultados = {}
+    with generador_datos.usando_bd(destino):
+        formatos = ["csv"] + (["parquet"] if pq is not None else [])
+        for formato in formatos:
+            copiar_bd(vacia, con_personas)
+            for entidad in ENTIDADES_IMPORT:
+                origen = con_personas if entidad in ("Citas", "FichaMedica") else vacia
+                ruta = os.path.join(archivos, EXPORTACIONES[entidad]["archivo"].replace(".csv", f".{formato}"))
+
+                def importar():
+                    with open(ruta, "rb") as archivo:
+                        return importar_csv(entidad, archivo)
+
+                resultados[f"import/{entidad}/{formato}"] = medir(
+                    importar, repeticiones, preparar=lambda: copiar_bd(origen, destino)
+                )
+                if entidad in ("Pacientes", "Medicos"):
+                    # con_personas acumula lo importado, para las entidades que lo referencian
+                    with generador_datos.usando_bd(con_personas):
+                        with open(ruta, "rb") as archivo:
+                            importar_csv(entidad, archivo)
+
+        # El paquete corre en procesos aparte: su memoria no aparece en tracemalloc
+        resultados["import/paquete"] = medir(
+            lambda: _total_paquete(importar_paquete(os.path.join(archivos, "paquete.zip"))),
+            repeticiones,
+            preparar=lambda: copiar_bd(vacia, destino),
+        )
+    return resultados
+
+
+def _total_paquete(resultado: dict) -> dict:
+    return {"filas_leidas": sum(r["filas_leidas"] for r in resultado["reportes"].values())}
+
+
+# =======================
+# Resultados y comparación
+# =======================
+def metadatos() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(actual: dict, base: dict, tolerancia: float = TOLERANCIA) -> list:
+    """
+    Regresiones de `actual` respecto de `base` (mismas claves): tiempo o memoria más de
+    `tolerancia` peor, cualquier consulta SQL extra, o un error donde antes no lo había. Devuelve [(clave, métrica, antes, ahora)].
+    """
+    regresiones = []
+    for clave, ahora in actual["resultados"].items():
+        antes = base["resultados"].get(clave)
+        if antes is None or "error" in antes:
+            continue
+        if "error" in ahora:
+            regresiones.append((clave, "error", antes["segundos"], float("inf")))
+            continue
+        if ahora["segundos"] > antes["segundos"] * (1 + tolerancia):
+            regresiones.append((clave, "segundos", antes["segundos"], ahora["segundos"]))
+        if ahora["consultas"] > antes["consultas"]:
+            regresiones.append((clave, "consultas", antes["consultas"], ahora["consultas"]))
+        memoria, memoria_base = ahora["memoria_pico_mb"], antes["memoria_pico_mb"]
+        if memoria > memoria_base * (1 + tolerancia) and memoria - memoria_base > MEMORIA_MINIMA_MB:
+            regresiones.append((clave, "memoria_pico_mb", memoria_base, memoria))
+    return regresiones
+
+
+def imprimir(resultados: dict, base: dict = None) -> None:
+    print(f"{'benchmark':48s} {'tiempo':>12s} {'vs base':>8s} {'consultas':>10s} {'memoria':>10s}")
+    for clave, m in resultados.items():
+        if "error" in m:
+            print(f"{clave:48s} {'ERROR':>12s}  {m['error']}")
+            continue
+        antes = (base or {}).get("resultados", {}).get(clave)
+        if antes and "error" in antes:
+            antes = None
+        cambio = f"{m['segundos'] / antes['segundos'] - 1:+.0%}" if antes and antes["segundos"] else ""
+        tiempo = f"{m['segundos'] * 1000:,.1f} ms" if m["segundos"] < 1 else f"{m['segundos']:,.2f} s"
+        print(f"{clave:48s} {tiempo:>12s} {cambio:>8s} {m['consultas']:>10,} {m['memoria_pico_mb']:>7,.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", nargs="+", default=["10k"], help="escalas de generador_datos (10k, 100k, 1M, 10M)")
+    parser.add_argument("--semilla", type=int, default=generador_datos.SEMILLA)
+    parser.add_argument("--grupos", nargs="+", default=["paginas", "db", "export", "import"],
+                        choices=["paginas", "db", "export", "import"])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--datos", default=CARPETA_DATOS, help="BDs y archivos generados (se reutilizan)")
+    parser.add_argument("--salida", help="JSON de resultados (por defecto en benchmarks/resultados/)")
+    parser.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--timeout-pagina", type=float, default=TIMEOUT_PAGINA,
+                        help="segundos máximos por rerun de una página")
+    args = parser.parse_args()
+
+    os.makedirs(args.datos, exist_ok=True)
+    resultados = {}
+    for escala in args.escalas:
+        ruta, archivos = preparar_datos(escala, args.semilla, args.datos)
+        with tempfile.TemporaryDirectory() as carpeta_tmp, generador_datos.usando_bd(ruta):
+            grupos = {
+                "paginas": lambda: bench_paginas(args.repeticiones, args.timeout_pagina),
+                "db": lambda: bench_db(args.repeticiones, carpeta_tmp),
+                "export": lambda: bench_exportadores(args.repeticiones),
+                "import": lambda: bench_importadores(archivos, args.repeticiones, carpeta_tmp),
+            }
+            for grupo in args.grupos:
+                print(f"[{escala}] {grupo}...", flush=True)
+                for clave, medicion in grupos[grupo]().items():
+                    resultados[f"{escala}/{clave}"] = medicion
+
+    corrida = {"meta": {**metadatos(), "escalas": args.escalas, "semilla": args.semilla}, "resultados": resultados}
+    salida = args.salida or os.path.join(
+        CARPETA_RESULTADOS, f"bench_{datetime.now():%Y%m%d_%H%M%S}_{corrida['meta']['commit'] or 'sin_git'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(corrida, f, ensure_ascii=False, indent=2)
+
+    base = None
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(resultados, base)
+    print(f"\nResultados en {salida}")
+    if base is not None:
+        regresiones = comparar(corrida, base, args.tolerancia)
+        for clave, metrica, antes, ahora in regresiones:
+            print(f"REGRESIÓN {clave} {metrica}: {antes:,.4g} -> {ahora:,.4g}")
+        if regresiones:
+            sys.exit(1)
+        print(f"Sin regresiones respecto de {args.base} (tolerancia {args.tolerancia:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
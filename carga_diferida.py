@@ -0,0 +1,40 @@
+import importlib
+import importlib.util
+from types import ModuleType
+
+# =======================
+# Imports diferidos
+# =======================
+# pandas, numpy y pyarrow suman varios cientos de ms al arrancar el proceso, y el primer render
+# (sidebar + página de Pacientes) no los necesita: solo exportar, importar o analizar datos.
+# `pd = modulo("pandas")` deja un objeto que importa el módulo real la primera vez que se le
+# pide un atributo; los módulos que lo usan en anotaciones llevan `from __future__ import annotations`.
+
+
+class ModuloDiferido:
+    """Se comporta como el módulo `nombre`, pero lo importa recién al primer acceso."""
+
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo = None
+
+    def cargar(self) -> ModuleType:
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)  # el lock de import lo hace seguro entre hilos
+        return self._modulo
+
+    def __getattr__(self, atributo: str):
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self) -> str:
+        estado = "cargado" if self._modulo is not None else "sin cargar"
+        return f"<módulo diferido {self._nombre!r} ({estado})>"
+
+
+def modulo(nombre: str) -> ModuloDiferido:
+    return ModuloDiferido(nombre)
+
+
+def disponible(nombre: str) -> bool:
+    """True si el paquete está instalado, sin importarlo (para dependencias opcionales)."""
+    return importlib.util.find_spec(nombre.partition(".")[0]) is not None
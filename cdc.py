@@ -0,0 +1,148 @@
+import contextlib
+from typing import Iterable, List, Optional, Tuple
+
+from db import TABLAS_CDC, get_conn
+
+# =======================
+# Consulta de cambios (CambioLog se llena con triggers, ver db.init_db)
+# =======================
+LIMITE_CAMBIOS = 10_000
+RETENCION_DIAS = 90
+
+
+def watermark_actual(conn=None) -> int:
+    """
+    Último seq asignado (0 si nunca hubo cambios). Se lee de sqlite_sequence y no de MAX(seq):
+    con AUTOINCREMENT nunca retrocede, aunque compactar_cambios o purgar_cambios vacíen el log.
+    """
+    if conn is None:
+        with contextlib.closing(get_conn()) as conn:
+            return watermark_actual(conn)
+    return conn.execute(
+        "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'CambioLog'), 0)"
+    ).fetchone()[0]
+
+
+def _sql_pagina(tablas: Optional[Iterable[str]]) -> str:
+    """Entradas del log con seq > :desde (a lo más :limite), opcionalmente de ciertas tablas."""
+    filtro = ""
+    if tablas is not None:
+        nombres = [t for t in tablas if t in TABLAS_CDC]
+        filtro = " AND tabla IN (" + ", ".join(f"'{t}'" for t in nombres) + ")" if nombres else " AND 0"
+    return f"""
+            SELECT seq, tabla, pk, op, ts FROM CambioLog
+            WHERE seq > :desde{filtro}
+            ORDER BY seq
+            LIMIT :limite"""
+
+
+def sql_cambios_netos(tablas: Optional[Iterable[str]] = None) -> str:
+    """
+    Cambios de una página del log reducidos a uno por (tabla, pk): el último. Así una fila
+    editada 10 veces se sincroniza una sola vez. Si la fila se creó dentro de la página se
+    informa como 'I', y si además se borró, no se informa.
+    """
+    return f"""
+        SELECT seq, tabla, pk, CASE WHEN inserts > 0 THEN 'I' ELSE op END AS op, ts
+        FROM (
+            -- con un único MAX(), SQLite toma op y ts de la fila con el seq máximo
+            SELECT MAX(seq) AS seq, tabla, pk, op, ts, SUM(op = 'I') AS inserts
+            FROM ({_sql_pagina(tablas)})
+            GROUP BY tabla, pk
+        )
+        WHERE NOT (inserts > 0 AND op = 'D')
+        ORDER BY seq
+    """
+
+
+def cambios_desde(
+    desde: int, limite: int = LIMITE_CAMBIOS, tablas: Optional[Iterable[str]] = None, conn=None
+) -> Tuple[List[dict], int]:
+    """
+    Devuelve (cambios, siguiente_watermark). Cada cambio es {seq, tabla, pk, op, ts}.
+    Si quedan más de `limite` entradas, se vuelve a llamar con el watermark devuelto.
+    """
+    if conn is None:
+        with contextlib.closing(get_conn()) as conn:
+            return cambios_desde(desde, limite, tablas, conn)
+    params = {"desde": desde, "limite": limite}
+    cambios = [dict(f) for f in conn.execute(sql_cambios_netos(tablas), params).fetchall()]
+    # El watermark avanza por toda la página, incluidas las entradas que se anularon entre sí
+    siguiente = conn.execute(f"SELECT MAX(seq) FROM ({_sql_pagina(tablas)})", params).fetchone()[0]
+    return cambios, siguiente if siguiente is not None else desde
+
+
+def filas_cambiadas(conn, tabla: str, desde: int, limite: int = LIMITE_CAMBIOS):
+    """
+    Cursor con el estado actual de cada fila cambiada de `tabla` (op, seq y todas sus columnas).
+    Las filas borradas vienen con las columnas en NULL salvo pk.
+    """
+    if tabla not in TABLAS_CDC:
+        raise ValueError(f"{tabla} no tiene captura de cambios.")
+    return conn.execute(
+        f"""
+        SELECT c.seq AS _seq, c.op AS _op, c.pk AS _pk, T.*
+        FROM ({sql_cambios_netos([tabla])}) c
+        LEFT JOIN {tabla} T ON T.rowid = c.pk AND c.op <> 'D'
+        ORDER BY c.seq
+        """,
+        {"desde": desde, "limite": limite},
+    )
+
+
+# =======================
+# Retención y compactación
+# =======================
+def compactar_cambios(hasta: Optional[int] = None) -> int:
+    """
+    Deja solo la última entrada por (tabla, pk) con seq <= hasta (por defecto, todo el log).
+    Un consumidor con watermark anterior sigue viendo el estado final de cada fila, aunque
+    un 'I' compactado llega como 'U': los consumidores deben tratar I y U como upsert.
+    Devuelve cuántas entradas se eliminaron.
+    """
+    with contextlib.closing(get_conn()) as conn, conn:
+        hasta = watermark_actual(conn) if hasta is None else hasta
+        cur = conn.execute(
+            """
+            DELETE FROM CambioLog
+            WHERE seq <= :hasta
+              AND EXISTS (
+                  SELECT 1 FROM CambioLog c2
+                  WHERE c2.tabla = CambioLog.tabla
+                    AND c2.pk = CambioLog.pk
+                    AND c2.seq > CambioLog.seq
+                    AND c2.seq <= :hasta
+              )
+            """,
+            {"hasta": hasta},
+        )
+        return cur.rowcount
+
+
+def purgar_cambios(dias: int = RETENCION_DIAS, hasta: Optional[int] = None) -> int:
+    """
+    Retención: borra entradas con más de `dias` de antigüedad (o con seq <= hasta).
+    Los consumidores con un watermark más antiguo deben volver a hacer una exportación completa.
+    """
+    with contextlib.closing(get_conn()) as conn, conn:
+        if hasta is not None:
+            cur = conn.execute("DELETE FROM CambioLog WHERE seq <= ?", (hasta,))
+        else:
+            cur = conn.execute(
+                "DELETE FROM CambioLog WHERE ts < strftime('%Y-%m-%d %H:%M:%f', 'now', ?)",
+                (f"-{int(dias)} days",),
+            )
+        return cur.rowcount
+
+
+def watermark_minimo(conn=None) -> int:
+    """
+    Seq más antiguo disponible (con el log vacío, el siguiente que se asignará). Un watermark
+    menor que este - 1 puede haber perdido cambios purgados y conviene una exportación completa
+    (tras compactar puede ser un falso positivo).
+    """
+    if conn is None:
+        with contextlib.closing(get_conn()) as conn:
+            return watermark_minimo(conn)
+    minimo = conn.execute("SELECT MIN(seq) FROM CambioLog").fetchone()[0]
+    return minimo if minimo is not None else watermark_actual(conn) + 1
@@ -0,0 +1,410 @@
+import argparse
+import contextlib
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from datetime import date
+
+import cdc
+import db
+import metricas
+
+# =======================
+# Línea de comandos (sin Streamlit)
+# =======================
+# Las mismas operaciones del sidebar, para correrlas desde cron sin navegador ni timeouts:
+#
+#   python cli.py importar pacientes.csv [--entidad Pacientes] [--modo upsert] [--simular] [--rechazos r.csv]
+#   python cli.py importar paquete.zip
+#   python cli.py exportar Citas --formato csv.gz --salida citas.csv.gz     (--salida - : a stdout)
+#   python cli.py exportar snapshot --salida snapshot.zip
+#   python cli.py exportar cambios --watermark estado/watermark.txt        (incremental desde la última corrida)
+#   python cli.py migrar
+#   python cli.py respaldar respaldos/base-$(date +%F).db --verificar
+#   python cli.py analizar
+#   python cli.py vacuum [--compactar-cambios] [--purgar-cambios 90]
+#   python cli.py generar datos/clinica_100k.db --escala 100k
+#
+# --bd elige la BD (por defecto la de la app). El avance y los resúmenes van a stderr: stdout
+# queda libre para los datos con --salida -. Los archivos se escriben primero como
+# <destino>.parcial y se renombran al terminar, así un consumidor nunca ve uno a medias.
+# import_export (y con él pandas y streamlit) se importa solo en los comandos que lo usan.
+SALIDA_OK = 0
+SALIDA_ERROR = 1            # excepción: nada quedó escrito (los imports van en una transacción)
+SALIDA_RECHAZOS = 3         # el import terminó, pero hubo filas rechazadas o chunks fallidos
+SALIDA_INTERRUMPIDA = 130   # Ctrl+C / SIGINT
+FORMATOS_EXPORT = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet"}
+PAGINAS_RESPALDO = 4096     # páginas copiadas por paso de la API de backup (entre pasos pueden escribir otros)
+
+
+class Progreso:
+    """Líneas de avance en stderr, a lo más una cada `intervalo` s; en una terminal se reescribe la misma línea."""
+
+    def __init__(self, silencioso: bool = False, intervalo: float = 1.0):
+        self.silencioso = silencioso
+        self.intervalo = intervalo
+        self._ultimo = time.monotonic()  # lo que dura menos de un intervalo solo muestra el resumen
+        self._terminal = sys.stderr.isatty()
+
+    def __call__(self, mensaje: str) -> None:
+        ahora = time.monotonic()
+        if self.silencioso or ahora - self._ultimo < self.intervalo:
+            return
+        self._ultimo = ahora
+        sys.stderr.write(f"\r\033[K{mensaje}" if self._terminal else f"{mensaje}\n")
+        sys.stderr.flush()
+
+    def informar(self, mensaje: str) -> None:
+        """Resumen que siempre se muestra (salvo con --silencioso)."""
+        if not self.silencioso:
+            sys.stderr.write(f"\r\033[K{mensaje}\n" if self._terminal else f"{mensaje}\n")
+            sys.stderr.flush()
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1e6:,.1f} MB"
+
+
+@contextlib.contextmanager
+def _escritura_atomica(destino: str):
+    """Entrega la ruta temporal <destino>.parcial; si todo sale bien la renombra a `destino`."""
+    parcial = destino + ".parcial"
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    try:
+        yield parcial
+        os.replace(parcial, destino)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(parcial)
+
+
+def _guardar(archivo, destino: str) -> int:
+    """Copia el archivo temporal de un exportador a `destino` (o a stdout con "-") por bloques."""
+    with archivo:
+        if destino == "-":
+            shutil.copyfileobj(archivo, sys.stdout.buffer, 1024 * 1024)
+            sys.stdout.buffer.flush()
+            return archivo.tell()
+        with _escritura_atomica(destino) as parcial:
+            with open(parcial, "wb") as salida:
+                shutil.copyfileobj(archivo, salida, 1024 * 1024)
+        return os.path.getsize(destino)
+
+
+@contextlib.contextmanager
+def _avance_lectura(archivo, etiqueta: str, progreso: Progreso):
+    """
+    Informa qué fracción del archivo se ha leído mirando el offset de su descriptor desde
+    otro hilo: importar_csv no se entera y la lectura sigue en streaming. En un .gz es la
+    fracción del archivo comprimido.
+    """
+    total = os.fstat(archivo.fileno()).st_size or 1
+    fin = threading.Event()
+
+    def vigilar():
+        while not fin.wait(progreso.intervalo):
+            leido = os.lseek(archivo.fileno(), 0, os.SEEK_CUR)
+            progreso(f"{etiqueta}: {min(leido / total, 1):.0%} leído ({_mb(leido)} de {_mb(total)})")
+
+    hilo = threading.Thread(target=vigilar, name="avance-lectura", daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        fin.set()
+        hilo.join()
+
+
+# =======================
+# Importar
+# =======================
+def _resumen_import(reporte: dict) -> str:
+    partes = [f"{reporte['filas_leidas']:,} leídas"]
+    if reporte["modo"] != "upsert":
+        claves = ["insertadas", "existentes", "duplicadas"]
+    elif reporte["simulacion"]:
+        claves = ["nuevas", "cambiadas", "sin_cambios"]
+    else:
+        claves = ["insertadas", "actualizadas", "sin_cambios"]
+    for clave in claves + ["omitidas", "invalidas", "fallidas"]:
+        if reporte.get(clave):
+            partes.append(f"{reporte[clave]:,} {clave.replace('_', ' ')}")
+    segundos = reporte.get("segundos") or 0.0
+    return (f"{reporte['entidad']}{' (simulación)' if reporte['simulacion'] else ''}: {', '.join(partes)} "
+            f"en {segundos:.1f} s ({reporte.get('filas_por_segundo', 0):,.0f} filas/s)")
+
+
+def _rechazadas(reporte: dict) -> int:
+    return sum(reporte.get(k, 0) for k in ("omitidas", "invalidas", "fallidas")) + len(reporte["errores"])
+
+
+def cmd_importar(args, progreso: Progreso) -> int:
+    from import_export import entidad_de_miembro, importar_csv, importar_paquete, rechazos_csv
+
+    if args.archivo.lower().endswith(".zip"):
+        progreso.informar(f"Importando el paquete {args.archivo} ...")
+        resultado = importar_paquete(args.archivo, modo=args.modo, simular=args.simular)
+        reportes = resultado["reportes"]
+        for aviso in resultado["avisos"]:
+            progreso.informar(f"aviso: {aviso}")
+    else:
+        entidad = args.entidad or entidad_de_miembro(args.archivo)
+        if entidad is None:
+            raise ValueError(f"No se reconoce la entidad de {args.archivo}: indícala con --entidad.")
+        etiqueta = f"{entidad} ← {os.path.basename(args.archivo)}"
+        with open(args.archivo, "rb") as crudo, _avance_lectura(crudo, etiqueta, progreso):
+            if args.archivo.lower().endswith(".gz"):
+                with gzip.GzipFile(fileobj=crudo) as archivo:
+                    reporte = importar_csv(entidad, archivo, args.chunksize, modo=args.modo, simular=args.simular)
+            else:
+                reporte = importar_csv(entidad, crudo, args.chunksize, modo=args.modo, simular=args.simular)
+        reportes = {entidad: reporte}
+
+    codigo = SALIDA_OK
+    for entidad, reporte in reportes.items():
+        progreso.informar(_resumen_import(reporte))
+        for texto in reporte["avisos"] + reporte["errores"]:
+            progreso.informar(f"  {texto}")
+        if _rechazadas(reporte):
+            codigo = SALIDA_RECHAZOS
+        if args.rechazos and reporte["rechazos"]:
+            base, extension = os.path.splitext(args.rechazos)
+            destino = args.rechazos if len(reportes) == 1 else f"{base}_{entidad}{extension}"
+            with _escritura_atomica(destino) as parcial, open(parcial, "wb") as salida:
+                salida.write(rechazos_csv(reporte))
+            progreso.informar(f"  {len(reporte['rechazos']):,} filas rechazadas en {destino}")
+    return codigo
+
+
+# =======================
+# Exportar
+# =======================
+def _informar_objeto(progreso: Progreso):
+    def informar(entrada: dict) -> None:
+        detalle = f"error: {entrada['error']}" if "error" in entrada else f"{entrada['filas']:>12,} filas"
+        progreso.informar(f"  {entrada['nombre']:28} {detalle}")
+    return informar
+
+
+def cmd_exportar(args, progreso: Progreso) -> int:
+    from import_export import EXPORTACIONES, exportar_cambios, exportar_csv, exportar_parquet, exportar_snapshot
+
+    inicio = time.perf_counter()
+    if args.que == "snapshot":
+        archivo, manifiesto = exportar_snapshot(progreso=_informar_objeto(progreso))
+        destino = args.salida or f"snapshot_{date.today().isoformat()}.zip"
+    elif args.que == "cambios":
+        desde = args.desde
+        if desde is None and args.watermark and os.path.exists(args.watermark):
+            with open(args.watermark, encoding="utf-8") as f:
+                desde = int(f.read().strip() or 0)
+        archivo, manifiesto = exportar_cambios(desde or 0, progreso=_informar_objeto(progreso))
+        destino = args.salida or f"cambios_{manifiesto['desde']}_{manifiesto['hasta']}.zip"
+        if "aviso" in manifiesto:
+            progreso.informar(f"aviso: {manifiesto['aviso']}")
+    elif args.que in EXPORTACIONES:
+        exp = EXPORTACIONES[args.que]
+
+        def avance(filas: int) -> None:
+            progreso(f"{args.que}: {filas:,} filas ({filas / (time.perf_counter() - inicio):,.0f} filas/s)")
+
+        if args.formato == "parquet":
+            archivo, stats = exportar_parquet(exp["sql"], progreso=avance)
+        else:
+            archivo, stats = exportar_csv(exp["sql"], comprimir=args.formato == "csv.gz", progreso=avance)
+        destino = args.salida or exp["archivo"].replace(".csv", FORMATOS_EXPORT[args.formato])
+        manifiesto = {"objetos": [{"filas": stats["filas"]}]}
+    else:
+        opciones = ", ".join(list(EXPORTACIONES) + ["snapshot", "cambios"])
+        raise ValueError(f"No hay exportación '{args.que}'. Opciones: {opciones}.")
+
+    total_bytes = _guardar(archivo, destino)
+    filas = sum(o.get("filas", 0) for o in manifiesto["objetos"])
+    progreso.informar(
+        f"{args.que}: {filas:,} filas, {_mb(total_bytes)} en {time.perf_counter() - inicio:.1f} s"
+        + ("" if destino == "-" else f" → {destino}")
+    )
+    if args.que == "cambios" and args.watermark and args.desde is None:
+        # Solo tras guardar el archivo: si algo falla, la próxima corrida repite desde el mismo punto
+        with _escritura_atomica(args.watermark) as parcial, open(parcial, "w", encoding="utf-8") as f:
+            f.write(f"{manifiesto['hasta']}\n")
+        progreso.informar(f"watermark {manifiesto['desde']} → {manifiesto['hasta']} en {args.watermark}")
+    return SALIDA_OK
+
+
+# =======================
+# Mantenimiento
+# =======================
+def _objetos_esquema(conn) -> set:
+    return {tuple(r) for r in conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite!_%' ESCAPE '!'")}
+
+
+def cmd_migrar(args, progreso: Progreso) -> int:
+    inicio = time.perf_counter()
+    with contextlib.closing(db.get_conn()) as conn:
+        version, antes = conn.execute("PRAGMA schema_version").fetchone()[0], _objetos_esquema(conn)
+    db.init_db()
+    with contextlib.closing(db.get_conn()) as conn:
+        version_nueva, nuevos = conn.execute("PRAGMA schema_version").fetchone()[0], _objetos_esquema(conn) - antes
+    for tipo, nombre in sorted(nuevos):
+        progreso.informar(f"  + {tipo} {nombre}")
+    estado = "sin cambios" if version_nueva == version else f"schema_version {version} → {version_nueva}"
+    progreso.informar(f"Esquema al día ({estado}) en {time.perf_counter() - inicio:.1f} s")
+    return SALIDA_OK
+
+
+def cmd_respaldar(args, progreso: Progreso) -> int:
+    """Copia consistente con la API de backup de SQLite (incluye lo que está en el WAL) sin detener la app."""
+    inicio = time.perf_counter()
+
+    def avance(_estado, restantes: int, total: int) -> None:
+        progreso(f"respaldo: {(total - restantes) / max(total, 1):.0%} ({total - restantes:,} de {total:,} páginas)")
+
+    with _escritura_atomica(args.destino) as parcial:
+        with contextlib.closing(sqlite3.connect(db.DB_PATH)) as origen, \
+                contextlib.closing(sqlite3.connect(parcial)) as copia:
+            origen.backup(copia, pages=args.paginas, progress=avance)
+            if args.verificar:
+                progreso.informar("Verificando la copia (PRAGMA integrity_check) ...")
+                problemas = [r[0] for r in copia.execute("PRAGMA integrity_check")]
+                if problemas != ["ok"]:
+                    raise RuntimeError(f"La copia no pasó integrity_check: {'; '.join(problemas[:5])}")
+            copia.execute("PRAGMA journal_mode = DELETE")  # un solo archivo, sin -wal ni -shm
+        for sufijo in ("-wal", "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(args.destino + sufijo)
+    progreso.informar(f"Respaldo de {db.DB_PATH} en {args.destino}: {_mb(os.path.getsize(args.destino))} "
+                      f"en {time.perf_counter() - inicio:.1f} s")
+    return SALIDA_OK
+
+
+def cmd_analizar(args, progreso: Progreso) -> int:
+    inicio = time.perf_counter()
+    with contextlib.closing(db.get_conn()) as conn:
+        conn.execute("ANALYZE")
+        conn.commit()
+        n = conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+    progreso.informar(f"ANALYZE: estadísticas de {n} índices/tablas en {time.perf_counter() - inicio:.1f} s")
+    return SALIDA_OK
+
+
+def _tamano_bd() -> int:
+    return sum(os.path.getsize(db.DB_PATH + s) for s in ("", "-wal") if os.path.exists(db.DB_PATH + s))
+
+
+def cmd_vacuum(args, progreso: Progreso) -> int:
+    inicio, antes = time.perf_counter(), _tamano_bd()
+    if args.compactar_cambios:
+        progreso.informar(f"CambioLog: {cdc.compactar_cambios():,} entradas compactadas")
+    if args.purgar_cambios is not None:
+        purgadas = cdc.purgar_cambios(args.purgar_cambios)
+        progreso.informar(f"CambioLog: {purgadas:,} entradas de más de {args.purgar_cambios} días purgadas")
+    progreso.informar("VACUUM (necesita que nadie esté escribiendo) ...")
+    with contextlib.closing(db.get_conn()) as conn:
+        conn.isolation_level = None
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    progreso.informar(f"VACUUM: {_mb(antes)} → {_mb(_tamano_bd())} en {time.perf_counter() - inicio:.1f} s")
+    return SALIDA_OK
+
+
+def cmd_generar(args, progreso: Progreso) -> int:
+    import generador_datos
+
+    progreso.informar(f"Generando {args.ruta} (escala {args.escala}, semilla {args.semilla}) ...")
+    resultado = generador_datos.generar(args.ruta, args.escala, args.semilla, args.reemplazar, args.verificar)
+    total = sum(resultado["filas"].values())
+    for tabla, n in resultado["filas"].items():
+        progreso.informar(f"  {tabla:22s} {n:>12,}")
+    progreso.informar(f"{total:,} filas en {resultado['segundos']:.1f} s")
+    if args.archivos:
+        for ruta in generador_datos.exportar_archivos(args.ruta, args.archivos, args.formatos):
+            progreso.informar(f"  {ruta}  {_mb(os.path.getsize(ruta))}")
+    return SALIDA_OK
+
+
+# =======================
+# Entrada
+# =======================
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Operaciones masivas sobre la BD de la clínica, sin Streamlit.")
+    parser.add_argument("--bd", default=db.DB_PATH, help="archivo SQLite (por defecto el de la app)")
+    parser.add_argument("-q", "--silencioso", action="store_true", help="sin avance ni resúmenes (solo errores)")
+    parser.add_argument("--metricas", metavar="ARCHIVO", help="al terminar escribe las métricas (textfile collector)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("importar", help="importa un CSV/CSV.gz/Parquet de una entidad o un paquete .zip")
+    p.add_argument("archivo")
+    p.add_argument("--entidad", help="Pacientes, Medicos, Citas o FichaMedica (por defecto, según el nombre del archivo)")
+    p.add_argument("--modo", choices=["agregar", "upsert"], default="agregar")
+    p.add_argument("--simular", action="store_true", help="calcula el resultado y revierte todo")
+    p.add_argument("--rechazos", metavar="CSV", help="guarda las filas rechazadas con sus motivos")
+    p.add_argument("--chunksize", type=int, default=50_000)
+    p.set_defaults(fn=cmd_importar)
+
+    p = sub.add_parser("exportar", help="exporta una tabla (Pacientes, Medicos, Citas, FichaMedica), snapshot o cambios")
+    p.add_argument("que")
+    p.add_argument("--formato", choices=list(FORMATOS_EXPORT), default="csv")
+    p.add_argument("--salida", help="archivo destino o - para stdout")
+    p.add_argument("--desde", type=int, help="cambios: watermark de partida")
+    p.add_argument("--watermark", metavar="ARCHIVO", help="cambios: lee el watermark de partida y guarda el nuevo")
+    p.set_defaults(fn=cmd_exportar)
+
+    p = sub.add_parser("migrar", help="aplica init_db (tablas, columnas, índices, triggers)")
+    p.set_defaults(fn=cmd_migrar)
+
+    p = sub.add_parser("respaldar", help="copia consistente de la BD mientras la app sigue en uso")
+    p.add_argument("destino")
+    p.add_argument("--verificar", action="store_true", help="corre PRAGMA integrity_check sobre la copia")
+    p.add_argument("--paginas", type=int, default=PAGINAS_RESPALDO, help="páginas por paso (-1: todo de una vez)")
+    p.set_defaults(fn=cmd_respaldar)
+
+    p = sub.add_parser("analizar", help="ANALYZE: actualiza las estadísticas del planificador")
+    p.set_defaults(fn=cmd_analizar)
+
+    p = sub.add_parser("vacuum", help="VACUUM y checkpoint del WAL, opcionalmente con retención de CambioLog")
+    p.add_argument("--compactar-cambios", action="store_true", help="deja solo la última entrada por fila en CambioLog")
+    p.add_argument("--purgar-cambios", type=int, metavar="DIAS", help="borra las entradas de CambioLog más antiguas")
+    p.set_defaults(fn=cmd_vacuum)
+
+    p = sub.add_parser("generar", help="crea una BD sintética (generador_datos)")
+    p.add_argument("ruta")
+    p.add_argument("--escala", default="10k")
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--reemplazar", action="store_true")
+    p.add_argument("--verificar", action="store_true", help="revisa las claves foráneas al terminar")
+    p.add_argument("--archivos", metavar="CARPETA", help="exporta además CSV/Parquet y paquete.zip")
+    p.add_argument("--formatos", nargs="+", default=["csv", "parquet"], choices=["csv", "parquet"])
+    p.set_defaults(fn=cmd_generar)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = crear_parser().parse_args(argv)
+    progreso = Progreso(args.silencioso)
+    db.DB_PATH = args.bd
+    try:
+        if args.comando not in ("migrar", "generar") and not os.path.exists(args.bd):
+            raise FileNotFoundError(f"No existe la BD {args.bd} (migrar la crea).")
+        return args.fn(args, progreso)
+    except KeyboardInterrupt:
+        sys.stderr.write("\ninterrumpido\n")
+        return SALIDA_INTERRUMPIDA
+    except Exception as e:
+        if os.environ.get("SGP_DEBUG"):
+            traceback.print_exc()
+        sys.stderr.write(f"\r\033[Kerror: {e}\n" if sys.stderr.isatty() else f"error: {e}\n")
+        return SALIDA_ERROR
+    finally:
+        if args.metricas:
+            metricas.escribir_archivo(args.metricas)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,18 @@
 import os
+import re
+import queue
 import sqlite3
+import sys
+import threading
+import time as _reloj
 from datetime import date, time
 import contextlib
 import pathlib
 from typing import Any, Dict, List, Optional
 
+import metricas
+from Validaciones import sql_rut_canonico  # forma canónica del RUT (índices y comparaciones por RUT)
+
 
 # -------------------------------------------------------------
 # Configuración y utilidades de base de datos
@@ -17,6 +25,7 @@ pathlib.Path(base_dir).mkdir(parents=True, exist_ok=True)
 def get_conn() -> sqlite3.Connection:
     """Obtiene una conexión a la base de datos SQLite."""
     conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    metricas.incrementar("sgp_conexiones_total")
     conn.row_factory = sqlite3.Row
     # Configuración de rendimiento y concurrencia para Streamlit
     conn.execute("PRAGMA foreign_keys = ON;")
@@ -27,21 +36,79 @@ def get_conn() -> sqlite3.Connection:
 
 def execute(query: str, params: tuple = ()) -> int:
     """Ejecuta una consulta SQL de escritura (INSERT, UPDATE, DELETE)."""
+    t0 = _reloj.perf_counter()
     with contextlib.closing(get_conn()) as conn, conn:  # autocommit
-        cur = conn.execute(query, params)
+        try:
+            cur = conn.execute(query, params)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                metricas.incrementar("sgp_bd_bloqueada_total")
+            raise
+        if _DDL_COLUMNAS.match(query):
+            invalidar_columnas()
+        _registrar(conn, query, params, t0, cur.rowcount if cur.rowcount >= 0 else None)
         return cur.lastrowid if cur.lastrowid is not None else 0
 
 
-def fetch_all(query: str, params: tuple = ()) -> List[sqlite3.Row]:
-    """Ejecuta una consulta SQL de lectura y devuelve todos los resultados."""
-    with contextlib.closing(get_conn()) as conn:
-        return conn.execute(query, params).fetchall()
-
-
-def fetch_one(query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
-    """Ejecuta una consulta SQL de lectura y devuelve el primer resultado."""
-    with contextlib.closing(get_conn()) as conn:
-        return conn.execute(query, params).fetchone()
+def fetch_all(query: str, params: tuple = (), conn: Optional[sqlite3.Connection] = None) -> List[sqlite3.Row]:
+    """Ejecuta una consulta SQL de lectura y devuelve todos los resultados (en `conn` si se entrega)."""
+    t0 = _reloj.perf_counter()
+    with contextlib.nullcontext(conn) if conn is not None else contextlib.closing(get_conn()) as conn:
+        filas = conn.execute(query, params).fetchall()
+        _registrar(conn, query, params, t0, len(filas))
+        return filas
+
+
+def fetch_one(query: str, params: tuple = (), conn: Optional[sqlite3.Connection] = None) -> Optional[sqlite3.Row]:
+    """Ejecuta una consulta SQL de lectura y devuelve el primer resultado (en `conn` si se entrega)."""
+    t0 = _reloj.perf_counter()
+    with contextlib.nullcontext(conn) if conn is not None else contextlib.closing(get_conn()) as conn:
+        fila = conn.execute(query, params).fetchone()
+        _registrar(conn, query, params, t0, int(fila is not None))
+        return fila
+
+
+class PoolConexiones:
+    """
+    Conexiones de get_conn reutilizadas entre requests, para procesos de larga vida (api.py):
+    abrir la conexión y correr sus PRAGMAs cuesta más que una consulta por PK. Hay a lo más
+    `tamano` conexiones prestadas; si se piden más, se espera hasta `espera` segundos.
+    Cada conexión queda apuntando a la BD de DB_PATH del momento en que se abrió.
+    """
+
+    def __init__(self, tamano: int = 8, espera: float = 30.0):
+        self._libres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._espera = espera
+
+    @contextlib.contextmanager
+    def conexion(self):
+        """Presta una conexión; al devolverla se revierte lo que quedó sin confirmar."""
+        if not self._cupos.acquire(timeout=self._espera):
+            raise sqlite3.OperationalError(f"pool de conexiones agotado (esperé {self._espera:g} s)")
+        try:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                conn = get_conn()
+            try:
+                yield conn
+            finally:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()  # no dejar un snapshot de lectura abierto ni escrituras a medias
+                    self._libres.put(conn)
+                except sqlite3.Error:  # conexión rota: se descarta
+                    conn.close()
+        finally:
+            self._cupos.release()
+
+    def cerrar(self) -> None:
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                return
 
 
 def row_get(row: sqlite3.Row, *keys, default: Optional[str] = None):
@@ -57,13 +124,129 @@ def row_get(row: sqlite3.Row, *keys, default: Optional[str] = None):
     return default
 
 
+# -------------------------------------------------------------
+# Instrumentación de execute / fetch_all / fetch_one (métricas y panel de rendimiento)
+# -------------------------------------------------------------
+_traza = threading.local()  # cada sesión de Streamlit corre en su propio hilo
+_traza_global: Optional[Dict[str, Any]] = None  # traza de todos los hilos (p. ej. AppTest en tests)
+_CON_PLAN = re.compile(r"\s*(SELECT|WITH|UPDATE|DELETE)\b", re.I)
+_ARCHIVO_DB = os.path.normcase(os.path.abspath(__file__))
+_HELPERS = {"execute", "fetch_all", "fetch_one", "columnas_tabla", "has_column", "ensure_column"}
+
+
+def iniciar_traza(planes: bool = True, todos_los_hilos: bool = False) -> List[Dict[str, Any]]:
+    """
+    Desde ahora registra cada sentencia de execute/fetch_all/fetch_one de este hilo (o de
+    todos, con `todos_los_hilos`) y devuelve la lista donde quedan: {"sql", "segundos",
+    "filas", "plan", "etiqueta", "origen"}. La duración incluye abrir la conexión; el plan
+    (EXPLAIN QUERY PLAN) se pide aparte y no se mide. `origen` es la línea que llamó a db.py.
+    """
+    global _traza_global
+    estado = {"registro": [], "planes": planes, "etiqueta": None}
+    if todos_los_hilos:
+        _traza_global = estado
+    else:
+        _traza.estado = estado
+    return estado["registro"]
+
+
+def etiquetar_traza(etiqueta: Optional[str], todos_los_hilos: bool = False) -> None:
+    """Las sentencias siguientes quedan registradas con esta etiqueta (p. ej. la sección)."""
+    estado = _traza_global if todos_los_hilos else getattr(_traza, "estado", None)
+    if estado is not None:
+        estado["etiqueta"] = etiqueta
+
+
+def detener_traza(todos_los_hilos: bool = False) -> None:
+    global _traza_global
+    if todos_los_hilos:
+        _traza_global = None
+    else:
+        _traza.estado = None
+
+
+def _origen() -> Optional[str]:
+    """Primera línea de la pila fuera de los helpers de db.py: quién pidió la consulta."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_name in _HELPERS and (
+        os.path.normcase(os.path.abspath(frame.f_code.co_filename)) == _ARCHIVO_DB
+    ):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+
+
+def _registrar(conn: sqlite3.Connection, query: str, params, t0: float, filas: Optional[int]) -> None:
+    segundos = _reloj.perf_counter() - t0
+    metricas.observar("sgp_consulta_segundos", segundos, *metricas.huella_sql(query))
+    activos = [e for e in (getattr(_traza, "estado", None), _traza_global) if e is not None]
+    if not activos:
+        return
+    plan = None
+    if any(e["planes"] for e in activos) and _CON_PLAN.match(query):
+        try:
+            plan = [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        except sqlite3.Error:
+            pass
+    entrada = {
+        "sql": " ".join(query.split()),
+        "segundos": segundos,
+        "filas": filas,
+        "plan": plan,
+        "origen": _origen(),
+    }
+    for estado in activos:
+        estado["registro"].append({**entrada, "etiqueta": estado["etiqueta"]})
+
+
 # -------------------------------------------------------------
 # Detección de esquema para compatibilidad hacia atrás
 # -------------------------------------------------------------
+# Columnas por (BD, tabla): has_column se llama decenas de veces por rerun
+# (paciente_columns, expr_*) y cada consulta abría una conexión. Se invalida cuando
+# execute corre un ALTER/DROP TABLE; las tablas inexistentes no se guardan.
+_COLUMNAS: Dict[tuple, frozenset] = {}
+_DDL_COLUMNAS = re.compile(r"\s*(ALTER|DROP)\s+TABLE\b", re.I)
+_estadisticas_cache = {"columnas": {"aciertos": 0, "fallos": 0}}
+
+
+def columnas_tabla(table: str) -> frozenset:
+    """Nombres de columna de `table` en minúsculas (vacío si la tabla no existe)."""
+    clave = (DB_PATH, table.lower())
+    cols = _COLUMNAS.get(clave)
+    if cols is not None:
+        _estadisticas_cache["columnas"]["aciertos"] += 1
+        return cols
+    _estadisticas_cache["columnas"]["fallos"] += 1
+    cols = frozenset(r[1].lower() for r in fetch_all(f"PRAGMA table_info('{table}')"))  # r[1] es nombre de columna
+    if cols:
+        _COLUMNAS[clave] = cols
+    return cols
+
+
+def invalidar_columnas() -> None:
+    """Olvida las columnas en caché (tras cambiar el esquema por fuera de execute)."""
+    _COLUMNAS.clear()
+
+
+def estadisticas_cache() -> Dict[str, Dict[str, int]]:
+    """Copia de los contadores de aciertos/fallos de cada caché de este módulo."""
+    return {nombre: dict(c) for nombre, c in _estadisticas_cache.items()}
+
+
+def _recolectar_metricas() -> None:
+    for nombre, contadores in estadisticas_cache().items():
+        metricas.fijar("sgp_cache_aciertos_total", contadores["aciertos"], nombre)
+        metricas.fijar("sgp_cache_fallos_total", contadores["fallos"], nombre)
+
+
+metricas.registrar_recolector(_recolectar_metricas)
+
+
 def has_column(table: str, col: str) -> bool:
     """Verifica si una columna existe en una tabla."""
-    rows = fetch_all(f"PRAGMA table_info('{table}')")
-    return any(r[1].lower() == col.lower() for r in rows)  # r[1] es nombre de columna
+    return col.lower() in columnas_tabla(table)
 
 
 def ensure_column(table: str, column: str, coltype: str, extra: str = ""):
@@ -72,6 +255,104 @@ def ensure_column(table: str, column: str, coltype: str, extra: str = ""):
         execute(f'ALTER TABLE {table} ADD COLUMN {column} {coltype} {extra}'.strip())
 
 
+# Tablas con captura de cambios (triggers hacia CambioLog)
+TABLAS_CDC = [
+    "Paciente", "Medico", "Cita", "FichaMedica", "SignosVitales",
+    "Prescripcion", "SolicitudExamen", "ResultadoExamen",
+]
+
+
+# Columnas que no cuentan como cambio para CambioLog: se mantienen solas (triggers)
+COLUMNAS_INTERNAS = {
+    "Paciente": ("hash_fila",),
+    "Medico": ("hash_fila",),
+    "SolicitudExamen": ("id_paciente",),
+    "Prescripcion": ("id_paciente",),
+    "ResultadoExamen": ("id_paciente",),
+}
+
+
+def _evento_update(tabla: str) -> str:
+    """UPDATE, o UPDATE OF <columnas> si la tabla tiene columnas internas que no deben disparar el trigger."""
+    internas = COLUMNAS_INTERNAS.get(tabla)
+    if not internas:
+        return "UPDATE"
+    columnas = [r[1] for r in fetch_all(f"PRAGMA table_info({tabla})") if r[1].lower() not in internas]
+    return f"UPDATE OF {', '.join(columnas)}"
+
+
+def _crear_trigger(existentes: Dict[str, str], nombre: str, sql: str) -> None:
+    """Crea el trigger, o lo reemplaza si su definición cambió (p. ej. UPDATE OF con una columna nueva)."""
+    if " ".join((existentes.get(nombre) or "").split()) == " ".join(sql.split()):
+        return
+    with contextlib.closing(get_conn()) as conn, conn:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+        conn.execute(sql)
+
+
+def _crear_indice(nombre: str, sql: str) -> None:
+    """
+    Crea el índice, o lo reemplaza si su definición cambió: SQLite solo usa un índice sobre
+    una expresión si la consulta usa la misma expresión (p. ej. sql_rut_canonico).
+    """
+    actual = fetch_one("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (nombre,))
+    if actual is not None and " ".join(actual["sql"].split()) == " ".join(sql.split()):
+        return
+    with contextlib.closing(get_conn()) as conn, conn:
+        conn.execute(f"DROP INDEX IF EXISTS {nombre}")
+        conn.execute(sql)
+
+
+def _paciente_derivado(fk_resultado: str) -> Dict[str, tuple]:
+    """tabla -> (columna FK, subconsulta con el paciente de la fila {fila}); el resultado lo toma de su solicitud."""
+    return {
+        "SolicitudExamen": (
+            "ID_ficha_medica", "(SELECT F.id_paciente FROM FichaMedica F WHERE F.ID_Ficha = {fila}.ID_ficha_medica)"
+        ),
+        "Prescripcion": (
+            "ID_Ficha_Medica", "(SELECT F.id_paciente FROM FichaMedica F WHERE F.ID_Ficha = {fila}.ID_Ficha_Medica)"
+        ),
+        "ResultadoExamen": (
+            fk_resultado, f"(SELECT S.id_paciente FROM SolicitudExamen S WHERE S.id = {{fila}}.{fk_resultado})"
+        ),
+    }
+
+
+def rellenar_paciente_derivado(conn: sqlite3.Connection) -> None:
+    """Completa id_paciente donde falta en exámenes, resultados y prescripciones (migración)."""
+    columnas = {r[1] for r in conn.execute("PRAGMA table_info(ResultadoExamen)")}
+    fk_resultado = "ID_SolicitudExamen" if "ID_SolicitudExamen" in columnas else "ID_Resultado_Examen"
+    for tabla, (fk, paciente) in _paciente_derivado(fk_resultado).items():  # resultados después de solicitudes
+        conn.execute(
+            f"UPDATE {tabla} SET id_paciente = {paciente.format(fila=tabla)} "
+            f"WHERE id_paciente IS NULL AND {fk} IS NOT NULL"
+        )
+
+
+# Migraciones de datos: cada una corre una sola vez por BD, en orden. PRAGMA user_version guarda
+# cuántas se aplicaron, así init_db (que la app corre en cada rerun) no abre una transacción de escritura.
+MIGRACIONES = [
+    rellenar_paciente_derivado,  # 1: filas anteriores a los triggers pac_* (sin CambioLog: columna interna)
+]
+
+
+def _migrar_datos() -> None:
+    with contextlib.closing(get_conn()) as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRACIONES):
+            return
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]  # otro proceso pudo adelantarse
+            for migracion in MIGRACIONES[version:]:
+                migracion(conn)
+            conn.execute(f"PRAGMA user_version = {len(MIGRACIONES)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
 def init_db() -> None:
     """Crea tablas si no existen y aplica migraciones (no borra datos)."""
     # Tabla Paciente (esquema base)
@@ -91,7 +372,7 @@ def init_db() -> None:
             sexo TEXT,
             estado_civil TEXT,
             tipo_paciente TEXT CHECK(tipo_paciente IN ('Ambulatorio', 'Urgencias', 'Hospitalizado')),
-            tipo_sangre TEXT
+            tipo_sangre TEXT,
             prevision TEXT CHECK(prevision IN ('Fonasa', 'Isapre'))
         );
         """
@@ -334,12 +615,178 @@ def init_db() -> None:
     ensure_column("Paciente", "tipo_sangre", "TEXT")  # O-, O+, etc.
     ensure_column("Paciente", "prevision", "TEXT", "CHECK(prevision IN ('Fonasa','Isapre'))")
 
+    # Hash del contenido importado (modo upsert: solo se actualiza si cambió)
+    ensure_column("Paciente", "hash_fila", "INTEGER")
+    ensure_column("Medico", "hash_fila", "INTEGER")
+
     # Índices útiles
     execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_paciente_rut ON Paciente(rut);")
+    execute("CREATE INDEX IF NOT EXISTS idx_medico_rut ON Medico(Rut);")
+    _crear_indice("idx_paciente_rut_canon", f"CREATE INDEX idx_paciente_rut_canon ON Paciente({sql_rut_canonico('rut')})")
+    _crear_indice("idx_medico_rut_canon", f"CREATE INDEX idx_medico_rut_canon ON Medico({sql_rut_canonico('Rut')})")
+    # Selectores y listados de pacientes: id, rut y nombre en orden de nombre, sin sort
+    execute("CREATE INDEX IF NOT EXISTS idx_paciente_nombre ON Paciente(nombre, rut);")
     execute("CREATE INDEX IF NOT EXISTS idx_cita_paciente ON Cita(id_paciente);")
     execute("CREATE INDEX IF NOT EXISTS idx_cita_medico ON Cita(id_medico);")
     execute("CREATE INDEX IF NOT EXISTS idx_cita_fecha_hora ON Cita(fecha, hora);")
     execute("CREATE INDEX IF NOT EXISTS idx_ficha_paciente_fecha ON FichaMedica(id_paciente, fecha_hora);")
+    execute("CREATE INDEX IF NOT EXISTS idx_ficha_fecha ON FichaMedica(fecha_hora);")
+    execute("CREATE INDEX IF NOT EXISTS idx_signos_ficha ON SignosVitales(ID_Ficha_Medica);")
+
+    # Paciente de cada examen, resultado y prescripción (el de su ficha), para que la línea de tiempo
+    # los recorra por paciente sin pasar por FichaMedica. Lo mantienen los triggers pac_* (abajo).
+    ensure_column("SolicitudExamen", "id_paciente", "INTEGER")
+    ensure_column("Prescripcion", "id_paciente", "INTEGER")
+    ensure_column("ResultadoExamen", "id_paciente", "INTEGER")
+
+    # Índices para la línea de tiempo del paciente: cada rama del UNION ALL filtra y ordena por
+    # (id_paciente, fecha con COALESCE), la misma expresión de su ts, así las fechas NULL también aparecen
+    execute("DROP INDEX IF EXISTS idx_cita_paciente_fecha;")
+    execute("CREATE INDEX IF NOT EXISTS idx_cita_paciente_ts ON Cita(id_paciente, COALESCE(fecha, ''), COALESCE(hora, ''));")
+    execute("CREATE INDEX IF NOT EXISTS idx_ficha_paciente_ts ON FichaMedica(id_paciente, COALESCE(fecha_hora, ''));")
+    execute("CREATE INDEX IF NOT EXISTS idx_solicitud_paciente_ts ON SolicitudExamen(id_paciente, COALESCE(fecha_solicitud, ''));")
+    execute("CREATE INDEX IF NOT EXISTS idx_prescripcion_paciente_ts ON Prescripcion(id_paciente, COALESCE(Fecha_emision, ''));")
+    execute("CREATE INDEX IF NOT EXISTS idx_resultado_paciente_ts ON ResultadoExamen(id_paciente, COALESCE(Fecha_Resultado, ''));")
+    # Exámenes y resultados de una ficha / solicitud (fichas y propagación de id_paciente)
+    execute("CREATE INDEX IF NOT EXISTS idx_solicitud_ficha_fecha ON SolicitudExamen(ID_ficha_medica, fecha_solicitud);")
+    # Prescripciones de una ficha en orden de ID (sin Fecha_emision: la línea de tiempo ya no la usa)
+    execute("DROP INDEX IF EXISTS idx_prescripcion_ficha_fecha;")
+    execute("CREATE INDEX IF NOT EXISTS idx_prescripcion_ficha_medica ON Prescripcion(ID_Ficha_Medica);")
+    fk_resultado = "ID_SolicitudExamen" if has_column("ResultadoExamen", "ID_SolicitudExamen") else "ID_Resultado_Examen"
+    execute(f"CREATE INDEX IF NOT EXISTS idx_resultado_solicitud_fecha ON ResultadoExamen({fk_resultado}, Fecha_Resultado);")
+
+    # Antecedentes del paciente: se listan por id_paciente con su ORDER BY (sin escaneo ni sort)
+    execute("CREATE INDEX IF NOT EXISTS idx_enfermedad_paciente ON EnfermedadCronica(id_paciente, nombre_enfermedad);")
+    execute("CREATE INDEX IF NOT EXISTS idx_cirugia_paciente ON CirugiaPrevia(id_paciente, fecha);")
+    execute("CREATE INDEX IF NOT EXISTS idx_alergia_paciente ON AlergiaPaciente(id_paciente, Sustancia);")
+    execute("CREATE INDEX IF NOT EXISTS idx_medicamento_paciente ON MedicamentoActual(id_paciente, nombre_Medicamento);")
+    execute("CREATE INDEX IF NOT EXISTS idx_habito_paciente ON HabitoPaciente(id_paciente, tipo);")
+    execute("CREATE INDEX IF NOT EXISTS idx_tratamiento_paciente ON TratamientoPrevio(id_paciente, fecha_inicio);")
+
+    # Registro de cambios (CDC) para exportaciones incrementales
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS CambioLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,  -- nunca se reutiliza, aunque se purgue
+            tabla TEXT NOT NULL,
+            pk INTEGER NOT NULL,                    -- rowid de la fila afectada
+            op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D')),
+            ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        );
+        """
+    )
+    execute("CREATE INDEX IF NOT EXISTS idx_cambiolog_tabla_pk ON CambioLog(tabla, pk, seq);")
+    execute("CREATE INDEX IF NOT EXISTS idx_cambiolog_ts ON CambioLog(ts);")
+    existentes = {r[0] for r in fetch_all("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    triggers = {r["name"]: r["sql"] for r in fetch_all("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")}
+    for tabla in TABLAS_CDC:
+        if tabla not in existentes:
+            continue
+        for evento, op, fila in (("INSERT", "I", "NEW"), (_evento_update(tabla), "U", "NEW"), ("DELETE", "D", "OLD")):
+            _crear_trigger(
+                triggers,
+                f"cdc_{tabla}_{op.lower()}",
+                f"""
+                CREATE TRIGGER cdc_{tabla}_{op.lower()} AFTER {evento} ON {tabla}
+                BEGIN
+                    INSERT INTO CambioLog (tabla, pk, op) VALUES ('{tabla}', {fila}.rowid, '{op}');
+                END;
+                """,
+            )
+
+    # id_paciente derivado: al insertar o cambiar la FK se copia el de la ficha (o la solicitud), y si
+    # la ficha cambia de paciente se propaga a sus exámenes y prescripciones (y de ahí a los resultados)
+    for tabla, (fk, paciente) in _paciente_derivado(fk_resultado).items():
+        for sufijo, evento in (("i", "INSERT"), ("u", f"UPDATE OF {fk}")):
+            _crear_trigger(
+                triggers,
+                f"pac_{tabla}_{sufijo}",
+                f"""
+                CREATE TRIGGER pac_{tabla}_{sufijo} AFTER {evento} ON {tabla}
+                WHEN NEW.id_paciente IS NOT {paciente.format(fila="NEW")}
+                BEGIN
+                    UPDATE {tabla} SET id_paciente = {paciente.format(fila="NEW")} WHERE rowid = NEW.rowid;
+                END;
+                """,
+            )
+    _crear_trigger(
+        triggers,
+        "pac_FichaMedica_p",
+        """
+        CREATE TRIGGER pac_FichaMedica_p AFTER UPDATE OF id_paciente ON FichaMedica
+        BEGIN
+            UPDATE SolicitudExamen SET id_paciente = NEW.id_paciente WHERE ID_ficha_medica = NEW.ID_Ficha;
+            UPDATE Prescripcion SET id_paciente = NEW.id_paciente WHERE ID_Ficha_Medica = NEW.ID_Ficha;
+        END;
+        """,
+    )
+    _crear_trigger(
+        triggers,
+        "pac_SolicitudExamen_p",
+        f"""
+        CREATE TRIGGER pac_SolicitudExamen_p AFTER UPDATE OF id_paciente ON SolicitudExamen
+        BEGIN
+            UPDATE ResultadoExamen SET id_paciente = NEW.id_paciente WHERE {fk_resultado} = NEW.id;
+        END;
+        """,
+    )
+    # hash_fila es el hash del contenido según el último import (modo upsert). Cualquier otra edición
+    # (app, API) lo borra: así el siguiente upsert compara columnas y restaura la fila editada.
+    # El UPDATE del propio import cambia el hash junto con las columnas y no dispara el trigger.
+    for tabla in ("Paciente", "Medico"):
+        _crear_trigger(
+            triggers,
+            f"hash_{tabla}_u",
+            f"""
+            CREATE TRIGGER hash_{tabla}_u AFTER {_evento_update(tabla)} ON {tabla}
+            WHEN NEW.hash_fila IS NOT NULL AND NEW.hash_fila IS OLD.hash_fila
+            BEGIN
+                UPDATE {tabla} SET hash_fila = NULL WHERE rowid = NEW.rowid;
+            END;
+            """,
+        )
+    _migrar_datos()
+
+    # Importaciones en segundo plano (ver import_jobs.py)
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS ImportJob (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entidad TEXT NOT NULL,
+            modo TEXT NOT NULL DEFAULT 'agregar',
+            archivo TEXT NOT NULL,          -- copia del archivo subido (se borra al terminar)
+            nombre_original TEXT,
+            chunksize INTEGER NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente'
+                CHECK(estado IN ('pendiente', 'corriendo', 'cancelada', 'completada', 'fallida', 'interrumpida')),
+            bytes_total INTEGER,
+            progreso REAL NOT NULL DEFAULT 0,   -- 0..1, estimado por posición en el archivo
+            filas_leidas INTEGER NOT NULL DEFAULT 0,
+            insertadas INTEGER NOT NULL DEFAULT 0,
+            filas_por_segundo REAL,
+            reporte TEXT,                       -- JSON del reporte de importar_csv
+            error TEXT,
+            pid INTEGER,                        -- proceso dueño mientras el job está activo
+            latido TEXT,                        -- último aviso de vida del dueño (UTC, ver import_jobs)
+            creado TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            actualizado TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+        );
+        """
+    )
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS ImportCheckpoint (
+            job_id INTEGER NOT NULL REFERENCES ImportJob(id) ON DELETE CASCADE,
+            chunk INTEGER NOT NULL,             -- último chunk confirmado (desde 0)
+            reporte TEXT NOT NULL,              -- reporte acumulado hasta ese chunk
+            ts TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            PRIMARY KEY (job_id, chunk)
+        );
+        """
+    )
+    ensure_column("ImportJob", "pid", "INTEGER")  # tablas creadas antes del control de dueño
+    ensure_column("ImportJob", "latido", "TEXT")
+    execute("CREATE INDEX IF NOT EXISTS idx_importjob_estado ON ImportJob(estado);")
 
 # Mapeo dinámico de columnas para Paciente y Medico
 def paciente_columns() -> Dict[str, Optional[str]]: 
@@ -0,0 +1,90 @@
+import os
+import warnings
+import contextlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+import db
+import metricas
+
+# =======================
+# Detector de consultas N+1
+# =======================
+# Agrupa las consultas de un rerun (o de un bloque) por huella SQL (metricas.huella_sql:
+# literales y parámetros aparte) y marca las que se repiten UMBRAL_REPETICIONES veces o más,
+# con las líneas que las pidieron. Típico: una consulta por ficha o por solicitud dentro de
+# un for. Se usa de tres formas:
+#   - en modo debug (perfil.py), como advertencia en el panel y en la consola;
+#   - como context manager: `with limitar_consultas(maximo=40): ...`, que lanza
+#     PresupuestoExcedido si se pasa del presupuesto o si hay un N+1;
+#   - como fixture de pytest `presupuesto_consultas` (tests/conftest.py).
+UMBRAL_REPETICIONES = int(os.environ.get("SGP_N1_UMBRAL", 5))
+
+
+class ConsultaRepetida(UserWarning):
+    """Advertencia de desarrollo: la misma consulta se ejecutó muchas veces en un rerun."""
+
+
+class PresupuestoExcedido(AssertionError):
+    """Un bloque hizo más consultas que su presupuesto o tuvo consultas N+1."""
+
+
+def detectar(consultas: List[dict], umbral: int = UMBRAL_REPETICIONES, ignorar: tuple = ()) -> List[dict]:
+    """
+    Consultas repetidas `umbral` veces o más en `consultas` (registros de db.iniciar_traza).
+    Devuelve [{"huella", "consulta", "veces", "segundos", "origenes": {línea: veces}}], de
+    la más repetida a la menos. `ignorar`: fragmentos de SQL que no se consideran.
+    """
+    grupos: Dict[str, dict] = {}
+    for c in consultas:
+        if any(fragmento in c["sql"] for fragmento in ignorar):
+            continue
+        huella, texto = metricas.huella_sql(c["sql"])
+        grupo = grupos.setdefault(huella, {"huella": huella, "consulta": texto, "veces": 0, "segundos": 0.0,
+                                           "origenes": Counter()})
+        grupo["veces"] += 1
+        grupo["segundos"] += c["segundos"]
+        grupo["origenes"][c.get("origen") or "?"] += 1
+    hallazgos = [g for g in grupos.values() if g["veces"] >= umbral]
+    for g in hallazgos:
+        g["origenes"] = dict(g["origenes"].most_common())
+    return sorted(hallazgos, key=lambda g: g["veces"], reverse=True)
+
+
+def describir(hallazgo: dict) -> str:
+    origenes = ", ".join(f"{linea} ×{veces}" for linea, veces in hallazgo["origenes"].items())
+    return (
+        f"{hallazgo['veces']}× ({hallazgo['segundos'] * 1000:,.1f} ms) {hallazgo['consulta']}"
+        f" — desde {origenes}"
+    )
+
+
+def advertir(consultas: List[dict], umbral: int = UMBRAL_REPETICIONES) -> List[dict]:
+    """Modo desarrollo: emite un ConsultaRepetida por cada hallazgo y los devuelve."""
+    hallazgos = detectar(consultas, umbral)
+    for h in hallazgos:
+        warnings.warn(describir(h), ConsultaRepetida, stacklevel=2)
+    return hallazgos
+
+
+@contextlib.contextmanager
+def limitar_consultas(maximo: Optional[int] = None, umbral: Optional[int] = UMBRAL_REPETICIONES,
+                      ignorar: tuple = ()):
+    """
+    Registra las consultas de db.py de todos los hilos durante el bloque (AppTest corre la
+    página en otro hilo) y al salir lanza PresupuestoExcedido si fueron más de `maximo` o si
+    alguna se repitió `umbral` veces o más (umbral=None desactiva esa revisión). Entrega la
+    lista de consultas registradas.
+    """
+    consultas = db.iniciar_traza(planes=False, todos_los_hilos=True)
+    try:
+        yield consultas
+    finally:
+        db.detener_traza(todos_los_hilos=True)
+    problemas = []
+    if maximo is not None and len(consultas) > maximo:
+        problemas.append(f"{len(consultas)} consultas, presupuesto {maximo}")
+    if umbral is not None:
+        problemas += [f"N+1: {describir(h)}" for h in detectar(consultas, umbral, ignorar)]
+    if problemas:
+        raise PresupuestoExcedido("\n".join(problemas))
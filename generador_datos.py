@@ -0,0 +1,557 @@
+"""
+Generador de una clínica sintética para pruebas de carga y benchmarks. Llena todas las
+tablas del esquema de db.init_db con datos realistas y consistentes entre sí: RUT válidos,
+citas en horario hábil con una carga distinta por médico, fichas de las citas realizadas
+con signos vitales, exámenes con resultados y prescripciones, y antecedentes por paciente.
+Con la misma semilla y escala la BD generada es siempre la misma.
+
+    python generador_datos.py datos/clinica_10k.db --escala 10k
+    python generador_datos.py datos/clinica_1M.db --escala 1M --archivos datos/import_1M
+
+--archivos deja además los CSV, Parquet y un paquete .zip en el formato de la exportación,
+para probar los importadores contra una BD vacía.
+"""
+import argparse
+import contextlib
+import functools
+import os
+import shutil
+import sqlite3
+import time
+import unicodedata
+import zipfile
+
+import numpy as np
+
+import db
+from import_export import EXPORTACIONES, dominios_check, exportar_csv, exportar_parquet, pq
+from Validaciones import digitos_verificadores
+
+# Escala = cantidad de pacientes; el resto de las tablas crece en proporción
+ESCALAS = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+SEMILLA = 42
+PACIENTES_POR_BLOQUE = 50_000
+CITAS_POR_BLOQUE = 100_000
+
+# "Hoy" de los datos: fijo para que la salida no dependa del día en que se genera
+FECHA_REFERENCIA = np.datetime64("2025-06-30")
+DIAS_HISTORIA = 730   # citas pasadas
+DIAS_AGENDA = 60      # citas futuras (Agendadas)
+CITAS_POR_PACIENTE = 2.0
+CITAS_POR_MEDICO_DIA = 12  # promedio; la carga de cada médico varía (lognormal)
+JORNADA_MINUTOS = (8 * 60, 18 * 60)
+
+# Pragmas de carga: sin journal ni fsync. Si la generación falla, la BD se vuelve a generar.
+PRAGMAS_CARGA = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MB
+    "PRAGMA foreign_keys = OFF",    # las claves se asignan aquí; --verificar las revisa al final
+]
+
+
+# =======================
+# Catálogos
+# =======================
+NOMBRES_F = ["María", "Josefa", "Sofía", "Isidora", "Catalina", "Valentina", "Fernanda", "Constanza",
+             "Javiera", "Camila", "Antonia", "Francisca", "Daniela", "Carolina", "Paula", "Andrea"]
+NOMBRES_M = ["José", "Juan", "Benjamín", "Matías", "Vicente", "Martín", "Agustín", "Tomás",
+             "Cristóbal", "Diego", "Felipe", "Sebastián", "Nicolás", "Pedro", "Luis", "Carlos"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez",
+             "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández", "Torres", "Araya",
+             "Flores", "Espinoza", "Valenzuela", "Castillo", "Tapia", "Reyes", "Gutiérrez", "Castro"]
+COMUNAS = ["Santiago", "Providencia", "Las Condes", "Ñuñoa", "Maipú", "La Florida", "Puente Alto",
+           "Vitacura", "San Miguel", "Independencia", "Valparaíso", "Viña del Mar", "Concepción"]
+CALLES = ["Av. Libertador Bernardo O'Higgins", "Los Leones", "Irarrázaval", "Gran Avenida", "Pajaritos",
+          "Vicuña Mackenna", "Apoquindo", "Manuel Montt", "Av. Matta", "Pedro de Valdivia"]
+NACIONALIDADES = (["Chile", "Venezuela", "Perú", "Colombia", "Haití", "Bolivia", "Argentina"],
+                  [0.88, 0.04, 0.03, 0.02, 0.01, 0.01, 0.01])
+TIPOS_SANGRE = (["O+", "O-", "A+", "A-", "B+", "B-", "AB+", "AB-"],
+                [0.56, 0.09, 0.22, 0.04, 0.06, 0.01, 0.015, 0.005])
+ESTADOS_CIVILES = ["Soltero", "Casado", "Divorciado", "Viudo", "Conviviente"]
+TIPOS_PACIENTE = (["Ambulatorio", "Urgencias", "Hospitalizado"], [0.8, 0.12, 0.08])
+
+ESPECIALIDADES = [
+    "Cirugía General", "Cirugía Ortopédica", "Cirugía Cardiaca", "Cirugía Plástica y Estética",
+    "Cirugía Neurocirúrgica", "Cirugía Ginecológica", "Cirugía Urológica", "Cirugía Oncológica",
+    "Cirugía Oftalmológica", "Cirugía Otorrinolaringológica", "Cirugía Torácica", "Cirugía Maxilofacial",
+]
+DURACIONES_CITA = (["20 min", "30 min", "45 min"], [0.3, 0.6, 0.1])
+
+# Motivo de consulta, anamnesis y observaciones de una misma visita
+CUADROS = [
+    ("Control de hipertensión", "Refiere cefalea ocasional. Adherente a Losartán.", "Presión controlada. Mantener tratamiento."),
+    ("Control de diabetes", "Glicemias en ayunas entre 110 y 140.", "Se solicita HbA1c. Reforzar dieta."),
+    ("Dolor abdominal", "Dolor epigástrico de 3 días, sin fiebre.", "Se indica omeprazol y control en 1 semana."),
+    ("Control postoperatorio", "Herida operatoria sin signos de infección.", "Retiro de puntos en 7 días."),
+    ("Dolor lumbar", "Lumbago mecánico tras esfuerzo.", "Reposo relativo y analgesia."),
+    ("Cefalea", "Cefalea tensional, sin signos de alarma.", "Analgesia y control si persiste."),
+    ("Control de tiroides", "Refiere cansancio. Toma Levotiroxina.", "Se ajusta dosis. Control en 3 meses."),
+    ("Evaluación preoperatoria", "Sin antecedentes quirúrgicos relevantes.", "Se solicitan exámenes preoperatorios."),
+    ("Infección respiratoria", "Tos y odinofagia de 4 días.", "Manejo sintomático. Reposo 3 días."),
+    ("Dolor de rodilla", "Caída leve hace 2 días, sin hematoma.", "Se solicita radiografía. Reposo 48 horas."),
+]
+MEDICAMENTOS = [  # Medicamento, Dosis, Frecuencia, Duración, Vía
+    ("Paracetamol", "500 mg", "cada 8 horas", "5 días", "Oral"),
+    ("Ibuprofeno", "400 mg", "cada 8 horas", "5 días", "Oral"),
+    ("Losartán", "50 mg", "cada 12 horas", "30 días", "Oral"),
+    ("Metformina", "850 mg", "cada 12 horas", "30 días", "Oral"),
+    ("Omeprazol", "20 mg", "cada 24 horas", "14 días", "Oral"),
+    ("Levotiroxina", "75 mcg", "cada 24 horas", "90 días", "Oral"),
+    ("Amoxicilina", "500 mg", "cada 8 horas", "7 días", "Oral"),
+    ("Ketorolaco", "30 mg", "cada 8 horas", "2 días", "Intramuscular"),
+    ("Ceftriaxona", "1 g", "cada 24 horas", "5 días", "Intravenosa"),
+    ("Enoxaparina", "40 mg", "cada 24 horas", "10 días", "Subcutánea"),
+    ("Diclofenaco gel", "1 aplicación", "cada 12 horas", "7 días", "Tópica"),
+]
+EXAMENES = [  # Tipo de examen, resultados posibles
+    ("Examen de sangre", ["Hemograma normal.", "Glucosa: 130 mg/dL", "Colesterol: 200 mg/dL", "HbA1c: 7,1 %"]),
+    ("Radiografía", ["Sin hallazgos patológicos.", "Signos de artrosis leve."]),
+    ("Ultrasonido", ["Sin alteraciones.", "Colelitiasis sin signos de colecistitis."]),
+    ("Electrocardiograma", ["Ritmo sinusal normal.", "Bloqueo de rama derecha incompleto."]),
+    ("Prueba de función pulmonar", ["Espirometría normal.", "Patrón obstructivo leve."]),
+    ("Prueba de esfuerzo", ["Prueba negativa para isquemia."]),
+]
+ENFERMEDADES = [  # Enfermedad, medicamento, dosis
+    ("Hipertensión arterial", "Losartán", "50 mg"), ("Diabetes mellitus tipo 2", "Metformina", "850 mg"),
+    ("Hipotiroidismo", "Levotiroxina", "75 mcg"), ("Asma", "Salbutamol", "2 inhalaciones SOS"),
+    ("Artrosis", "Paracetamol", "500 mg SOS"),
+]
+ALERGIAS = [("Penicilina", "Urticaria"), ("AINEs", "Broncoespasmo"), ("Mariscos", "Edema facial"),
+            ("Látex", "Dermatitis"), ("Polen", "Rinitis")]
+GRAVEDADES = ["Grave", "Moderada", "Leve"]
+CIRUGIAS = ["Apendicectomía", "Colecistectomía", "Cesárea", "Hernioplastía inguinal", "Artroscopía de rodilla"]
+HABITOS = [("Tabaquismo", "Fuma 5 cigarrillos al día", "Diaria"), ("Alcohol", "Consumo social", "Semanal"),
+           ("Actividad física", "Camina 30 minutos", "3 veces por semana"), ("Dieta", "Dieta hiposódica", "Diaria")]
+TRATAMIENTOS = [("Kinesioterapia", "Mejoría parcial"), ("Fisioterapia respiratoria", "Buena respuesta"),
+                ("Psicoterapia", "En seguimiento"), ("Tratamiento antibiótico", "Resuelto")]
+
+
+@functools.lru_cache(maxsize=None)  # los nombres salen de catálogos chicos
+def _ascii(texto: str) -> str:
+    """'Muñoz' -> 'munoz', para correos válidos."""
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower().replace(" ", "")
+
+
+# =======================
+# Utilidades de generación
+# =======================
+def _rng(semilla: int, *claves: int) -> np.random.Generator:
+    """Un generador por tabla y bloque: la salida no depende del orden en que se consuman."""
+    return np.random.default_rng([semilla, *claves])
+
+
+def _elegir(rng, opciones, n: int, p=None) -> np.ndarray:
+    """n valores de `opciones` (lista o (lista, probabilidades)) como arreglo de objetos."""
+    if isinstance(opciones, tuple):
+        opciones, p = opciones
+    return np.asarray(opciones, dtype=object)[rng.choice(len(opciones), n, p=p)]
+
+
+def _con_nulos(rng, valores: np.ndarray, prob: float) -> np.ndarray:
+    valores = np.asarray(valores, dtype=object).copy()
+    valores[rng.random(len(valores)) < prob] = None
+    return valores
+
+
+def _fechas(dias: np.ndarray) -> np.ndarray:
+    """Arreglo datetime64[D] -> 'YYYY-MM-DD'."""
+    return np.datetime_as_string(dias.astype("datetime64[D]"), unit="D").astype(object)
+
+
+def formatear_ruts(cuerpos: np.ndarray) -> list:
+    """Cuerpos enteros -> RUT con puntos y DV, como los guarda la app ('12.345.678-5')."""
+    dv = digitos_verificadores(cuerpos)
+    return [f"{c:,}".replace(",", ".") + "-" + d for c, d in zip(cuerpos.tolist(), dv.tolist())]
+
+
+def _insertar(conn, tabla: str, columnas: dict) -> int:
+    """Un executemany por bloque; los arreglos de NumPy pasan a tipos de Python."""
+    nombres = list(columnas)
+    valores = [v.tolist() if isinstance(v, np.ndarray) else list(v) for v in columnas.values()]
+    conn.executemany(
+        f"INSERT INTO {tabla} ({', '.join(nombres)}) VALUES ({', '.join('?' * len(nombres))})",
+        zip(*valores),
+    )
+    return len(valores[0]) if valores else 0
+
+
+def _valor_dominio(dominios: dict, columna: str, valores: list) -> list:
+    """Escribe `valores` como los acepta el CHECK de la BD (p. ej. 'Fonasa' o 'FONASA')."""
+    permitidos = {v.lower(): v for v in dominios.get(columna.lower(), [])}
+    return [permitidos.get(v.lower(), v) for v in valores]
+
+
+# =======================
+# Tablas
+# =======================
+def _medicos(conn, rng, n: int) -> dict:
+    """Médicos con su duración de cita (minutos) y un factor de carga para repartir las citas."""
+    ids = np.arange(1, n + 1)
+    mujer = rng.random(n) < 0.5
+    nombres = np.where(mujer, _elegir(rng, NOMBRES_F, n), _elegir(rng, NOMBRES_M, n))
+    apellidos = _elegir(rng, APELLIDOS, n) + " " + _elegir(rng, APELLIDOS, n)
+    duracion = _elegir(rng, DURACIONES_CITA, n)
+    _insertar(conn, "Medico", {
+        "id_medico": ids,
+        "nombre": nombres,
+        "Apellidos": apellidos,
+        "Duracion_de_cita": duracion,
+        "Telefono": [f"9{t:08d}" for t in rng.integers(0, 10**8, n).tolist()],
+        "Rut": formatear_ruts(25_000_000 + ids * 13),
+        "Estado": _elegir(rng, (["Activo", "Inactivo"], [0.95, 0.05]), n),
+        "Correo_Electronico": [
+            f"{_ascii(nom)}.{_ascii(ap.split()[0])}{i}@gmail.com" for nom, ap, i in zip(nombres, apellidos, ids.tolist())
+        ],
+        "especialidad": _elegir(rng, ESPECIALIDADES, n),
+    })
+    return {
+        "minutos": np.array([int(d.split()[0]) for d in duracion]),
+        "carga": rng.lognormal(0.0, 0.4, n),
+    }
+
+
+def _pacientes(conn, rng, ids: np.ndarray, dominios: dict) -> None:
+    """Un bloque de pacientes con sus antecedentes (enfermedades, alergias, cirugías, etc.)."""
+    n = len(ids)
+    sexo = _elegir(rng, (["Femenino", "Masculino", "Otro"], [0.51, 0.48, 0.01]), n)
+    nombres = np.where(sexo == "Femenino", _elegir(rng, NOMBRES_F, n), _elegir(rng, NOMBRES_M, n))
+    ap1, ap2 = _elegir(rng, APELLIDOS, n), _elegir(rng, APELLIDOS, n)
+    nacimiento = FECHA_REFERENCIA - rng.integers(0, 95 * 365, n)
+    enfermedad = np.where(rng.random(n) < 0.22, rng.integers(0, len(ENFERMEDADES), n), -1)
+    alergia = np.where(rng.random(n) < 0.15, rng.integers(0, len(ALERGIAS), n), -1)
+    prevision = _valor_dominio(dominios, "prevision", ["FONASA", "ISAPRE"])
+
+    # cuerpo = 5.000.000 + (id * 7919 mod 20.000.000): único para id < 20 millones
+    _insertar(conn, "Paciente", {
+        "id_paciente": ids,
+        "rut": formatear_ruts(5_000_000 + (ids * 7_919) % 20_000_000),
+        "nombre": nombres + " " + ap1 + " " + ap2,
+        "fecha_nacimiento": _fechas(nacimiento),
+        "correo": [f"{_ascii(a)}.{_ascii(b)}{i}@mail.cl" for a, b, i in zip(nombres, ap1, ids.tolist())],
+        "telefono": [f"9{t:08d}" for t in rng.integers(0, 10**8, n).tolist()],
+        "direccion": [
+            f"{c} {num}, {com}" for c, num, com in
+            zip(_elegir(rng, CALLES, n), rng.integers(1, 9_999, n).tolist(), _elegir(rng, COMUNAS, n))
+        ],
+        "alergias": [ALERGIAS[a][0] if a >= 0 else None for a in alergia.tolist()],
+        "enfermedades_previas": [ENFERMEDADES[e][0] if e >= 0 else None for e in enfermedad.tolist()],
+        "nacionalidad": _elegir(rng, NACIONALIDADES, n),
+        "sexo": sexo,
+        "estado_civil": _con_nulos(rng, _elegir(rng, ESTADOS_CIVILES, n), 0.1),
+        "tipo_paciente": _elegir(rng, TIPOS_PACIENTE, n),
+        "tipo_sangre": _con_nulos(rng, _elegir(rng, TIPOS_SANGRE, n), 0.05),
+        "prevision": _elegir(rng, (prevision, [0.78, 0.22]), n),
+    })
+
+    con = enfermedad >= 0
+    _insertar(conn, "EnfermedadCronica", {
+        "id_paciente": ids[con],
+        "nombre_enfermedad": [ENFERMEDADES[e][0] for e in enfermedad[con].tolist()],
+        "observacion": _con_nulos(rng, np.full(con.sum(), "En control", dtype=object), 0.5),
+        "tratamiento_actual": [" ".join(ENFERMEDADES[e][1:]) for e in enfermedad[con].tolist()],
+        "Año_diagnostico": rng.integers(1990, 2025, con.sum()).astype(str),
+    })
+    # Quien tiene una enfermedad crónica toma su medicamento
+    _insertar(conn, "MedicamentoActual", {
+        "id_paciente": ids[con],
+        "nombre_Medicamento": [ENFERMEDADES[e][1] for e in enfermedad[con].tolist()],
+        "dosis": [ENFERMEDADES[e][2] for e in enfermedad[con].tolist()],
+        "frecuencia": np.full(con.sum(), "cada 24 horas", dtype=object),
+        "Via": np.full(con.sum(), "Oral", dtype=object),
+        "Indicaciones": _con_nulos(rng, np.full(con.sum(), "Tomar con alimentos", dtype=object), 0.6),
+    })
+    con = alergia >= 0
+    _insertar(conn, "AlergiaPaciente", {
+        "id_paciente": ids[con],
+        "Sustancia": [ALERGIAS[a][0] for a in alergia[con].tolist()],
+        "reaccion": [ALERGIAS[a][1] for a in alergia[con].tolist()],
+        "Gravedad": _elegir(rng, (GRAVEDADES, [0.1, 0.4, 0.5]), con.sum()),
+    })
+    con = rng.random(n) < 0.1
+    _insertar(conn, "CirugiaPrevia", {
+        "id_paciente": ids[con],
+        "nombre": _elegir(rng, CIRUGIAS, con.sum()),
+        "fecha": _fechas(FECHA_REFERENCIA - rng.integers(365, 30 * 365, con.sum())),
+        "observacion": _con_nulos(rng, np.full(con.sum(), "Sin complicaciones", dtype=object), 0.5),
+    })
+    veces = rng.poisson(0.4, n)
+    habito = rng.integers(0, len(HABITOS), veces.sum())
+    _insertar(conn, "HabitoPaciente", {
+        "id_paciente": np.repeat(ids, veces),
+        "tipo": [HABITOS[h][0] for h in habito.tolist()],
+        "descripcion": [HABITOS[h][1] for h in habito.tolist()],
+        "Frecuencia": [HABITOS[h][2] for h in habito.tolist()],
+    })
+    con = rng.random(n) < 0.08
+    inicio = FECHA_REFERENCIA - rng.integers(60, 10 * 365, con.sum())
+    tratamiento = rng.integers(0, len(TRATAMIENTOS), con.sum())
+    _insertar(conn, "TratamientoPrevio", {
+        "id_paciente": ids[con],
+        "nombre": [TRATAMIENTOS[t][0] for t in tratamiento.tolist()],
+        "fecha_inicio": _fechas(inicio),
+        "fecha_fin": _fechas(inicio + rng.integers(14, 180, con.sum())),
+        "resultado": [TRATAMIENTOS[t][1] for t in tratamiento.tolist()],
+    })
+
+
+def _agenda_medico(rng, dias: np.ndarray, minutos: int, citas_por_dia: float):
+    """
+    Citas de un médico: cada día hábil una cantidad Poisson de horas distintas dentro de la
+    jornada, sin topes entre sí. Devuelve (fechas datetime64[D], minutos desde medianoche).
+    """
+    cupos = (JORNADA_MINUTOS[1] - JORNADA_MINUTOS[0]) // minutos
+    por_dia = np.minimum(rng.poisson(min(citas_por_dia, 0.9 * cupos), len(dias)), cupos)
+    orden = rng.random((len(dias), cupos)).argsort(axis=1)  # permutación de horas por día
+    fila, columna = np.nonzero(np.arange(cupos) < por_dia[:, None])
+    cupo = orden[fila, columna]
+    cronologico = np.lexsort((cupo, fila))
+    return dias[fila[cronologico]], JORNADA_MINUTOS[0] + cupo[cronologico] * minutos
+
+
+def _visitas(conn, rng, citas: dict, ids: dict, dominios: dict, col_resultado: str) -> None:
+    """Inserta un lote de citas y, para las realizadas, su ficha, signos vitales, exámenes y recetas."""
+    n = len(citas["fecha"])
+    pasada = citas["fecha"] <= FECHA_REFERENCIA
+    estados_pasados = ["Realizada", "Cancelada"] + (["Inasistencia"] if "Inasistencia" in dominios.get("estado", []) else [])
+    prob_pasados = [0.85, 0.15] if len(estados_pasados) == 2 else [0.8, 0.12, 0.08]
+    estado = np.where(
+        pasada,
+        _elegir(rng, (estados_pasados, prob_pasados), n),
+        _elegir(rng, (["Agendada", "Cancelada"], [0.95, 0.05]), n),
+    )
+    fecha = _fechas(citas["fecha"])
+    hora = np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in citas["minutos"].tolist()], dtype=object)
+    id_cita = ids["cita"] + np.arange(1, n + 1)
+    ids["cita"] += n
+    _insertar(conn, "Cita", {
+        "id_cita": id_cita, "fecha": fecha, "hora": hora, "estado": estado,
+        "id_paciente": citas["paciente"], "id_medico": citas["medico"],
+    })
+
+    # Una ficha por cita realizada
+    realizada = estado == "Realizada"
+    k = int(realizada.sum())
+    id_ficha = ids["ficha"] + np.arange(1, k + 1)
+    ids["ficha"] += k
+    cuadro = rng.integers(0, len(CUADROS), k)
+    fecha_ficha = fecha[realizada]
+    paciente_ficha = citas["paciente"][realizada]
+    _insertar(conn, "FichaMedica", {
+        "ID_Ficha": id_ficha,
+        "id_paciente": paciente_ficha,
+        "fecha_hora": fecha_ficha + " " + hora[realizada],
+        "motivo_consulta": [CUADROS[c][0] for c in cuadro.tolist()],
+        "Anamnesis": [CUADROS[c][1] for c in cuadro.tolist()],
+        "observaciones": [CUADROS[c][2] for c in cuadro.tolist()],
+    })
+    con = rng.random(k) < 0.92
+    m = int(con.sum())
+    _insertar(conn, "SignosVitales", {
+        "ID_Ficha_Medica": id_ficha[con],
+        "presion_arterial": [
+            f"{s}/{d}" for s, d in
+            zip(rng.normal(122, 15, m).astype(int).tolist(), rng.normal(78, 10, m).astype(int).tolist())
+        ],
+        "Temperatura": np.round(rng.normal(36.7, 0.4, m), 1),
+        "Frecuencia_cardiaca": rng.normal(76, 11, m).astype(int),
+        "peso": np.round(np.clip(rng.normal(72, 14, m), 3, 180), 1),
+    })
+
+    veces = rng.poisson(0.9, k)
+    med = rng.integers(0, len(MEDICAMENTOS), veces.sum())
+    _insertar(conn, "Prescripcion", {
+        "ID_Ficha_Medica": np.repeat(id_ficha, veces),
+        "id_paciente": np.repeat(paciente_ficha, veces),  # lo que harían los triggers pac_* (se crean al final)
+        "Medicamento": [MEDICAMENTOS[i][0] for i in med.tolist()],
+        "Dosis": [MEDICAMENTOS[i][1] for i in med.tolist()],
+        "Frecuencia": [MEDICAMENTOS[i][2] for i in med.tolist()],
+        "Duracion": [MEDICAMENTOS[i][3] for i in med.tolist()],
+        "Via_administracion": [MEDICAMENTOS[i][4] for i in med.tolist()],
+        "Fecha_emision": np.repeat(fecha_ficha, veces),
+        "Observaciones": _con_nulos(rng, np.full(veces.sum(), "Tomar con agua", dtype=object), 0.7),
+        "Estado": _elegir(rng, (["Dispensada", "Pendiente", "Cancelada"], [0.7, 0.2, 0.1]), veces.sum()),
+    })
+
+    veces = rng.poisson(0.35, k)
+    s = int(veces.sum())
+    id_solicitud = ids["solicitud"] + np.arange(1, s + 1)
+    ids["solicitud"] += s
+    examen = rng.integers(0, len(EXAMENES), s)
+    estado_ex = _elegir(rng, (["Realizada", "Pendiente", "Cancelada"], [0.75, 0.2, 0.05]), s)
+    dia_solicitud = np.repeat(citas["fecha"][realizada], veces)
+    paciente_solicitud = np.repeat(paciente_ficha, veces)
+    _insertar(conn, "SolicitudExamen", {
+        "id": id_solicitud,
+        "ID_ficha_medica": np.repeat(id_ficha, veces),
+        "id_paciente": paciente_solicitud,
+        "Tipo_de_examen": [EXAMENES[e][0] for e in examen.tolist()],
+        "fecha_solicitud": _fechas(dia_solicitud),
+        "Observaciones": _con_nulos(rng, np.full(s, "En ayunas", dtype=object), 0.6),
+        "Estado": estado_ex,
+    })
+    con = estado_ex == "Realizada"
+    _insertar(conn, "ResultadoExamen", {
+        col_resultado: id_solicitud[con],
+        "id_paciente": paciente_solicitud[con],
+        "Fecha_Resultado": _fechas(dia_solicitud[con] + rng.integers(1, 15, con.sum())),
+        "Archivo_adjunto": _con_nulos(
+            rng, np.array([f"examen_{i}.pdf" for i in id_solicitud[con].tolist()], dtype=object), 0.4
+        ),
+        "Resultado_texto": [
+            EXAMENES[e][1][r % len(EXAMENES[e][1])]
+            for e, r in zip(examen[con].tolist(), rng.integers(0, 100, con.sum()).tolist())
+        ],
+    })
+
+
+# =======================
+# Generación
+# =======================
+@contextlib.contextmanager
+def usando_bd(ruta: str):
+    """Apunta temporalmente db.DB_PATH (y con él get_conn) a otra BD."""
+    anterior = db.DB_PATH
+    db.DB_PATH = ruta
+    try:
+        yield
+    finally:
+        db.DB_PATH = anterior
+
+
+def generar(
+    ruta: str, escala="10k", semilla: int = SEMILLA, reemplazar: bool = False, verificar: bool = False
+) -> dict:
+    """
+    Crea `ruta` con el esquema de db.init_db y la llena. `escala` es una clave de ESCALAS o
+    la cantidad de pacientes. Los índices y los triggers de CambioLog se crean al final
+    (el log de cambios queda vacío). Devuelve {"filas": {tabla: n}, "segundos": s}.
+    """
+    n_pacientes = ESCALAS[escala] if escala in ESCALAS else int(escala)
+    if os.path.exists(ruta):
+        if not reemplazar:
+            raise FileExistsError(f"{ruta} ya existe (usa reemplazar=True para sobrescribirla).")
+        for sufijo in ("", "-wal", "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(ruta + sufijo)
+        db.invalidar_columnas()
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with usando_bd(ruta):
+        db.init_db()
+
+    inicio = time.perf_counter()
+    with contextlib.closing(sqlite3.connect(ruta, isolation_level=None)) as conn:
+        for pragma in PRAGMAS_CARGA:
+            conn.execute(pragma)
+        # Índices y triggers se recrean al final: construir un índice de una vez es mucho
+        # más barato que mantenerlo fila a fila, y los triggers de CDC duplicarían cada insert.
+        diferidos = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ).fetchall()
+        for tipo, nombre, _ in diferidos:
+            conn.execute(f"DROP {tipo.upper()} {nombre}")
+        dominios = {**dominios_check(conn, "Paciente"), **dominios_check(conn, "Cita")}
+        columnas_resultado = [r[1] for r in conn.execute("PRAGMA table_info(ResultadoExamen)")]
+        col_resultado = "ID_SolicitudExamen" if "ID_SolicitudExamen" in columnas_resultado else "ID_Resultado_Examen"
+        ids = {"cita": 0, "ficha": 0, "solicitud": 0}  # último id asignado por tabla
+
+        dias = np.arange(FECHA_REFERENCIA - DIAS_HISTORIA, FECHA_REFERENCIA + DIAS_AGENDA + 1)
+        dias = dias[np.is_busday(dias)]
+        citas_objetivo = n_pacientes * CITAS_POR_PACIENTE
+        n_medicos = max(5, round(citas_objetivo / (CITAS_POR_MEDICO_DIA * len(dias))))
+
+        conn.execute("BEGIN")
+        medicos = _medicos(conn, _rng(semilla, 0), n_medicos)
+        conn.execute("COMMIT")
+        for bloque, desde in enumerate(range(1, n_pacientes + 1, PACIENTES_POR_BLOQUE)):
+            conn.execute("BEGIN")
+            hasta = min(desde + PACIENTES_POR_BLOQUE, n_pacientes + 1)
+            _pacientes(conn, _rng(semilla, 1, bloque), np.arange(desde, hasta), dominios)
+            conn.execute("COMMIT")
+
+        # Citas por médico: el promedio diario se reparte según la carga de cada uno
+        por_dia = citas_objetivo / (n_medicos * len(dias)) * medicos["carga"] / medicos["carga"].mean()
+        pendientes, acumuladas, lote = [], 0, 0
+        for m in range(n_medicos):
+            rng = _rng(semilla, 2, m)
+            fechas, minutos = _agenda_medico(rng, dias, int(medicos["minutos"][m]), por_dia[m])
+            pendientes.append({
+                "fecha": fechas, "minutos": minutos, "medico": np.full(len(fechas), m + 1),
+                "paciente": rng.integers(1, n_pacientes + 1, len(fechas)),
+            })
+            acumuladas += len(fechas)
+            if m == n_medicos - 1 or acumuladas >= CITAS_POR_BLOQUE:
+                citas = {k: np.concatenate([p[k] for p in pendientes]) for k in pendientes[0]}
+                conn.execute("BEGIN")
+                _visitas(conn, _rng(semilla, 3, lote), citas, ids, dominios, col_resultado)
+                conn.execute("COMMIT")
+                pendientes, acumuladas, lote = [], 0, lote + 1
+
+        for _, _, sql in diferidos:
+            conn.execute(sql)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("ANALYZE")
+        if verificar:
+            fallas = conn.execute("PRAGMA foreign_key_check").fetchall()
+            if fallas:
+                raise RuntimeError(f"{len(fallas)} filas con claves foráneas inválidas, p. ej. {fallas[:3]}")
+        tablas = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite!_%' ESCAPE '!' ORDER BY name"
+        )]
+        filas = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tablas}
+    return {"filas": filas, "segundos": time.perf_counter() - inicio}
+
+
+def exportar_archivos(ruta: str, carpeta: str, formatos=("csv", "parquet")) -> list:
+    """
+    Exporta Pacientes, Médicos, Citas y FichaMedica de la BD `ruta` con los mismos
+    exportadores de la app (CSV y/o Parquet) y arma paquete.zip con los CSV, listo para
+    import_export.importar_paquete. Devuelve las rutas creadas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    creados = []
+    with usando_bd(ruta):
+        for nombre, exp in EXPORTACIONES.items():
+            for formato in formatos:
+                if formato == "parquet" and pq is None:
+                    continue
+                archivo, _ = exportar_parquet(exp["sql"]) if formato == "parquet" else exportar_csv(exp["sql"])
+                destino = os.path.join(carpeta, exp["archivo"].replace(".csv", f".{formato}"))
+                with archivo, open(destino, "wb") as salida:
+                    shutil.copyfileobj(archivo, salida, 1024 * 1024)
+                creados.append(destino)
+    csvs = [c for c in creados if c.endswith(".csv")]
+    if csvs:
+        paquete = os.path.join(carpeta, "paquete.zip")
+        with zipfile.ZipFile(paquete, "w", zipfile.ZIP_DEFLATED) as zf:
+            for c in csvs:
+                zf.write(c, os.path.basename(c))
+        creados.append(paquete)
+    return creados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ruta", help="BD a crear (no se sobrescribe sin --reemplazar)")
+    parser.add_argument("--escala", default="10k", help=f"{', '.join(ESCALAS)} o cantidad de pacientes")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--reemplazar", action="store_true")
+    parser.add_argument("--verificar", action="store_true", help="revisa las claves foráneas al terminar")
+    parser.add_argument("--archivos", metavar="CARPETA", help="exporta además CSV/Parquet y paquete.zip")
+    parser.add_argument("--formatos", nargs="+", default=["csv", "parquet"], choices=["csv", "parquet"])
+    args = parser.parse_args()
+
+    resultado = generar(args.ruta, args.escala, args.semilla, args.reemplazar, args.verificar)
+    total = sum(resultado["filas"].values())
+    for tabla, n in resultado["filas"].items():
+        print(f"{tabla:22s} {n:>12,}")
+    print(f"{total:,} filas en {resultado['segundos']:.1f} s ({total / resultado['segundos']:,.0f} filas/s)")
+    if args.archivos:
+        for ruta in exportar_archivos(args.ruta, args.archivos, args.formatos):
+            print(f"{ruta}  {os.path.getsize(ruta) / 1e6:,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,43 @@
+from __future__ import annotations
+
 import io
+import re
 import csv
+import codecs
+import sys
+import gzip
+import sqlite3
+import json
+import os
+import time
+import shutil
+import zipfile
+import unicodedata
+import multiprocessing
+import tempfile
+import functools
 import contextlib
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-import pandas as pd
 import streamlit as st
 
-from db import get_conn
+import cdc
+import carga_diferida
+import metricas
+from db import TABLAS_CDC, get_conn
+from Validaciones import canonizar_ruts_serie, sql_rut_canonico, validar_correo_serie, validar_rut_serie
+
+# pandas y pyarrow se cargan al primer export/import, no al dibujar el sidebar
+pd = carga_diferida.modulo("pandas")
+if carga_diferida.disponible("pyarrow"):  # Parquet es opcional: sin pyarrow solo se ofrece CSV
+    pa = carga_diferida.modulo("pyarrow")
+    pc = carga_diferida.modulo("pyarrow.compute")
+    pq = carga_diferida.modulo("pyarrow.parquet")
+else:  # pragma: no cover
+    pa = pc = pq = None
 
 
 # Helper para leer un SELECT como DataFrame
@@ -14,16 +46,13 @@ def df(query: str, params: tuple = ()):
         return pd.read_sql_query(query, conn, params=params)
 
 
-def sidebar_exports_imports():
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("📤 Exportar CSV")
-
-    # =========================================================================
-    # EXPORTAR PACIENTES
-    # =========================================================================
-    try:
-        pacientes_df = df(
-            """
+# =========================================================================
+# Exportación en streaming
+# =========================================================================
+EXPORTACIONES = {
+    "Pacientes": {
+        "archivo": "Pacientes_export.csv",
+        "sql": """
             SELECT
                 id_paciente,
                 rut,
@@ -40,23 +69,11 @@ def sidebar_exports_imports():
                 prevision
             FROM Paciente
             ORDER BY nombre
-            """
-        )
-        st.sidebar.download_button(
-            "Descargar Pacientes.csv",
-            data=pacientes_df.to_csv(index=False).encode("utf-8"),
-            file_name="Pacientes_export.csv",
-            mime="text/csv",
-        )
-    except Exception as ex:
-        st.sidebar.caption(f"Pacientes (export): {ex}")
-
-    # =========================================================================
-    # EXPORTAR MÉDICOS
-    # =========================================================================
-    try:
-        medicos_df = df(
-            """
+            """,
+    },
+    "Medicos": {
+        "archivo": "Medicos_export.csv",
+        "sql": """
             SELECT
                 id_medico,
                 nombre,
@@ -69,23 +86,11 @@ def sidebar_exports_imports():
                 especialidad
             FROM Medico
             ORDER BY nombre
-            """
-        )
-        st.sidebar.download_button(
-            "Descargar Medicos.csv",
-            data=medicos_df.to_csv(index=False).encode("utf-8"),
-            file_name="Medicos_export.csv",
-            mime="text/csv",
-        )
-    except Exception as ex:
-        st.sidebar.caption(f"Médicos (export): {ex}")
-
-    # =========================================================================
-    # EXPORTAR CITAS
-    # =========================================================================
-    try:
-        citas_df = df(
-            """
+            """,
+    },
+    "Citas": {
+        "archivo": "Citas_export.csv",
+        "sql": """
             SELECT
                 C.id_cita,
                 C.fecha,
@@ -94,6 +99,7 @@ def sidebar_exports_imports():
                 C.id_paciente,
                 C.id_medico,
                 P.rut     AS rut_paciente,
+                M.Rut     AS rut_medico,
                 P.nombre  AS nombre_paciente,
                 M.nombre  AS nombre_medico,
                 M.especialidad AS especialidad_medico
@@ -101,23 +107,11 @@ def sidebar_exports_imports():
             JOIN Paciente P ON P.id_paciente = C.id_paciente
             JOIN Medico   M ON M.id_medico   = C.id_medico
             ORDER BY C.fecha DESC, C.hora DESC
-            """
-        )
-        st.sidebar.download_button(
-            "Descargar Citas.csv",
-            data=citas_df.to_csv(index=False).encode("utf-8"),
-            file_name="Citas_export.csv",
-            mime="text/csv",
-        )
-    except Exception as ex:
-        st.sidebar.caption(f"Citas (export): {ex}")
-
-    # =========================================================================
-    # EXPORTAR FICHA MÉDICA
-    # =========================================================================
-    try:
-        ficha_df = df(
-            """
+            """,
+    },
+    "FichaMedica": {
+        "archivo": "FichaMedica_export.csv",
+        "sql": """
             SELECT
                 F.ID_Ficha,
                 F.fecha_hora,
@@ -136,739 +130,1722 @@ def sidebar_exports_imports():
               ON P.id_paciente = F.id_paciente
             LEFT JOIN SignosVitales SV
               ON SV.ID_Ficha_Medica = F.ID_Ficha
-            ORDER BY datetime(F.fecha_hora) DESC
-            """
-        )
-        st.sidebar.download_button(
-            "Descargar FichaMedica.csv",
-            data=ficha_df.to_csv(index=False).encode("utf-8"),
-            file_name="FichaMedica_export.csv",
-            mime="text/csv",
-        )
-    except Exception as ex:
-        st.sidebar.caption(f"Ficha Médica (export): {ex}")
-
-    # =====================================================================
-    #  IMPORTAR CSV
-    # =====================================================================
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("📥 Importar CSV")
-
-    # =====================================================================
-    #  IMPORTAR PACIENTES 
-    # =====================================================================
-    with st.sidebar.expander("Importar Pacientes.csv"):
-        up = st.file_uploader("Selecciona CSV de Pacientes", type=["csv"], key="up_pac")
-        if up is not None:
-            try:
-                # Leemos el archivo UNA sola vez
-                raw = up.read()
-                if not raw:
-                    st.error("El archivo CSV está vacío.")
-                    return
-
-                # Decodificamos texto (Excel en Windows suele ir bien con latin1)
-                txt = raw.decode("latin1", errors="ignore")
-
-                # 1) Intento normal con coma (sep=",")
-                data = pd.read_csv(io.StringIO(txt), sep=",")
-
-                # 2) Caso “encabezado raro”: solo 1 columna y dentro hay ';'
-                if len(data.columns) == 1 and ";" in data.columns[0]:
-                    st.warning("Encabezado de CSV inválido detectado. Aplicando corrección...")
-
-                    # Limpiamos: sacamos comillas al inicio/fin de cada línea
-                    lines = txt.splitlines()
-                    clean = "\n".join(
-                        l.strip().strip('"')
-                        for l in lines
-                        if l.strip()
-                    )
-
-                    # Releemos ahora sí como CSV separado por ';'
-                    data = pd.read_csv(io.StringIO(clean), sep=";", engine="python")
-
-                # ================================
-                # 1) Leemos columnas REALES de la tabla Paciente
-                # ================================
-                with contextlib.closing(get_conn()) as conn:
-                    cur = conn.execute("PRAGMA table_info(Paciente)")
-                    db_cols = [row[1] for row in cur.fetchall()]
-
-                # ================================
-                # 2) Columnas posibles que pueden venir desde el CSV
-                # ================================
-                csv_cols_posibles = [
-                    "id_paciente",
-                    "rut",
-                    "nombre",
-                    "apellido",            # si en algún momento lo usas separado
-                    "fecha_nacimiento",
-                    "correo",
-                    "telefono",
-                    "direccion",
-                    "alergias",
-                    "enfermedades_previas",
-                    "nacionalidad",
-                    "sexo",
-                    "estado_civil",
-                    "tipo_paciente",
-                    "tipo_sangre",
-                    "prevision",
+            ORDER BY F.fecha_hora DESC
+            """,
+    },
+}
+
+FILAS_POR_LOTE = 5_000
+MAX_MEMORIA_EXPORT = 8 * 1024 * 1024  # sobre esto el archivo temporal pasa a disco
+
+
+def exportar_csv(query: str, params: tuple = (), comprimir: bool = False, lote: int = FILAS_POR_LOTE, progreso=None):
+    """
+    Recorre el SELECT con fetchmany y escribe el CSV fila a fila en un archivo temporal
+    (en memoria hasta MAX_MEMORIA_EXPORT, luego en disco), opcionalmente con gzip.
+    La memoria usada depende de `lote`, no del tamaño de la tabla. `progreso(filas)` se
+    llama tras cada lote (cli.py).
+
+    Devuelve (archivo posicionado al inicio, stats) con stats = filas, segundos,
+    filas_por_segundo y bytes.
+    """
+    inicio = time.perf_counter()
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_EXPORT)
+    destino = gzip.GzipFile(fileobj=archivo, mode="wb") if comprimir else archivo
+    # Buffer de texto de un solo lote: se codifica y vacía tras cada fetchmany
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    filas = 0
+    try:
+        with contextlib.closing(get_conn()) as conn:
+            cur = conn.execute(query, params)
+            writer.writerow([d[0] for d in cur.description])
+            while True:
+                bloque = cur.fetchmany(lote)
+                if not bloque:
+                    break
+                writer.writerows(bloque)
+                filas += len(bloque)
+                destino.write(buf.getvalue().encode("utf-8"))
+                buf.seek(0)
+                buf.truncate(0)
+                if progreso is not None:
+                    progreso(filas)
+        destino.write(buf.getvalue().encode("utf-8"))
+    finally:
+        if comprimir:
+            destino.close()
+
+    segundos = time.perf_counter() - inicio
+    total_bytes = archivo.tell()
+    archivo.seek(0)
+    _metricas_export("csv_gzip" if comprimir else "csv", filas, segundos, total_bytes)
+    return archivo, {
+        "filas": filas,
+        "segundos": segundos,
+        "filas_por_segundo": filas / segundos if segundos > 0 else float(filas),
+        "bytes": total_bytes,
+    }
+
+
+def _metricas_export(formato: str, filas: int, segundos: float, total_bytes: int) -> None:
+    metricas.observar("sgp_export_segundos", segundos, formato)
+    metricas.incrementar("sgp_export_filas_total", formato, valor=filas)
+    metricas.incrementar("sgp_export_bytes_total", formato, valor=total_bytes)
+    if segundos > 0:
+        metricas.fijar("sgp_export_filas_por_segundo", filas / segundos, formato)
+
+
+# =========================================================================
+# Snapshot completo (todas las tablas y vistas en un solo ZIP consistente)
+# =========================================================================
+FILAS_POR_BLOQUE_SNAPSHOT = 20_000
+
+
+def _volcar_csv_gzip(cur, destino, pool, lote: int, max_pendientes: int) -> int:
+    """
+    Escribe el resultado de `cur` como CSV gzip en `destino`. Cada bloque de filas se
+    comprime en paralelo como un miembro gzip independiente (zlib libera el GIL); los
+    miembros concatenados forman un .gz válido. Se escriben en orden y con un máximo de
+    bloques pendientes para acotar la memoria.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([d[0] for d in cur.description])
+    pendientes = deque()
+    filas = 0
+    while True:
+        bloque = cur.fetchmany(lote)
+        if bloque:
+            writer.writerows(bloque)
+            filas += len(bloque)
+        if buf.tell():
+            pendientes.append(pool.submit(gzip.compress, buf.getvalue().encode("utf-8"), 6))
+            buf.seek(0)
+            buf.truncate(0)
+        while pendientes and (len(pendientes) >= max_pendientes or not bloque):
+            destino.write(pendientes.popleft().result())
+        if not bloque:
+            return filas
+
+
+def exportar_snapshot(lote: int = FILAS_POR_BLOQUE_SNAPSHOT, hilos: int = None, progreso=None):
+    """
+    Exporta todas las tablas y las vistas Vista_* a un ZIP con un CSV gzip por objeto y un
+    manifest.json con conteos. Todo se lee dentro de una única transacción de lectura, así
+    que el conjunto es consistente; en modo WAL los escritores no se bloquean mientras tanto.
+    Las vistas que no se pueden consultar (esquema antiguo) quedan registradas con su error.
+    `progreso(entrada)` se llama con la entrada del manifiesto de cada objeto ya escrito.
+    Devuelve (archivo posicionado al inicio, manifiesto).
+    """
+    inicio = time.perf_counter()
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_EXPORT)
+    manifiesto = {"creado": datetime.now().isoformat(timespec="seconds"), "objetos": []}
+    hilos = hilos or os.cpu_count() or 1
+
+    with contextlib.closing(get_conn()) as conn, ThreadPoolExecutor(hilos) as pool, zipfile.ZipFile(
+        archivo, "w", zipfile.ZIP_STORED  # los miembros ya van comprimidos con gzip
+    ) as zf:
+        conn.isolation_level = None
+        conn.execute("BEGIN")  # la primera lectura fija la instantánea para todo el export
+        try:
+            objetos = conn.execute(
+                """
+                SELECT type, name FROM sqlite_master
+                WHERE (type = 'table' AND name NOT LIKE 'sqlite!_%' ESCAPE '!')
+                   OR (type = 'view' AND name LIKE 'Vista!_%' ESCAPE '!')
+                ORDER BY type, name
+                """
+            ).fetchall()
+            manifiesto["version_esquema"] = conn.execute("PRAGMA schema_version").fetchone()[0]
+            for tipo, nombre in objetos:
+                entrada = {"nombre": nombre, "tipo": "tabla" if tipo == "table" else "vista"}
+                try:
+                    cur = conn.execute(f'SELECT * FROM "{nombre}"')
+                except sqlite3.OperationalError as e:
+                    entrada["error"] = str(e)
+                    manifiesto["objetos"].append(entrada)
+                    continue
+                entrada["archivo"] = f"{nombre}.csv.gz"
+                entrada["columnas"] = [d[0] for d in cur.description]
+                with zf.open(entrada["archivo"], "w") as destino:
+                    entrada["filas"] = _volcar_csv_gzip(cur, destino, pool, lote, 2 * hilos)
+                manifiesto["objetos"].append(entrada)
+                if progreso is not None:
+                    progreso(entrada)
+        finally:
+            conn.execute("COMMIT")
+
+        manifiesto["segundos"] = round(time.perf_counter() - inicio, 3)
+        zf.writestr("manifest.json", json.dumps(manifiesto, ensure_ascii=False, indent=2))
+
+    _metricas_export(
+        "snapshot", sum(o.get("filas", 0) for o in manifiesto["objetos"]), time.perf_counter() - inicio, archivo.tell()
+    )
+    archivo.seek(0)
+    return archivo, manifiesto
+
+
+def exportar_cambios(desde: int, lote: int = FILAS_POR_BLOQUE_SNAPSHOT, hilos: int = None, progreso=None):
+    """
+    Exportación incremental: para cada tabla con CDC, las filas que cambiaron después del
+    watermark `desde` (una por fila, con su última operación I/U/D y el estado actual).
+    Mismo formato que exportar_snapshot; el manifiesto trae el watermark `hasta` que el
+    consumidor debe usar en la próxima llamada (`progreso` como en exportar_snapshot). El costo depende de los cambios, no del
+    tamaño de las tablas.
+    """
+    inicio = time.perf_counter()
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_EXPORT)
+    manifiesto = {"creado": datetime.now().isoformat(timespec="seconds"), "desde": desde, "objetos": []}
+    hilos = hilos or os.cpu_count() or 1
+
+    with contextlib.closing(get_conn()) as conn, ThreadPoolExecutor(hilos) as pool, zipfile.ZipFile(
+        archivo, "w", zipfile.ZIP_STORED
+    ) as zf:
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        try:
+            manifiesto["hasta"] = cdc.watermark_actual(conn)
+            if desde < cdc.watermark_minimo(conn) - 1:
+                manifiesto["aviso"] = (
+                    "El watermark es anterior a los cambios retenidos; puede faltar información. "
+                    "Se recomienda un snapshot completo."
+                )
+            for tabla in TABLAS_CDC:
+                entrada = {"nombre": tabla, "tipo": "cambios"}
+                try:
+                    cur = cdc.filas_cambiadas(conn, tabla, desde, limite=-1)
+                except sqlite3.OperationalError as e:
+                    entrada["error"] = str(e)
+                    manifiesto["objetos"].append(entrada)
+                    continue
+                entrada["archivo"] = f"{tabla}.csv.gz"
+                entrada["columnas"] = [d[0] for d in cur.description]
+                with zf.open(entrada["archivo"], "w") as destino:
+                    entrada["filas"] = _volcar_csv_gzip(cur, destino, pool, lote, 2 * hilos)
+                manifiesto["objetos"].append(entrada)
+                if progreso is not None:
+                    progreso(entrada)
+        finally:
+            conn.execute("COMMIT")
+
+        manifiesto["segundos"] = round(time.perf_counter() - inicio, 3)
+        zf.writestr("manifest.json", json.dumps(manifiesto, ensure_ascii=False, indent=2))
+
+    _metricas_export(
+        "cambios", sum(o.get("filas", 0) for o in manifiesto["objetos"]), time.perf_counter() - inicio, archivo.tell()
+    )
+    archivo.seek(0)
+    return archivo, manifiesto
+
+
+# =========================================================================
+# Parquet (tipos según el esquema SQLite)
+# =========================================================================
+FILAS_POR_GRUPO_PARQUET = 100_000
+
+
+def _tipo_arrow(declarado: str):
+    """
+    Tipo declarado en SQLite -> tipo Arrow. Sigue las reglas de afinidad de SQLite y
+    distingue fechas/horas; NUMERIC (p. ej. teléfonos) queda como texto porque en la
+    práctica esas columnas mezclan enteros y texto.
+    """
+    t = (declarado or "").upper()
+    if "INT" in t:
+        return pa.int64()
+    if any(x in t for x in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    if "TIMESTAMP" in t or ("DAT" in t and "TIME" in t):
+        return pa.timestamp("s")
+    if "DATE" in t:
+        return pa.date32()
+    if "TIME" in t:
+        return pa.time32("s")
+    if "BOOL" in t:
+        return pa.bool_()
+    return pa.string()
+
+
+def esquema_arrow(conn, query: str):
+    """
+    Esquema Arrow del resultado de `query`: SQLite expone el tipo declarado de cada
+    columna de una vista, así que basta con crear una vista temporal y leer PRAGMA table_info.
+    """
+    conn.execute("DROP VIEW IF EXISTS temp._esquema_export")
+    conn.execute(f"CREATE TEMP VIEW _esquema_export AS {query}")
+    try:
+        info = conn.execute("PRAGMA temp.table_info(_esquema_export)").fetchall()
+    finally:
+        conn.execute("DROP VIEW temp._esquema_export")
+    return pa.schema([(row[1], _tipo_arrow(row[2])) for row in info])
+
+
+def _columna_arrow(valores, tipo):
+    """
+    Convierte una columna leída de SQLite (tupla de valores) al tipo Arrow. Si los datos ya
+    son del tipo declarado se pasan directo; si no, se limpian y lo no convertible queda nulo.
+    """
+    if pa.types.is_integer(tipo) or pa.types.is_floating(tipo) or pa.types.is_string(tipo):
+        try:
+            return pa.array(valores, type=tipo)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if pa.types.is_string(tipo):
+                return pa.array([None if v is None else str(v) for v in valores], type=tipo)
+    if pa.types.is_timestamp(tipo) or pa.types.is_date(tipo):
+        # Camino rápido: todo viene en el formato ISO que guarda la app
+        iso = "%Y-%m-%d %H:%M:%S" if pa.types.is_timestamp(tipo) else "%Y-%m-%d"
+        try:
+            txt = pa.array(valores, type=pa.string())
+            fechas = pc.strptime(txt, format=iso, unit="s", error_is_null=True)
+            if fechas.null_count == txt.null_count:
+                return fechas.cast(tipo)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    valores = pd.Series(valores, dtype=object)
+    if pa.types.is_integer(tipo):
+        num = pd.to_numeric(valores, errors="coerce")
+        return pa.array(num.where(num == num.round()).astype("Int64"), type=tipo, from_pandas=True)
+    if pa.types.is_floating(tipo):
+        return pa.array(pd.to_numeric(valores, errors="coerce"), type=tipo, from_pandas=True)
+    if pa.types.is_timestamp(tipo):
+        txt = _normalizar_fecha(valores, FORMATOS_FECHA_HORA, "%Y-%m-%d %H:%M:%S", largo=None)
+        fechas = pd.to_datetime(txt, format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        return pa.array(fechas, type=tipo, from_pandas=True)
+    if pa.types.is_date(tipo):
+        fechas = pd.to_datetime(_normalizar_fecha(valores), format="%Y-%m-%d", errors="coerce")
+        return pa.array(fechas.dt.date.where(fechas.notna(), None), type=tipo, from_pandas=True)
+    if pa.types.is_time(tipo):
+        txt = valores.astype("string").str.strip().str.replace(r"^(\d{1,2}:\d{2})$", r"\1:00", regex=True)
+        horas = pd.to_datetime(txt, format="%H:%M:%S", errors="coerce")
+        return pa.array(horas.dt.time.where(horas.notna(), None), type=tipo, from_pandas=True)
+    if pa.types.is_boolean(tipo):
+        num = pd.to_numeric(valores, errors="coerce")
+        return pa.array(num.map({1: True, 0: False}), type=tipo, from_pandas=True)
+    return pa.array(valores.where(valores.isna(), valores.astype(str)), type=tipo, from_pandas=True)
+
+
+def exportar_parquet(query: str, params: tuple = (), lote: int = FILAS_POR_GRUPO_PARQUET, progreso=None):
+    """
+    Igual que exportar_csv pero en Parquet: cada fetchmany se convierte a los tipos del
+    esquema SQLite y se escribe como un row group. Devuelve (archivo, stats).
+    """
+    if pq is None:
+        raise RuntimeError("Exportar a Parquet requiere pyarrow.")
+    inicio = time.perf_counter()
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_EXPORT)
+    filas = 0
+    with contextlib.closing(get_conn()) as conn:
+        esquema = esquema_arrow(conn, query)
+        with pq.ParquetWriter(archivo, esquema, compression="snappy") as writer:
+            cur = conn.execute(query, params)
+            while True:
+                bloque = cur.fetchmany(lote)
+                if not bloque:
+                    break
+                columnas = [
+                    _columna_arrow(valores, esquema.field(i).type) for i, valores in enumerate(zip(*bloque))
                 ]
+                writer.write_table(pa.Table.from_arrays(columnas, schema=esquema))
+                filas += len(bloque)
+                if progreso is not None:
+                    progreso(filas)
+
+    segundos = time.perf_counter() - inicio
+    total_bytes = archivo.tell()
+    archivo.seek(0)
+    _metricas_export("parquet", filas, segundos, total_bytes)
+    return archivo, {
+        "filas": filas,
+        "segundos": segundos,
+        "filas_por_segundo": filas / segundos if segundos > 0 else float(filas),
+        "bytes": total_bytes,
+    }
+
+
+def _es_parquet(archivo) -> bool:
+    """Los archivos Parquet comienzan con los bytes mágicos PAR1."""
+    pos = archivo.tell()
+    magia = archivo.read(4)
+    archivo.seek(pos)
+    return magia == b"PAR1"
+
+
+def leer_parquet_por_chunks(archivo, chunksize: int = None, columnas=None):
+    """
+    Itera un Parquet en DataFrames de texto (como read_csv con dtype=str) para reutilizar
+    la misma limpieza. Solo se leen las columnas de `columnas` que existan en el archivo
+    (sin distinguir mayúsculas).
+    """
+    if pq is None:
+        raise RuntimeError("Importar Parquet requiere pyarrow.")
+    chunksize = chunksize or FILAS_POR_CHUNK
+    pf = pq.ParquetFile(archivo)
+    nombres = pf.schema_arrow.names
+    if columnas is not None:
+        buscadas = {c.lower() for c in columnas}
+        nombres = [c for c in nombres if c.lower() in buscadas]
+    for lote in pf.iter_batches(batch_size=chunksize, columns=nombres):
+        texto = [_columna_texto(lote.column(i)) for i in range(lote.num_columns)]
+        yield pa.Table.from_arrays(texto, names=lote.schema.names).to_pandas()
+
+
+def _columna_texto(col):
+    """Columna Arrow -> texto con el mismo formato que guarda la app (sin milisegundos)."""
+    if pa.types.is_timestamp(col.type):
+        # con unidad ms/us, %S incluiría la fracción de segundo
+        return pc.strftime(col.cast(pa.timestamp("s"), safe=False), format="%Y-%m-%d %H:%M:%S")
+    if pa.types.is_time(col.type):
+        return pc.utf8_slice_codeunits(col.cast(pa.string()), 0, 8)
+    return col.cast(pa.string())
+
+
+# =========================================================================
+# Importación por chunks (Pacientes, Médicos, Citas)
+# =========================================================================
+FILAS_POR_CHUNK = 50_000
+BYTES_MUESTRA = 64 * 1024
+
+
+# Candidatos en orden de preferencia cuando hay empate
+SEPARADORES = [",", ";", "\t", "|"]
+
+
+def _detectar_encoding(muestra: bytes) -> str:
+    """UTF-8 con BOM, UTF-8 o cp1252 (latin1 si hay bytes que cp1252 no define)."""
+    if muestra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # Incremental: un carácter multibyte cortado al final de la muestra no es un error
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        muestra.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def _fila_entre_comillas(linea: str) -> bool:
+    """'"a;b;c"': la fila completa es un solo campo entre comillas (sin comillas internas)."""
+    s = linea.strip()
+    return len(s) >= 2 and s[0] == s[-1] == '"' and '"' not in s[1:-1]
+
+
+def _contar_campos(lineas, sep: str, quoting: int):
+    return [len(f) for f in csv.reader(lineas, delimiter=sep, quoting=quoting)]
+
+
+def _elegir_separador(lineas, quoting: int = csv.QUOTE_MINIMAL) -> str:
+    """El separador que da el mismo número de campos (>1) en más líneas; a igualdad, más campos."""
+    mejor, puntaje = SEPARADORES[0], (0.0, 0)
+    for sep in SEPARADORES:
+        cuentas = _contar_campos(lineas, sep, quoting)
+        moda = max(set(cuentas), key=cuentas.count)
+        if moda < 2:
+            continue
+        candidato = (cuentas.count(moda) / len(cuentas), moda)
+        if candidato > puntaje:
+            mejor, puntaje = sep, candidato
+    return mejor
+
+
+def _parece_encabezado(campos, filas) -> bool:
+    """
+    Encabezado si ningún campo es numérico y alguna columna que lo es en los datos
+    no lo es en la primera fila (misma idea que csv.Sniffer.has_header).
+    """
+    def es_numero(v: str) -> bool:
+        try:
+            float(v.replace(",", "."))
+            return True
+        except ValueError:
+            return False
+
+    if not campos or any(not c.strip() or es_numero(c) for c in campos):
+        return False
+    for i in range(len(campos)):
+        valores = [f[i] for f in filas if i < len(f) and f[i].strip()]
+        if valores and all(es_numero(v) for v in valores):
+            return True
+    # Sin columnas numéricas no hay cómo distinguir: se asume encabezado, como siempre
+    return True
+
+
+def detectar_dialecto(archivo, bytes_muestra: int = BYTES_MUESTRA):
+    """
+    Mira solo los primeros `bytes_muestra` bytes y devuelve un dict con lo necesario para
+    parsear el archivo una sola vez con el motor C de pandas:
+      encoding, sep, quoting, encabezado (bool), nombres (si hay que imponerlos),
+      limpiar_comillas (filas completas entre comillas). None si la muestra está vacía.
+    Formatos “rotos” que se siguen aceptando:
+      - filas completas entre comillas con ';' adentro
+      - encabezado con ',' y filas con ';'
+    """
+    muestra = archivo.read(bytes_muestra)
+    archivo.seek(0)
+    encoding = _detectar_encoding(muestra)
+    texto = muestra.decode(encoding, errors="ignore")
+    lineas = texto.splitlines()
+    if len(muestra) == bytes_muestra and len(lineas) > 1:
+        lineas = lineas[:-1]  # la última línea puede venir cortada
+    lineas = [l for l in lineas if l.strip()][:200]
+    if not lineas:
+        return None
+
+    cabecera, datos = lineas[0], lineas[1:] or lineas[:1]
+    entre_comillas = all(_fila_entre_comillas(l) for l in datos)
+    # Filas entre comillas: las comillas pasan a ser parte del primer y último campo y se quitan después
+    quoting = csv.QUOTE_NONE if entre_comillas else csv.QUOTE_MINIMAL
+    sep = _elegir_separador(datos, quoting)
+
+    campos_cab = next(csv.reader([cabecera], delimiter=sep, quoting=quoting), [])
+    nombres = None
+    if _fila_entre_comillas(cabecera) or len(campos_cab) < 2 <= len(next(csv.reader([datos[0]], delimiter=sep))):
+        # Encabezado con otro separador o entero entre comillas: los nombres se imponen
+        limpia = cabecera.strip().strip('"')
+        sep_cab = _elegir_separador([limpia], csv.QUOTE_NONE)
+        nombres = [c.strip().strip('"') for c in limpia.split(sep_cab)]
+        campos_cab = nombres
+
+    filas = list(csv.reader(
+        [l.strip().strip('"') if entre_comillas else l for l in datos], delimiter=sep, quoting=quoting
+    ))
+    return {
+        "encoding": encoding,
+        "sep": sep,
+        "quoting": quoting,
+        "encabezado": _parece_encabezado([c.strip().strip('"') for c in campos_cab], filas),
+        "nombres": nombres,
+        "limpiar_comillas": entre_comillas,
+    }
+
+
+def _opciones_read_csv(dialecto: dict) -> dict:
+    opciones = {
+        "sep": dialecto["sep"],
+        "quoting": dialecto["quoting"],
+        "encoding": dialecto["encoding"],
+        "engine": "c",
+        "dtype": str,
+    }
+    if dialecto["nombres"] is not None:
+        opciones.update(header=None, skiprows=1, names=dialecto["nombres"])
+    return opciones
+
+
+def leer_csv_por_chunks(archivo, chunksize: int = FILAS_POR_CHUNK):
+    """
+    Itera el CSV en DataFrames de a lo más `chunksize` filas (todas las columnas como texto).
+    Una sola pasada del motor C con el dialecto detectado por `detectar_dialecto`.
+    """
+    dialecto = detectar_dialecto(archivo)
+    if dialecto is None:
+        return
+    if not dialecto["encabezado"]:
+        raise ValueError("El CSV no tiene fila de encabezado; no se pueden reconocer las columnas.")
+    # Bytes que no calzan con el encoding detectado (fuera de la muestra) se reemplazan por '�'
+    with pd.read_csv(
+        archivo, chunksize=chunksize, encoding_errors="replace", **_opciones_read_csv(dialecto)
+    ) as lector:
+        for chunk in lector:
+            chunk.columns = [str(c).strip().strip('"') for c in chunk.columns]
+            if dialecto["limpiar_comillas"]:
+                primera, ultima = chunk.columns[0], chunk.columns[-1]
+                chunk[primera] = chunk[primera].str.lstrip('"')
+                chunk[ultima] = chunk[ultima].str.rstrip('"')
+            yield chunk
+
+
+def leer_por_chunks(archivo, chunksize: int = FILAS_POR_CHUNK, columnas=None):
+    """CSV o Parquet (se detecta por contenido), siempre como DataFrames de texto."""
+    if _es_parquet(archivo):
+        return leer_parquet_por_chunks(archivo, chunksize, columnas)
+    return leer_csv_por_chunks(archivo, chunksize)
+
+
+def _columnas_tabla(tabla: str):
+    with contextlib.closing(get_conn()) as conn:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({tabla})").fetchall()]
 
-                # Aviso si el CSV trae columnas que NO existen en la BD
-                extras = [c for c in csv_cols_posibles if c in data.columns and c not in db_cols]
-                if extras:
-                    st.info(
-                        "Estas columnas están en el CSV pero no en la tabla Paciente; se ignorarán: "
-                        + ", ".join(extras)
-                    )
-
-                # ================================
-                # 3) Nos quedamos solo con columnas que:
-                #    (a) estén en el CSV y
-                #    (b) EXISTAN en la tabla Paciente
-                # ================================
-                present = [c for c in csv_cols_posibles if c in data.columns and c in db_cols]
-
-                if not present:
-                    st.error(
-                        "No se detectaron columnas compatibles en el CSV de Pacientes. "
-                        "Revisa que los encabezados sean rut, nombre, fecha_nacimiento, etc."
-                    )
-                    return
-
-                # Nunca insertamos id_paciente (AUTOINCREMENT)
-                if "id_paciente" in present:
-                    present.remove("id_paciente")
-
-                # ================================
-                # 4) Normalizaciones de datos (solo si la columna existe)
-                # ================================
-                if "fecha_nacimiento" in present:
-                    data["fecha_nacimiento"] = (
-                        pd.to_datetime(
-                            data["fecha_nacimiento"],
-                            errors="coerce",
-                            dayfirst=True,
-                        )
-                        .dt.strftime("%Y-%m-%d")
-                    )
 
-                if "telefono" in present:
-                    data["telefono"] = (
-                        data["telefono"]
-                        .astype(str)
-                        .str.strip()
-                        .replace({"nan": None, "None": None})
-                    )
+def _tipos_columnas(conn, tabla: str) -> dict:
+    """nombre de columna (minúsculas) -> tipo declarado, para que el staging tenga la misma afinidad."""
+    return {row[1].lower(): row[2] for row in conn.execute(f"PRAGMA table_info({tabla})").fetchall()}
 
-                if "prevision" in present:
-                    data["prevision"] = (
-                        data["prevision"]
-                        .astype(str)
-                        .str.upper()
-                        .str.strip()
-                        .replace(
-                            {
-                                "FONAS": "FONASA",
-                                "FONASA ": "FONASA",
-                                "ISAPRES": "ISAPRE",
-                                "IS APRE": "ISAPRE",
-                                "": None,
-                                "NONE": None,
-                                "NAN": None,
-                                "NULL": None,
-                            }
-                        )
-                    )
-                    data["prevision"] = data["prevision"].where(
-                        data["prevision"].isin(["FONASA", "ISAPRE"]), None
-                    )
 
-                # ================================
-                # 5) Limpieza de RUT y filtro contra BD
-                # ================================
-                if "rut" in present:
-                    # Filtrar vacíos
-                    before = len(data)
-                    data = data[data["rut"].astype(str).str.strip().ne("")]
-                    dropped = before - len(data)
-                    if dropped > 0:
-                        st.warning(f"Se omitieron {dropped} filas con RUT vacío.")
-
-                    # Evitar duplicados dentro del propio CSV
-                    data = data.drop_duplicates(subset=["rut"], keep="last")
-
-                    # Filtrar RUT que ya están en la base
-                    with contextlib.closing(get_conn()) as conn:
-                        existing = conn.execute(
-                            "SELECT rut FROM Paciente WHERE rut IS NOT NULL"
-                        ).fetchall()
-                    existing_ruts = {row[0] for row in existing}
-
-                    before_db = len(data)
-                    data = data[~data["rut"].isin(existing_ruts)]
-                    skipped = before_db - len(data)
-                    if skipped > 0:
-                        st.info(
-                            f"Se omitieron {skipped} filas porque el RUT ya existe en Paciente."
-                        )
+def _texto_no_vacio(s: pd.Series) -> pd.Series:
+    return s.notna() & s.astype(str).str.strip().ne("")
 
-                # ================================
-                # 6) Insertar SOLO columnas que existen en la tabla
-                # ================================
-                if len(data) == 0:
-                    st.warning(
-                        "No quedaron filas nuevas para importar "
-                        "(todos los RUT ya existían o los datos estaban vacíos)."
-                    )
-                    return
-
-                with contextlib.closing(get_conn()) as conn:
-                    data[present].to_sql(
-                        "Paciente",
-                        conn,
-                        if_exists="append",
-                        index=False,
-                    )
 
-                st.success(f"Se importaron {len(data[present])} filas nuevas a Paciente.")
-                st.rerun()
-
-            except Exception as e:
-                st.error(f"Error importando Pacientes: {e}")
-
-    # =====================================================================
-    #  IMPORTAR MÉDICOS 
-    # =====================================================================
-    with st.sidebar.expander("Importar Medicos.csv"):
-        up_m = st.file_uploader(
-            "Selecciona CSV de Médicos", type=["csv"], key="up_med"
+def _memoria_pico_mb():
+    """Pico de memoria residente del proceso (None donde no existe el módulo resource)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 if sys.platform != "darwin" else pico / (1024 * 1024)
+
+
+FORMATOS_FECHA = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"]
+
+
+FORMATOS_FECHA_HORA = [
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%Y-%m-%d",
+]
+
+
+def _normalizar_fecha(s: pd.Series, formatos=FORMATOS_FECHA, salida: str = "%Y-%m-%d", largo=10) -> pd.Series:
+    """
+    Texto de fecha -> `salida` (NaN si no se reconoce). Se prueba cada formato sobre la
+    columna completa: ISO primero y luego día/mes/año, sin inferir formato fila a fila.
+    """
+    txt = s.astype("string").str.strip()
+    if largo:
+        txt = txt.str.slice(0, largo)
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    for fmt in formatos:
+        falta = out.isna() & txt.notna()
+        if not falta.any():
+            break
+        out[falta] = pd.to_datetime(txt[falta], format=fmt, errors="coerce")
+    return out.dt.strftime(salida)
+
+
+def _preparar_pacientes(data: pd.DataFrame, present: list):
+    if "fecha_nacimiento" in present:
+        data["fecha_nacimiento"] = _normalizar_fecha(data["fecha_nacimiento"])
+
+    if "telefono" in present:
+        data["telefono"] = data["telefono"].str.strip()
+
+    if "prevision" in present:
+        # Solo se corrigen variantes conocidas; el dominio lo revisa _validar
+        data["prevision"] = (
+            data["prevision"]
+            .str.upper()
+            .str.strip()
+            .replace({"FONAS": "FONASA", "ISAPRES": "ISAPRE", "IS APRE": "ISAPRE"})
         )
-        if up_m is not None:
-            try:
-                raw = up_m.read()
-                if not raw:
-                    st.error("El archivo CSV de Médicos está vacío.")
-                    return
-
-                txt = raw.decode("latin1", errors="ignore")
-                lines = txt.splitlines()
-                if not lines:
-                    st.error("El archivo CSV no tiene contenido.")
-                    return
-
-                # Cabecera original (nombres de columnas tal como los exporta tu sistema)
-                header = lines[0]
-
-                filas_limpias = []
-                for l in lines[1:]:
-                    if not l.strip():
-                        continue
-                    s = l.strip()
-                    # Caso feo: toda la fila entre comillas y separada por ';'
-                    if ";" in s and s.startswith('"') and s.endswith('"'):
-                        inner = s.strip('"')
-                        partes = inner.split(";")
-                        filas_limpias.append(",".join(partes))
-                    else:
-                        # Línea ya normal con comas
-                        filas_limpias.append(s)
-
-                clean_txt = "\n".join([header] + filas_limpias)
-
-                # Leemos el CSV ya normalizado
-                data = pd.read_csv(io.StringIO(clean_txt), sep=",")
-
-                # Ver columnas reales de la tabla Medico
-                with contextlib.closing(get_conn()) as conn:
-                    cur = conn.execute("PRAGMA table_info(Medico)")
-                    db_cols = [row[1] for row in cur.fetchall()]
-
-                # Columnas posibles según tu esquema/export
-                posibles = [
-                    "id_medico",
-                    "nombre",
-                    "Apellidos",
-                    "Duracion_de_cita",
-                    "Telefono",
-                    "Rut",
-                    "Estado",
-                    "Correo_Electronico",
-                    "especialidad",
-                ]
 
-                # Solo columnas que existen en CSV y en la tabla
-                present = [c for c in posibles if c in data.columns and c in db_cols]
-                if not present:
-                    st.error(
-                        "No se detectaron columnas compatibles en el CSV de Médicos. "
-                        "Ejemplo: nombre, Apellidos, Rut, especialidad..."
+    # Sin RUT no hay paciente
+    if "rut" in present:
+        data = data[_texto_no_vacio(data["rut"])]
+        data = data.assign(rut=data["rut"].str.strip())
+    return data
+
+
+def _preparar_medicos(data: pd.DataFrame, present: list):
+    data = data.dropna(how="all", subset=present)
+    # Regla mínima: sin nombre o sin Rut, no tiene sentido crear médico
+    if "nombre" in present:
+        data = data[_texto_no_vacio(data["nombre"])]
+    if "Rut" in present:
+        data = data[_texto_no_vacio(data["Rut"])]
+        data = data.assign(Rut=data["Rut"].str.strip())
+    return data
+
+
+def _preparar_citas(data: pd.DataFrame, present: list):
+    data = data.dropna(how="all", subset=present)
+    for col in ["fecha", "hora", "id_paciente", "id_medico"]:
+        if col in present:
+            data = data[_texto_no_vacio(data[col])]
+
+    # Normalizar fecha, hora e ids (las filas que no se puedan leer se descartan)
+    if "fecha" in present:
+        data = data.assign(fecha=_normalizar_fecha(data["fecha"]))
+        data = data[data["fecha"].notna()]
+    if "hora" in present:
+        # 'H:MM', 'HH:MM' o 'HH:MM:SS' -> 'HH:MM:SS'
+        partes = data["hora"].str.extract(r"^\s*(\d{1,2}):([0-5]\d)(?::([0-5]\d))?")
+        hora = partes[0].str.zfill(2) + ":" + partes[1] + ":" + partes[2].fillna("00")
+        data = data.assign(hora=hora.where(pd.to_numeric(partes[0], errors="coerce") < 24))
+        data = data[data["hora"].notna()]
+    for col in ["id_paciente", "id_medico"]:
+        if col in present:
+            data = data.assign(**{col: pd.to_numeric(data[col], errors="coerce").astype("Int64")})
+            data = data[data[col].notna()]
+    return data
+
+
+COLUMNAS_SIGNOS = ["presion_arterial", "Temperatura", "Frecuencia_cardiaca", "peso"]
+
+
+def _renombres_ficha(db_cols: list) -> dict:
+    """Mapeo de nombres del CSV -> nombres de la tabla (la BD puede tener Anamnesis o Anamesis)."""
+    cols = {c.lower() for c in db_cols}
+    anam = "Anamesis" if "anamesis" in cols and "anamnesis" not in cols else "Anamnesis"
+    return {
+        "id_ficha": "ID_Ficha",
+        "id_paciente": "ID_paciente",
+        "paciente_id": "ID_paciente",
+        "FechaHora": "fecha_hora",
+        "fecha": "fecha_hora",
+        "Motivo_consulta": "motivo_consulta",
+        "motivo": "motivo_consulta",
+        "Anamnesis": anam,
+        "anamnesis": anam,
+        "Anamesis": anam,
+        "Observaciones": "observaciones",
+        # columnas de signos vitales (van a SignosVitales)
+        "Presion_arterial": "presion_arterial",
+        "temperatura": "Temperatura",
+        "frecuencia_cardiaca": "Frecuencia_cardiaca",
+    }
+
+
+def _preparar_fichas(data: pd.DataFrame, present: list):
+    if "fecha_hora" in present:
+        data["fecha_hora"] = _normalizar_fecha(
+            data["fecha_hora"], FORMATOS_FECHA_HORA, "%Y-%m-%d %H:%M:%S", largo=None
+        )
+    if "ID_paciente" in present:
+        data["ID_paciente"] = pd.to_numeric(data["ID_paciente"], errors="coerce").astype("Int64")
+
+    data = data.dropna(how="all", subset=present)
+    # Campos obligatorios de la ficha (los de signos vitales son opcionales)
+    for col in ["ID_paciente", "fecha_hora", "motivo_consulta", "observaciones", "Anamnesis", "Anamesis"]:
+        if col in present:
+            data = data[_texto_no_vacio(data[col])]
+    return data
+
+
+def _insertar_filas(conn, tabla: str, cols: list, reporte: dict) -> int:
+    """Inserción por defecto: todo lo que quedó en staging, en el orden del archivo."""
+    cur = conn.execute(
+        f"INSERT INTO {tabla} ({', '.join(cols)}) "
+        f"SELECT {', '.join(cols)} FROM _stg_import ORDER BY stg_id"
+    )
+    return cur.rowcount
+
+
+def _insertar_fichas(conn, tabla: str, cols: list, reporte: dict) -> int:
+    """
+    FichaMedica + SignosVitales sin recorrer filas en Python: los ID_Ficha nuevos se fijan
+    antes de insertar en la tabla temporal _fichas_import (stg_id -> ID_Ficha), un INSERT ...
+    SELECT crea las fichas con esos ID y otro inserta sus signos vitales uniendo por stg_id.
+    """
+    cols_sv = [c for c in COLUMNAS_SIGNOS if c in cols]
+    cols_ficha = [c for c in cols if c not in cols_sv]
+
+    # Por encima del máximo actual y de sqlite_sequence: AUTOINCREMENT no reutiliza ID borrados
+    ultimo = conn.execute("SELECT COALESCE(MAX(ID_Ficha), 0) FROM FichaMedica").fetchone()[0]
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'FichaMedica'").fetchone()
+        ultimo = max(ultimo, seq[0] if seq else 0)
+    conn.execute("DROP TABLE IF EXISTS temp._fichas_import")
+    conn.execute("CREATE TEMP TABLE _fichas_import (stg_id INTEGER PRIMARY KEY, id_ficha INTEGER NOT NULL)")
+    conn.execute(
+        "INSERT INTO _fichas_import SELECT stg_id, ? + ROW_NUMBER() OVER (ORDER BY stg_id) FROM _stg_import",
+        (ultimo,),
+    )
+
+    insertadas = conn.execute(
+        f"""
+        INSERT INTO {tabla} (ID_Ficha, {', '.join(cols_ficha)})
+        SELECT m.id_ficha, {', '.join('s.' + c for c in cols_ficha)}
+        FROM _stg_import s JOIN _fichas_import m ON m.stg_id = s.stg_id
+        ORDER BY s.stg_id
+        """
+    ).rowcount
+
+    if cols_sv and insertadas:
+        cur = conn.execute(
+            f"""
+            INSERT INTO SignosVitales (ID_Ficha_Medica, {', '.join(cols_sv)})
+            SELECT m.id_ficha, {', '.join('s.' + c for c in cols_sv)}
+            FROM _stg_import s JOIN _fichas_import m ON m.stg_id = s.stg_id
+            WHERE {' OR '.join('s.' + c + ' IS NOT NULL' for c in cols_sv)}
+            ORDER BY s.stg_id
+            """
+        )
+        reporte["signos_vitales"] = reporte.get("signos_vitales", 0) + cur.rowcount
+
+    return insertadas
+
+
+def _crear_staging(conn, tabla: str, cols: list, clave: list, extra: dict = None) -> None:
+    """
+    Tablas temporales del import: _stg_import recibe cada chunk (mismos tipos que la tabla
+    destino, sin restricciones) y _claves_import acumula las claves ya insertadas en este
+    archivo, para distinguir duplicados del archivo de filas que ya existían en la BD.
+    """
+    tipos = _tipos_columnas(conn, tabla)
+    tipos.update({c.lower(): t for c, t in (extra or {}).items()})
+    columnas = ", ".join(f"{c} {tipos.get(c.lower(), '')}".strip() for c in cols + list(extra or {}))
+    conn.execute("DROP TABLE IF EXISTS temp._stg_import")
+    conn.execute("DROP TABLE IF EXISTS temp._claves_import")
+    conn.execute(f"CREATE TEMP TABLE _stg_import (stg_id INTEGER PRIMARY KEY, {columnas})")
+    if clave:
+        cols_clave = ", ".join(clave)
+        conn.execute(f"CREATE INDEX temp.idx_stg_import_clave ON _stg_import({cols_clave}, stg_id)")
+        conn.execute(f"CREATE TEMP TABLE _claves_import AS SELECT {cols_clave} FROM _stg_import WHERE 0")
+        conn.execute(f"CREATE INDEX temp.idx_claves_import ON _claves_import({cols_clave})")
+
+
+def _deduplicar_staging(conn, tabla: str, clave: list, reporte: dict, contra_tabla: bool = True) -> None:
+    """
+    Dedupe en SQLite con anti-joins sobre índices; nada depende del tamaño de la BD en memoria.
+      - repetidas dentro del chunk: se conserva la última aparición,
+      - repetidas respecto de chunks anteriores del mismo archivo (_claves_import),
+      - ya existentes en la tabla destino (salvo en upsert, donde esas se comparan).
+    """
+    def misma_clave(alias: str) -> str:
+        return " AND ".join(f"{alias}.{c} = _stg_import.{c}" for c in clave)
+
+    cur = conn.execute(
+        f"""DELETE FROM _stg_import WHERE EXISTS (
+                SELECT 1 FROM _stg_import t
+                WHERE {misma_clave('t')} AND t.stg_id > _stg_import.stg_id)"""
+    )
+    duplicadas = cur.rowcount
+    cur = conn.execute(
+        f"DELETE FROM _stg_import WHERE EXISTS (SELECT 1 FROM _claves_import k WHERE {misma_clave('k')})"
+    )
+    reporte["duplicadas"] += duplicadas + cur.rowcount
+    if not contra_tabla:
+        return
+    cur = conn.execute(
+        f"DELETE FROM _stg_import WHERE EXISTS (SELECT 1 FROM {tabla} d WHERE {misma_clave('d')})"
+    )
+    reporte["existentes"] += cur.rowcount
+
+
+# =======================
+# Upsert por RUT canónico
+# =======================
+def _hash_filas(data: pd.DataFrame) -> pd.Series:
+    """Hash de contenido por fila (uint64 reinterpretado como INTEGER de SQLite)."""
+    h = pd.util.hash_pandas_object(data.astype("string"), index=False)
+    return pd.Series(h.to_numpy().view("int64"), index=data.index)
+
+
+def _upsert_staging(conn, tabla: str, spec: dict, cols: list, simular: bool, reporte: dict) -> None:
+    """
+    Clasifica el staging en nueva / cambiada / igual con SQL y, si no es simulación,
+    inserta las nuevas y actualiza solo las cambiadas. Una fila cuenta como cambiada si su
+    hash difiere del guardado; si la fila nunca se importó o se editó después del último import
+    (hash NULL: lo borra el trigger hash_*_u de db.py) se comparan columnas.
+    """
+    pk, col_rut = spec["autoincremento"], spec["clave_rut"]
+    actualizables = [c for c in cols if c != col_rut]
+    iguales = " AND ".join(f"D.{c} IS _stg_import.{c}" for c in actualizables) or "1"
+
+    conn.execute(
+        f"""UPDATE _stg_import SET id_destino = (
+                SELECT D.{pk} FROM {tabla} D
+                WHERE {sql_rut_canonico('D.' + col_rut)} = _stg_import.rut_canon)"""
+    )
+    conn.execute(
+        f"""UPDATE _stg_import SET accion = CASE
+                WHEN id_destino IS NULL THEN 'nueva'
+                WHEN EXISTS (
+                    SELECT 1 FROM {tabla} D
+                    WHERE D.{pk} = _stg_import.id_destino
+                      AND (D.hash_fila = _stg_import.hash_fila
+                           OR (D.hash_fila IS NULL AND {iguales}))
+                ) THEN 'igual'
+                ELSE 'cambiada' END"""
+    )
+    conteo = dict(conn.execute("SELECT accion, COUNT(*) FROM _stg_import GROUP BY accion").fetchall())
+    reporte["nuevas"] += conteo.get("nueva", 0)
+    reporte["cambiadas"] += conteo.get("cambiada", 0)
+    reporte["sin_cambios"] += conteo.get("igual", 0)
+    faltan = 10 - len(reporte["muestra_cambiadas"])
+    if faltan > 0:
+        reporte["muestra_cambiadas"] += [
+            r[0] for r in conn.execute(
+                f"SELECT {col_rut} FROM _stg_import WHERE accion = 'cambiada' ORDER BY stg_id LIMIT ?",
+                (faltan,),
+            )
+        ]
+    if simular:
+        return
+
+    cur = conn.execute(
+        f"INSERT INTO {tabla} ({', '.join(cols)}, hash_fila) "
+        f"SELECT {', '.join(cols)}, hash_fila FROM _stg_import WHERE accion = 'nueva' ORDER BY stg_id"
+    )
+    reporte["insertadas"] += cur.rowcount
+    if actualizables:
+        cur = conn.execute(
+            f"""UPDATE {tabla} SET ({', '.join(actualizables)}, hash_fila) = (
+                    SELECT {', '.join('s.' + c for c in actualizables)}, s.hash_fila
+                    FROM _stg_import s WHERE s.id_destino = {tabla}.{pk})
+                WHERE {pk} IN (SELECT id_destino FROM _stg_import WHERE accion = 'cambiada')"""
+        )
+        reporte["actualizadas"] += cur.rowcount
+    # Filas idénticas que aún no tenían hash: se guarda para que la próxima vez baste comparar hashes
+    conn.execute(
+        f"""UPDATE {tabla} SET hash_fila = (
+                SELECT s.hash_fila FROM _stg_import s WHERE s.id_destino = {tabla}.{pk})
+            WHERE hash_fila IS NULL
+              AND {pk} IN (SELECT id_destino FROM _stg_import WHERE accion = 'igual')"""
+    )
+
+
+# =======================
+# Validación por columnas (reglas de Validaciones y dominios de los CHECK)
+# =======================
+MAX_RECHAZOS_REPORTE = 5_000  # filas rechazadas que se guardan con detalle en el reporte
+
+
+def dominios_check(conn, tabla: str) -> dict:
+    """columna (minúsculas) -> valores permitidos, según los CHECK(col IN (...)) del esquema real."""
+    fila = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()
+    dominios = {}
+    for col, valores in re.findall(r'CHECK\s*\(\s*"?(\w+)"?\s+IN\s*\(([^)]*)\)', fila[0] if fila else "", re.I):
+        dominios[col.lower()] = [v.replace("''", "'") for v in re.findall(r"'((?:[^']|'')*)'", valores)]
+    return dominios
+
+
+def _validar(data: pd.DataFrame, original: pd.DataFrame, spec: dict, dominios: dict, reporte: dict):
+    """
+    Descarta las filas que no pasan las reglas de spec["validar"] o que tienen valores fuera
+    de dominio (el CHECK de la tabla o, si no tiene, spec["dominios"]) y las anota en
+    reporte["rechazos"] con sus motivos y valores originales. Los valores de dominio quedan
+    escritos como en el esquema ('fonasa' -> 'Fonasa'). Los vacíos no se validan.
+    """
+    fallas = {}
+    for col, validador, motivo in spec.get("validar", []):
+        if col in data.columns:
+            fallas[motivo] = _texto_no_vacio(data[col]) & ~validador(data[col])
+    for col, por_defecto in spec.get("dominios", {}).items():
+        if col not in data.columns:
+            continue
+        permitidos = dominios.get(col.lower(), por_defecto)
+        lleno = _texto_no_vacio(data[col])
+        canonico = data[col].str.strip().str.lower().map({v.lower(): v for v in permitidos})
+        fallas[f"{col} fuera de dominio ({', '.join(permitidos)})"] = lleno & canonico.isna()
+        data = data.assign(**{col: canonico.where(lleno, None)})
+    if not fallas:
+        return data
+    return _rechazar(data, original, pd.DataFrame(fallas), reporte)
+
+
+def _rechazar(data: pd.DataFrame, original: pd.DataFrame, fallas: pd.DataFrame, reporte: dict):
+    """
+    Quita de `data` las filas con alguna falla (una columna booleana por motivo) y las anota
+    en reporte["rechazos"] con sus valores de `original`, hasta MAX_RECHAZOS_REPORTE.
+    """
+    malas = fallas.any(axis=1)
+    n = int(malas.sum())
+    if not n:
+        return data
+    reporte["invalidas"] += n
+    cupo = MAX_RECHAZOS_REPORTE - len(reporte["rechazos"])
+    if cupo > 0:
+        detalle = fallas[malas].head(cupo)
+        motivos = ["; ".join(detalle.columns[f]) for f in detalle.to_numpy()]
+        valores = original.loc[detalle.index]
+        valores = valores.astype(object).where(valores.notna(), None)
+        for fila, motivo, registro in zip(detalle.index, motivos, valores.to_dict("records")):
+            reporte["rechazos"].append({"fila": int(fila) + 1, "motivos": motivo, **registro})
+    return data[~malas]
+
+
+def rechazos_csv(reporte: dict) -> bytes:
+    """Filas rechazadas como CSV: n° de fila de datos (sin contar el encabezado), motivos y valores."""
+    return pd.DataFrame(reporte["rechazos"]).to_csv(index=False).encode("utf-8-sig")
+
+
+# Especificación de cada importador: tabla destino, columnas aceptadas,
+# clave de duplicados, función de limpieza por chunk y, opcionales, cómo insertar,
+# la columna RUT que habilita el modo upsert, validaciones por columna, dominios y
+# las claves foráneas que se pueden resolver por RUT (p. ej. en un paquete .zip).
+ENTIDADES_IMPORT = {
+    "Pacientes": {
+        "tabla": "Paciente",
+        "posibles": [
+            "id_paciente", "rut", "nombre", "apellido", "fecha_nacimiento", "correo",
+            "telefono", "direccion", "alergias", "enfermedades_previas", "nacionalidad",
+            "sexo", "estado_civil", "tipo_paciente", "tipo_sangre", "prevision",
+        ],
+        "autoincremento": "id_paciente",
+        "clave": ["rut"],
+        "clave_rut": "rut",
+        "preparar": _preparar_pacientes,
+        "validar": [("rut", validar_rut_serie, "RUT inválido"), ("correo", validar_correo_serie, "correo inválido")],
+        # Se usan si la tabla no tiene CHECK (base.db guarda la previsión en mayúsculas)
+        "dominios": {
+            "tipo_paciente": ["Ambulatorio", "Urgencias", "Hospitalizado"],
+            "prevision": ["FONASA", "ISAPRE"],
+        },
+    },
+    "Medicos": {
+        "tabla": "Medico",
+        "posibles": [
+            "id_medico", "nombre", "Apellidos", "Duracion_de_cita", "Telefono",
+            "Rut", "Estado", "Correo_Electronico", "especialidad",
+        ],
+        "autoincremento": "id_medico",
+        "clave": ["Rut"],
+        "clave_rut": "Rut",
+        "preparar": _preparar_medicos,
+        "validar": [
+            ("Rut", validar_rut_serie, "RUT inválido"),
+            ("Correo_Electronico", validar_correo_serie, "correo inválido"),
+        ],
+    },
+    "Citas": {
+        "tabla": "Cita",
+        "posibles": ["id_cita", "fecha", "hora", "estado", "id_paciente", "id_medico"],
+        "autoincremento": "id_cita",
+        "clave": ["fecha", "hora", "id_paciente", "id_medico"],
+        "preparar": _preparar_citas,
+        "dominios": {"estado": ["Agendada", "Realizada", "Cancelada"]},
+        # columna id -> (columna RUT del archivo, tabla, columna RUT y PK de la tabla referenciada)
+        "referencias": {
+            "id_paciente": ("rut_paciente", "Paciente", "rut", "id_paciente"),
+            "id_medico": ("rut_medico", "Medico", "Rut", "id_medico"),
+        },
+    },
+    "FichaMedica": {
+        "tabla": "FichaMedica",
+        "posibles": [
+            "ID_Ficha", "ID_paciente", "fecha_hora", "motivo_consulta",
+            "Anamnesis", "Anamesis", "observaciones",
+        ],
+        "auxiliares": COLUMNAS_SIGNOS,
+        "renombrar": _renombres_ficha,
+        "autoincremento": "ID_Ficha",
+        "clave": ["ID_paciente", "fecha_hora"],
+        "preparar": _preparar_fichas,
+        "insertar": _insertar_fichas,
+        "referencias": {"ID_paciente": ("rut_paciente", "Paciente", "rut", "id_paciente")},
+    },
+}
+
+
+def _filas_sql(data: pd.DataFrame):
+    """Tuplas listas para executemany (NaN/NA -> None, tipos numpy -> Python), columna a columna."""
+    columnas = [
+        data[c].astype(object).where(data[c].notna(), None).tolist() for c in data.columns
+    ]
+    return list(zip(*columnas))
+
+
+def _reporte_inicial(entidad: str, modo: str, simular: bool) -> dict:
+    reporte = {
+        "entidad": entidad,
+        "modo": modo,
+        "simulacion": simular,
+        "filas_leidas": 0,
+        "insertadas": 0,
+        "omitidas": 0,      # vacías o ilegibles según la limpieza
+        "invalidas": 0,     # rechazadas por la validación (detalle en "rechazos")
+        "existentes": 0,    # la clave ya estaba en la BD
+        "duplicadas": 0,    # repetidas dentro del propio archivo
+        "fallidas": 0,      # chunks rechazados por la BD (se revierte solo ese chunk)
+        "chunks": 0,
+        "errores": [],
+        "avisos": [],
+        "rechazos": [],
+    }
+    if modo == "upsert":
+        reporte.update(nuevas=0, cambiadas=0, sin_cambios=0, actualizadas=0, muestra_cambiadas=[])
+    return reporte
+
+
+def _columnas_import(entidad: str, columnas_archivo, db_cols: list, upsert: bool, reporte: dict) -> dict:
+    """
+    A partir del encabezado decide qué columnas se importan:
+      present: columnas que se limpian y validan (incluye auxiliares y RUT de referencias),
+      refs:    columna id -> referencia por RUT que se resuelve contra la BD (ver _resolver_referencias),
+      cols_db: columnas que llegan a staging (present sin los RUT de referencia, más los id resueltos),
+      clave:   clave de duplicados (vacía si el archivo no la trae completa).
+    """
+    spec = ENTIDADES_IMPORT[entidad]
+    tabla = spec["tabla"]
+    en_tabla = {c.lower() for c in db_cols}  # SQLite no distingue mayúsculas en nombres de columna
+    present = [c for c in spec["posibles"] if c in columnas_archivo and c.lower() in en_tabla]
+    extras = [c for c in spec["posibles"] if c in columnas_archivo and c.lower() not in en_tabla]
+    if extras:
+        reporte["avisos"].append(
+            f"Estas columnas están en el CSV pero no en la tabla {tabla}; se ignorarán: " + ", ".join(extras)
+        )
+    # Nunca insertamos la PK (AUTOINCREMENT)
+    if spec["autoincremento"] in present:
+        present.remove(spec["autoincremento"])
+    # Si el archivo trae el RUT de la fila referenciada, manda sobre el id (que puede venir de otra BD)
+    refs = {
+        col_id: ref for col_id, ref in spec.get("referencias", {}).items()
+        if ref[0] in columnas_archivo and col_id.lower() in en_tabla
+    }
+    present = [c for c in present if c not in refs]
+    if not present and not refs:
+        raise ValueError(
+            f"No se detectaron columnas compatibles en el CSV de {entidad}. "
+            f"Se esperaban columnas como: {', '.join(spec['posibles'][1:5])}..."
+        )
+    if upsert and spec["clave_rut"] not in present:
+        raise ValueError(f"El modo upsert requiere la columna {spec['clave_rut']} en el CSV.")
+    cols_db = present + list(refs)
+    clave = spec["clave"] if all(c in cols_db for c in spec["clave"]) else []
+    if upsert:
+        clave = ["rut_canon"]
+    auxiliares = [c for c in spec.get("auxiliares", []) if c in columnas_archivo]
+    return {
+        "present": present + auxiliares + [ref[0] for ref in refs.values()],
+        "refs": refs,
+        "cols_db": cols_db + auxiliares,
+        "clave": clave,
+    }
+
+
+def _leer_limpio(
+    archivo, entidad: str, modo: str, dominios: dict, db_cols: list, chunksize: int, reporte: dict,
+    desde_chunk: int = 0,
+):
+    """
+    Lee `archivo` por chunks y entrega (n_chunk, columnas, data): cada chunk ya limpio y
+    validado, con los conteos en `reporte`. No toca la BD, así que también corre en otro
+    proceso (ver importar_paquete). columnas es el dict de _columnas_import.
+    """
+    spec = ENTIDADES_IMPORT[entidad]
+    upsert = modo == "upsert"
+    renombres = spec["renombrar"](db_cols) if "renombrar" in spec else {}
+    conocidas = (
+        list(spec["posibles"]) + spec.get("auxiliares", []) + [ref[0] for ref in spec.get("referencias", {}).values()]
+    )
+    por_minuscula = {c.lower(): c for c in conocidas}
+    columnas = None
+    for n_chunk, data in enumerate(leer_por_chunks(archivo, chunksize, set(conocidas) | set(renombres))):
+        if renombres:
+            data = data.rename(columns=renombres)
+        data = data.rename(columns=lambda c: c if c in conocidas else por_minuscula.get(c.lower(), c))
+        if columnas is None:
+            columnas = _columnas_import(entidad, list(data.columns), db_cols, upsert, reporte)
+            present = columnas["present"]
+        if n_chunk < desde_chunk:
+            continue  # confirmado en una ejecución anterior del job
+
+        # Índice = n° de fila de datos - 1, para ubicar los rechazos en el archivo
+        data.index = pd.RangeIndex(reporte["filas_leidas"], reporte["filas_leidas"] + len(data))
+        reporte["chunks"] += 1
+        reporte["filas_leidas"] += len(data)
+
+        original = data[present]
+        data = spec["preparar"](original.copy(), present)
+        reporte["omitidas"] += len(original) - len(data)
+        data = _validar(data, original, spec, dominios, reporte)
+        if upsert:
+            antes = len(data)
+            data = data.assign(rut_canon=canonizar_ruts_serie(data[spec["clave_rut"]]))
+            data = data[data["rut_canon"].notna()]
+            data = data.assign(hash_fila=_hash_filas(data[present]))
+            reporte["omitidas"] += antes - len(data)
+        yield n_chunk, columnas, data
+
+
+def _resolver_referencias(conn, data: pd.DataFrame, refs: dict, reporte: dict) -> pd.DataFrame:
+    """
+    Completa cada columna id de `refs` buscando el RUT (canónico) en la tabla referenciada.
+    Se consulta solo por los RUT distintos del chunk, con el índice de expresión del RUT.
+    Las filas cuyo RUT no existe en la BD se rechazan.
+    """
+    fallas = {}
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _ruts_ref (rut_canon PRIMARY KEY)")  # sin tipo: usa el índice
+    for col_id, (col_rut, tabla_ref, rut_ref, pk_ref) in refs.items():
+        canon = canonizar_ruts_serie(data[col_rut])
+        conn.execute("DELETE FROM _ruts_ref")
+        conn.executemany("INSERT INTO _ruts_ref VALUES (?)", ((r,) for r in canon.dropna().unique()))
+        ids = dict(
+            conn.execute(
+                f"""SELECT r.rut_canon, T.{pk_ref} FROM _ruts_ref r
+                    JOIN {tabla_ref} T ON {sql_rut_canonico(f'T.{rut_ref}')} = r.rut_canon"""
+            ).fetchall()
+        )
+        resuelto = canon.map(ids).astype("Int64")
+        fallas[f"{col_rut} no registrado en {tabla_ref}"] = resuelto.isna()
+        data = data.assign(**{col_id: resuelto})
+    return _rechazar(data, data.drop(columns=list(refs)), pd.DataFrame(fallas), reporte)
+
+
+def importar_csv(
+    entidad: str,
+    archivo,
+    chunksize: int = FILAS_POR_CHUNK,
+    modo: str = "agregar",
+    simular: bool = False,
+    checkpoint=None,
+    desde_chunk: int = 0,
+    reporte_previo: dict = None,
+    conn=None,
+    limpios=None,
+) -> dict:
+    """
+    Importa un CSV o Parquet de `entidad` (clave de ENTIDADES_IMPORT) por chunks de tamaño fijo.
+    Cada chunk se limpia, se carga a una tabla temporal de staging, se deduplica en SQL
+    y se inserta con INSERT ... SELECT dentro de un SAVEPOINT; todo el archivo va en una
+    sola transacción que se confirma una vez al final.
+
+    modo="upsert" (Pacientes/Médicos): la clave es el RUT canónico; las filas existentes
+    se actualizan solo si su contenido cambió. simular=True calcula el diff
+    (nuevas / cambiadas / sin cambios / rechazadas) y revierte todo al final.
+
+    Modo job (ver import_jobs.py): con `checkpoint`, cada chunk se confirma por separado junto
+    con checkpoint(conn, n_chunk, reporte), que corre dentro de su transacción; si devuelve
+    False la importación se detiene ahí. Entre chunks no queda ninguna transacción abierta:
+    BEGIN IMMEDIATE se ejecuta recién cuando el siguiente chunk ya está leído y limpio, así
+    el lock de escritura no se retiene mientras se parsea. `desde_chunk` salta los chunks ya confirmados y
+    `reporte_previo` retoma sus conteos.
+
+    Modo paquete (ver importar_paquete): con `conn` el import corre dentro de la transacción
+    ya abierta del llamador (en un SAVEPOINT, sin confirmar) y, en vez de `archivo`,
+    limpios(reporte) entrega los chunks que _leer_limpio va leyendo en otro proceso y suma
+    sus conteos a `reporte`.
+    Devuelve un reporte con conteos y métricas de rendimiento.
+    """
+    spec = ENTIDADES_IMPORT[entidad]
+    tabla = spec["tabla"]
+    upsert = modo == "upsert"
+    if upsert and "clave_rut" not in spec:
+        raise ValueError(f"El modo upsert no está disponible para {entidad}.")
+    if simular and checkpoint is not None:
+        raise ValueError("Una simulación no se puede confirmar por chunks.")
+    if conn is not None and (checkpoint is not None or simular):
+        raise ValueError("Dentro de una transacción externa la confirmación la decide el llamador.")
+    insertar = spec.get("insertar", _insertar_filas)
+    reporte = _reporte_inicial(entidad, modo, simular)
+    if reporte_previo:
+        # Al reanudar, los avisos se vuelven a generar al leer el encabezado
+        reporte.update({k: v for k, v in reporte_previo.items() if k in reporte and k != "avisos"})
+    inicio = time.perf_counter()
+
+    externa = conn is not None
+    with contextlib.nullcontext(conn) if externa else contextlib.closing(get_conn()) as conn:
+        if externa:
+            conn.execute("SAVEPOINT importar")
+        else:
+            conn.isolation_level = None  # transacción manual: se abre con el primer chunk listo
+        if limpios is None:
+            dominios = dominios_check(conn, tabla)
+            chunks = _leer_limpio(
+                archivo, entidad, modo, dominios, _columnas_tabla(tabla), chunksize, reporte, desde_chunk
+            )
+        else:
+            chunks = limpios(reporte)
+
+        def confirmar(n_chunk: int) -> bool:
+            """Modo job: confirma el chunk junto con su checkpoint. False si hay que detenerse."""
+            if checkpoint is None:
+                return True
+            seguir = checkpoint(conn, n_chunk, reporte)
+            conn.execute("COMMIT")  # el siguiente BEGIN espera a que su chunk esté leído
+            if not seguir:
+                reporte["cancelada"] = True
+            return seguir
+
+        try:
+            columnas = None
+            for n_chunk, cols_chunk, data in chunks:
+                if not externa and not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                if columnas is None:
+                    columnas = cols_chunk
+                    cols_db, clave = columnas["cols_db"], columnas["clave"]
+                    extra = {}
+                    if upsert:
+                        # rut_canon sin tipo: con afinidad TEXT SQLite no usaría el índice de expresión
+                        extra = {"rut_canon": "", "hash_fila": "INTEGER", "id_destino": "INTEGER", "accion": "TEXT"}
+                    _crear_staging(conn, tabla, cols_db, clave, extra)
+                    if upsert:
+                        conn.execute("CREATE INDEX temp.idx_stg_import_destino ON _stg_import(id_destino)")
+                    cols_stg = cols_db + (["rut_canon", "hash_fila"] if upsert else [])
+                    sql_stg = (
+                        f"INSERT INTO _stg_import ({', '.join(cols_stg)}) "
+                        f"VALUES ({', '.join('?' for _ in cols_stg)})"
                     )
-                    return
-
-                # Nunca insertamos id_medico (AUTOINCREMENT)
-                if "id_medico" in present:
-                    present.remove("id_medico")
-
-                # Nos quedamos con las columnas relevantes
-                data_sub = data[present].copy()
-
-                # Limpiar filas completamente vacías
-                data_sub = data_sub.dropna(how="all")
-
-                # Regla mínima: sin nombre o sin Rut, no tiene sentido crear médico
-                if "nombre" in data_sub.columns:
-                    data_sub = data_sub[data_sub["nombre"].astype(str).str.strip().ne("")]
-                if "Rut" in data_sub.columns:
-                    data_sub = data_sub[data_sub["Rut"].astype(str).str.strip().ne("")]
-
-                if data_sub.empty:
-                    st.warning("Después de limpiar, no quedaron filas válidas para importar.")
-                    return
-
-                # Evitar duplicados por Rut dentro del propio archivo
-                if "Rut" in data_sub.columns:
-                    data_sub = data_sub.drop_duplicates(subset=["Rut"], keep="last")
-
-                    # --- NUEVO: filtrar RUT que ya existen en la BD ---
-                    with contextlib.closing(get_conn()) as conn:
-                        existing = conn.execute(
-                            "SELECT Rut FROM Medico WHERE Rut IS NOT NULL"
-                        ).fetchall()
-                    existing_ruts = {row[0] for row in existing}
-
-                    before_db = len(data_sub)
-                    data_sub = data_sub[~data_sub["Rut"].isin(existing_ruts)]
-                    skipped = before_db - len(data_sub)
-                    if skipped > 0:
-                        st.info(
-                            f"Se omitieron {skipped} filas porque el Rut ya existe en Medico."
-                        )
 
-                if data_sub.empty:
-                    st.warning(
-                        "No quedaron filas nuevas para importar "
-                        "(todos los Rut ya existían o los datos estaban vacíos)."
+                if columnas["refs"] and not data.empty:
+                    data = _resolver_referencias(conn, data, columnas["refs"], reporte)
+                if data.empty:
+                    if not confirmar(n_chunk):
+                        break
+                    continue
+
+                previo = {k: v for k, v in reporte.items() if isinstance(v, int) and not isinstance(v, bool)}
+                conn.execute(f"SAVEPOINT chunk_{n_chunk}")
+                try:
+                    conn.execute("DELETE FROM _stg_import")
+                    conn.executemany(sql_stg, _filas_sql(data[cols_stg]))
+                    if clave:
+                        _deduplicar_staging(conn, tabla, clave, reporte, contra_tabla=not upsert)
+                    pendientes = conn.execute("SELECT COUNT(*) FROM _stg_import").fetchone()[0]
+                    if pendientes:
+                        if upsert:
+                            _upsert_staging(conn, tabla, spec, columnas["present"], simular, reporte)
+                        else:
+                            reporte["insertadas"] += insertar(conn, tabla, cols_db, reporte)
+                        if clave:
+                            conn.execute(
+                                f"INSERT INTO _claves_import SELECT {', '.join(clave)} FROM _stg_import"
+                            )
+                    conn.execute(f"RELEASE chunk_{n_chunk}")
+                except sqlite3.DatabaseError as e:
+                    conn.execute(f"ROLLBACK TO chunk_{n_chunk}")
+                    conn.execute(f"RELEASE chunk_{n_chunk}")
+                    reporte.update(previo)
+                    reporte["fallidas"] += len(data)
+                    reporte["errores"].append(f"Chunk {n_chunk + 1}: {e}")
+                if not confirmar(n_chunk):
+                    break
+
+            if externa:
+                conn.execute("RELEASE importar")
+            elif conn.in_transaction:
+                conn.execute("ROLLBACK" if simular else "COMMIT")
+        except Exception:
+            if externa:
+                conn.execute("ROLLBACK TO importar")
+                conn.execute("RELEASE importar")
+            elif conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            # Tras un break o un error el lector de pandas se libera aquí, mientras el llamador
+            # aún tiene abierto el archivo (si no, lo cerraría el recolector, ya sin archivo)
+            chunks.close()
+
+    if upsert:
+        reporte["rechazadas"] = reporte["omitidas"] + reporte["invalidas"] + reporte["fallidas"]
+    segundos = time.perf_counter() - inicio
+    reporte["segundos"] = segundos
+    reporte["filas_por_segundo"] = reporte["filas_leidas"] / segundos if segundos > 0 else 0.0
+    reporte["memoria_pico_mb"] = _memoria_pico_mb()
+    if not simular:
+        metricas.observar("sgp_import_segundos", segundos, entidad)
+        metricas.incrementar("sgp_import_filas_total", entidad, valor=reporte["filas_leidas"])
+        metricas.fijar("sgp_import_filas_por_segundo", reporte["filas_por_segundo"], entidad)
+    return reporte
+
+
+# =========================================================================
+# Importación de un paquete .zip (varias entidades en una transacción)
+# =========================================================================
+EXTENSIONES_PAQUETE = (".csv.gz", ".csv", ".parquet")
+CHUNKS_EN_COLA = 2  # chunks validados que cada proceso lector adelanta antes de esperar al escritor
+
+
+def _clave_nombre(texto: str) -> str:
+    """'Médicos_export' -> 'medicos': sin tildes, mayúsculas ni separadores."""
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+    texto = re.sub(r"[^a-z0-9]", "", texto)
+    return re.sub(r"(export|cambios)$", "", texto)
+
+
+def entidad_de_miembro(nombre: str):
+    """
+    Entidad de un archivo del paquete según su nombre: la de la exportación
+    (Pacientes_export.csv), la tabla (Paciente.csv.gz, como en el snapshot) o el nombre
+    de la entidad, en CSV, CSV gzip o Parquet. None si no corresponde a ninguna.
+    """
+    base = os.path.basename(nombre)
+    extension = next((e for e in EXTENSIONES_PAQUETE if base.lower().endswith(e)), None)
+    if extension is None or not base[: -len(extension)]:
+        return None
+    clave = _clave_nombre(base[: -len(extension)])
+    for entidad, spec in ENTIDADES_IMPORT.items():
+        if clave in (_clave_nombre(entidad), _clave_nombre(spec["tabla"])):
+            return entidad
+    return None
+
+
+def _avance_reporte(reporte: dict, enviado: dict) -> dict:
+    """Conteos y entradas de las listas de `reporte` nuevos desde el último envío (actualiza `enviado`)."""
+    avance = {}
+    for k, v in reporte.items():
+        if isinstance(v, list):
+            avance[k] = v[enviado.get(k, 0):]
+            enviado[k] = len(v)
+        elif isinstance(v, int) and not isinstance(v, bool):
+            avance[k] = v - enviado.get(k, 0)
+            enviado[k] = v
+    return avance
+
+
+def _parsear_miembro(ruta_zip: str, miembro: str, entidad: str, modo: str, dominios: dict, db_cols: list,
+                     chunksize: int, cola) -> None:
+    """
+    Corre en un proceso aparte: lee y valida un archivo del paquete con _leer_limpio, sin
+    descomprimirlo entero, y pone cada chunk limpio en `cola` con el avance de su reporte.
+    La cola es acotada: si el escritor va atrasado, el proceso espera. La BD no se toca aquí.
+    Mensajes: ("chunk", chunk, avance), ("fin", None, avance) o ("error", excepción, None).
+    """
+    try:
+        reporte, enviado = _reporte_inicial(entidad, modo, False), {}
+        with contextlib.ExitStack() as pila:
+            zf = pila.enter_context(zipfile.ZipFile(ruta_zip))
+            archivo = pila.enter_context(zf.open(miembro))
+            if miembro.lower().endswith(".gz"):
+                archivo = pila.enter_context(gzip.GzipFile(fileobj=archivo))
+            elif miembro.lower().endswith(".parquet"):
+                # Parquet se lee desde el final (metadatos): se copia a disco en vez de a memoria
+                copia = pila.enter_context(tempfile.TemporaryFile())
+                shutil.copyfileobj(archivo, copia, 1024 * 1024)
+                copia.seek(0)
+                archivo = copia
+            for chunk in _leer_limpio(archivo, entidad, modo, dominios, db_cols, chunksize, reporte):
+                cola.put(("chunk", chunk, _avance_reporte(reporte, enviado)))
+        cola.put(("fin", None, _avance_reporte(reporte, enviado)))
+    except Exception as e:
+        cola.put(("error", e, None))
+
+
+def _recibir_chunks(cola, proceso, miembro: str, reporte: dict):
+    """Chunks que `proceso` (_parsear_miembro) deja en `cola`; suma a `reporte` el avance de cada uno."""
+    while True:
+        try:
+            tipo, contenido, avance = cola.get(timeout=1)
+        except queue.Empty:
+            if not proceso.is_alive():
+                raise RuntimeError(f"{miembro}: el proceso de lectura terminó antes de tiempo "
+                                   f"(código {proceso.exitcode}).")
+            continue
+        if tipo == "error":
+            if isinstance(contenido, ValueError):
+                raise ValueError(f"{miembro}: {contenido}") from contenido
+            raise contenido
+        for k, v in avance.items():
+            if isinstance(v, list):
+                reporte[k].extend(v)
+            else:
+                reporte[k] += v
+        del reporte["rechazos"][MAX_RECHAZOS_REPORTE:]
+        if tipo == "fin":
+            return
+        yield contenido
+
+
+def _detener_lectores(lectores: dict) -> None:
+    for proceso, _ in lectores.values():
+        if proceso.is_alive():  # simulación, error o cancelación: lo que quede por leer ya no sirve
+            proceso.terminate()
+        proceso.join()
+
+
+def importar_paquete(archivo_zip, modo: str = "agregar", simular: bool = False, procesos: int = None,
+                     chunksize: int = FILAS_POR_CHUNK) -> dict:
+    """
+    Importa un .zip con archivos de varias entidades (ver entidad_de_miembro). Cada archivo
+    se lee y valida en un proceso aparte, en paralelo con las inserciones, que van en el orden
+    de ENTIDADES_IMPORT (pacientes y médicos antes que citas y fichas) dentro de una sola
+    transacción, resolviendo rut_paciente / rut_medico contra lo ya insertado. Si algo
+    falla no queda nada escrito; simular=True revierte todo al final.
+
+    modo="upsert" se aplica a las entidades que lo admiten; las demás se agregan.
+    Cada proceso adelanta a lo más CHUNKS_EN_COLA chunks validados mientras espera su turno,
+    así la memoria depende de chunksize y no del tamaño de los archivos.
+    Devuelve {"reportes": {entidad: reporte}, "avisos": [...], "segundos": ...}.
+    """
+    inicio = time.perf_counter()
+    resultado = {"reportes": {}, "avisos": []}
+    with contextlib.ExitStack() as pila:
+        if isinstance(archivo_zip, (str, os.PathLike)):
+            ruta = os.fspath(archivo_zip)
+        else:
+            # Los procesos abren el zip por ruta: se copia la subida a un archivo temporal
+            temporal = pila.enter_context(tempfile.NamedTemporaryFile(suffix=".zip"))
+            archivo_zip.seek(0)
+            shutil.copyfileobj(archivo_zip, temporal, 1024 * 1024)
+            temporal.flush()
+            ruta = temporal.name
+
+        with zipfile.ZipFile(ruta) as zf:
+            nombres = [i.filename for i in zf.infolist() if not i.is_dir()]
+        miembros = {}
+        for nombre in nombres:
+            entidad = entidad_de_miembro(nombre)
+            if entidad is None:
+                resultado["avisos"].append(f"{nombre}: no corresponde a ninguna entidad; se ignoró.")
+            elif entidad in miembros:
+                resultado["avisos"].append(f"{nombre}: ya hay un archivo de {entidad} ({miembros[entidad]}); se ignoró.")
+            else:
+                miembros[entidad] = nombre
+        if not miembros:
+            raise ValueError("El paquete no contiene archivos de Pacientes, Médicos, Citas ni FichaMedica.")
+
+        with contextlib.closing(get_conn()) as conn:
+            modos = {e: modo if modo != "upsert" or "clave_rut" in ENTIDADES_IMPORT[e] else "agregar" for e in miembros}
+            orden = [e for e in ENTIDADES_IMPORT if e in miembros]  # orden de las claves foráneas
+            simultaneos = procesos or min(len(miembros), os.cpu_count() or 1)
+            # spawn: la app corre en hilos (Streamlit, import_jobs) y un fork los copiaría a medias
+            contexto = multiprocessing.get_context("spawn")
+            lectores = {}
+            pila.callback(_detener_lectores, lectores)
+
+            def lanzar_hasta(n: int) -> None:
+                """Inicia la lectura de las primeras `n` entidades del orden (las que falten)."""
+                for entidad in orden[:n]:
+                    if entidad in lectores:
+                        continue
+                    tabla = ENTIDADES_IMPORT[entidad]["tabla"]
+                    cola = contexto.Queue(CHUNKS_EN_COLA)
+                    proceso = contexto.Process(
+                        target=_parsear_miembro,
+                        args=(ruta, miembros[entidad], entidad, modos[entidad], dominios_check(conn, tabla),
+                              _columnas_tabla(tabla), chunksize, cola),
+                        daemon=True,
                     )
-                    return
-
-                # Insertar en la tabla Medico
-                with contextlib.closing(get_conn()) as conn:
-                    data_sub.to_sql("Medico", conn, if_exists="append", index=False)
-
-                st.success(f"Se importaron {len(data_sub)} médicos nuevos.")
-                st.rerun()
-
-            except Exception as e:
-                st.error(f"Error importando Médicos: {e}")
+                    proceso.start()
+                    lectores[entidad] = (proceso, cola)
 
-    # =====================================================================
-    #  IMPORTAR CITAS 
-    # =====================================================================
-    with st.sidebar.expander("Importar Citas.csv"):
-        up_c = st.file_uploader(
-            "Selecciona CSV de Citas", type=["csv"], key="up_cit"
-        )
-        if up_c is not None:
+            conn.isolation_level = None  # transacción manual
             try:
-                raw = up_c.read()
-                if not raw:
-                    st.error("El archivo CSV de Citas está vacío.")
-                    return
-
-                txt = raw.decode("latin1", errors="ignore")
-                lines = txt.splitlines()
-                if not lines:
-                    st.error("El archivo CSV no tiene contenido.")
-                    return
-
-                # Detectamos formato de las filas de datos
-                line1 = lines[1] if len(lines) > 1 else ""
-                usa_punto_coma = line1.count(";") > 0 and line1.count(";") >= line1.count(",")
-
-                if usa_punto_coma:
-                    # CASO 1: filas como "101;2025-11-20;10:00:00;..."
-                    header = lines[0]
-                    header_cols = header.split(",")  # nombres originales
-
-                    data_lines = [
-                        l.strip().strip('"')
-                        for l in lines[1:]
-                        if l.strip()
-                    ]
-
-                    clean_txt = ";".join(header_cols) + "\n" + "\n".join(data_lines)
-                    data = pd.read_csv(io.StringIO(clean_txt), sep=";", engine="python")
-                else:
-                    # CASO 2: CSV ya limpio con comas normales
-                    data = pd.read_csv(io.StringIO(txt), sep=",")
-
-                # Columnas posibles según tu export
-                posibles = [
-                    "id_cita",
-                    "fecha",
-                    "hora",
-                    "estado",
-                    "id_paciente",
-                    "id_medico",
-                    "rut_paciente",
-                    "nombre_paciente",
-                    "nombre_medico",
-                    "especialidad_medico",
-                ]
-
-                # Columnas reales de la tabla Cita
-                with contextlib.closing(get_conn()) as conn:
-                    cur = conn.execute("PRAGMA table_info(Cita)")
-                    db_cols = [row[1] for row in cur.fetchall()]
-
-                present = [c for c in posibles if c in data.columns and c in db_cols]
-                if not present:
-                    st.error(
-                        "No se detectaron columnas compatibles en el CSV de Citas. "
-                        "Se esperaban al menos: fecha, hora, id_paciente, id_medico."
+                for i, entidad in enumerate(orden):
+                    # Hay a lo más `simultaneos` lectores activos: esta entidad y las siguientes
+                    lanzar_hasta(i + simultaneos)
+                    proceso, cola = lectores[entidad]
+                    if not conn.in_transaction:
+                        # El lock de escritura se toma recién cuando el primer chunk está listo
+                        conn.execute("BEGIN IMMEDIATE")
+                    reporte = importar_csv(
+                        entidad, None, modo=modos[entidad], conn=conn,
+                        limpios=functools.partial(_recibir_chunks, cola, proceso, miembros[entidad]),
                     )
-                    return
-
-                # Nunca insertamos id_cita (AUTOINCREMENT)
-                if "id_cita" in present:
-                    present.remove("id_cita")
+                    reporte["archivo"] = miembros[entidad]
+                    reporte["simulacion"] = simular
+                    resultado["reportes"][entidad] = reporte
+                conn.execute("ROLLBACK" if simular else "COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def _mostrar_reporte(reporte: dict, key: str = None) -> None:
+    """Resume el reporte de importación en el sidebar."""
+    for aviso in reporte["avisos"]:
+        st.info(aviso)
+    if reporte["omitidas"]:
+        st.warning(f"Se omitieron {reporte['omitidas']} filas vacías o ilegibles.")
+    if reporte["invalidas"]:
+        st.warning(f"Se rechazaron {reporte['invalidas']} filas que no pasaron la validación.")
+        st.download_button(
+            "Descargar filas rechazadas (.csv)",
+            data=rechazos_csv(reporte),
+            file_name=f"rechazos_{reporte['entidad']}.csv",
+            mime="text/csv",
+            key=key or f"rechazos_{reporte['entidad']}",
+        )
+        if reporte["invalidas"] > len(reporte["rechazos"]):
+            st.caption(f"El reporte incluye las primeras {len(reporte['rechazos']):,} filas rechazadas.")
+    if reporte["existentes"]:
+        st.info(f"Se omitieron {reporte['existentes']} filas porque ya existían en la BD.")
+    if reporte["duplicadas"]:
+        st.info(f"Se omitieron {reporte['duplicadas']} filas repetidas dentro del archivo.")
+    for err in reporte["errores"]:
+        st.error(err)
+    memoria = (
+        f" • pico {reporte['memoria_pico_mb']:,.0f} MB" if reporte["memoria_pico_mb"] is not None else ""
+    )
+    st.caption(
+        f"{reporte['filas_leidas']:,} filas en {reporte['chunks']} chunks • "
+        f"{reporte['segundos']:.2f} s • {reporte['filas_por_segundo']:,.0f} filas/s{memoria}"
+    )
+
+
+def _mostrar_diff(reporte: dict) -> None:
+    """Diff del modo upsert (simulado o aplicado)."""
+    st.markdown(
+        f"- Nuevas: **{reporte['nuevas']}**\n"
+        f"- Cambiadas: **{reporte['cambiadas']}**\n"
+        f"- Sin cambios: **{reporte['sin_cambios']}**\n"
+        f"- Rechazadas: **{reporte['rechazadas']}**"
+    )
+    if reporte["muestra_cambiadas"]:
+        st.caption("Algunos RUT con cambios: " + ", ".join(str(r) for r in reporte["muestra_cambiadas"]))
+    if reporte["simulacion"]:
+        st.info("Simulación: no se escribió nada en la BD.")
+    else:
+        st.success(
+            f"Se insertaron {reporte['insertadas']} y se actualizaron {reporte['actualizadas']} filas."
+        )
 
-                data_sub = data[present].copy()
-                data_sub = data_sub.dropna(how="all")
 
-                # Campos críticos
-                obligatorias = [c for c in ["fecha", "hora", "id_paciente", "id_medico"] if c in data_sub.columns]
-                for col in obligatorias:
-                    data_sub = data_sub[data_sub[col].astype(str).str.strip().ne("")]
+def sidebar_exports_imports():
+    import import_jobs  # importa este módulo: se carga aquí para evitar el ciclo
 
-                if data_sub.empty:
-                    st.warning("Después de limpiar, no quedaron filas válidas para importar.")
-                    return
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("📤 Exportar")
 
-                # Normalizar fecha y hora
-                if "fecha" in data_sub.columns:
-                    data_sub["fecha"] = (
-                        pd.to_datetime(data_sub["fecha"], errors="coerce", dayfirst=True)
-                        .dt.date.astype(str)
-                    )
-                if "hora" in data_sub.columns:
-                    data_sub["hora"] = (
-                        pd.to_datetime(data_sub["hora"], errors="coerce")
-                        .dt.time.astype(str)
-                    )
+    formatos = ["CSV", "CSV (gzip)"] + (["Parquet"] if pq is not None else [])
+    formato = st.sidebar.selectbox("Formato de exportación", formatos, key="export_formato")
+    extension, mime = {
+        "CSV": (".csv", "text/csv"),
+        "CSV (gzip)": (".csv.gz", "application/gzip"),
+        "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    }[formato]
 
-                if "fecha" in data_sub.columns:
-                    data_sub = data_sub[data_sub["fecha"].astype(str).str.strip().ne("NaT")]
-                if "hora" in data_sub.columns:
-                    data_sub = data_sub[data_sub["hora"].astype(str).str.strip().ne("NaT")]
-
-                if data_sub.empty:
-                    st.warning("No quedaron filas válidas después de normalizar fecha y hora.")
-                    return
-
-                # Evitar duplicados dentro del propio archivo
-                subset_dup = [c for c in ["fecha", "hora", "id_paciente", "id_medico"] if c in data_sub.columns]
-                if subset_dup:
-                    data_sub = data_sub.drop_duplicates(subset=subset_dup, keep="last")
-
-                # Evitar duplicados contra la BD
-                if all(c in data_sub.columns for c in ["fecha", "hora", "id_paciente", "id_medico"]):
-                    with contextlib.closing(get_conn()) as conn:
-                        existing = conn.execute(
-                            "SELECT fecha, hora, id_paciente, id_medico FROM Cita"
-                        ).fetchall()
-                    existing_keys = {
-                        f"{f}|{h}|{pid}|{mid}"
-                        for (f, h, pid, mid) in existing
-                    }
-
-                    def make_key(row):
-                        return f"{row['fecha']}|{row['hora']}|{row['id_paciente']}|{row['id_medico']}"
-
-                    before_db = len(data_sub)
-                    data_sub = data_sub[~data_sub.apply(make_key, axis=1).isin(existing_keys)]
-                    skipped = before_db - len(data_sub)
-                    if skipped > 0:
-                        st.info(f"Se omitieron {skipped} citas porque ya existían en la BD.")
-
-                if data_sub.empty:
-                    st.warning(
-                        "No quedaron citas nuevas para importar "
-                        "(todas ya existían o los datos estaban vacíos)."
+    # =========================================================================
+    # EXPORTAR PACIENTES / MÉDICOS / CITAS / FICHA MÉDICA
+    # =========================================================================
+    # Se exporta al pedirlo (como el snapshot): antes cada rerun exportaba las cuatro tablas
+    # completas solo para tener listos los botones de descarga.
+    for nombre, exp in EXPORTACIONES.items():
+        if not st.sidebar.button(f"Exportar {nombre}{extension}", key=f"export_{nombre}"):
+            continue
+        try:
+            if formato == "Parquet":
+                archivo, stats = exportar_parquet(exp["sql"])
+            else:
+                archivo, stats = exportar_csv(exp["sql"], comprimir=formato == "CSV (gzip)")
+            with archivo:
+                st.sidebar.download_button(
+                    f"Descargar {nombre}{extension}",
+                    # download_button necesita bytes: es la única copia completa en memoria
+                    data=archivo.read(),
+                    file_name=exp["archivo"].replace(".csv", extension),
+                    mime=mime,
+                )
+            st.sidebar.caption(
+                f"{stats['filas']:,} filas • {stats['filas_por_segundo']:,.0f} filas/s"
+            )
+        except Exception as ex:
+            st.sidebar.caption(f"{nombre} (export): {ex}")
+
+    # Snapshot consistente de toda la BD (una sola transacción de lectura)
+    if st.sidebar.button("Generar snapshot completo (.zip)", key="export_snapshot"):
+        try:
+            archivo, manifiesto = exportar_snapshot()
+            with archivo:
+                st.sidebar.download_button(
+                    "Descargar snapshot",
+                    data=archivo.read(),
+                    file_name=f"snapshot_{manifiesto['creado'].replace(':', '').replace('-', '')}.zip",
+                    mime="application/zip",
+                )
+            exportados = [o for o in manifiesto["objetos"] if "error" not in o]
+            st.sidebar.caption(
+                f"{len(exportados)} tablas/vistas • {sum(o['filas'] for o in exportados):,} filas • "
+                f"{manifiesto['segundos']:.2f} s"
+            )
+            omitidas = [o["nombre"] for o in manifiesto["objetos"] if "error" in o]
+            if omitidas:
+                st.sidebar.caption("Vistas omitidas (no se pudieron consultar): " + ", ".join(omitidas))
+        except Exception as ex:
+            st.sidebar.error(f"Snapshot: {ex}")
+
+    # Exportación incremental (cambios desde un watermark)
+    with st.sidebar.expander("Exportar cambios (incremental)"):
+        st.caption(f"Watermark actual: {cdc.watermark_actual()}")
+        desde = st.number_input("Cambios desde (seq)", min_value=0, value=0, step=1, key="cdc_desde")
+        if st.button("Exportar cambios (.zip)", key="cdc_exportar"):
+            try:
+                archivo, manifiesto = exportar_cambios(int(desde))
+                with archivo:
+                    st.download_button(
+                        "Descargar cambios",
+                        data=archivo.read(),
+                        file_name=f"cambios_{manifiesto['desde']}_{manifiesto['hasta']}.zip",
+                        mime="application/zip",
                     )
-                    return
+                total = sum(o.get("filas", 0) for o in manifiesto["objetos"])
+                st.caption(f"{total:,} filas cambiadas • próximo watermark: {manifiesto['hasta']}")
+                if "aviso" in manifiesto:
+                    st.warning(manifiesto["aviso"])
+            except Exception as ex:
+                st.error(f"Cambios: {ex}")
 
-                with contextlib.closing(get_conn()) as conn:
-                    data_sub.to_sql("Cita", conn, if_exists="append", index=False)
-
-                st.success(f"Se importaron {len(data_sub)} citas nuevas.")
-                st.rerun()
-
-            except Exception as e:
-                st.error(f"Error importando Citas: {e}")
+    # =====================================================================
+    #  IMPORTAR CSV
+    # =====================================================================
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("📥 Importar CSV / Parquet")
+    tipos_import = ["csv"] + (["parquet"] if pq is not None else [])
 
+    # =====================================================================
+    #  IMPORTAR PACIENTES / MÉDICOS / CITAS (por chunks, una transacción)
+    # =====================================================================
+    importadores = [
+        ("Pacientes", "Importar Pacientes.csv", "Selecciona CSV de Pacientes", "up_pac"),
+        ("Medicos", "Importar Medicos.csv", "Selecciona CSV de Médicos", "up_med"),
+        ("Citas", "Importar Citas.csv", "Selecciona CSV de Citas", "up_cit"),
+        ("FichaMedica", "Importar FichaMedica.csv", "Selecciona CSV de Ficha Médica", "up_ficha"),
+    ]
+    for entidad, titulo, etiqueta, key in importadores:
+        with st.sidebar.expander(titulo):
+            modo, simular = "agregar", False
+            if "clave_rut" in ENTIDADES_IMPORT[entidad]:
+                modo = st.radio(
+                    "Modo",
+                    ["agregar", "upsert"],
+                    format_func=lambda m: "Solo agregar nuevos" if m == "agregar" else "Actualizar por RUT (upsert)",
+                    key=f"{key}_modo",
+                )
+                if modo == "upsert":
+                    simular = st.checkbox("Simular (solo mostrar diferencias)", value=True, key=f"{key}_simular")
+            # Archivos grandes: en un hilo aparte, confirmando y registrando cada chunk
+            fondo = not simular and st.checkbox("Ejecutar en segundo plano", key=f"{key}_fondo")
+            up = st.file_uploader(etiqueta, type=tipos_import, key=key)
+            if up is not None:
+                try:
+                    if up.size == 0:
+                        st.error("El archivo está vacío.")
+                        continue
+                    if fondo:
+                        if st.button("Iniciar importación", key=f"{key}_iniciar"):
+                            job_id = import_jobs.crear_job(entidad, up, up.name, modo)
+                            st.success(f"Importación #{job_id} en cola; el progreso se ve más abajo.")
+                        continue
+                    reporte = importar_csv(entidad, up, modo=modo, simular=simular)
+                    _mostrar_reporte(reporte)
+                    if modo == "upsert":
+                        _mostrar_diff(reporte)
+                    elif reporte["insertadas"]:
+                        st.success(f"Se importaron {reporte['insertadas']} filas nuevas a {ENTIDADES_IMPORT[entidad]['tabla']}.")
+                        if "signos_vitales" in reporte:
+                            st.caption(f"Se registraron signos vitales para {reporte['signos_vitales']} fichas.")
+                    else:
+                        st.warning(
+                            "No quedaron filas nuevas para importar "
+                            "(todas ya existían o los datos estaban vacíos)."
+                        )
+                except Exception as e:
+                    st.error(f"Error importando {entidad}: {e}")
 
-   # =====================================================================
-    #  IMPORTAR FICHA MÉDICA 
     # =====================================================================
-    with st.sidebar.expander("Importar FichaMedica.csv"):
-        up_f = st.file_uploader(
-            "Selecciona CSV de Ficha Médica", type=["csv"], key="up_ficha"
+    #  IMPORTAR PAQUETE (.zip con varias entidades, una transacción)
+    # =====================================================================
+    with st.sidebar.expander("Importar paquete (.zip)"):
+        st.caption(
+            "Un .zip con los archivos de Pacientes, Médicos, Citas y/o FichaMedica (CSV, CSV gzip o "
+            "Parquet, con los nombres de la exportación). Las citas y fichas se enlazan por "
+            "rut_paciente / rut_medico. Si algo falla, no se guarda nada."
         )
-        if up_f is not None:
+        modo = st.radio(
+            "Modo",
+            ["agregar", "upsert"],
+            format_func=lambda m: "Solo agregar nuevos" if m == "agregar" else "Actualizar pacientes y médicos por RUT",
+            key="up_zip_modo",
+        )
+        simular = st.checkbox("Simular (revertir al final)", key="up_zip_simular")
+        up = st.file_uploader("Selecciona el paquete", type=["zip"], key="up_zip")
+        if up is not None and st.button("Importar paquete", key="up_zip_importar"):
             try:
-                raw = up_f.read()
-                if not raw:
-                    st.error("El archivo CSV de Ficha Médica está vacío.")
-                    return
-
-                txt = raw.decode("latin1", errors="ignore")
-                lines = txt.splitlines()
-                if not lines:
-                    st.error("El archivo CSV no tiene contenido.")
-                    return
-
-                # Detectar si las filas vienen con ';' (CSV “roto”) o con comas normales
-                line1 = lines[1] if len(lines) > 1 else ""
-                usa_punto_coma = line1.count(";") > 0 and line1.count(";") >= line1.count(",")
-
-                if usa_punto_coma:
-                    # CASO 1: filas tipo "1;2025-11-20 10:00;Dolor..."
-                    header = lines[0]
-                    header_cols = header.split(",")  # nombres originales del export
-
-                    data_lines = [
-                        l.strip().strip('"')
-                        for l in lines[1:]
-                        if l.strip()
-                    ]
-
-                    clean_txt = ";".join(header_cols) + "\n" + "\n".join(data_lines)
-                    data = pd.read_csv(io.StringIO(clean_txt), sep=";", engine="python")
-                else:
-                    # CASO 2: CSV ya limpio con comas
-                    data = pd.read_csv(io.StringIO(txt), sep=",")
-
-                # --- Consultar esquema real de FichaMedica ---
-                with contextlib.closing(get_conn()) as conn:
-                    cur = conn.execute("PRAGMA table_info(FichaMedica)")
-                    db_cols = [row[1] for row in cur.fetchall()]
-
-                # Determinar qué columna usar para anamnesis en la BD
-                anam_col_db = None
-                if "Anamnesis" in db_cols:
-                    anam_col_db = "Anamnesis"
-                elif "Anamesis" in db_cols:
-                    anam_col_db = "Anamesis"
-
-                # Mapeo de nombres del CSV -> nombres de la tabla
-                rename_map = {
-                    "ID_Ficha": "ID_Ficha",
-                    "id_ficha": "ID_Ficha",
-                    "ID_paciente": "ID_paciente",
-                    "id_paciente": "ID_paciente",
-                    "paciente_id": "ID_paciente",
-                    "fecha_hora": "fecha_hora",
-                    "FechaHora": "fecha_hora",
-                    "fecha": "fecha_hora",
-                    "motivo_consulta": "motivo_consulta",
-                    "Motivo_consulta": "motivo_consulta",
-                    "motivo": "motivo_consulta",
-                    "Anamnesis": anam_col_db or "Anamnesis",
-                    "anamnesis": anam_col_db or "Anamnesis",
-                    "Anamesis": anam_col_db or "Anamnesis",
-                    "observaciones": "observaciones",
-                    "Observaciones": "observaciones",
-                    # columnas de signos vitales (se usan para otra tabla)
-                    "presion_arterial": "presion_arterial",
-                    "Presion_arterial": "presion_arterial",
-                    "Temperatura": "Temperatura",
-                    "temperatura": "Temperatura",
-                    "Frecuencia_cardiaca": "Frecuencia_cardiaca",
-                    "frecuencia_cardiaca": "Frecuencia_cardiaca",
-                    "peso": "peso",
-                    # joins que podríamos ignorar
-                    "rut_paciente": "rut_paciente",
-                    "nombre_paciente": "nombre_paciente",
-                }
-
-                cols_presentes = {
-                    c: rename_map[c]
-                    for c in data.columns
-                    if c in rename_map and rename_map[c] is not None
-                }
-                data = data.rename(columns=cols_presentes)
-
-                # Columnas posibles ligadas a FichaMedica
-                posibles_ficha = [
-                    "ID_Ficha",
-                    "ID_paciente",
-                    "fecha_hora",
-                    "motivo_consulta",
-                    "observaciones",
-                ]
-                if anam_col_db:
-                    posibles_ficha.append(anam_col_db)
-
-                # Columnas de signos vitales si vienen en el CSV
-                posibles_sv = [
-                    "presion_arterial",
-                    "Temperatura",
-                    "Frecuencia_cardiaca",
-                    "peso",
-                ]
-
-                # Solo columnas de FichaMedica que están en CSV y en la tabla
-                present_ficha = [c for c in posibles_ficha if c in data.columns and c in db_cols]
-
-                if not present_ficha:
-                    st.error(
-                        "No se detectaron columnas compatibles en el CSV de Ficha Médica. "
-                        "Se esperaban al menos ID_paciente, fecha_hora, motivo_consulta, anamnesis, observaciones."
-                    )
-                    return
-
-                # Nunca insertamos ID_Ficha (AUTOINCREMENT)
-                if "ID_Ficha" in present_ficha:
-                    present_ficha.remove("ID_Ficha")
-
-                # Campos obligatorios
-                requeridas_base = ["ID_paciente", "fecha_hora", "motivo_consulta", "observaciones"]
-                if anam_col_db:
-                    requeridas_base.append(anam_col_db)
-
-                requeridas = [c for c in requeridas_base if c in present_ficha]
-
-                # Validar que las requeridas existan en CSV
-                faltantes = [c for c in requeridas if c not in data.columns]
-                if faltantes:
-                    st.error(
-                        f"Faltan columnas obligatorias en el CSV de Ficha Médica: {faltantes}"
-                    )
-                    return
-
-                # Sub-DF de fichas, conservando también las columnas de signos vitales si están
-                columnas_usar = present_ficha + [c for c in posibles_sv if c in data.columns]
-                data_sub = data[columnas_usar].copy()
-
-                # Normalizar fecha_hora
-                if "fecha_hora" in data_sub.columns:
-                    data_sub["fecha_hora"] = pd.to_datetime(
-                        data_sub["fecha_hora"], errors="coerce"
-                    ).dt.strftime("%Y-%m-%d %H:%M:%S")
-
-                # Limpiar filas completamente vacías
-                data_sub = data_sub.dropna(how="all")
-
-                # Validar que las columnas requeridas no estén vacías
-                for col in requeridas:
-                    data_sub = data_sub[data_sub[col].astype(str).str.strip().ne("")]
-
-                if data_sub.empty:
-                    st.warning("Después de limpiar, no quedaron filas válidas para importar Ficha Médica.")
-                    return
-
-                # Evitar duplicados por (ID_paciente, fecha_hora) contra la BD
-                if "ID_paciente" in data_sub.columns and "fecha_hora" in data_sub.columns:
-                    with contextlib.closing(get_conn()) as conn:
-                        existing = conn.execute(
-                            "SELECT ID_paciente, fecha_hora FROM FichaMedica"
-                        ).fetchall()
-                    existing_keys = {f"{pid}|{fh}" for (pid, fh) in existing}
-
-                    def make_key(row):
-                        return f"{row['ID_paciente']}|{row['fecha_hora']}"
-
-                    before_db = len(data_sub)
-                    data_sub = data_sub[~data_sub.apply(make_key, axis=1).isin(existing_keys)]
-                    skipped = before_db - len(data_sub)
-                    if skipped > 0:
-                        st.info(
-                            f"Se omitieron {skipped} fichas porque ya existían en la BD "
-                            "(misma combinación ID_paciente + fecha_hora)."
-                        )
-
-                if data_sub.empty:
-                    st.warning(
-                        "No quedaron fichas nuevas para importar "
-                        "(todas ya existían o los datos estaban vacíos)."
-                    )
-                    return
-
-                # ========== INSERT MANUAL: FichaMedica + SignosVitales ==========
-                inserted_fichas = 0
-                inserted_sv = 0
-
-                with contextlib.closing(get_conn()) as conn:
-                    cur = conn.cursor()
-
-                    for _, row in data_sub.iterrows():
-                        # Campos de ficha
-                        id_pac = row["ID_paciente"]
-                        fh = row["fecha_hora"]
-                        mot = row["motivo_consulta"]
-                        obs = row.get("observaciones", None)
-                        anam_val = None
-                        if anam_col_db and anam_col_db in row:
-                            anam_val = row[anam_col_db]
-
-                        cur.execute(
-                            f"""
-                            INSERT INTO FichaMedica
-                                (ID_paciente, fecha_hora, motivo_consulta, {anam_col_db if anam_col_db else 'Anamnesis'}, observaciones)
-                            VALUES (?, ?, ?, ?, ?)
-                            """,
-                            (
-                                id_pac,
-                                fh,
-                                mot,
-                                anam_val,
-                                obs,
-                            ),
-                        )
-                        ficha_id = cur.lastrowid
-                        inserted_fichas += 1
-
-                        # Campos de signos vitales (si existen en el CSV)
-                        pres = row.get("presion_arterial", None) if "presion_arterial" in row else None
-                        temp = row.get("Temperatura", None) if "Temperatura" in row else None
-                        fc = row.get("Frecuencia_cardiaca", None) if "Frecuencia_cardiaca" in row else None
-                        peso_val = row.get("peso", None) if "peso" in row else None
-
-                        # Si viene al menos un dato de signos vitales, insertamos en SignosVitales
-                        if not (
-                            (pd.isna(pres) if 'presion_arterial' in row else True)
-                            and (pd.isna(temp) if 'Temperatura' in row else True)
-                            and (pd.isna(fc) if 'Frecuencia_cardiaca' in row else True)
-                            and (pd.isna(peso_val) if 'peso' in row else True)
-                        ):
-                            cur.execute(
-                                """
-                                INSERT INTO SignosVitales
-                                    (ID_Ficha_Medica, presion_arterial, Temperatura, Frecuencia_cardiaca, peso)
-                                VALUES (?, ?, ?, ?, ?)
-                                """,
-                                (
-                                    ficha_id,
-                                    pres,
-                                    temp,
-                                    fc,
-                                    peso_val,
-                                ),
-                            )
-                            inserted_sv += 1
-
-                    conn.commit()
-
-                st.success(
-                    f"Se importaron {inserted_fichas} fichas nuevas a FichaMedica. "
-                    f"Se registraron signos vitales para {inserted_sv} fichas."
-                )
-                st.rerun()
-
+                resultado = importar_paquete(up, modo=modo, simular=simular)
+                for aviso in resultado["avisos"]:
+                    st.info(aviso)
+                for entidad, reporte in resultado["reportes"].items():
+                    st.markdown(f"**{entidad}** · {reporte['archivo']}")
+                    _mostrar_reporte(reporte, key=f"up_zip_rechazos_{entidad}")
+                    if reporte["modo"] == "upsert":
+                        _mostrar_diff(reporte)
+                    else:
+                        st.success(f"{reporte['insertadas']} filas nuevas en {ENTIDADES_IMPORT[entidad]['tabla']}.")
+                if simular:
+                    st.info("Simulación: no se escribió nada en la BD.")
+                st.caption(f"Paquete importado en {resultado['segundos']:.2f} s")
             except Exception as e:
-                st.error(f"Error importando Ficha Médica: {e}")
\ No newline at end of file
+                st.error(f"Error importando el paquete: {e}")
+
+    import_jobs.panel_jobs()
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import streamlit as st
+
+import db
+import metricas
+from db import get_conn
+from import_export import FILAS_POR_CHUNK, importar_csv, rechazos_csv
+
+# =======================
+# Importaciones en segundo plano
+# =======================
+# Un solo hilo: SQLite admite un escritor a la vez, así que más hilos solo esperarían el lock.
+# importar_csv pasa casi todo el tiempo en SQLite y pandas (sin el GIL), por eso basta un hilo
+# y no hace falta un pool de procesos.
+HILOS_IMPORTACION = 1
+ESTADOS_ACTIVOS = ("pendiente", "corriendo")
+SEGUNDOS_REFRESCO = 2
+
+# Varios procesos pueden usar la misma BD (otra instancia de Streamlit, cli.py): cada job activo
+# lleva el pid de su dueño y un latido que ese proceso renueva. Solo un job sin latido reciente
+# se da por huérfano; los de otro proceso vivo no se tocan.
+SEGUNDOS_LATIDO = 10
+LATIDO_VENCIDO = 60
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_VENCIDO = f"(latido IS NULL OR latido < strftime('%Y-%m-%d %H:%M:%f', 'now', '-{LATIDO_VENCIDO} seconds'))"
+
+_pool = ThreadPoolExecutor(max_workers=HILOS_IMPORTACION, thread_name_prefix="import_job")
+_lock = threading.Lock()
+_cancelar: Dict[int, threading.Event] = {}  # job_id -> evento, solo jobs de este proceso
+_latido = None  # hilo que renueva el latido de los jobs de este proceso
+_ultima_revision = None  # time.monotonic() de la última búsqueda de huérfanos
+
+
+def carpeta_jobs() -> str:
+    """Copias de los archivos subidos, junto a la BD (sobreviven a un reinicio)."""
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "import_jobs")
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def _actualizar(conn, job_id: int, propio: bool = False, **campos) -> None:
+    """propio=True: lo escribe el proceso que corre el job, que así renueva su latido."""
+    if propio:
+        campos["pid"] = os.getpid()
+    asignaciones = "".join(f"{c} = :{c}, " for c in campos) + (f"latido = {_AHORA}, " if propio else "")
+    conn.execute(
+        f"UPDATE ImportJob SET {asignaciones}actualizado = datetime('now', 'localtime') WHERE id = :id",
+        {**campos, "id": job_id},
+    )
+
+
+def crear_job(
+    entidad: str, archivo, nombre: str = None, modo: str = "agregar", chunksize: int = FILAS_POR_CHUNK
+) -> int:
+    """Guarda una copia del archivo, registra el job y lo encola. Devuelve el id del job."""
+    with contextlib.closing(get_conn()) as conn, conn:
+        job_id = conn.execute(
+            f"""INSERT INTO ImportJob (entidad, modo, archivo, nombre_original, chunksize, pid, latido)
+                VALUES (?, ?, '', ?, ?, ?, {_AHORA})""",
+            (entidad, modo, nombre or getattr(archivo, "name", None), chunksize, os.getpid()),
+        ).lastrowid
+    ruta = os.path.join(carpeta_jobs(), f"job_{job_id}")
+    archivo.seek(0)
+    with open(ruta, "wb") as destino:
+        shutil.copyfileobj(archivo, destino, 1024 * 1024)
+    with contextlib.closing(get_conn()) as conn, conn:
+        _actualizar(conn, job_id, propio=True, archivo=ruta, bytes_total=os.path.getsize(ruta))
+    _encolar(job_id)
+    return job_id
+
+
+def _encolar(job_id: int) -> None:
+    global _latido
+    with _lock:
+        if job_id in _cancelar:
+            return  # ya está en la cola de este proceso
+        _cancelar[job_id] = threading.Event()
+        if _latido is None:
+            _latido = threading.Thread(target=_latir, name="import_job_latido", daemon=True)
+            _latido.start()
+    _pool.submit(_ejecutar, job_id)
+
+
+def _latir() -> None:
+    """Renueva cada SEGUNDOS_LATIDO el latido de los jobs de este proceso (corriendo o en cola)."""
+    while True:
+        time.sleep(SEGUNDOS_LATIDO)
+        with _lock:
+            propios = list(_cancelar)
+        if not propios:
+            continue
+        try:
+            with contextlib.closing(get_conn()) as conn, conn:
+                conn.execute(
+                    f"UPDATE ImportJob SET latido = {_AHORA} WHERE id IN ({', '.join('?' for _ in propios)})",
+                    propios,
+                )
+        except sqlite3.OperationalError:
+            pass  # BD ocupada por el chunk en curso, cuyo checkpoint también renueva el latido
+
+
+def _ultimo_checkpoint(conn, job_id: int):
+    """(siguiente chunk a procesar, reporte acumulado) según el último checkpoint confirmado."""
+    fila = conn.execute(
+        "SELECT chunk, reporte FROM ImportCheckpoint WHERE job_id = ? ORDER BY chunk DESC LIMIT 1", (job_id,)
+    ).fetchone()
+    if fila is None:
+        return 0, None
+    return fila["chunk"] + 1, json.loads(fila["reporte"])
+
+
+def _ejecutar(job_id: int) -> None:
+    cancelar = _cancelar[job_id]
+    try:
+        with contextlib.closing(get_conn()) as conn:
+            job = conn.execute("SELECT * FROM ImportJob WHERE id = ?", (job_id,)).fetchone()
+            desde, previo = _ultimo_checkpoint(conn, job_id)
+            with conn:
+                if cancelar.is_set() or job["estado"] == "cancelada":  # cancelado mientras esperaba
+                    _actualizar(conn, job_id, estado="cancelada")
+                    return
+                _actualizar(conn, job_id, propio=True, estado="corriendo", error=None)
+
+        filas_previas = previo["filas_leidas"] if previo else 0
+        inicio = time.perf_counter()
+        with open(job["archivo"], "rb") as archivo:
+
+            def checkpoint(conn, n_chunk: int, reporte: dict) -> bool:
+                # Corre dentro de la transacción del chunk: datos y checkpoint se confirman juntos
+                conn.execute(
+                    "INSERT OR REPLACE INTO ImportCheckpoint (job_id, chunk, reporte) VALUES (?, ?, ?)",
+                    (job_id, n_chunk, json.dumps(reporte)),
+                )
+                segundos = time.perf_counter() - inicio
+                _actualizar(
+                    conn,
+                    job_id,
+                    propio=True,
+                    progreso=min(archivo.tell() / job["bytes_total"], 1.0) if job["bytes_total"] else 0.0,
+                    filas_leidas=reporte["filas_leidas"],
+                    insertadas=reporte["insertadas"],
+                    filas_por_segundo=(reporte["filas_leidas"] - filas_previas) / segundos if segundos > 0 else None,
+                )
+                # Cancelado aquí o desde otro proceso (ver cancelar_job)
+                estado = conn.execute("SELECT estado FROM ImportJob WHERE id = ?", (job_id,)).fetchone()[0]
+                return not cancelar.is_set() and estado != "cancelada"
+
+            reporte = importar_csv(
+                job["entidad"],
+                archivo,
+                chunksize=job["chunksize"],
+                modo=job["modo"],
+                checkpoint=checkpoint,
+                desde_chunk=desde,
+                reporte_previo=previo,
+            )
+
+        cancelada = reporte.pop("cancelada", False)
+        final = {"estado": "cancelada"} if cancelada else {"estado": "completada", "progreso": 1.0}
+        with contextlib.closing(get_conn()) as conn, conn:
+            _actualizar(
+                conn,
+                job_id,
+                filas_leidas=reporte["filas_leidas"],
+                insertadas=reporte["insertadas"],
+                reporte=json.dumps(reporte),
+                **final,
+            )
+        os.remove(job["archivo"])
+    except Exception as e:
+        # El archivo se conserva para poder reanudar desde el último chunk confirmado
+        with contextlib.closing(get_conn()) as conn, conn:
+            _actualizar(conn, job_id, estado="fallida", error=str(e))
+    finally:
+        with _lock:
+            _cancelar.pop(job_id, None)
+
+
+def cancelar_job(job_id: int) -> None:
+    """
+    Pide detener el job. Si corre en este proceso o en otro vivo, se detiene tras confirmar el
+    chunk actual; si quedó interrumpido o falló, se marca cancelado y se borra su copia del archivo.
+    """
+    with _lock:
+        evento = _cancelar.get(job_id)
+    if evento is not None:
+        evento.set()
+        return
+    with contextlib.closing(get_conn()) as conn, conn:
+        job = conn.execute(
+            f"SELECT archivo, estado, {_VENCIDO} AS vencido FROM ImportJob WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None or job["estado"] in ("completada", "cancelada"):
+            return
+        _actualizar(conn, job_id, estado="cancelada")
+    if job["estado"] in ESTADOS_ACTIVOS and not job["vencido"]:
+        return  # su dueño lo ve en el próximo checkpoint y borra el archivo al terminar
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(job["archivo"])
+
+
+def reanudar_job(job_id: int) -> None:
+    """Vuelve a encolar un job fallido o interrumpido; sigue desde el último chunk confirmado."""
+    with contextlib.closing(get_conn()) as conn, conn:
+        cur = conn.execute(
+            f"""UPDATE ImportJob SET estado = 'pendiente', pid = ?, latido = {_AHORA}
+                WHERE id = ? AND estado IN ('fallida', 'interrumpida')""",
+            (os.getpid(), job_id),
+        )
+    if cur.rowcount:
+        _encolar(job_id)
+
+
+def recuperar_jobs(reanudar: bool = True) -> List[int]:
+    """
+    Jobs activos cuyo dueño dejó de dar señales (el proceso terminó o se reinició): quedan
+    'interrumpida' y, con reanudar=True, este proceso los retoma desde su último checkpoint.
+    Los de un proceso vivo, aunque sea otro, no se tocan. Busca a lo más una vez por latido.
+    """
+    global _ultima_revision
+    with _lock:
+        if _ultima_revision is not None and time.monotonic() - _ultima_revision < SEGUNDOS_LATIDO:
+            return []
+        _ultima_revision = time.monotonic()
+        propios = set(_cancelar)
+    marcadores = ", ".join("?" for _ in ESTADOS_ACTIVOS)
+    huerfanos = []
+    with contextlib.closing(get_conn()) as conn:
+        vencidos = [
+            f["id"]
+            for f in conn.execute(f"SELECT id FROM ImportJob WHERE estado IN ({marcadores}) AND {_VENCIDO}", ESTADOS_ACTIVOS)
+            if f["id"] not in propios
+        ]
+        for job_id in vencidos:
+            with conn:
+                # Se vuelve a revisar al escribir: otro proceso pudo tomarlo entre medio
+                cur = conn.execute(
+                    f"""UPDATE ImportJob SET estado = 'interrumpida', pid = NULL, actualizado = datetime('now', 'localtime')
+                        WHERE id = ? AND estado IN ({marcadores}) AND {_VENCIDO}""",
+                    (job_id, *ESTADOS_ACTIVOS),
+                )
+            if cur.rowcount:
+                huerfanos.append(job_id)
+    if reanudar:
+        for job_id in huerfanos:
+            reanudar_job(job_id)
+    return huerfanos
+
+
+def listar_jobs(limite: int = 10) -> List[dict]:
+    """Jobs más recientes, con `cancelando` = True si se pidió detenerlos y aún no terminan."""
+    with contextlib.closing(get_conn()) as conn:
+        filas = conn.execute("SELECT * FROM ImportJob ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+    with _lock:
+        cancelando = {j for j, e in _cancelar.items() if e.is_set()}
+    return [{**dict(f), "cancelando": f["id"] in cancelando} for f in filas]
+
+
+def _recolectar_metricas() -> None:
+    """Jobs por estado: los pendientes son la cola del único hilo escritor."""
+    try:
+        with contextlib.closing(get_conn()) as conn:
+            conteos = dict(conn.execute("SELECT estado, COUNT(*) FROM ImportJob GROUP BY estado").fetchall())
+    except sqlite3.Error:  # BD aún sin init_db
+        return
+    for estado in ("pendiente", "corriendo", "cancelada", "completada", "fallida", "interrumpida"):
+        metricas.fijar("sgp_import_jobs", conteos.get(estado, 0), estado)
+
+
+metricas.registrar_recolector(_recolectar_metricas)
+
+
+# =======================
+# Panel del sidebar
+# =======================
+def _lista_jobs() -> None:
+    for job in listar_jobs():
+        estado = "cancelando" if job["cancelando"] else job["estado"]
+        st.caption(f"#{job['id']} {job['entidad']} • {job['nombre_original'] or ''} • {estado}")
+        st.progress(float(job["progreso"] or 0.0))
+        velocidad = f" • {job['filas_por_segundo']:,.0f} filas/s" if job["filas_por_segundo"] else ""
+        st.caption(f"{job['filas_leidas']:,} filas leídas • {job['insertadas']:,} nuevas{velocidad}")
+        if job["error"]:
+            st.error(job["error"])
+        reporte = json.loads(job["reporte"]) if job["reporte"] else {}
+        if reporte.get("invalidas"):
+            st.download_button(
+                f"{reporte['invalidas']:,} filas rechazadas (.csv)",
+                data=rechazos_csv(reporte),
+                file_name=f"rechazos_job_{job['id']}.csv",
+                mime="text/csv",
+                key=f"job_rechazos_{job['id']}",
+            )
+        if job["estado"] in ESTADOS_ACTIVOS and not job["cancelando"]:
+            if st.button("Cancelar", key=f"job_cancelar_{job['id']}"):
+                cancelar_job(job["id"])
+                st.rerun()
+        elif job["estado"] in ("fallida", "interrumpida"):
+            col1, col2 = st.columns(2)
+            if col1.button("Reanudar", key=f"job_reanudar_{job['id']}"):
+                reanudar_job(job["id"])
+                st.rerun()
+            if col2.button("Descartar", key=f"job_descartar_{job['id']}"):
+                cancelar_job(job["id"])
+                st.rerun()
+
+
+def panel_jobs() -> None:
+    """Progreso de las importaciones en segundo plano; se refresca solo mientras haya jobs activos."""
+    recuperar_jobs()
+    jobs = listar_jobs()
+    if not jobs:
+        return
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("⏳ Importaciones en segundo plano")
+    activos = any(j["estado"] in ESTADOS_ACTIVOS for j in jobs)
+    with st.sidebar:
+        if activos and hasattr(st, "fragment"):
+            st.fragment(run_every=SEGUNDOS_REFRESCO)(_lista_jobs)()
+        else:
+            _lista_jobs()
+            if activos:
+                st.button("Actualizar progreso", key="jobs_actualizar")
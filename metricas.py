@@ -0,0 +1,248 @@
+import os
+import re
+import time
+import bisect
+import hashlib
+import tempfile
+import threading
+import functools
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+# =======================
+# Métricas (formato de texto de Prometheus)
+# =======================
+# Solo biblioteca estándar. Registrar una observación es un lock, un dict y un bisect (~1 µs),
+# nada comparado con abrir una conexión SQLite en cada helper de db.py. Se exponen con un
+# servidor HTTP local (SGP_METRICAS_PUERTO, GET /metrics) y/o escribiendo un archivo cada
+# cierto tiempo (SGP_METRICAS_ARCHIVO, para el textfile collector de node_exporter).
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_SERIES = 500           # por métrica; el resto se acumula en la serie "otros"
+SEGUNDOS_ARCHIVO = 15
+
+_lock = threading.Lock()
+_metricas: Dict[str, dict] = {}
+_recolectores: List[Callable[[], None]] = []
+_servidor: Optional[ThreadingHTTPServer] = None
+_hilo_archivo: Optional[threading.Thread] = None
+
+
+def definir(nombre: str, tipo: str, ayuda: str, etiquetas: tuple = (), limites: tuple = LIMITES_SEGUNDOS) -> None:
+    """Declara una métrica (counter, gauge o histogram). Volver a declararla no hace nada."""
+    if tipo not in ("counter", "gauge", "histogram"):
+        raise ValueError(f"Tipo de métrica desconocido: {tipo}")
+    with _lock:
+        _metricas.setdefault(nombre, {
+            "tipo": tipo,
+            "ayuda": ayuda,
+            "etiquetas": tuple(etiquetas),
+            "limites": tuple(limites) if tipo == "histogram" else (),
+            "series": {},
+        })
+
+
+def _serie(metrica: dict, valores: tuple):
+    series = metrica["series"]
+    serie = series.get(valores)
+    if serie is None:
+        if len(series) >= MAX_SERIES:
+            valores = ("otros",) * len(metrica["etiquetas"])
+            serie = series.get(valores)
+        if serie is None:
+            serie = [[0] * (len(metrica["limites"]) + 1), 0.0, 0] if metrica["tipo"] == "histogram" else [0.0]
+            series[valores] = serie
+    return serie
+
+
+def incrementar(nombre: str, *etiquetas, valor: float = 1.0) -> None:
+    with _lock:
+        _serie(_metricas[nombre], etiquetas)[0] += valor
+
+
+def fijar(nombre: str, valor: float, *etiquetas) -> None:
+    with _lock:
+        _serie(_metricas[nombre], etiquetas)[0] = valor
+
+
+def observar(nombre: str, valor: float, *etiquetas) -> None:
+    metrica = _metricas[nombre]
+    i = bisect.bisect_left(metrica["limites"], valor)
+    with _lock:
+        serie = _serie(metrica, etiquetas)
+        serie[0][i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+
+@contextlib.contextmanager
+def cronometro(nombre: str, *etiquetas):
+    """Observa en el histograma `nombre` la duración del bloque (también si lanza una excepción)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nombre, time.perf_counter() - t0, *etiquetas)
+
+
+def registrar_recolector(fn: Callable[[], None]) -> None:
+    """`fn` se llama justo antes de exponer las métricas (típicamente para fijar gauges)."""
+    if fn not in _recolectores:
+        _recolectores.append(fn)
+
+
+def reiniciar() -> None:
+    """Pone en cero todas las series (las definiciones y recolectores se mantienen)."""
+    with _lock:
+        for metrica in _metricas.values():
+            metrica["series"].clear()
+
+
+# =======================
+# Huella de consultas SQL
+# =======================
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=2048)
+def huella_sql(sql: str) -> tuple:
+    """
+    (hash corto, texto normalizado) de una consulta: espacios colapsados, literales y
+    listas IN (...) reemplazados por ?, para agrupar las que solo cambian en sus valores.
+    """
+    texto = _LISTAS.sub("(?...)", _LITERALES.sub("?", " ".join(sql.split())))
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:12], texto[:120]
+
+
+# =======================
+# Exposición
+# =======================
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def texto() -> str:
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    for fn in list(_recolectores):
+        fn()
+    lineas = []
+    with _lock:
+        for nombre, metrica in sorted(_metricas.items()):
+            lineas.append(f"# HELP {nombre} {metrica['ayuda']}")
+            lineas.append(f"# TYPE {nombre} {metrica['tipo']}")
+            for valores, serie in sorted(metrica["series"].items()):
+                if metrica["tipo"] != "histogram":
+                    lineas.append(f"{nombre}{_formatear_etiquetas(metrica['etiquetas'], valores)} {_numero(serie[0])}")
+                    continue
+                conteos, suma, total = serie
+                acumulado = 0
+                for limite, conteo in zip(metrica["limites"] + (float("inf"),), conteos):
+                    acumulado += conteo
+                    le = "+Inf" if limite == float("inf") else repr(limite)
+                    etiquetas = _formatear_etiquetas(metrica["etiquetas"], valores, f'le="{le}"')
+                    lineas.append(f"{nombre}_bucket{etiquetas} {acumulado}")
+                etiquetas = _formatear_etiquetas(metrica["etiquetas"], valores)
+                lineas.append(f"{nombre}_sum{etiquetas} {_numero(suma)}")
+                lineas.append(f"{nombre}_count{etiquetas} {total}")
+    return "\n".join(lineas) + "\n"
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        cuerpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):  # sin una línea en stderr por cada scrape
+        pass
+
+
+def iniciar_servidor(puerto: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Sirve /metrics en un hilo aparte. Idempotente: Streamlit reejecuta app.py en cada rerun."""
+    global _servidor
+    with _lock:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+            _servidor.daemon_threads = True
+            threading.Thread(target=_servidor.serve_forever, name="metricas_http", daemon=True).start()
+    return _servidor
+
+
+def escribir_archivo(ruta: str) -> None:
+    """Escribe las métricas en `ruta` de forma atómica (archivo temporal + os.replace)."""
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".metricas_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(texto())
+        os.replace(tmp, ruta)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def iniciar_archivo(ruta: str, cada: float = SEGUNDOS_ARCHIVO) -> None:
+    """Reescribe `ruta` cada `cada` segundos en un hilo aparte (idempotente)."""
+    global _hilo_archivo
+
+    def bucle():
+        while True:
+            with contextlib.suppress(OSError):
+                escribir_archivo(ruta)
+            time.sleep(cada)
+
+    with _lock:
+        if _hilo_archivo is None:
+            _hilo_archivo = threading.Thread(target=bucle, name="metricas_archivo", daemon=True)
+            _hilo_archivo.start()
+
+
+def iniciar_desde_entorno() -> None:
+    """Activa el servidor y/o el archivo según SGP_METRICAS_PUERTO y SGP_METRICAS_ARCHIVO."""
+    puerto = os.environ.get("SGP_METRICAS_PUERTO")
+    if puerto:
+        iniciar_servidor(int(puerto), os.environ.get("SGP_METRICAS_HOST", "127.0.0.1"))
+    ruta = os.environ.get("SGP_METRICAS_ARCHIVO")
+    if ruta:
+        iniciar_archivo(ruta, float(os.environ.get("SGP_METRICAS_SEGUNDOS", SEGUNDOS_ARCHIVO)))
+
+
+# =======================
+# Métricas de la aplicación
+# =======================
+definir("sgp_consulta_segundos", "histogram", "Duración de execute/fetch_all/fetch_one de db.py (incluye abrir la conexión).",
+        ("huella", "consulta"))
+definir("sgp_conexiones_total", "counter", "Conexiones SQLite abiertas con db.get_conn.")
+definir("sgp_bd_bloqueada_total", "counter", "Escrituras de db.execute que fallaron con 'database is locked'.")
+definir("sgp_pagina_segundos", "histogram", "Duración del render de cada página de la app.", ("pagina",))
+definir("sgp_rerun_segundos", "histogram", "Duración total de cada rerun de app.py.")
+definir("sgp_import_segundos", "histogram", "Duración de importar_csv por entidad.", ("entidad",))
+definir("sgp_import_filas_total", "counter", "Filas leídas por importar_csv.", ("entidad",))
+definir("sgp_import_filas_por_segundo", "gauge", "Throughput de la última importación.", ("entidad",))
+definir("sgp_export_segundos", "histogram", "Duración de cada exportación por formato.", ("formato",))
+definir("sgp_export_filas_total", "counter", "Filas exportadas por formato.", ("formato",))
+definir("sgp_export_bytes_total", "counter", "Bytes exportados por formato.", ("formato",))
+definir("sgp_export_filas_por_segundo", "gauge", "Throughput de la última exportación.", ("formato",))
+definir("sgp_cache_aciertos_total", "counter", "Aciertos de las cachés de db.py.", ("cache",))
+definir("sgp_cache_fallos_total", "counter", "Fallos de las cachés de db.py.", ("cache",))
+definir("sgp_import_jobs", "gauge", "Importaciones en segundo plano por estado (cola del escritor).", ("estado",))
+definir("sgp_api_segundos", "histogram", "Duración de cada request de api.py.", ("metodo", "recurso", "estado"))
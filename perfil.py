@@ -0,0 +1,114 @@
+import os
+import time
+from typing import Optional
+
+import streamlit as st
+
+import db
+
+# =======================
+# Panel de rendimiento (debug)
+# =======================
+# Opcional: se activa con SGP_DEBUG=1 o con ?debug=1 en la URL. Muestra cuánto tardó el
+# rerun y en qué se fue el tiempo (fondo, init_db, exportaciones, página activa), cada
+# consulta que pasó por db.execute / fetch_all / fetch_one con su duración, filas y plan,
+# la tasa de aciertos de las cachés de db.py y las consultas N+1 (ver detector_n1.py).
+VALORES_ACTIVO = ("1", "true", "si", "sí")
+
+
+def activo() -> bool:
+    if os.environ.get("SGP_DEBUG", "").strip().lower() in VALORES_ACTIVO:
+        return True
+    try:
+        valor = st.query_params.get("debug", "")
+    except AttributeError:  # Streamlit < 1.30
+        valor = (st.experimental_get_query_params().get("debug") or [""])[0]
+    return str(valor).strip().lower() in VALORES_ACTIVO
+
+
+def iniciar() -> Optional[dict]:
+    """Empieza a medir el rerun; None si el panel está apagado (las demás funciones no hacen nada)."""
+    if not activo():
+        return None
+    return {
+        "inicio": time.perf_counter(),
+        "secciones": [],  # [nombre, inicio, fin]
+        "consultas": db.iniciar_traza(),
+        "cache": db.estadisticas_cache(),
+    }
+
+
+def seccion(perfil: Optional[dict], nombre: str) -> None:
+    """Cierra la sección en curso y abre `nombre`; las consultas siguientes quedan en ella."""
+    if perfil is None:
+        return
+    ahora = time.perf_counter()
+    _cerrar_seccion(perfil, ahora)
+    perfil["secciones"].append([nombre, ahora, None])
+    db.etiquetar_traza(nombre)
+
+
+def _cerrar_seccion(perfil: dict, ahora: float) -> None:
+    if perfil["secciones"] and perfil["secciones"][-1][2] is None:
+        perfil["secciones"][-1][2] = ahora
+
+
+def mostrar(perfil: Optional[dict]) -> None:
+    """Termina la medición y dibuja el panel al final del sidebar."""
+    if perfil is None:
+        return
+    import pandas as pd  # solo con el panel activo: no pesa en el arranque normal
+    import detector_n1
+
+    ahora = time.perf_counter()
+    _cerrar_seccion(perfil, ahora)
+    db.detener_traza()
+    total = ahora - perfil["inicio"]
+    consultas = pd.DataFrame(perfil["consultas"], columns=["etiqueta", "segundos", "filas", "sql", "plan", "origen"])
+    hallazgos = detector_n1.advertir(perfil["consultas"])
+
+    with st.sidebar.expander(f"⏱️ Rendimiento: {total * 1000:,.0f} ms", expanded=True):
+        st.caption(f"{len(consultas)} consultas, {consultas['segundos'].sum() * 1000:,.1f} ms en SQL")
+        for h in hallazgos:
+            st.warning(f"Posible N+1: {detector_n1.describir(h)}")
+
+        por_seccion = consultas.groupby("etiqueta", dropna=False)["segundos"].agg(["count", "sum"])
+        secciones = [(nombre, fin - inicio) for nombre, inicio, fin in perfil["secciones"]]
+        otros = total - sum(s for _, s in secciones)
+        if otros > 0.0005:
+            secciones.append(("(otros)", otros))
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "Sección": nombre,
+                        "ms": round(segundos * 1000, 1),
+                        "%": round(segundos / total * 100, 1) if total else 0.0,
+                        "consultas": int(por_seccion["count"].get(nombre, 0)),
+                        "ms SQL": round(por_seccion["sum"].get(nombre, 0.0) * 1000, 1),
+                    }
+                    for nombre, segundos in secciones
+                ]
+            ).set_index("Sección"),
+            use_container_width=True,
+        )
+
+        filas_cache = []
+        for nombre, ahora_cache in db.estadisticas_cache().items():
+            antes = perfil["cache"].get(nombre, {"aciertos": 0, "fallos": 0})
+            aciertos = ahora_cache["aciertos"] - antes["aciertos"]
+            fallos = ahora_cache["fallos"] - antes["fallos"]
+            tasa = aciertos / (aciertos + fallos) * 100 if aciertos + fallos else None
+            filas_cache.append({"Caché": nombre, "aciertos": aciertos, "fallos": fallos, "% aciertos": tasa})
+        st.dataframe(pd.DataFrame(filas_cache).set_index("Caché"), use_container_width=True)
+
+        if consultas.empty:
+            return
+        consultas["ms"] = (consultas["segundos"] * 1000).round(2)
+        consultas["plan"] = consultas["plan"].map(lambda p: " | ".join(p) if p else "")
+        st.markdown("**Consultas** (más lentas primero)")
+        st.dataframe(
+            consultas.sort_values("segundos", ascending=False)[["ms", "filas", "etiqueta", "sql", "plan", "origen"]]
+            .set_index("ms"),
+            use_container_width=True,
+        )
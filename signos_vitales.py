@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+from typing import Iterator, Optional
+
+import carga_diferida
+from db import get_conn
+
+# Módulo de biblioteca (análisis por lotes y benchmarks): ninguna página lo importa al arrancar,
+# pero igual difiere numpy y pandas hasta la primera llamada, como Validaciones.
+np = carga_diferida.modulo("numpy")
+pd = carga_diferida.modulo("pandas")
+
+# =======================
+# Parsing vectorizado (equivalente a as_float / as_int / parse_pa de ui_ficha_medica)
+# =======================
+def _texto(s: pd.Series) -> pd.Series:
+    """Columna como texto; con pyarrow las operaciones .str corren en C en vez de Python."""
+    try:
+        return s.astype("string[pyarrow]")
+    except (ImportError, TypeError):
+        return s.astype("string")
+
+
+def _a_float(txt: pd.Series, basura: str, patron: str, default) -> pd.Series:
+    """
+    Quita los caracteres `basura` y convierte; lo que no calza con `patron` queda en default
+    (como el except de as_float).
+    """
+    txt = txt.str.replace(basura, "", regex=True)
+    valido = txt.str.fullmatch(patron).fillna(False).astype(bool)
+    return txt.where(valido).astype("float64").fillna(default)
+
+
+def parse_float_series(s: pd.Series, default=float("nan")) -> pd.Series:
+    """'37.0°C', '37,2', 37 -> 37.0 sobre una columna completa. Lo no convertible queda en default."""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype("float64").fillna(default)
+    txt = _texto(s).str.strip().str.replace(",", ".", regex=False)
+    # Mantener solo dígitos, punto y signo (igual que as_float)
+    return _a_float(txt, r"[^0-9.\-]", r"-?(?:\d+\.?\d*|\.\d+)", default)
+
+
+def parse_int_series(s: pd.Series, default=float("nan")) -> pd.Series:
+    """
+    '75 lpm', '075', 75 -> 75 sobre una columna completa. Lo no convertible queda en default.
+    A diferencia de as_int, un REAL como 75.0 se lee como 75 (no como 750).
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return np.trunc(s.astype("float64")).fillna(default)
+    txt = _texto(s).str.strip().str.replace(r"\.0+$", "", regex=True)
+    return _a_float(txt, r"[^0-9\-]", r"-?\d+", default)
+
+
+def parse_pa_series(s: pd.Series, default_pas=float("nan"), default_pad=float("nan")) -> pd.DataFrame:
+    """'120/80' -> columnas pas, pad. Filas sin '/' reciben los defaults."""
+    txt = _texto(s)
+    tiene_barra = txt.str.contains("/", regex=False).fillna(False).astype(bool)
+    # Dos reemplazos regex son bastante más rápidos que str.split(expand=True)
+    antes = txt.str.replace(r"/.*$", "", regex=True)
+    despues = txt.str.replace(r"^[^/]*/", "", regex=True)
+    pas = parse_int_series(antes.where(tiene_barra), default_pas)
+    pad = parse_int_series(despues.where(tiene_barra), default_pad)
+    return pd.DataFrame({"pas": pas, "pad": pad}, index=s.index)
+
+
+# =======================
+# Lectura por chunks
+# =======================
+SQL_SIGNOS = """
+    SELECT
+        SV.ID_Signos_vitales,
+        SV.ID_Ficha_Medica,
+        F.id_paciente AS id_paciente,
+        F.fecha_hora  AS fecha_hora,
+        SV.presion_arterial,
+        SV.Temperatura,
+        SV.Frecuencia_cardiaca,
+        SV.peso
+    FROM SignosVitales SV
+    JOIN FichaMedica F ON F.ID_Ficha = SV.ID_Ficha_Medica
+"""
+
+
+def leer_signos_vitales(chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Recorre SignosVitales en bloques de `chunksize` filas ya parseadas."""
+    with contextlib.closing(get_conn()) as conn:
+        for chunk in pd.read_sql_query(SQL_SIGNOS, conn, chunksize=chunksize):
+            yield parsear_signos(chunk)
+
+
+def parsear_signos(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega columnas numéricas (pas, pad, temperatura, fc, peso_kg) y métricas derivadas."""
+    out = df.copy()
+    pa = parse_pa_series(out["presion_arterial"])
+    out["pas"] = pa["pas"]
+    out["pad"] = pa["pad"]
+    out["temperatura"] = parse_float_series(out["Temperatura"])
+    out["fc"] = parse_int_series(out["Frecuencia_cardiaca"])
+    out["peso_kg"] = parse_float_series(out["peso"])
+    out["fecha_hora"] = pd.to_datetime(out["fecha_hora"], errors="coerce")
+    return metricas_derivadas(out)
+
+
+# =======================
+# Métricas derivadas
+# =======================
+def imc(peso_kg: pd.Series, talla_m: pd.Series) -> pd.Series:
+    """Índice de masa corporal. El esquema no guarda talla, así que se recibe aparte."""
+    talla = talla_m.where(talla_m > 0)
+    return peso_kg / (talla * talla)
+
+
+def metricas_derivadas(df: pd.DataFrame) -> pd.DataFrame:
+    """Presión de pulso, presión arterial media, índice de shock y alertas clínicas básicas."""
+    out = df
+    out["presion_pulso"] = out["pas"] - out["pad"]
+    out["pam"] = out["pad"] + (out["pas"] - out["pad"]) / 3.0
+    out["indice_shock"] = out["fc"] / out["pas"].where(out["pas"] > 0)
+    out["fiebre"] = out["temperatura"] >= 38.0
+    out["hipertension"] = (out["pas"] >= 140) | (out["pad"] >= 90)
+    out["taquicardia"] = out["fc"] > 100
+    return out
+
+
+# =======================
+# Tendencias y distribuciones (acumulables entre chunks)
+# =======================
+VARIABLES = ["pas", "pad", "temperatura", "fc", "peso_kg"]
+
+
+@functools.lru_cache(maxsize=None)
+def _bordes() -> dict:
+    """Bordes fijos para que los histogramas de distintos chunks se puedan sumar."""
+    return {
+        "pas": np.arange(40, 262, 2),
+        "pad": np.arange(20, 162, 2),
+        "temperatura": np.arange(30.0, 45.2, 0.2),
+        "fc": np.arange(20, 252, 2),
+        "peso_kg": np.arange(0, 302, 2),
+    }
+
+
+def _sumas_por_paciente(df: pd.DataFrame) -> pd.DataFrame:
+    """Sumas suficientes por paciente para una regresión lineal de cada variable vs tiempo (años)."""
+    # Años desde 2000: centrar el eje reduce la cancelación numérica en n·Σx² − (Σx)²
+    t = (df["fecha_hora"] - pd.Timestamp("2000-01-01")).dt.total_seconds() / (365.25 * 86400)
+    base = pd.DataFrame({"id_paciente": df["id_paciente"]})
+    for v in VARIABLES:
+        ok = df[v].notna() & t.notna()
+        y = df[v].where(ok)
+        x = t.where(ok)
+        base[f"{v}_n"] = ok.astype("int64")
+        base[f"{v}_x"] = x
+        base[f"{v}_y"] = y
+        base[f"{v}_xx"] = x * x
+        base[f"{v}_xy"] = x * y
+    base["t_min"] = df["fecha_hora"]
+    base["t_max"] = df["fecha_hora"]
+    agg = {c: "sum" for c in base.columns if c not in ("id_paciente", "t_min", "t_max")}
+    agg["t_min"] = "min"
+    agg["t_max"] = "max"
+    return base.groupby("id_paciente").agg(agg)
+
+
+def _combinar_sumas(acum: Optional[pd.DataFrame], parcial: pd.DataFrame) -> pd.DataFrame:
+    if acum is None:
+        return parcial
+    sumas = [c for c in parcial.columns if c not in ("t_min", "t_max")]
+    out = acum[sumas].add(parcial[sumas], fill_value=0)
+    out["t_min"] = pd.concat([acum["t_min"], parcial["t_min"]], axis=1).min(axis=1)
+    out["t_max"] = pd.concat([acum["t_max"], parcial["t_max"]], axis=1).max(axis=1)
+    return out
+
+
+def tendencias_desde_sumas(sumas: pd.DataFrame) -> pd.DataFrame:
+    """Pendiente (unidades por año) y promedio de cada variable por paciente."""
+    out = pd.DataFrame(index=sumas.index)
+    out["primera_atencion"] = sumas["t_min"]
+    out["ultima_atencion"] = sumas["t_max"]
+    for v in VARIABLES:
+        n = sumas[f"{v}_n"]
+        sx, sy = sumas[f"{v}_x"], sumas[f"{v}_y"]
+        denom = n * sumas[f"{v}_xx"] - sx * sx
+        pendiente = (n * sumas[f"{v}_xy"] - sx * sy) / denom.where(denom.abs() > 1e-12)
+        out[f"{v}_n"] = n
+        out[f"{v}_promedio"] = sy / n.where(n > 0)
+        out[f"{v}_pendiente_anual"] = pendiente
+    return out
+
+
+def tendencias_por_paciente(df: pd.DataFrame) -> pd.DataFrame:
+    """Tendencias de un DataFrame ya parseado (ver parsear_signos)."""
+    return tendencias_desde_sumas(_sumas_por_paciente(df))
+
+
+def _histogramas(df: pd.DataFrame) -> dict:
+    return {
+        v: np.histogram(df[v].dropna().to_numpy(), bins=_bordes()[v])[0]
+        for v in VARIABLES
+    }
+
+
+def distribucion_desde_histogramas(hists: dict) -> pd.DataFrame:
+    """n, media y percentiles aproximados (resolución = ancho del bin) por variable."""
+    filas = []
+    for v, cuenta in hists.items():
+        bordes = _bordes()[v]
+        centros = (bordes[:-1] + bordes[1:]) / 2
+        n = int(cuenta.sum())
+        fila = {"variable": v, "n": n}
+        if n:
+            acum = np.cumsum(cuenta) / n
+            fila["media"] = float((centros * cuenta).sum() / n)
+            for p in (5, 25, 50, 75, 95):
+                fila[f"p{p}"] = float(centros[np.searchsorted(acum, p / 100)])
+        filas.append(fila)
+    return pd.DataFrame(filas).set_index("variable")
+
+
+def analizar_signos_vitales(chunksize: int = 100_000):
+    """
+    Recorre SignosVitales por chunks y devuelve (tendencias_por_paciente, distribuciones, alertas).
+    La memoria depende de chunksize y del número de pacientes, no del total de filas.
+    """
+    sumas = None
+    hists = {v: np.zeros(len(_bordes()[v]) - 1, dtype="int64") for v in VARIABLES}
+    alertas = {"fiebre": 0, "hipertension": 0, "taquicardia": 0, "total": 0}
+
+    for chunk in leer_signos_vitales(chunksize):
+        sumas = _combinar_sumas(sumas, _sumas_por_paciente(chunk))
+        for v, h in _histogramas(chunk).items():
+            hists[v] += h
+        for k in ("fiebre", "hipertension", "taquicardia"):
+            alertas[k] += int(chunk[k].sum())
+        alertas["total"] += len(chunk)
+
+    tendencias = tendencias_desde_sumas(sumas) if sumas is not None else pd.DataFrame()
+    return tendencias, distribucion_desde_histogramas(hists), alertas
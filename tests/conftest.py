@@ -0,0 +1,69 @@
+"""
+Fixtures comunes: cada prueba trabaja sobre su propia copia de una BD sintética chica de
+generador_datos (mismo esquema que la app: init_db, índices y triggers de CambioLog).
+"""
+import contextlib
+import io
+import shutil
+
+import numpy as np
+import pytest
+
+import db
+import detector_n1
+import generador_datos
+
+PACIENTES = 100
+CUERPO_RUT_NUEVO = 40_000_000  # por encima de los RUT que genera generador_datos
+
+
+@pytest.fixture(scope="session")
+def _plantilla(tmp_path_factory) -> str:
+    ruta = str(tmp_path_factory.mktemp("plantilla") / "clinica.db")
+    generador_datos.generar(ruta, PACIENTES, reemplazar=True)
+    return ruta
+
+
+@pytest.fixture
+def bd(_plantilla, tmp_path) -> str:
+    """Ruta de una copia de la BD sintética; db.py (get_conn, fetch_*, execute) apunta a ella."""
+    ruta = str(tmp_path / "clinica.db")
+    shutil.copy(_plantilla, ruta)
+    db.invalidar_columnas()
+    with generador_datos.usando_bd(ruta):
+        yield ruta
+    db.invalidar_columnas()
+
+
+@pytest.fixture
+def presupuesto_consultas():
+    """
+    Presupuesto de consultas para un bloque (detector_n1.limitar_consultas). Si se excede, la
+    prueba falla con el detalle (consultas repetidas y sus líneas) en vez de un traceback:
+
+        def test_pacientes(bd, presupuesto_consultas):
+            with presupuesto_consultas(maximo=40):
+                AppTest.from_file("app.py").run()
+    """
+    @contextlib.contextmanager
+    def limitar(maximo=None, umbral=detector_n1.UMBRAL_REPETICIONES, ignorar=()):
+        mensaje = None
+        try:
+            with detector_n1.limitar_consultas(maximo, umbral, ignorar) as consultas:
+                yield consultas
+        except detector_n1.PresupuestoExcedido as e:
+            mensaje = str(e)
+        if mensaje is not None:
+            pytest.fail(mensaje, pytrace=False)
+
+    return limitar
+
+
+def ruts_nuevos(n: int, desde: int = 0) -> list:
+    """n RUT válidos ('40.000.000-K') que no existen en la BD sintética."""
+    return generador_datos.formatear_ruts(np.arange(CUERPO_RUT_NUEVO + desde, CUERPO_RUT_NUEVO + desde + n))
+
+
+def csv(encabezado: str, filas) -> io.BytesIO:
+    """Archivo CSV en memoria, como lo entrega el file_uploader de Streamlit."""
+    return io.BytesIO("\n".join([encabezado, *filas]).encode("utf-8"))
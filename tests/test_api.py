@@ -0,0 +1,138 @@
+"""API JSON (api.py) con un servidor real en un puerto libre: paginación por cursor, ETag y altas masivas."""
+import http.client
+import json
+import threading
+
+import pytest
+
+import api
+import cdc
+import db
+
+from tests.conftest import ruts_nuevos
+
+
+@pytest.fixture
+def servidor(bd):
+    srv = api.crear_servidor(puerto=0)
+    hilo = threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    hilo.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    srv.pool.cerrar()
+
+
+def pedir(servidor, metodo: str, url: str, cuerpo=None, encabezados=None):
+    """(estado, headers, JSON o None)."""
+    conn = http.client.HTTPConnection("127.0.0.1", servidor.server_port, timeout=30)
+    try:
+        datos = None if cuerpo is None else json.dumps(cuerpo).encode("utf-8")
+        conn.request(metodo, url, body=datos, headers=encabezados or {})
+        respuesta = conn.getresponse()
+        texto = respuesta.read()
+        return respuesta.status, respuesta.headers, json.loads(texto) if texto else None
+    finally:
+        conn.close()
+
+
+def test_paginacion_recorre_todo_una_vez(servidor):
+    ids, url, paginas = [], "/pacientes?limite=30", 0
+    while url:
+        estado, headers, cuerpo = pedir(servidor, "GET", url)
+        assert estado == 200
+        ids += [p["id_paciente"] for p in cuerpo["datos"]]
+        assert "hash_fila" not in cuerpo["datos"][0]
+        paginas += 1
+        if cuerpo["siguiente"] is None:
+            assert "Link" not in headers
+            url = None
+        else:
+            url = headers["Link"].split(">")[0].lstrip("<")
+            assert f"despues={cuerpo['siguiente']}" in url
+
+    assert ids == [r[0] for r in db.fetch_all("SELECT id_paciente FROM Paciente ORDER BY rowid")]
+    assert paginas == -(-len(ids) // 30)
+
+
+def test_filtros(servidor):
+    pid = db.fetch_one("SELECT id_paciente FROM Cita GROUP BY id_paciente ORDER BY COUNT(*) DESC LIMIT 1")[0]
+    estado, _, cuerpo = pedir(servidor, "GET", f"/citas?id_paciente={pid}&limite=2")
+    assert estado == 200
+    assert {c["id_paciente"] for c in cuerpo["datos"]} == {pid}
+
+    rut = db.fetch_one("SELECT rut FROM Paciente LIMIT 1")[0]
+    sin_formato = rut.replace(".", "").replace("-", "").lower()
+    estado, _, cuerpo = pedir(servidor, "GET", f"/pacientes?rut={sin_formato}")
+    assert [p["rut"] for p in cuerpo["datos"]] == [rut]
+
+
+@pytest.mark.parametrize("url, esperado", [
+    ("/pacientes?limite=0", 400),
+    ("/pacientes?despues=-1", 400),
+    ("/pacientes?color=rojo", 400),
+    ("/pacientes/999999", 404),
+    ("/no_existe", 404),
+])
+def test_errores_de_cliente(servidor, url, esperado):
+    estado, _, cuerpo = pedir(servidor, "GET", url)
+    assert estado == esperado
+    assert "error" in cuerpo
+
+
+def test_etag_304_hasta_que_hay_cambios(servidor):
+    estado, headers, _ = pedir(servidor, "GET", "/medicos?limite=5")
+    etiqueta = headers["ETag"]
+    assert estado == 200 and etiqueta
+
+    estado, headers, cuerpo = pedir(servidor, "GET", "/medicos?limite=5", encabezados={"If-None-Match": etiqueta})
+    assert (estado, cuerpo, headers["ETag"]) == (304, None, etiqueta)
+    assert pedir(servidor, "GET", "/medicos?limite=6")[1]["ETag"] != etiqueta  # otra URL, otra etiqueta
+
+    db.execute("UPDATE Medico SET Estado = 'Inactivo' WHERE id_medico = (SELECT MIN(id_medico) FROM Medico)")
+    estado, headers, _ = pedir(servidor, "GET", "/medicos?limite=5", encabezados={"If-None-Match": etiqueta})
+    assert estado == 200
+    assert headers["ETag"] != etiqueta
+
+
+def test_etag_no_se_repite_tras_purgar_el_log(servidor):
+    antes = pedir(servidor, "GET", "/medicos?limite=5")[1]["ETag"]
+    db.execute("UPDATE Medico SET Estado = 'Inactivo' WHERE id_medico = (SELECT MIN(id_medico) FROM Medico)")
+    cdc.purgar_cambios(hasta=cdc.watermark_actual())
+
+    estado, headers, _ = pedir(servidor, "GET", "/medicos?limite=5", encabezados={"If-None-Match": antes})
+
+    assert estado == 200  # con el log vacío, la etiqueta no vuelve a la de antes del cambio
+    assert headers["ETag"] != antes
+
+
+def test_alta_masiva_total_parcial_y_rechazada(servidor):
+    ruts = ruts_nuevos(3)
+    estado, _, reporte = pedir(servidor, "POST", "/pacientes", [{"rut": r, "nombre": "Api"} for r in ruts[:2]])
+    assert (estado, reporte["insertadas"]) == (201, 2)
+
+    estado, _, reporte = pedir(servidor, "POST", "/pacientes", [{"rut": ruts[2], "nombre": "Api"}, {"rut": "1-1"}])
+    assert (estado, reporte["insertadas"], reporte["invalidas"]) == (207, 1, 1)
+    assert reporte["rechazos"][0]["fila"] == 2
+
+    estado, _, reporte = pedir(servidor, "POST", "/pacientes", [{"rut": r, "nombre": "Api"} for r in ruts[:2]])
+    assert (estado, reporte["insertadas"], reporte["existentes"]) == (422, 0, 2)
+
+    estado, _, reporte = pedir(servidor, "POST", "/pacientes?modo=upsert&simular=1", [{"rut": r, "nombre": "Api"} for r in ruts])
+    assert (estado, reporte["sin_cambios"]) == (200, 3)
+
+    assert pedir(servidor, "POST", "/signos_vitales", [{"peso": 70}])[0] == 405
+    assert pedir(servidor, "POST", "/pacientes", {"rut": [1]})[0] == 400
+
+
+def test_error_inesperado_responde_500_en_json(servidor, monkeypatch, capsys):
+    def falla(*args):
+        raise ZeroDivisionError("división por cero")
+
+    monkeypatch.setattr(api, "obtener", falla)
+    estado, _, cuerpo = pedir(servidor, "GET", "/pacientes/1")
+
+    assert estado == 500
+    assert "ZeroDivisionError" in cuerpo["error"]
+    assert "Traceback" in capsys.readouterr().err
+    assert pedir(servidor, "GET", "/salud")[0] == 200  # el servidor sigue atendiendo
@@ -0,0 +1,62 @@
+"""Imports diferidos: la app arranca sin pandas, numpy ni pyarrow y los carga al primer uso."""
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import carga_diferida
+
+RAIZ = pathlib.Path(__file__).resolve().parent.parent
+PESADOS = ["pandas", "numpy", "pyarrow", "pytest"]
+MODULOS_APP = [
+    "db", "Validaciones", "import_export", "import_jobs", "signos_vitales", "cdc", "api", "perfil", "metricas",
+    "ui_pacientes", "ui_medicos", "ui_citas", "ui_ficha_medica", "ui_timeline",
+]
+
+
+def _cargados(codigo: str, **entorno) -> list:
+    """Corre `codigo` en un proceso nuevo y devuelve cuáles de PESADOS quedaron en sys.modules."""
+    script = f"import json, sys\n{codigo}\nprint(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))"
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=RAIZ, capture_output=True, text=True, check=True, timeout=120,
+        env={**os.environ, **entorno, "PYTHONPATH": str(RAIZ)},
+    )
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def test_importar_los_modulos_de_la_app_no_carga_dependencias_pesadas():
+    assert _cargados(f"import {', '.join(MODULOS_APP)}") == []
+
+
+def test_pandas_se_carga_al_primer_uso():
+    codigo = (
+        "import Validaciones\n"
+        "assert 'pandas' not in sys.modules\n"
+        "assert Validaciones.validar_rut_serie(Validaciones.pd.Series(['12.345.678-5', 'x'])).tolist() == [True, False]"
+    )
+    cargados = _cargados(codigo)
+    assert {"pandas", "numpy"} <= set(cargados)  # pandas puede traer pyarrow consigo
+    assert "pytest" not in cargados
+
+
+def test_el_sidebar_no_carga_pandas(bd):
+    codigo = (
+        "import db\n"
+        f"db.DB_PATH = {bd!r}\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "app = AppTest.from_file('benchmarks/app_pagina.py', default_timeout=60).run()\n"
+        "assert not app.exception, app.exception"
+    )
+    assert _cargados(codigo, SGP_BENCH_PAGINA="sidebar") == []
+
+
+def test_modulo_diferido():
+    json_diferido = carga_diferida.modulo("json")
+    assert "sin cargar" in repr(json_diferido)
+
+    assert json_diferido.dumps([1]) == "[1]"
+    assert "(cargado)" in repr(json_diferido)
+    assert json_diferido.cargar() is json
+    assert carga_diferida.disponible("json.decoder")
+    assert not carga_diferida.disponible("modulo_que_no_existe")
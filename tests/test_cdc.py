@@ -0,0 +1,105 @@
+"""CambioLog: cambios netos por watermark (cdc.cambios_desde), paginación y compactación."""
+import cdc
+import db
+
+
+def _nuevo_medico(nombre: str) -> int:
+    return db.execute("INSERT INTO Medico (nombre, especialidad) VALUES (?, 'Medicina general')", (nombre,))
+
+
+def _netos(desde: int, **kwargs):
+    cambios, siguiente = cdc.cambios_desde(desde, **kwargs)
+    return [(c["tabla"], c["pk"], c["op"]) for c in cambios], siguiente
+
+
+def test_log_vacio_tras_generar(bd):
+    assert cdc.watermark_actual() == 0
+    assert cdc.cambios_desde(0) == ([], 0)
+
+
+def test_cambios_netos_por_fila(bd):
+    pid = db.fetch_one("SELECT MIN(id_paciente) FROM Paciente")[0]
+    db.execute("UPDATE Paciente SET nombre = 'Uno' WHERE id_paciente = ?", (pid,))
+    db.execute("UPDATE Paciente SET nombre = 'Dos' WHERE id_paciente = ?", (pid,))
+    creado = _nuevo_medico("creado")
+    db.execute("UPDATE Medico SET especialidad = 'Pediatría' WHERE id_medico = ?", (creado,))
+    efimero = _nuevo_medico("efimero")
+    db.execute("DELETE FROM Medico WHERE id_medico = ?", (efimero,))
+
+    cambios, siguiente = _netos(0)
+
+    # Dos ediciones = una 'U'; creado y editado = 'I'; creado y borrado en la página = nada
+    assert cambios == [("Paciente", pid, "U"), ("Medico", creado, "I")]
+    assert siguiente == cdc.watermark_actual() == 6
+    assert _netos(siguiente) == ([], siguiente)
+    assert _netos(0, tablas=["Medico"])[0] == [("Medico", creado, "I")]
+
+
+def test_paginas_por_limite(bd):
+    ids = [_nuevo_medico(f"m{i}") for i in range(5)]
+
+    vistos, desde = [], 0
+    while True:
+        cambios, siguiente = _netos(desde, limite=2)
+        if siguiente == desde:
+            break
+        vistos += cambios
+        desde = siguiente
+
+    assert [pk for _, pk, _ in vistos] == ids
+    assert desde == cdc.watermark_actual()
+
+
+def test_columnas_internas_no_generan_cambios(bd):
+    ficha = db.fetch_one("SELECT ID_Ficha FROM FichaMedica WHERE ID_Ficha IN (SELECT ID_Ficha_Medica FROM Prescripcion)")[0]
+    otro = db.fetch_one("SELECT MAX(id_paciente) FROM Paciente")[0]
+
+    db.execute("UPDATE FichaMedica SET id_paciente = ? WHERE ID_Ficha = ?", (otro, ficha))
+
+    # El id_paciente derivado de sus prescripciones se propaga, pero solo la ficha queda en el log
+    assert {r[0] for r in db.fetch_all("SELECT id_paciente FROM Prescripcion WHERE ID_Ficha_Medica = ?", (ficha,))} == {otro}
+    assert _netos(0)[0] == [("FichaMedica", ficha, "U")]
+
+
+def test_compactar_conserva_el_estado_final(bd):
+    pid = db.fetch_one("SELECT MIN(id_paciente) FROM Paciente")[0]
+    for nombre in ("a", "b", "c"):
+        db.execute("UPDATE Paciente SET nombre = ? WHERE id_paciente = ?", (nombre, pid))
+    creado = _nuevo_medico("compactado")
+    db.execute("UPDATE Medico SET Estado = 'Activo' WHERE id_medico = ?", (creado,))
+    antes, watermark = _netos(0)
+
+    eliminadas = cdc.compactar_cambios()
+
+    assert eliminadas == 3
+    assert db.fetch_one("SELECT COUNT(*) FROM CambioLog")[0] == 2
+    despues, siguiente = _netos(0)
+    assert siguiente == watermark
+    # El 'I' compactado llega como 'U' (los consumidores tratan I y U como upsert)
+    assert despues == [("Paciente", pid, "U"), ("Medico", creado, "U")]
+    assert [(t, pk) for t, pk, _ in antes] == [(t, pk) for t, pk, _ in despues]
+
+
+def test_compactar_hasta_un_watermark(bd):
+    pid = db.fetch_one("SELECT MIN(id_paciente) FROM Paciente")[0]
+    for nombre in ("a", "b"):
+        db.execute("UPDATE Paciente SET nombre = ? WHERE id_paciente = ?", (nombre, pid))
+    corte = cdc.watermark_actual()
+    db.execute("UPDATE Paciente SET nombre = 'c' WHERE id_paciente = ?", (pid,))
+
+    assert cdc.compactar_cambios(hasta=corte) == 1
+    assert [r[0] for r in db.fetch_all("SELECT seq FROM CambioLog ORDER BY seq")] == [corte, corte + 1]
+
+
+def test_el_watermark_no_retrocede_al_purgar(bd):
+    _nuevo_medico("purgado")
+    watermark = cdc.watermark_actual()
+
+    assert cdc.purgar_cambios(hasta=watermark) == 1
+
+    # Un consumidor que retoma desde su watermark no ve cambios viejos ni se salta los siguientes
+    assert cdc.watermark_actual() == watermark
+    assert cdc.watermark_minimo() == watermark + 1
+    assert cdc.cambios_desde(watermark) == ([], watermark)
+    creado = _nuevo_medico("después de purgar")
+    assert _netos(watermark) == ([("Medico", creado, "I")], watermark + 1)
@@ -0,0 +1,97 @@
+"""cli.py: códigos de salida de los comandos (0 ok, 1 error, 3 filas rechazadas, 130 interrumpido)."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+import db
+
+from tests.conftest import ruts_nuevos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _csv(tmp_path, nombre: str, filas) -> str:
+    ruta = tmp_path / nombre
+    ruta.write_text("\n".join(["rut,nombre", *filas]), encoding="utf-8")
+    return str(ruta)
+
+
+def test_importar_sin_rechazos(bd, tmp_path):
+    archivo = _csv(tmp_path, "Pacientes.csv", [f"{r},Cli {i}" for i, r in enumerate(ruts_nuevos(4))])
+    assert cli.main(["--bd", bd, "-q", "importar", archivo]) == cli.SALIDA_OK
+    assert db.fetch_one("SELECT COUNT(*) FROM Paciente WHERE nombre LIKE 'Cli %'")[0] == 4
+
+
+def test_importar_con_rechazos(bd, tmp_path, capsys):
+    archivo = _csv(tmp_path, "nuevos.csv", [f"{ruts_nuevos(1)[0]},Cli", "12.345.678-4,Malo"])
+    rechazos = tmp_path / "rechazos.csv"
+
+    codigo = cli.main(["--bd", bd, "importar", archivo, "--entidad", "Pacientes", "--rechazos", str(rechazos)])
+
+    assert codigo == cli.SALIDA_RECHAZOS
+    assert "12.345.678-4" in rechazos.read_text(encoding="utf-8-sig")
+    assert not os.path.exists(f"{rechazos}.parcial")
+    salida = capsys.readouterr()
+    assert salida.out == ""  # el resumen va a stderr
+    assert "Pacientes: 2 leídas, 1 insertadas, 1 invalidas" in salida.err
+
+
+def test_simular_no_escribe_y_mantiene_el_codigo(bd, tmp_path):
+    archivo = _csv(tmp_path, "Pacientes.csv", [f"{ruts_nuevos(1)[0]},Cli", "x,Malo"])
+    antes = db.fetch_one("SELECT COUNT(*) FROM Paciente")[0]
+    assert cli.main(["--bd", bd, "-q", "importar", archivo, "--simular"]) == cli.SALIDA_RECHAZOS
+    assert db.fetch_one("SELECT COUNT(*) FROM Paciente")[0] == antes
+
+
+@pytest.mark.parametrize("argumentos", [
+    ["importar", "no-existe.csv", "--entidad", "Pacientes"],
+    ["importar", "{csv}"],                       # entidad no reconocible por el nombre
+    ["exportar", "Recetas"],
+])
+def test_errores_salen_con_1(bd, tmp_path, capsys, argumentos):
+    archivo = _csv(tmp_path, "datos.csv", ["1-9,X"])
+    argumentos = [a.format(csv=archivo) for a in argumentos]
+    assert cli.main(["--bd", bd, *argumentos]) == cli.SALIDA_ERROR
+    assert capsys.readouterr().err.startswith("error: ")
+
+
+def test_bd_inexistente(tmp_path, capsys):
+    assert cli.main(["--bd", str(tmp_path / "no.db"), "analizar"]) == cli.SALIDA_ERROR
+    assert "No existe la BD" in capsys.readouterr().err
+    assert not (tmp_path / "no.db").exists()
+
+
+def test_exportar_a_stdout(bd, capsys):
+    assert cli.main(["--bd", bd, "-q", "exportar", "Medicos", "--salida", "-"]) == cli.SALIDA_OK
+    lineas = capsys.readouterr().out.splitlines()
+    assert len(lineas) == 1 + db.fetch_one("SELECT COUNT(*) FROM Medico")[0]
+
+
+def test_exportar_cambios_avanza_el_watermark(bd, tmp_path):
+    watermark = tmp_path / "watermark.txt"
+    db.execute("UPDATE Medico SET Estado = 'Inactivo' WHERE id_medico = (SELECT MIN(id_medico) FROM Medico)")
+    argumentos = ["--bd", bd, "-q", "exportar", "cambios", "--watermark", str(watermark), "--salida", str(tmp_path / "c.zip")]
+
+    assert cli.main(argumentos) == cli.SALIDA_OK
+    assert watermark.read_text().strip() == "1"
+    assert (tmp_path / "c.zip").exists()
+
+
+def test_interrumpido_sale_con_130(bd, monkeypatch):
+    def interrumpir(args, progreso):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, "cmd_analizar", interrumpir)
+    assert cli.main(["--bd", bd, "analizar"]) == cli.SALIDA_INTERRUMPIDA
+
+
+def test_codigo_del_proceso(bd, tmp_path):
+    archivo = _csv(tmp_path, "Pacientes.csv", ["12.345.678-4,Malo"])
+    correr = lambda *a: subprocess.run([sys.executable, "cli.py", "--bd", bd, "-q", *a], cwd=RAIZ, capture_output=True)
+
+    assert correr("analizar").returncode == cli.SALIDA_OK
+    assert correr("importar", archivo).returncode == cli.SALIDA_RECHAZOS
+    assert correr("respaldar").returncode == 2  # uso incorrecto: argparse
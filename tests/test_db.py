@@ -0,0 +1,55 @@
+"""Caché de columnas de db.py: aciertos entre llamadas e invalidación al cambiar el esquema."""
+import contextlib
+import sqlite3
+
+import db
+import generador_datos
+
+
+def test_columnas_en_cache_entre_llamadas(bd):
+    db.columnas_tabla("Paciente")
+    antes = db.estadisticas_cache()["columnas"]
+
+    for _ in range(3):
+        assert db.has_column("Paciente", "RUT")  # sin distinguir mayúsculas
+
+    despues = db.estadisticas_cache()["columnas"]
+    assert (despues["aciertos"] - antes["aciertos"], despues["fallos"] - antes["fallos"]) == (3, 0)
+
+
+def test_alter_table_invalida_la_cache(bd):
+    assert not db.has_column("Paciente", "apodo")
+
+    db.execute("ALTER TABLE Paciente ADD COLUMN apodo TEXT")
+
+    assert db.has_column("Paciente", "apodo")
+
+
+def test_drop_table_invalida_la_cache(bd):
+    db.execute("CREATE TABLE Temporal (a INTEGER, b TEXT)")
+    assert db.columnas_tabla("Temporal") == {"a", "b"}
+
+    db.execute("DROP TABLE Temporal")
+
+    assert db.columnas_tabla("Temporal") == frozenset()
+
+
+def test_tabla_inexistente_no_queda_en_cache(bd):
+    assert db.columnas_tabla("Nueva") == frozenset()
+
+    db.execute("CREATE TABLE Nueva (x INTEGER)")  # CREATE no invalida: no hay nada que olvidar
+
+    assert db.columnas_tabla("Nueva") == {"x"}
+
+
+def test_cache_separada_por_bd(bd, tmp_path):
+    assert not db.has_column("Paciente", "solo_en_la_otra")  # queda en caché para `bd`
+    otra = str(tmp_path / "otra.db")
+    with contextlib.closing(sqlite3.connect(bd)) as conn:
+        conn.execute("VACUUM INTO ?", (otra,))
+    with contextlib.closing(sqlite3.connect(otra)) as conn:
+        conn.execute("ALTER TABLE Paciente ADD COLUMN solo_en_la_otra TEXT")  # por fuera de execute
+
+    with generador_datos.usando_bd(otra):
+        assert db.has_column("Paciente", "solo_en_la_otra")
+    assert not db.has_column("Paciente", "solo_en_la_otra")
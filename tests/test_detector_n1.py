@@ -0,0 +1,51 @@
+"""detector_n1: presupuesto de consultas por bloque y detección de consultas repetidas (N+1)."""
+import pathlib
+
+import pytest
+
+import db
+from detector_n1 import PresupuestoExcedido, limitar_consultas
+
+APP_PAGINA = str(pathlib.Path(__file__).resolve().parent.parent / "benchmarks" / "app_pagina.py")
+
+
+def _ids_pacientes(n: int) -> list:
+    return [fila[0] for fila in db.fetch_all("SELECT id_paciente FROM Paciente ORDER BY id_paciente LIMIT ?", (n,))]
+
+
+def test_una_consulta_por_fila_es_un_n1(bd):
+    ids = _ids_pacientes(6)
+
+    with pytest.raises(PresupuestoExcedido, match=r"N\+1: 6×") as error:
+        with limitar_consultas():
+            for id_paciente in ids:
+                db.fetch_one("SELECT nombre FROM Paciente WHERE id_paciente = ?", (id_paciente,))
+
+    assert "test_detector_n1.py" in str(error.value)  # línea que pidió la consulta
+
+
+def test_presupuesto_excedido(bd):
+    with pytest.raises(PresupuestoExcedido, match="3 consultas, presupuesto 2"):
+        with limitar_consultas(maximo=2):
+            for tabla in ("Paciente", "Medico", "Cita"):
+                db.fetch_one(f"SELECT COUNT(*) FROM {tabla}")
+
+
+def test_el_fixture_falla_la_prueba_con_el_detalle(bd, presupuesto_consultas):
+    ids = _ids_pacientes(5)
+
+    with pytest.raises(pytest.fail.Exception, match=r"N\+1: 5×"):
+        with presupuesto_consultas():
+            for id_paciente in ids:
+                db.fetch_one("SELECT nombre FROM Paciente WHERE id_paciente = ?", (id_paciente,))
+
+
+def test_pagina_de_pacientes_dentro_del_presupuesto(bd, presupuesto_consultas, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setenv("SGP_BENCH_PAGINA", "ui_pacientes")
+    with presupuesto_consultas(maximo=25) as consultas:
+        app = AppTest.from_file(APP_PAGINA, default_timeout=60).run()
+
+    assert not app.exception
+    assert consultas  # la página sí pasó por db.py
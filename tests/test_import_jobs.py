@@ -0,0 +1,139 @@
+"""Jobs de importación: reanudación desde el último checkpoint, dueño por latido y cierre del lector."""
+import contextlib
+import gc
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+import db
+import import_export
+import import_jobs
+
+from tests.conftest import csv, ruts_nuevos
+
+
+def _esperar(job_id: int, segundos: float = 30) -> dict:
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        job = db.fetch_one("SELECT * FROM ImportJob WHERE id = ?", (job_id,))
+        if job["estado"] not in import_jobs.ESTADOS_ACTIVOS:
+            return dict(job)
+        time.sleep(0.05)
+    raise AssertionError(f"el job {job_id} no terminó en {segundos} s")
+
+
+def test_reanudar_desde_el_ultimo_checkpoint(bd, monkeypatch):
+    ruts = ruts_nuevos(25)
+    archivo = csv("rut,nombre", [f"{r},Job {i}" for i, r in enumerate(ruts)])
+    antes = db.fetch_one("SELECT COUNT(*) FROM Paciente")[0]
+
+    llamadas = []
+    insertar = import_export._insertar_filas
+
+    def contando(conn, tabla, cols, reporte):
+        llamadas.append(reporte["chunks"])
+        if len(llamadas) == 3 and fallar:
+            raise RuntimeError("corte simulado")
+        return insertar(conn, tabla, cols, reporte)
+
+    fallar = True
+    monkeypatch.setattr(import_export, "_insertar_filas", contando)
+    job_id = import_jobs.crear_job("Pacientes", archivo, nombre="pacientes.csv", chunksize=5)
+    job = _esperar(job_id)
+
+    assert (job["estado"], job["error"]) == ("fallida", "corte simulado")
+    assert db.fetch_one("SELECT MAX(chunk) FROM ImportCheckpoint WHERE job_id = ?", (job_id,))[0] == 1
+    assert db.fetch_one("SELECT COUNT(*) FROM Paciente")[0] == antes + 10  # solo los chunks confirmados
+
+    fallar, llamadas[:] = False, []
+    import_jobs.reanudar_job(job_id)
+    job = _esperar(job_id)
+
+    assert job["estado"] == "completada"
+    assert len(llamadas) == 3  # chunks 3, 4 y 5: los dos primeros no se vuelven a leer ni insertar
+    assert (job["filas_leidas"], job["insertadas"], job["progreso"]) == (25, 25, 1.0)
+    assert db.fetch_one("SELECT COUNT(*) FROM Paciente")[0] == antes + 25
+    nombres = [r[0] for r in db.fetch_all(f"SELECT nombre FROM Paciente WHERE rut IN ({', '.join('?' * 25)})", ruts)]
+    assert sorted(nombres) == sorted(f"Job {i}" for i in range(25))  # ninguno repetido ni perdido
+
+
+def _job_activo(pid: int, hace_segundos: int) -> int:
+    """Job 'corriendo' de otro proceso cuyo último latido fue hace `hace_segundos`."""
+    return db.execute(
+        """INSERT INTO ImportJob (entidad, archivo, chunksize, estado, pid, latido)
+           VALUES ('Pacientes', 'no-existe', 5, 'corriendo', ?, strftime('%Y-%m-%d %H:%M:%f', 'now', ?))""",
+        (pid, f"-{hace_segundos} seconds"),
+    )
+
+
+def test_solo_se_recuperan_jobs_sin_latido(bd, monkeypatch):
+    vivo = _job_activo(os.getpid() + 1, hace_segundos=1)
+    huerfano = _job_activo(os.getpid() + 2, hace_segundos=import_jobs.LATIDO_VENCIDO + 5)
+    monkeypatch.setattr(import_jobs, "_ultima_revision", None)
+
+    assert import_jobs.recuperar_jobs(reanudar=False) == [huerfano]
+    estados = dict(db.fetch_all("SELECT id, estado FROM ImportJob WHERE id IN (?, ?)", (vivo, huerfano)))
+    assert estados == {vivo: "corriendo", huerfano: "interrumpida"}  # el del otro proceso vivo sigue suyo
+
+
+def test_cancelar_un_job_de_otro_proceso_no_borra_su_archivo(bd, tmp_path):
+    job_id = _job_activo(os.getpid() + 1, hace_segundos=1)
+    copia = tmp_path / "job"
+    copia.write_bytes(b"rut,nombre")
+    db.execute("UPDATE ImportJob SET archivo = ? WHERE id = ?", (str(copia), job_id))
+
+    import_jobs.cancelar_job(job_id)
+
+    assert db.fetch_one("SELECT estado FROM ImportJob WHERE id = ?", (job_id,))[0] == "cancelada"
+    assert copia.exists()  # lo borra su dueño al ver la cancelación en el próximo checkpoint
+
+
+def test_entre_chunks_no_retiene_el_lock(bd, monkeypatch):
+    leer = import_export._leer_limpio
+    libre = []
+
+    def leer_y_probar(*args, **kwargs):
+        for chunk in leer(*args, **kwargs):
+            # Mientras se lee y limpia el chunk, otra conexión tiene que poder escribir
+            with contextlib.closing(sqlite3.connect(bd, timeout=0, isolation_level=None)) as otra:
+                try:
+                    otra.execute("BEGIN IMMEDIATE")
+                    otra.execute("ROLLBACK")
+                    libre.append(True)
+                except sqlite3.OperationalError:
+                    libre.append(False)
+            yield chunk
+
+    monkeypatch.setattr(import_export, "_leer_limpio", leer_y_probar)
+    archivo = csv("rut,nombre", [f"{r},Lock {i}" for i, r in enumerate(ruts_nuevos(12))])
+
+    reporte = import_export.importar_csv("Pacientes", archivo, chunksize=4, checkpoint=lambda conn, n, r: True)
+
+    assert reporte["insertadas"] == 12
+    assert libre == [True, True, True]
+
+
+def test_tras_un_error_el_lector_se_libera_con_el_archivo_abierto(bd, tmp_path, monkeypatch):
+    ruta = tmp_path / "pacientes.csv"
+    ruta.write_text("\n".join(["rut,nombre", *(f"{r},Corte {i}" for i, r in enumerate(ruts_nuevos(10)))]))
+    insertar = import_export._insertar_filas
+
+    def fallar_en_el_segundo(conn, tabla, cols, reporte):
+        if reporte["chunks"] == 2:
+            raise RuntimeError("corte simulado")
+        return insertar(conn, tabla, cols, reporte)
+
+    monkeypatch.setattr(import_export, "_insertar_filas", fallar_en_el_segundo)
+    no_reportadas = []
+    monkeypatch.setattr(sys, "unraisablehook", no_reportadas.append)
+
+    # La traza del error (como en el except de _ejecutar) mantiene vivo el frame de importar_csv
+    with pytest.raises(RuntimeError) as error, open(ruta, "rb") as archivo:
+        import_export.importar_csv("Pacientes", archivo, chunksize=2, checkpoint=lambda conn, n, r: True)
+    del error
+    gc.collect()
+
+    assert no_reportadas == []  # el lector de pandas no queda para el recolector, con el archivo ya cerrado
@@ -0,0 +1,134 @@
+"""Importación por chunks (importar_csv): conteos de aceptadas y rechazadas, y una sola transacción."""
+import pandas as pd
+import pytest
+
+import db
+from import_export import importar_csv
+
+from tests.conftest import csv, ruts_nuevos
+
+
+def _contar_pacientes() -> int:
+    return db.fetch_one("SELECT COUNT(*) FROM Paciente")[0]
+
+
+def test_conteos_por_chunk(bd):
+    nuevos = ruts_nuevos(23)
+    existente = db.fetch_one("SELECT rut FROM Paciente LIMIT 1")[0]
+    filas = [f"{r},Paciente {i},nombre{i}@mail.cl" for i, r in enumerate(nuevos)]
+    filas += [
+        "12.345.678-4,RUT malo,malo@mail.cl",       # DV incorrecto
+        f"{nuevos[1]},Repetido,rep@mail.cl",        # duplicada en el archivo (en otro chunk)
+        f"{existente},Ya existe,existe@mail.cl",    # ya está en la BD
+        f"{ruts_nuevos(1, 100)[0]},Correo malo,sin-arroba",
+    ]
+    antes = _contar_pacientes()
+
+    reporte = importar_csv("Pacientes", csv("rut,nombre,correo", filas), chunksize=10)
+
+    assert reporte["filas_leidas"] == 27
+    assert reporte["chunks"] == 3
+    assert reporte["insertadas"] == 23
+    assert reporte["invalidas"] == 2
+    assert reporte["duplicadas"] == 1
+    assert reporte["existentes"] == 1
+    assert reporte["errores"] == []
+    assert sorted(r["fila"] for r in reporte["rechazos"]) == [24, 27]
+    assert _contar_pacientes() == antes + 23
+    nombre = db.fetch_one("SELECT nombre FROM Paciente WHERE rut = ?", (nuevos[1],))[0]
+    assert nombre == "Paciente 1"  # la repetición de otro chunk no pisa a la primera
+
+
+def test_un_error_de_lectura_revierte_todo_el_archivo(bd):
+    filas = [f"{r},Paciente {i}" for i, r in enumerate(ruts_nuevos(30))]
+    filas.insert(25, '"comilla sin cerrar,x')  # el parser falla en el tercer chunk
+    antes = _contar_pacientes()
+
+    with pytest.raises(pd.errors.ParserError):
+        importar_csv("Pacientes", csv("rut,nombre", filas), chunksize=10)
+
+    assert _contar_pacientes() == antes  # los dos chunks ya insertados se revierten
+
+
+def test_citas_por_id(bd):
+    paciente = db.fetch_one("SELECT MIN(id_paciente) FROM Paciente")[0]
+    medico = db.fetch_one("SELECT MIN(id_medico) FROM Medico")[0]
+    filas = [
+        f"2031-02-03,9:00,{paciente},{medico}",
+        f"03/02/2031,09:30,{paciente},{medico}",
+        f"2031-02-03,25:00,{paciente},{medico}",  # hora inválida
+        f"2031-02-03,09:00:00,{paciente},{medico}",  # misma cita que la primera
+    ]
+
+    reporte = importar_csv("Citas", csv("fecha,hora,id_paciente,id_medico", filas), chunksize=2)
+
+    assert (reporte["insertadas"], reporte["omitidas"], reporte["duplicadas"]) == (2, 1, 1)
+    horas = db.fetch_all("SELECT fecha, hora FROM Cita WHERE fecha = '2031-02-03' ORDER BY hora")
+    assert [tuple(r) for r in horas] == [("2031-02-03", "09:00:00"), ("2031-02-03", "09:30:00")]
+
+
+def test_fichas_con_signos_vitales_quedan_en_su_ficha(bd):
+    paciente = db.fetch_one("SELECT MIN(id_paciente) FROM Paciente")[0]
+    ultima = db.fetch_one("SELECT MAX(ID_Ficha) FROM FichaMedica")[0]
+    # Se borra la última ficha: AUTOINCREMENT no debe reutilizar su ID
+    for tabla, fk in (("SignosVitales", "ID_Ficha_Medica"), ("Prescripcion", "ID_Ficha_Medica")):
+        db.execute(f"DELETE FROM {tabla} WHERE {fk} = ?", (ultima,))
+    db.execute("DELETE FROM ResultadoExamen WHERE id_paciente = (SELECT id_paciente FROM FichaMedica WHERE ID_Ficha = ?)", (ultima,))
+    db.execute("DELETE FROM SolicitudExamen WHERE ID_ficha_medica = ?", (ultima,))
+    db.execute("DELETE FROM FichaMedica WHERE ID_Ficha = ?", (ultima,))
+
+    filas = []
+    for i in range(12):
+        signos = f"1{i:02d}/80,36.{i},{60 + i},{70 + i}" if i % 3 else ",,,"  # cada tercera, sin signos
+        filas.append(f"{paciente},2031-03-{i + 1:02d} 10:00,motivo {i},{signos}")
+    # Misma (paciente, fecha) que la fila 2 pero en otro chunk: se descarta junto con sus signos
+    filas.append(f"{paciente},2031-03-02 10:00,motivo 1 repetido,199/99,40.1,61,71")
+
+    reporte = importar_csv(
+        "FichaMedica",
+        csv("id_paciente,fecha_hora,motivo_consulta,presion_arterial,Temperatura,Frecuencia_cardiaca,peso", filas),
+        chunksize=5,
+    )
+
+    assert (reporte["insertadas"], reporte["duplicadas"], reporte["signos_vitales"]) == (12, 1, 8)
+    fichas = db.fetch_all(
+        """
+        SELECT F.ID_Ficha, F.motivo_consulta, SV.presion_arterial, SV.Frecuencia_cardiaca
+        FROM FichaMedica F LEFT JOIN SignosVitales SV ON SV.ID_Ficha_Medica = F.ID_Ficha
+        WHERE F.fecha_hora LIKE '2031-03-%'
+        """
+    )
+    assert len(fichas) == 12
+    assert not any(f["motivo_consulta"].endswith("repetido") for f in fichas)
+    assert min(f["ID_Ficha"] for f in fichas) > ultima
+    for f in fichas:
+        i = int(f["motivo_consulta"].split()[1])
+        if i % 3 == 0:
+            assert f["presion_arterial"] is None
+        else:
+            assert (f["presion_arterial"], str(f["Frecuencia_cardiaca"])) == (f"1{i:02d}/80", str(60 + i))
+
+
+def test_simulacion_no_escribe(bd):
+    antes = _contar_pacientes()
+    filas = [f"{r},Simulado {i}" for i, r in enumerate(ruts_nuevos(15))]
+
+    reporte = importar_csv("Pacientes", csv("rut,nombre", filas), chunksize=4, simular=True)
+
+    assert reporte["insertadas"] == 15
+    assert _contar_pacientes() == antes
+    assert db.fetch_one("SELECT COUNT(*) FROM CambioLog")[0] == 0
+
+
+def test_referencias_sin_resolver_se_rechazan(bd):
+    paciente = db.fetch_one("SELECT rut FROM Paciente LIMIT 1")[0]
+    medico = db.fetch_one("SELECT Rut FROM Medico LIMIT 1")[0]
+    filas = [
+        f"{paciente},{medico},2031-02-03,09:00,Agendada",
+        f"{ruts_nuevos(1)[0]},{medico},2031-02-03,09:30,Agendada",  # paciente que no existe
+    ]
+
+    reporte = importar_csv("Citas", csv("rut_paciente,rut_medico,fecha,hora,estado", filas), chunksize=1)
+
+    assert (reporte["insertadas"], reporte["invalidas"], reporte["chunks"]) == (1, 1, 2)
+    assert [(r["fila"], r["motivos"]) for r in reporte["rechazos"]] == [(2, "rut_paciente no registrado en Paciente")]
@@ -0,0 +1,74 @@
+"""metricas: formato de texto de Prometheus (0.0.4) y servidor /metrics."""
+import urllib.request
+
+import pytest
+
+import db
+import metricas
+
+
+@pytest.fixture
+def limpias():
+    metricas.reiniciar()
+    yield
+    metricas.reiniciar()
+
+
+def _lineas(nombre: str) -> list:
+    return [l for l in metricas.texto().splitlines() if l.split("{")[0].split(" ")[0].startswith(nombre)]
+
+
+def test_histograma_con_buckets_acumulados(limpias):
+    metricas.definir("prueba_render_segundos", "histogram", "Render de prueba.", ("pagina",), limites=(0.1, 1.0))
+    for valor in (0.05, 0.5, 0.5, 3.0):
+        metricas.observar("prueba_render_segundos", valor, "Pacientes")
+
+    texto = metricas.texto()
+
+    assert "# HELP prueba_render_segundos Render de prueba.\n# TYPE prueba_render_segundos histogram\n" in texto
+    assert _lineas("prueba_render_segundos") == [
+        'prueba_render_segundos_bucket{pagina="Pacientes",le="0.1"} 1',
+        'prueba_render_segundos_bucket{pagina="Pacientes",le="1.0"} 3',
+        'prueba_render_segundos_bucket{pagina="Pacientes",le="+Inf"} 4',
+        'prueba_render_segundos_sum{pagina="Pacientes"} 4.05',
+        'prueba_render_segundos_count{pagina="Pacientes"} 4',
+    ]
+    assert texto.endswith("\n")
+
+
+def test_contador_gauge_y_etiquetas_escapadas(limpias):
+    metricas.definir("prueba_total", "counter", "Contador de prueba.", ("consulta",))
+    metricas.definir("prueba_filas", "gauge", "Gauge de prueba.")
+    metricas.incrementar("prueba_total", 'SELECT "x" FROM t\\n\nWHERE 1')
+    metricas.incrementar("prueba_total", 'SELECT "x" FROM t\\n\nWHERE 1', valor=2)
+    metricas.fijar("prueba_filas", 12.5)
+
+    assert _lineas("prueba_total") == ['prueba_total{consulta="SELECT \\"x\\" FROM t\\\\n\\nWHERE 1"} 3']
+    assert _lineas("prueba_filas") == ["prueba_filas 12.5"]
+
+
+def test_series_sobre_el_maximo_van_a_otros(limpias, monkeypatch):
+    monkeypatch.setattr(metricas, "MAX_SERIES", 2)
+    metricas.definir("prueba_por_tabla_total", "counter", "Series acotadas.", ("tabla",))
+    for tabla in ("A", "B", "C", "D"):
+        metricas.incrementar("prueba_por_tabla_total", tabla)
+
+    assert _lineas("prueba_por_tabla_total") == [
+        'prueba_por_tabla_total{tabla="A"} 1',
+        'prueba_por_tabla_total{tabla="B"} 1',
+        'prueba_por_tabla_total{tabla="otros"} 2',
+    ]
+
+
+def test_consultas_de_db_y_servidor_metrics(bd, limpias):
+    db.fetch_one("SELECT COUNT(*) FROM Paciente WHERE id_paciente > 10")
+    servidor = metricas.iniciar_servidor(0)
+
+    with urllib.request.urlopen(f"http://127.0.0.1:{servidor.server_address[1]}/metrics", timeout=10) as r:
+        tipo, cuerpo = r.headers["Content-Type"], r.read().decode("utf-8")
+
+    assert tipo == "text/plain; version=0.0.4; charset=utf-8"
+    assert "# TYPE sgp_consulta_segundos histogram" in cuerpo
+    cuentas = [l for l in cuerpo.splitlines() if l.startswith("sgp_consulta_segundos_count")]
+    assert any('consulta="SELECT COUNT(*) FROM Paciente WHERE id_paciente > ?"' in l for l in cuentas)
+    assert "sgp_cache_aciertos_total" in cuerpo  # recolector de db.py
@@ -0,0 +1,74 @@
+"""importar_paquete: lectura en procesos aparte por chunks, enlace por RUT entre archivos y una sola transacción."""
+import gzip
+import zipfile
+
+import pytest
+
+import db
+from import_export import importar_paquete
+
+from tests.conftest import ruts_nuevos
+
+
+def _paquete(tmp_path, archivos: dict) -> str:
+    ruta = str(tmp_path / "paquete.zip")
+    with zipfile.ZipFile(ruta, "w", zipfile.ZIP_DEFLATED) as zf:
+        for nombre, lineas in archivos.items():
+            contenido = "\n".join(lineas).encode("utf-8")
+            zf.writestr(nombre, gzip.compress(contenido) if nombre.endswith(".gz") else contenido)
+    return ruta
+
+
+def _contar(tabla: str) -> int:
+    return db.fetch_one(f"SELECT COUNT(*) FROM {tabla}")[0]
+
+
+def test_citas_se_enlazan_con_pacientes_del_mismo_paquete(bd, tmp_path):
+    ruts = ruts_nuevos(9)
+    medico = db.fetch_one("SELECT Rut FROM Medico LIMIT 1")[0]
+    ruta = _paquete(tmp_path, {
+        "Pacientes_export.csv.gz": ["rut,nombre", *(f"{r},Paquete {i}" for i, r in enumerate(ruts)), "1-1,Malo"],
+        "Citas.csv": [
+            "rut_paciente,rut_medico,fecha,hora,estado",
+            *(f"{r},{medico},2032-01-{i + 1:02d},10:00,Agendada" for i, r in enumerate(ruts)),
+        ],
+        "notas.txt": ["no es una entidad"],
+    })
+    antes = {t: _contar(t) for t in ("Paciente", "Cita")}
+
+    resultado = importar_paquete(ruta, chunksize=4)
+
+    pacientes, citas = resultado["reportes"]["Pacientes"], resultado["reportes"]["Citas"]
+    assert (pacientes["filas_leidas"], pacientes["chunks"], pacientes["insertadas"], pacientes["invalidas"]) == (10, 3, 9, 1)
+    assert [r["fila"] for r in pacientes["rechazos"]] == [10]
+    assert (citas["insertadas"], citas["invalidas"]) == (9, 0)
+    assert resultado["avisos"] == ["notas.txt: no corresponde a ninguna entidad; se ignoró."]
+    assert _contar("Paciente") == antes["Paciente"] + 9
+    assert _contar("Cita") == antes["Cita"] + 9
+    enlazadas = db.fetch_one(
+        "SELECT COUNT(*) FROM Cita C JOIN Paciente P ON P.id_paciente = C.id_paciente WHERE P.nombre LIKE 'Paquete %'"
+    )[0]
+    assert enlazadas == 9
+
+
+def test_si_un_archivo_falla_no_queda_nada(bd, tmp_path):
+    ruta = _paquete(tmp_path, {
+        "Pacientes.csv": ["rut,nombre", *(f"{r},Revertido" for r in ruts_nuevos(6))],
+        "Citas.csv": ["12345", "67890"],  # sin encabezado: falla al leerse, después de insertar los pacientes
+    })
+    antes = {t: _contar(t) for t in ("Paciente", "Cita", "CambioLog")}
+
+    with pytest.raises(ValueError, match="Citas.csv"):
+        importar_paquete(ruta, chunksize=2)
+
+    assert {t: _contar(t) for t in antes} == antes
+
+
+def test_simular_revierte_todo(bd, tmp_path):
+    ruta = _paquete(tmp_path, {"Pacientes.csv": ["rut,nombre", *(f"{r},Simulado" for r in ruts_nuevos(5))]})
+    antes = _contar("Paciente")
+
+    resultado = importar_paquete(ruta, simular=True)
+
+    assert resultado["reportes"]["Pacientes"]["insertadas"] == 5
+    assert _contar("Paciente") == antes
@@ -0,0 +1,62 @@
+"""benchmarks.planes: comparación con la foto de planes (planes_base.json) y justificaciones."""
+import contextlib
+import json
+import sqlite3
+
+import pytest
+
+from benchmarks import planes
+
+
+@pytest.fixture
+def base() -> dict:
+    with open(planes.ARCHIVO_BASE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _planes_actuales(ruta: str) -> dict:
+    with contextlib.closing(sqlite3.connect(ruta)) as conn:
+        conn.execute("ANALYZE")
+        tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return planes.planes_registrados(conn, tablas)
+
+
+def test_consultas_registradas_sin_regresiones(bd, base):
+    if base["meta"]["sqlite"] != sqlite3.sqlite_version:
+        pytest.skip(f"la foto se tomó con SQLite {base['meta']['sqlite']}")
+
+    actual = _planes_actuales(bd)
+
+    assert set(actual) <= set(base["consultas"])
+    assert planes.comparar(actual, base["consultas"]) == []
+    assert planes.sin_justificar(actual, base["consultas"]) == []
+
+
+def test_sin_el_indice_por_rut_es_una_regresion(bd, base):
+    with contextlib.closing(sqlite3.connect(bd)) as conn:
+        conn.execute("DROP INDEX idx_paciente_rut_canon")
+
+    actual = _planes_actuales(bd)
+
+    regresiones = dict(planes.comparar(actual, base["consultas"]))
+    assert regresiones["rut/paciente"] == ["escaneo:Paciente"]
+    sql = planes.CONSULTAS["rut/paciente"]()[0]
+    assert "índice sobre la expresión" in planes.sugerir("escaneo:Paciente", sql, {"Paciente"})
+
+
+def test_problema_aceptado_sin_justificacion():
+    actual = {"q": {"problemas": ["escaneo:Cita", "temp_btree:ORDER BY"]}}
+    base = {"q": {
+        "problemas": ["escaneo:Cita", "temp_btree:ORDER BY"],
+        "justificaciones": {"escaneo:Cita": "la tabla completa es el resultado", "temp_btree:ORDER BY": "  "},
+    }}
+
+    assert planes.comparar(actual, base) == []
+    assert planes.sin_justificar(actual, base) == [("q", ["temp_btree:ORDER BY"])]
+
+
+def test_problema_repetido_cuenta_como_nuevo():
+    actual = {"q": {"problemas": ["escaneo:Cita", "escaneo:Cita"]}}
+    base = {"q": {"problemas": ["escaneo:Cita"], "justificaciones": {"escaneo:Cita": "exportación completa"}}}
+
+    assert planes.comparar(actual, base) == [("q", ["escaneo:Cita"])]
@@ -0,0 +1,77 @@
+"""Modo upsert de importar_csv: diff en simulación, aplicación y hash_fila tras ediciones fuera del import."""
+import db
+from import_export import importar_csv
+from Validaciones import sql_rut_canonico
+
+from tests.conftest import csv, ruts_nuevos
+
+ENCABEZADO = "rut,nombre,telefono"
+
+
+def _archivo(ruts, sufijo=""):
+    return csv(ENCABEZADO, [f"{r},Paciente {i}{sufijo},9{i:08d}" for i, r in enumerate(ruts)])
+
+
+def _nombre(rut):
+    return db.fetch_one("SELECT nombre FROM Paciente WHERE rut = ?", (rut,))[0]
+
+
+def test_simulacion_clasifica_sin_escribir(bd):
+    ruts = ruts_nuevos(6)
+    importar_csv("Pacientes", _archivo(ruts[:4]), modo="upsert")
+    antes = db.fetch_all("SELECT * FROM Paciente ORDER BY id_paciente")
+    watermark = db.fetch_one("SELECT MAX(seq) FROM CambioLog")[0]
+
+    # 2 iguales, 2 cambiadas (nombre), 2 nuevas y una inválida
+    filas = [f"{r},Paciente {i},9{i:08d}" for i, r in enumerate(ruts[:2])]
+    filas += [f"{r},Paciente {i + 2} bis,9{i + 2:08d}" for i, r in enumerate(ruts[2:4])]
+    filas += [f"{r},Nuevo {i},9{i:08d}" for i, r in enumerate(ruts[4:])]
+    filas.append("12.345.678-4,Malo,900000000")
+    reporte = importar_csv("Pacientes", csv(ENCABEZADO, filas), modo="upsert", simular=True, chunksize=3)
+
+    assert (reporte["nuevas"], reporte["cambiadas"], reporte["sin_cambios"], reporte["rechazadas"]) == (2, 2, 2, 1)
+    assert (reporte["insertadas"], reporte["actualizadas"]) == (0, 0)
+    assert sorted(reporte["muestra_cambiadas"]) == sorted(ruts[2:4])
+    assert db.fetch_all("SELECT * FROM Paciente ORDER BY id_paciente") == antes
+    assert db.fetch_one("SELECT MAX(seq) FROM CambioLog")[0] == watermark
+
+
+def test_aplicar_actualiza_solo_las_cambiadas(bd):
+    ruts = ruts_nuevos(5)
+    primera = importar_csv("Pacientes", _archivo(ruts), modo="upsert")
+    assert (primera["nuevas"], primera["insertadas"]) == (5, 5)
+    watermark = db.fetch_one("SELECT MAX(seq) FROM CambioLog")[0]
+
+    filas = [f"{r},Paciente {i}{' bis' if i < 2 else ''},9{i:08d}" for i, r in enumerate(ruts)]
+    reporte = importar_csv("Pacientes", csv(ENCABEZADO, filas), modo="upsert")
+
+    assert (reporte["cambiadas"], reporte["actualizadas"], reporte["sin_cambios"]) == (2, 2, 3)
+    assert [_nombre(r) for r in ruts[:3]] == ["Paciente 0 bis", "Paciente 1 bis", "Paciente 2"]
+    cambios = db.fetch_all("SELECT tabla, op FROM CambioLog WHERE seq > ?", (watermark,))
+    assert [tuple(c) for c in cambios] == [("Paciente", "U")] * 2  # las iguales no se tocan
+
+
+def test_edicion_fuera_del_import_se_restaura(bd):
+    ruts = ruts_nuevos(3)
+    importar_csv("Pacientes", _archivo(ruts), modo="upsert")
+    db.execute("UPDATE Paciente SET nombre = 'Editado en la app' WHERE rut = ?", (ruts[0],))
+    assert db.fetch_one("SELECT hash_fila FROM Paciente WHERE rut = ?", (ruts[0],))[0] is None
+
+    simulado = importar_csv("Pacientes", _archivo(ruts), modo="upsert", simular=True)
+    assert (simulado["cambiadas"], simulado["sin_cambios"]) == (1, 2)
+
+    reporte = importar_csv("Pacientes", _archivo(ruts), modo="upsert")
+    assert reporte["actualizadas"] == 1
+    assert _nombre(ruts[0]) == "Paciente 0"
+    assert db.fetch_one("SELECT hash_fila FROM Paciente WHERE rut = ?", (ruts[0],))[0] is not None
+    assert importar_csv("Pacientes", _archivo(ruts), modo="upsert", simular=True)["sin_cambios"] == 3
+
+
+def test_indice_con_la_forma_anterior_del_rut_se_recrea(bd):
+    db.execute("DROP INDEX idx_paciente_rut_canon")
+    db.execute("CREATE INDEX idx_paciente_rut_canon ON Paciente(UPPER(REPLACE(REPLACE(TRIM(rut), '.', ''), '-', '')))")
+
+    db.init_db()
+
+    plan = db.fetch_all(f"EXPLAIN QUERY PLAN SELECT id_paciente FROM Paciente WHERE {sql_rut_canonico('rut')} = '12345678K'")
+    assert any("idx_paciente_rut_canon" in p["detail"] for p in plan)
@@ -0,0 +1,143 @@
+"""
+Propiedades de la validación de RUT: los caminos por columna (validar_rut_serie) y por lotes
+(validar_ruts, normalizar_ruts) dan exactamente lo mismo que validar_rut / normalizar_rut
+aplicados fila a fila, con cualquier entrada (Unicode, nulos, basura), y la forma canónica
+es la misma en Python, en pandas y en SQL.
+"""
+import re
+import sqlite3
+
+import pandas as pd
+import pytest
+from hypothesis import example, given, settings
+from hypothesis import strategies as st
+
+from Validaciones import (
+    canonizar_rut,
+    canonizar_ruts_serie,
+    normalizar_rut,
+    normalizar_ruts,
+    sql_rut_canonico,
+    validar_rut,
+    validar_rut_serie,
+    validar_ruts,
+)
+
+# Dígitos Unicode (árabe-índicos, superíndice), espacios raros y letras fuera de ASCII
+ALFABETO_RUT = "0123456789kK.- \t\n\u00a0\u0663\u00b2\u00f1@x"
+NULOS = [None, float("nan"), pd.NA]
+
+
+def dv(cuerpo: int) -> str:
+    """Dígito verificador por módulo 11, escrito aparte de Validaciones para no probarlo contra sí mismo."""
+    suma = sum(int(c) * (2 + i % 6) for i, c in enumerate(reversed(str(cuerpo))))
+    return {11: "0", 10: "K"}.get(11 - suma % 11, str(11 - suma % 11))
+
+
+def con_puntos(cuerpo: str) -> str:
+    """'01234567' -> '01.234.567' (los ceros a la izquierda se conservan)."""
+    return re.sub(r"(\d)(?=(\d{3})+$)", r"\1.", cuerpo)
+
+
+@st.composite
+def ruts_validos(draw):
+    """(texto, forma canónica esperada): cuerpo de 7-8 dígitos con ceros a la izquierda, K/k, con o sin puntos y guion."""
+    cuerpo = draw(st.integers(0, 99_999_999))
+    texto = str(cuerpo).zfill(draw(st.integers(7, 8)) if cuerpo < 10_000_000 else 8)
+    verificador = dv(cuerpo)
+    canonico = f"{texto}{verificador}"
+    if draw(st.booleans()):
+        texto = con_puntos(texto)
+    if verificador == "K" and draw(st.booleans()):
+        verificador = "k"
+    texto += ("-" if draw(st.booleans()) else "") + verificador
+    relleno = st.sampled_from(["", " ", "  ", "\t"])
+    return draw(relleno) + texto + draw(relleno), canonico
+
+
+entradas = st.one_of(
+    ruts_validos().map(lambda par: par[0]),
+    st.text(alphabet=ALFABETO_RUT, max_size=14),
+    st.text(max_size=14),  # cualquier Unicode
+    st.sampled_from(NULOS),
+)
+
+
+def _igual(a, b) -> bool:
+    return a == b or (a is None and b is None)
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(entradas, max_size=40))
+@example(["12.345.678-5", "12345678-5", "123456785", "1.000.005-k", "01000005-K", "0.000.000-0", ""])
+@example(["\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668-5", "12.345.678-\u00b2", "1234567-\u00f1", "\u00a012345678-5"])
+@example(NULOS + ["", " ", "-", ".", "K"])
+def test_por_columna_y_por_lotes_coinciden_con_el_escalar(valores):
+    esperado = [validar_rut(v) for v in valores]
+    assert validar_rut_serie(pd.Series(valores, dtype=object)).tolist() == esperado
+    assert validar_ruts(valores).tolist() == esperado
+    normalizados = normalizar_ruts(valores)
+    assert len(normalizados) == len(valores)
+    assert all(_igual(n, normalizar_rut(v)) for n, v in zip(normalizados, valores))
+
+
+@settings(max_examples=300, deadline=None)
+@given(ruts_validos())
+def test_rut_valido_en_cualquier_formato(par):
+    texto, canonico = par
+    assert validar_rut(texto)
+    assert normalizar_rut(texto) == canonico
+    assert normalizar_ruts([texto]) == [canonico]
+
+
+@settings(max_examples=200, deadline=None)
+@given(ruts_validos(), st.sampled_from("0123456789K"))
+def test_dv_incorrecto_se_rechaza(par, otro):
+    texto, canonico = par
+    if otro == canonico[-1]:
+        return
+    malo = texto.rstrip()[:-1] + otro
+    assert not validar_rut(malo)
+    assert normalizar_ruts([malo]) == [None]
+
+
+@pytest.mark.parametrize("texto, canonico", [
+    ("12.345.678-5", "123456785"),
+    (" 123456785\t", "123456785"),
+    ("1.000.005-k", "1000005K"),
+    ("10000013K", "10000013K"),
+    ("0.123.456-0", "01234560"),       # cero a la izquierda: 8 caracteres, se conserva
+    ("123.456-0", None),               # 6 dígitos: muy corto
+    ("12.345.678-4", None),
+    ("12,345,678-5", None),
+    ("1234567\u00f1-5", None),
+    ("\u00b212345678-5", None),        # superíndice: no es dígito para int()
+    ("", None),
+])
+def test_casos_borde(texto, canonico):
+    assert normalizar_rut(texto) == canonico
+    assert validar_rut(texto) is (canonico is not None)
+    assert normalizar_ruts([texto]) == [canonico]
+    assert validar_ruts([texto]).tolist() == [canonico is not None]
+
+
+@pytest.mark.parametrize("valor", NULOS)
+def test_nulos_no_son_validos(valor):
+    assert not validar_rut(valor)
+    assert normalizar_rut(valor) is None
+    assert validar_ruts([valor]).tolist() == [False]
+    assert normalizar_ruts([valor]) == [None]
+    assert validar_rut_serie(pd.Series([valor], dtype=object)).tolist() == [False]
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(st.one_of(ruts_validos().map(lambda par: par[0]), st.text(alphabet=ALFABETO_RUT, max_size=14))))
+@example(["12.345.678-k", " 1.000.005-K\t", "\n01234560\r", "12345678-5 ."])
+def test_forma_canonica_igual_en_python_pandas_y_sql(valores):
+    esperado = [canonizar_rut(v) for v in valores]
+    serie = canonizar_ruts_serie(pd.Series(valores, dtype=object))
+    assert [None if pd.isna(c) else c for c in serie] == esperado
+    with sqlite3.connect(":memory:") as conn:
+        en_sql = [conn.execute(f"SELECT {sql_rut_canonico('?')}", (v,)).fetchone()[0] for v in valores]
+    # SQL no revisa la forma: donde hay RUT, da lo mismo que canonizar_rut
+    assert [c for c, e in zip(en_sql, esperado) if e is not None] == [e for e in esperado if e is not None]
@@ -1,5 +1,5 @@
 import streamlit as st
-from db import fetch_all, execute, expr_paciente_rut, expr_paciente_nombre, row_get, expr_medico_esp_aliased
+from db import fetch_all, execute, expr_paciente_rut, expr_paciente_nombre, row_get
 from datetime import date, time
 
 # -------------------------------------------------------------
@@ -17,7 +17,7 @@ def ui_citas():
                    {expr_paciente_rut()} AS rut,
                    {expr_paciente_nombre()} AS nombre
             FROM Paciente
-            ORDER BY COALESCE(nombre, '')
+            ORDER BY nombre
             """
         )
     except Exception as e:
@@ -118,6 +118,3 @@ def ui_citas():
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error al eliminar la cita: {e}")
-
-
-print(expr_medico_esp_aliased())  # Esto debería imprimir "E.especialidad AS especialidad"
@@ -185,7 +185,7 @@ def ui_ficha_medica():
                        observaciones
                 FROM FichaMedica
                 WHERE id_paciente = ?
-                ORDER BY datetime(fecha_hora) DESC
+                ORDER BY fecha_hora DESC
                 """,
                 (paciente_hist_id,)
             )
@@ -400,7 +400,7 @@ def ui_ficha_medica():
                 {expr_paciente_rut()}   AS rut,
                 {expr_paciente_nombre()} AS nombre
             FROM Paciente
-            ORDER BY COALESCE(nombre,'')
+            ORDER BY nombre
         """)
         if not pacientes:
             st.info("No hay pacientes.")
@@ -422,7 +422,7 @@ def ui_ficha_medica():
                 SELECT ID_Ficha, fecha_hora, motivo_consulta
                 FROM FichaMedica
                 WHERE ID_paciente = ?
-                ORDER BY datetime(fecha_hora) DESC
+                ORDER BY fecha_hora DESC
                 """,
                 (paciente_rx_id,)
             )
@@ -380,7 +380,7 @@ def ui_pacientes():
                    {ts_expr},
                    {prev_expr}
             FROM Paciente
-            ORDER BY COALESCE(nombre, '')
+            ORDER BY nombre
         """)
         st.dataframe([dict(r) for r in rows], use_container_width=True)
         
@@ -391,7 +391,7 @@ def ui_pacientes():
         pacientes = fetch_all("""
             SELECT id_paciente, {rut} AS rut, {nom} AS nombre
             FROM Paciente
-            ORDER BY COALESCE({nom}, '')
+            ORDER BY {nom}
         """.format(rut=expr_paciente_rut(), nom=expr_paciente_nombre()))
         if not pacientes:
             st.info("No hay pacientes para gestionar antecedentes.")
@@ -0,0 +1,179 @@
+import streamlit as st
+from db import fetch_all, has_column, row_get
+from ui_pacientes import listado_pacientes
+
+# -------------------------------------------------------------
+# Línea de tiempo del paciente
+# -------------------------------------------------------------
+PAGINA_TIMELINE = 50
+
+# Cursor inicial: mayor que cualquier (ts, tipo, id) posible
+CURSOR_INICIAL = ("9999-12-31 23:59:59", "~", 2**62)
+
+
+def _fk_resultado_examen() -> str:
+    """Columna de ResultadoExamen que apunta a SolicitudExamen (depende del esquema)."""
+    if has_column("ResultadoExamen", "ID_SolicitudExamen"):
+        return "ID_SolicitudExamen"
+    return "ID_Resultado_Examen"
+
+
+def _ramas_timeline(fk_resultado: str):
+    """
+    Cada rama devuelve eventos de una tabla para un paciente.
+    (tipo, expr_ts, expr_id, titulo, detalle, FROM/JOIN, filtro_indexado, ORDER BY)
+    El filtro y el orden usan la misma expresión (con COALESCE) que ts, así los eventos sin
+    fecha también aparecen (al final), y el índice (id_paciente, COALESCE(fecha, '')) de cada
+    tabla los sirve sin ordenar: exámenes, resultados y prescripciones llevan el id_paciente
+    de su ficha (ver db.init_db).
+    """
+    return [
+        (
+            "Cita",
+            "COALESCE(C.fecha, '') || ' ' || COALESCE(C.hora, '')",
+            "C.id_cita",
+            "'Cita con ' || COALESCE(M.nombre, '')",
+            "C.estado",
+            "Cita C LEFT JOIN Medico M ON M.id_medico = C.id_medico",
+            "C.id_paciente = :pid AND COALESCE(C.fecha, '') <= substr(:ts, 1, 10)",
+            "COALESCE(C.fecha, '') DESC, COALESCE(C.hora, '') DESC, C.id_cita DESC",
+        ),
+        (
+            "Ficha médica",
+            "COALESCE(F.fecha_hora, '')",
+            "F.ID_Ficha",
+            "F.motivo_consulta",
+            "F.observaciones",
+            "FichaMedica F",
+            "F.id_paciente = :pid AND COALESCE(F.fecha_hora, '') <= :ts",
+            "COALESCE(F.fecha_hora, '') DESC, F.ID_Ficha DESC",
+        ),
+        (
+            "Examen solicitado",
+            "COALESCE(S.fecha_solicitud, '')",
+            "S.id",
+            "S.Tipo_de_examen",
+            "S.Estado",
+            "SolicitudExamen S",
+            "S.id_paciente = :pid AND COALESCE(S.fecha_solicitud, '') <= :ts",
+            "COALESCE(S.fecha_solicitud, '') DESC, S.id DESC",
+        ),
+        (
+            "Resultado de examen",
+            "COALESCE(R.Fecha_Resultado, '')",
+            "R.rowid",
+            "'Resultado: ' || COALESCE(S.Tipo_de_examen, '')",
+            "R.Resultado_texto",
+            f"ResultadoExamen R LEFT JOIN SolicitudExamen S ON S.id = R.{fk_resultado}",
+            "R.id_paciente = :pid AND COALESCE(R.Fecha_Resultado, '') <= :ts",
+            "COALESCE(R.Fecha_Resultado, '') DESC, R.rowid DESC",
+        ),
+        (
+            "Prescripción",
+            "COALESCE(P.Fecha_emision, '')",
+            "P.ID_Prescripcion",
+            "P.Medicamento",
+            "TRIM(COALESCE(P.Dosis, '') || ' ' || COALESCE(P.Frecuencia, ''))",
+            "Prescripcion P",
+            "P.id_paciente = :pid AND COALESCE(P.Fecha_emision, '') <= :ts",
+            "COALESCE(P.Fecha_emision, '') DESC, P.ID_Prescripcion DESC",
+        ),
+    ]
+
+
+def sql_timeline() -> str:
+    """
+    Un único UNION ALL ordenado por timestamp con paginación por keyset.
+    Cada rama ya viene ordenada y limitada (recorre su índice desde el cursor y corta en
+    :limit), así una página nunca recorre el historial completo del paciente; solo se
+    ordenan las a lo más 5 × :limit filas que entregan las ramas.
+    """
+    ramas = []
+    for tipo, ts, pk, titulo, detalle, origen, filtro, orden in _ramas_timeline(_fk_resultado_examen()):
+        ramas.append(
+            f"""
+            SELECT * FROM (
+                SELECT {ts} AS ts, '{tipo}' AS tipo, {pk} AS id,
+                       {titulo} AS titulo, {detalle} AS detalle
+                FROM {origen}
+                WHERE {filtro}
+                  AND ({ts}, '{tipo}', {pk}) < (:ts, :tipo, :id)
+                ORDER BY {orden}
+                LIMIT :limit
+            )"""
+        )
+    return (
+        "SELECT ts, tipo, id, titulo, detalle FROM ("
+        + "\n            UNION ALL".join(ramas)
+        + "\n        )\n        ORDER BY ts DESC, tipo DESC, id DESC\n        LIMIT :limit"
+    )
+
+
+def timeline_paciente(id_paciente: int, cursor=CURSOR_INICIAL, limit: int = PAGINA_TIMELINE):
+    """Devuelve (eventos, siguiente_cursor). siguiente_cursor es None si no hay más."""
+    ts, tipo, pk = cursor
+    rows = fetch_all(
+        sql_timeline(),
+        {"pid": id_paciente, "ts": ts, "tipo": tipo, "id": pk, "limit": limit},
+    )
+    if len(rows) < limit:
+        return rows, None
+    ultimo = rows[-1]
+    return rows, (ultimo["ts"], ultimo["tipo"], ultimo["id"])
+
+
+# -------------------------------------------------------------
+# UI: Línea de tiempo
+# -------------------------------------------------------------
+ICONOS = {
+    "Cita": "📅",
+    "Ficha médica": "📋",
+    "Examen solicitado": "🧪",
+    "Resultado de examen": "📄",
+    "Prescripción": "💊",
+}
+
+
+def ui_timeline():
+    st.header("🕒 Línea de tiempo del paciente")
+
+    pacientes = listado_pacientes()
+    if not pacientes:
+        st.info("No hay pacientes registrados.")
+        return
+
+    opciones = {
+        f"#{p['id_paciente']} • {row_get(p, 'rut')} – {row_get(p, 'nombre')}": p["id_paciente"]
+        for p in pacientes
+    }
+    sel_key = st.selectbox("Paciente", list(opciones.keys()), key="timeline_paciente_select")
+    pid = opciones[sel_key]
+
+    # Estado por paciente: eventos ya cargados + cursor de la próxima página
+    estado_key = f"timeline_{pid}"
+    if estado_key not in st.session_state:
+        eventos, cursor = timeline_paciente(pid)
+        st.session_state[estado_key] = {"eventos": [dict(e) for e in eventos], "cursor": cursor}
+    estado = st.session_state[estado_key]
+
+    if not estado["eventos"]:
+        st.info("Este paciente no tiene eventos registrados.")
+        return
+
+    for e in estado["eventos"]:
+        icono = ICONOS.get(e["tipo"], "•")
+        st.markdown(
+            f"{icono} **{e['ts'] or 's/f'}** — {e['tipo']} #{e['id']}  \n"
+            f"{e['titulo'] or ''}"
+            + (f"  \n<small>{e['detalle']}</small>" if e["detalle"] else ""),
+            unsafe_allow_html=True,
+        )
+
+    if estado["cursor"] is not None:
+        if st.button("Cargar más", key=f"timeline_mas_{pid}"):
+            eventos, cursor = timeline_paciente(pid, estado["cursor"])
+            estado["eventos"].extend(dict(e) for e in eventos)
+            estado["cursor"] = cursor
+            st.rerun()
+    else:
+        st.caption(f"Fin del historial ({len(estado['eventos'])} eventos).")